@@ -7,12 +7,16 @@ import sys
 import time
 import json
 import threading
-import subprocess
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
+from core.runtime.stage_engine import StageEngine
+from core.runtime.dag_scheduler import DagScheduler, Stage, StageGraph
+from core.runtime.flag_events import FlagWatcher, request_interrupt, clear_interrupt
+from core.runtime.config_service import get_service
+
 # ===== VERSION =====
-VERSION = "CrX auto_runner v1.7.11 (pnl-sync scheduler + seed-cooldown + closeall)"
+VERSION = "CrX auto_runner v1.7.13 (candle-close tick + in-process stage engine + pnl-sync scheduler + seed-cooldown + closeall)"
 
 # ----- ENV / CONFIG -----
 try:
@@ -53,13 +57,15 @@ def _read_notify_toggles():
     )
 ENABLE_NOTIFY_DECISION, ENABLE_NOTIFY_FLAGS = _read_notify_toggles()
 
-# Tùy chọn: feature flags (nếu có)
+# Tùy chọn: feature flags (nếu có) – bảng cờ biên dịch dùng chung, reload tại chỗ khi config đổi
 FF = None
-try:
-    from configs.feature_flags_loader import load_flags  # không bắt buộc
-    FF = load_flags()
-except Exception:
-    FF = None
+def _load_ff():
+    try:
+        from configs.feature_flags_loader import get_flags  # không bắt buộc
+        return get_flags()
+    except Exception:
+        return None
+FF = _load_ff()
 
 def now_utc() -> datetime:
     return datetime.now(timezone.utc)
@@ -67,53 +73,110 @@ def now_utc() -> datetime:
 def ts() -> str:
     return now_utc().strftime("%Y-%m-%d %H:%M:%S")
 
-# ===== Watcher trạng thái cờ (nền) =====
+# ===== Watcher trạng thái cờ (sự kiện: inotify, fallback polling) =====
 _reload_event = threading.Event()
 _risk_changed_event = threading.Event()  # báo có thay đổi Risk-off (bật/tắt)
-_stop_state_last = None
-_risk_state_last = None
-_reload_state_last = None
-
-def _flag_watcher(poll_sec: float = 1.0):
-    """Theo dõi cờ mỗi 1s và phát sự kiện khi thay đổi."""
-    global _stop_state_last, _risk_state_last, _reload_state_last
+_closeall_event = threading.Event()      # closeall.flag xuất hiện → worker khẩn chạy ngay
+_config_event = threading.Event()        # file trong config/ hoặc configs/ đổi → nạp snapshot ở ranh giới tick
+_closeall_lock = threading.Lock()        # không chạy close-all chồng nhau
+_exec_lock = threading.Lock()            # close-all & order_executor không chạy song song
+FLAGS = None                             # FlagWatcher (khởi động trong main)
+
+def _wake_waiters() -> None:
+    """Đánh thức ngay vòng chờ tick (nến/đồng hồ) để xử lý cờ."""
+    if TICKER is not None:
+        TICKER.interrupt()
+
+def _on_flag(name: str, exists: bool) -> None:
+    """Callback từ FlagWatcher (thread watcher) mỗi khi 1 cờ đổi trạng thái."""
+    path = FLAG_DIR / name
+    print(f"[{ts()}] 👀 {name} = {exists} at {path}", flush=True)
+    if name == RELOAD_FLAG.name and exists:
+        _reload_event.set()
+    elif name == RISK_FLAG.name:
+        _risk_changed_event.set()
+        if exists:
+            request_interrupt("riskoff")
+    elif name == CLOSEALL_FLAG.name and exists:
+        request_interrupt("closeall")
+        _closeall_event.set()
+    _wake_waiters()
+
+def _closeall_worker() -> None:
+    """Worker khẩn: close-all chạy ngay khi cờ xuất hiện, không chờ hết stage/tick."""
     while True:
-        # RELOAD
-        cur_reload = RELOAD_FLAG.exists()
-        if cur_reload != _reload_state_last:
-            print(f"[{ts()}] 👀 reload.flag = {cur_reload} at {RELOAD_FLAG}", flush=True)
-            _reload_state_last = cur_reload
-            if cur_reload:
-                _reload_event.set()
-
-        # STOP
-        cur_stop = STOP_FLAG.exists()
-        if cur_stop != _stop_state_last:
-            print(f"[{ts()}] 👀 stop.flag   = {cur_stop} at {STOP_FLAG}", flush=True)
-            _stop_state_last = cur_stop
-
-        # RISK-OFF
-        cur_risk = RISK_FLAG.exists()
-        if cur_risk != _risk_state_last:
-            print(f"[{ts()}] 👀 riskoff.flag= {cur_risk} at {RISK_FLAG}", flush=True)
-            _risk_state_last = cur_risk
-            _risk_changed_event.set()
-
-        time.sleep(poll_sec)
+        _closeall_event.wait()
+        _closeall_event.clear()
+        try:
+            _check_closeall_if_any()
+        except Exception as e:
+            print(f"[{ts()}] ❌ Close-all lỗi: {e}", flush=True)
+
+def _start_flag_watcher() -> None:
+    global FLAGS
+    names = (RELOAD_FLAG.name, STOP_FLAG.name, RISK_FLAG.name, CLOSEALL_FLAG.name)
+    FLAGS = FlagWatcher(FLAG_DIR, names, on_change=_on_flag,
+                        log=lambda msg: print(f"[{ts()}] {msg}", flush=True)).start()
+    threading.Thread(target=_closeall_worker, name="closeall-worker", daemon=True).start()
+    print(f"[{ts()}] 👀 Theo dõi cờ bằng {FLAGS.backend} tại {FLAG_DIR}")
+
+# ----- CONFIG SERVICE (hot reload YAML, không gỡ module ấm) -----
+CONFIG_SVC = get_service()
+CONFIG_SVC.log = lambda msg: print(f"[{ts()}] {msg}", flush=True)
+
+def _on_config_change() -> None:
+    """Watcher config (thread riêng) thấy file đổi → báo runner áp dụng ở ranh giới tick."""
+    if not _config_event.is_set():
+        print(f"[{ts()}] 👀 File config thay đổi → nạp snapshot mới ở lần poll kế.", flush=True)
+        _config_event.set()
+        _wake_waiters()
+
+def _on_config_published(old, new) -> None:
+    """Snapshot mới: biên dịch lại bảng cờ từ nội dung đã parse (không đọc lại file) nếu feature_flags.yaml đổi."""
+    global FF
+    rel = "configs/feature_flags.yaml"
+    if FF is None:
+        FF = _load_ff()
+        return
+    if old is not None and old.get(rel) == new.get(rel):
+        return
+    try:
+        changes = FF.reload(raw=new.get(rel))
+    except Exception as e:
+        print(f"[{ts()}] ⚠️  Feature flags lỗi biên dịch, giữ bảng cũ: {e}", flush=True)
+        return
+    for path, (a, b) in sorted(changes.items()):
+        print(f"[{ts()}] 🚩 {path}: {a} → {b}", flush=True)
+
+def _start_config_service() -> None:
+    CONFIG_SVC.subscribe(_on_config_published)
+    CONFIG_SVC.start(on_change=_on_config_change)
+    snap = CONFIG_SVC.current()
+    if snap is not None:
+        print(f"[{ts()}] ⚙️  Config v{snap.version} (yaml_hash={snap.yaml_hash[:12]}) – watcher mỗi {CONFIG_SVC.watch_sec:g}s")
+
+def _apply_config_changes() -> bool:
+    """Áp dụng thay đổi file config (nếu có): validate → publish snapshot mới, lỗi thì giữ bản cũ."""
+    if not _config_event.is_set():
+        return False
+    _config_event.clear()
+    return CONFIG_SVC.reload(reason="watch")
+
+def _idle(sec: float) -> None:
+    """Ngủ tối đa `sec` giây nhưng dậy ngay khi có cờ đổi (không tốn CPU)."""
+    if FLAGS is not None:
+        FLAGS.wait_change(timeout=sec)
+    else:
+        time.sleep(sec)
 
 # ----- TIỆN ÍCH CHẠY MODULE -----
+# Stage engine: import module 1 lần & chạy in-process (CRX_STAGE_MODE=subprocess → python -m như cũ)
+ENGINE = StageEngine(log=lambda msg: print(f"[{ts()}] {msg}", flush=True))
+
 def run_module(mod: str, timeout: int = 300) -> int:
-    """Chạy 1 module bằng python -m. Trả về return code (0 = OK)."""
+    """Chạy 1 stage qua ENGINE (timeout + cách ly lỗi). Trả về return code (0 = OK)."""
     print(f"[{ts()}] Chạy module: {mod}")
-    try:
-        res = subprocess.run([PYTHON, "-m", mod], capture_output=False, check=False, timeout=timeout)
-        rc = res.returncode
-    except subprocess.TimeoutExpired:
-        print(f"[{ts()}] ⚠️  TIMEOUT: {mod}")
-        rc = 124
-    except Exception as e:
-        print(f"[{ts()}] ❌ Lỗi chạy {mod}: {e}")
-        rc = 1
+    rc = ENGINE.run(mod, timeout=timeout)
     if rc != 0:
         print(f"[{ts()}] ⚠️  Module {mod} kết thúc với mã {rc}")
     return rc
@@ -121,12 +184,35 @@ def run_module(mod: str, timeout: int = 300) -> int:
 def run_module_args(mod: str, args: list[str], timeout: int = 300) -> int:
     """Chạy module kèm tham số."""
     print(f"[{ts()}] Chạy module: {mod} {' '.join(args)}")
+    return ENGINE.run(mod, args=args, timeout=timeout)
+
+def run_exclusive(mod: str, args: list[str] | None = None, timeout: int = 300) -> int:
+    """
+    Stage đặt lệnh dưới _exec_lock. Quá timeout mà thread vẫn sống → giữ lock tới khi thread thoát
+    (nhả ở thread nền), để close-all/executor kế tiếp không chạy song song với bản treo.
+    """
+    hung = ENGINE.hung_thread(mod)
+    if hung is not None:
+        print(f"[{ts()}] ⏭️  {mod} lần trước vẫn chạy → bỏ qua.", flush=True)
+        return 124
+    _exec_lock.acquire()
+    release = True
     try:
-        res = subprocess.run([PYTHON, "-m", mod, *args], capture_output=False, check=False, timeout=timeout)
-        return res.returncode
-    except Exception as e:
-        print(f"[{ts()}] ❌ Lỗi chạy {mod}: {e}")
-        return 1
+        rc = run_module_args(mod, args, timeout=timeout) if args else run_module(mod, timeout=timeout)
+        hung = ENGINE.hung_thread(mod)
+        if hung is not None:
+            release = False
+
+            def _release_after(th=hung):
+                th.join()
+                _exec_lock.release()
+                print(f"[{ts()}] 🔓 {mod} (quá timeout) đã thoát → nhả khoá thực thi.", flush=True)
+
+            threading.Thread(target=_release_after, name=f"exec-lock:{mod}", daemon=True).start()
+        return rc
+    finally:
+        if release:
+            _exec_lock.release()
 
 def run_if_exists(mod: str, timeout: int = 300) -> int:
     """Chỉ chạy nếu module có thật trong repo (tránh lỗi khi một số module chưa có)."""
@@ -147,8 +233,8 @@ def should_run(flag_path: str, default_on: bool = True) -> bool:
 
 # ----- QUẢN LÝ CỜ -----
 def _consume_reload_flag() -> bool:
-    """Nếu có reload.flag hoặc event → xoá cờ (nếu có), reload .env và trả True."""
-    global ENABLE_NOTIFY_DECISION, ENABLE_NOTIFY_FLAGS
+    """Nếu có reload.flag hoặc event → xoá cờ (nếu có), reload .env + code, nạp lại config và trả True."""
+    global ENABLE_NOTIFY_DECISION, ENABLE_NOTIFY_FLAGS, FF
     if _reload_event.is_set() or RELOAD_FLAG.exists():
         try:
             if RELOAD_FLAG.exists():
@@ -163,17 +249,22 @@ def _consume_reload_flag() -> bool:
         except Exception:
             pass
         ENABLE_NOTIFY_DECISION, ENABLE_NOTIFY_FLAGS = _read_notify_toggles()
+        # Stage in-process giữ module ấm → gỡ để vòng sau nạp lại code/.env; config đi qua config service
+        ENGINE.reset()
+        FF = _load_ff()
+        _config_event.clear()
+        CONFIG_SVC.reload(reason="reload.flag", republish=True)
         print(f"[{ts()}] ENV reloaded: CRX_ENABLE_NOTIFY_DECISION={1 if ENABLE_NOTIFY_DECISION else 0} | CRX_ENABLE_NOTIFY_FLAGS={1 if ENABLE_NOTIFY_FLAGS else 0}")
         print(f"[{ts()}] 🔄 Nhận RELOAD → áp dụng config mới từ vòng kế tiếp.")
         return True
     return False
 
-def _wait_stop_if_needed(poll_sec: int = 2) -> None:
-    """Nếu có STOP → tạm dừng cho đến khi gỡ cờ."""
+def _wait_stop_if_needed(poll_sec: int = 60) -> None:
+    """Nếu có STOP → tạm dừng cho đến khi gỡ cờ (dậy ngay khi cờ đổi; close-all vẫn chạy)."""
     if STOP_FLAG.exists():
         print(f"[{ts()}] ⏸️ STOP đang bật tại: {STOP_FLAG}. (Xoá stop.flag để tiếp tục)")
         while STOP_FLAG.exists():
-            time.sleep(poll_sec)
+            _idle(poll_sec)
         print(f"[{ts()}] ▶️ STOP đã gỡ. Tiếp tục chạy.")
 
 _last_riskoff_state_print = None
@@ -191,22 +282,61 @@ def _read_risk_state() -> bool:
 
 def _check_closeall_if_any():
     """Nếu có closeall.flag → gọi tools.close_all_positions rồi xoá cờ."""
-    if CLOSEALL_FLAG.exists():
+    if not CLOSEALL_FLAG.exists() or not _closeall_lock.acquire(blocking=False):
+        return  # không có cờ, hoặc worker khẩn đang xử lý
+    try:
+        if not CLOSEALL_FLAG.exists():
+            return
         print(f"[{ts()}] 🧹 Phát hiện closeall.flag → đóng toàn bộ vị thế (reduceOnly).")
-        rc = run_module_args("tools.close_all_positions", ["--wait","8"], timeout=180)
+        # chờ order_executor (nếu đang chạy, kể cả bản quá timeout) dừng tại safe point
+        rc = run_exclusive("tools.close_all_positions", ["--wait","8"], timeout=180)
         try:
             CLOSEALL_FLAG.unlink()
         except Exception:
             pass
         print(f"[{ts()}] 🧹 Close-all đã chạy (rc={rc}).")
+    finally:
+        _closeall_lock.release()
 
 # ----- NGỦ CÓ POLLING CỜ -----
-def _sleep_until_next_tick(loop_minutes: int, poll_sec: int = 2) -> bool:
+def _poll_flags_while_sleeping() -> bool:
+    """Poll STOP/CLOSEALL/RELOAD/RISK-OFF khi đang chờ tick. True = dậy sớm."""
+    _wait_stop_if_needed()
+    _check_closeall_if_any()
+    _apply_config_changes()
+
+    if _consume_reload_flag():
+        print(f"[{ts()}] ⏩ Dậy sớm do RELOAD.")
+        return True
+
+    if _risk_changed_event.is_set():
+        _risk_changed_event.clear()
+        print(f"[{ts()}] ⏩ Dậy sớm do RISK-OFF thay đổi.")
+        return True
+    return False
+
+def _sleep_until_next_tick(loop_minutes: int, poll_sec: int = 60) -> bool:
     """
-    Ngủ đến mốc tick kế tiếp (00, 15, 30, 45…).
-    Trong lúc ngủ: poll STOP/RELOAD và **đánh thức nếu Risk-off thay đổi**.
+    Chờ tick kế tiếp:
+    - CRX_TICK_SOURCE=candle: chờ nến timeframe đóng theo giờ sàn (ws kline / REST close+epsilon);
+    - CRX_TICK_SOURCE=clock : ngủ đến mốc phút máy (00, 15, 30, 45…) như cũ.
+    Trong lúc chờ: dậy ngay khi cờ đổi (FlagWatcher), poll an toàn mỗi poll_sec;
+    xử lý STOP/RELOAD và **đánh thức nếu Risk-off thay đổi**.
     Trả True nếu dậy sớm (do RELOAD hoặc RISK-OFF change).
     """
+    global _close_event
+    _close_event = None
+    if TICKER is not None:
+        nxt = datetime.fromtimestamp(TICKER.next_close_ms() / 1000, tz=timezone.utc)
+        print(f"[{ts()}] 💤 Chờ nến {TICKER.interval} đóng lúc {nxt.strftime('%H:%M:%S')} (giờ sàn, "
+              f"ws={'on' if TICKER.ws_connected else 'off'}, poll={poll_sec}s)...")
+        ev = TICKER.wait(poll=_poll_flags_while_sleeping, poll_sec=poll_sec)
+        if ev is None:
+            return True
+        _close_event = ev
+        print(f"[{ts()}] 🕯️  Nến đóng (nguồn={ev.source}, trễ phát hiện {ev.detect_latency_ms}ms).")
+        return False
+
     now = datetime.now()
     minute = (now.minute // loop_minutes) * loop_minutes
     next_min = minute + loop_minutes
@@ -223,20 +353,11 @@ def _sleep_until_next_tick(loop_minutes: int, poll_sec: int = 2) -> bool:
         if now >= next_tick:
             return False  # ngủ đủ
 
-        _wait_stop_if_needed(poll_sec=poll_sec)
-        _check_closeall_if_any()
-
-        if _consume_reload_flag():
-            print(f"[{ts()}] ⏩ Dậy sớm do RELOAD.")
-            return True
-
-        if _risk_changed_event.is_set():
-            _risk_changed_event.clear()
-            print(f"[{ts()}] ⏩ Dậy sớm do RISK-OFF thay đổi.")
+        if _poll_flags_while_sleeping():
             return True
 
         remain = (next_tick - now).total_seconds()
-        time.sleep(poll_sec if remain > poll_sec else remain)
+        _idle(poll_sec if remain > poll_sec else remain)
 
 def _maybe_run_daily_report() -> None:
     """Chạy báo cáo ngày 1 lần/giờ (phút 00) để tránh spam."""
@@ -253,14 +374,14 @@ def _maybe_run_pnl_sync() -> None:
     """
     Đồng bộ PnL theo lịch:
       - Mỗi mốc 00/15/30/45 phút, hoặc
-      - Khi file đã cũ > 30 phút (đề phòng runner ngủ dài hay lỗi trước đó).
+      - Khi pnl_summary.json đã cũ > 30 phút (đề phòng runner ngủ dài hay lỗi trước đó).
+    pnl_sync chạy tăng dần theo con trỏ nên mỗi lần chỉ tải income mới.
     """
     try:
         now = datetime.now()
         on_quarter = (now.minute % 15 == 0)
         p_sum = DATA_DIR / "pnl_summary.json"
-        p_raw = DATA_DIR / "pnl_income_raw.json"
-        stale = (_file_age_minutes(p_sum) > 30.0) or (_file_age_minutes(p_raw) > 30.0)
+        stale = _file_age_minutes(p_sum) > 30.0
         if on_quarter or stale:
             run_if_exists("core.evaluator.pnl_sync", timeout=180)
     except Exception as e:
@@ -268,15 +389,12 @@ def _maybe_run_pnl_sync() -> None:
 
 # ----- SEED COOLDOWN TỪ FILE -----
 def _seed_cooldown_from_file():
-    """Khởi tạo _last_decision_wallclock dựa trên quyết định cuối trong data/decision_history.json."""
+    """Khởi tạo _last_decision_wallclock dựa trên quyết định cuối trong decision log (đọc O(1))."""
     global _last_decision_wallclock
     try:
-        f = DATA_DIR / "decision_history.json"
-        if not f.exists():
-            return
-        obj = json.loads(f.read_text(encoding="utf-8"))
-        if isinstance(obj, list) and obj:
-            last = obj[-1]
+        from core.memory.decision_log import get_log
+        last = get_log().last()
+        if isinstance(last, dict):
             ts_iso = last.get("timestamp")
             if ts_iso:
                 try:
@@ -288,6 +406,160 @@ def _seed_cooldown_from_file():
     except Exception:
         pass
 
+# ----- NGUỒN TICK THEO GIỜ ĐÓNG NẾN -----
+TICKER = None          # CandleCloseTicker khi CRX_TICK_SOURCE=candle
+_close_event = None    # CloseEvent đã kích hoạt tick hiện tại (để đo close → decision)
+
+def _init_ticker():
+    global TICKER
+    try:
+        from core.runtime import candle_clock
+        if candle_clock.TICK_SOURCE != "candle":
+            return
+        from configs.config import SYMBOLS, TIMEFRAME
+        interval = os.getenv("CRX_TICK_INTERVAL", str(TIMEFRAME or "15m"))
+        symbol = (SYMBOLS or ["BTCUSDT"])[0]
+        TICKER = candle_clock.CandleCloseTicker(
+            symbol, interval, log=lambda msg: print(f"[{ts()}] {msg}", flush=True)).start()
+        print(f"[{ts()}] 🕯️  Tick theo nến {symbol} {interval} (lệch giờ sàn {TICKER.clock.offset_ms}ms)")
+    except Exception as e:
+        TICKER = None
+        print(f"[{ts()}] ⚠️  Không khởi tạo được tick theo nến ({e}) → ngủ theo đồng hồ máy.")
+
+# ----- METADATA SYMBOL (bộ lọc lệnh) -----
+def _warm_symbol_meta():
+    """Nạp data/symbol_meta.json (hoặc tải exchangeInfo) ở luồng nền → lệnh đầu tiên không phải chờ."""
+    def _run():
+        try:
+            from core.execution.order_executor import BINANCE_FUTURES_TESTNET
+            from core.execution.symbol_meta import get_symbol_meta
+            meta = get_symbol_meta(BINANCE_FUTURES_TESTNET)
+            meta.warm()
+            print(f"[{ts()}] 📐 symbol_meta: {len(meta.symbols)} symbol (stale={meta.stale()})")
+        except Exception as e:
+            print(f"[{ts()}] ⚠️  symbol_meta warm lỗi: {e}")
+    threading.Thread(target=_run, name="symbol-meta-warm", daemon=True).start()
+
+# ----- ĐỒ THỊ STAGE CHO 1 TICK -----
+SCHEDULER = DagScheduler(log=lambda msg: print(f"[{ts()}] {msg}", flush=True))
+
+def _refresh_riskoff(tick: dict, note: str) -> bool:
+    """Nếu Risk-off vừa đổi giữa vòng → cập nhật trạng thái tick."""
+    if _risk_changed_event.is_set():
+        _risk_changed_event.clear()
+        tick["riskoff"] = _read_risk_state()
+        if tick["riskoff"]:
+            print(f"[{ts()}] ⏭️  RISK-OFF bật giữa vòng: {note}.")
+    return tick["riskoff"]
+
+def _gate_decision(tick: dict) -> bool:
+    """DECISION (bỏ qua khi risk-off) + COOLDOWN (seed từ file)."""
+    if _refresh_riskoff(tick, "bỏ qua decision & order"):
+        print(f"[{ts()}] ⏭️  RISK-OFF: bỏ qua decision_*.")
+        return False
+    now_wall = time.time()
+    if (now_wall - _last_decision_wallclock) < COOLDOWN_DECISION_SEC:
+        remain = COOLDOWN_DECISION_SEC - (now_wall - _last_decision_wallclock)
+        print(f"[{ts()}] ⏳ Cooldown {COOLDOWN_DECISION_SEC}s (còn {remain:.1f}s): bỏ qua decision_* vòng này.")
+        return False
+    return True
+
+def _run_decision(tick: dict) -> int:
+    rc = run_if_exists("core.decision.decision_maker", timeout=120)
+    tick["decided"] = True
+    ev = tick.get("close_event")
+    if TICKER is not None and ev is not None:
+        lat = TICKER.record_latency(ev, "decision")
+        print(f"[{ts()}] ⏱️  Close → decision: {lat}ms (nguồn={ev.source}).")
+    return rc
+
+def _run_meta(tick: dict) -> int:
+    global _last_decision_wallclock
+    rc = 0
+    if should_run("modules.decision.meta_controller.enabled", True):
+        rc = run_if_exists("core.decision.meta_controller", timeout=120)
+    _last_decision_wallclock = time.time()
+    return rc
+
+def _run_executor() -> int:
+    return run_exclusive("core.execution.order_executor", timeout=180)
+
+def _gate_executor(tick: dict) -> bool:
+    riskoff = _refresh_riskoff(tick, "bỏ qua order")
+    if ENABLE_EXECUTOR and riskoff:
+        print(f"[{ts()}] ⏭️  RISK-OFF: bỏ qua order_executor.")
+    return ENABLE_EXECUTOR and not riskoff
+
+def _run_evaluate() -> int:
+    rc_eval = run_if_exists("core.evaluator.evaluate_latest", timeout=120)
+    if rc_eval != 0:
+        return run_if_exists("core.evaluator.evaluate_decision", timeout=120)
+    return rc_eval
+
+def _build_tick_stages(tick: dict) -> list[Stage]:
+    """
+    Khai báo stage của 1 tick (inputs/outputs = artefact dùng chung).
+    Thứ tự khai báo giữ đúng pipeline cũ và là ưu tiên khi nhiều stage cùng sẵn sàng.
+    """
+    candles = ("candles",)
+    left_agg_on = lambda: (should_run("modules.analyzer.aggregators.left_agg.enabled", True) or
+                           should_run("modules.aggregators.left_agg.enabled", True))
+
+    stages: list[Stage] = []
+    # 1) COLLECTOR – tự thu song song mọi symbol×timeframe trong 1 đợt (pool + weight riêng)
+    stages.append(Stage("collector", lambda: run_if_exists("core.collector.market_collector", timeout=300),
+                        outputs=candles))
+    # 8) PnL SYNC & REPORT – không phụ thuộc dữ liệu tick → chạy song song ngay từ đầu
+    stages += [
+        Stage("pnl_sync", _maybe_run_pnl_sync, outputs=("pnl",)),
+        Stage("report_daily", _maybe_run_daily_report, outputs=("report",)),
+    ]
+    # 2) FEATURE ETL → 3) ANALYZER
+    stages += [
+        Stage("etl.cleaner", lambda: run_if_exists("core.feature_etl.cleaner", timeout=120),
+              inputs=candles, outputs=("etl.clean",)),
+        Stage("etl.alignment", lambda: run_if_exists("core.feature_etl.alignment", timeout=120),
+              inputs=("etl.clean",), outputs=("etl.aligned",)),
+        Stage("etl.selector", lambda: run_if_exists("core.feature_etl.selector", timeout=120),
+              inputs=("etl.aligned",), outputs=("features",)),
+        Stage("technical_analyzer", lambda: run_if_exists("core.analyzer.technical_analyzer", timeout=300),
+              inputs=("features",), outputs=("signals",)),
+        Stage("left_agg", lambda: run_if_exists("core.aggregators.left_agg", timeout=120),
+              inputs=("signals",), outputs=("signals.left",), when=left_agg_on),
+    ]
+    # 4) DECISION → META (chuỗi an toàn)
+    stages += [
+        Stage("decision_maker", lambda: _run_decision(tick),
+              inputs=("signals", "signals.left") + candles, outputs=("decision",),
+              when=lambda: _gate_decision(tick)),
+        Stage("meta_controller", lambda: _run_meta(tick),
+              inputs=("decision",), outputs=("route",), when=lambda: tick["decided"]),
+    ]
+    # 5) CAPITAL / FUNDING (tùy chọn) – độc lập với chuỗi decision
+    stages += [
+        Stage("capital_gate", lambda: run_if_exists("core.capital.capital_gate", timeout=90),
+              outputs=("sizing",), when=lambda: should_run("modules.capital.capital_gate.enabled", True)),
+        Stage("funding_optimizer", lambda: run_if_exists("core.capital.funding_optimizer", timeout=90),
+              outputs=("funding",), when=lambda: should_run("modules.capital.funding_optimizer.enabled", True)),
+    ]
+    # 6) EXECUTION & MONITOR – luôn sau meta_controller (route) & capital
+    stages += [
+        Stage("order_executor", _run_executor,
+              inputs=("decision", "route", "sizing", "funding"), outputs=("orders",),
+              after=("meta_controller",), when=lambda: _gate_executor(tick)),
+        Stage("order_monitor", lambda: run_if_exists("core.execution.order_monitor", timeout=180),
+              inputs=("orders",), outputs=("order_status",), after=("order_executor",)),
+    ]
+    # 7) EVALUATE + NOTIFY
+    stages += [
+        Stage("evaluate", _run_evaluate, inputs=("order_status",), outputs=("evaluation",)),
+        Stage("notify_decision", lambda: run_if_exists("notifier.notify_decision", timeout=90),
+              inputs=("decision",), outputs=("notify_state",), when=lambda: ENABLE_NOTIFY_DECISION),
+        Stage("notify_flags", lambda: run_if_exists("notifier.notify_flags", timeout=60),
+              outputs=("notify_state",), when=lambda: ENABLE_NOTIFY_FLAGS),
+    ]
+    return stages
+
 # ----- VÒNG LẶP CHÍNH -----
 def main():
     print(f"{VERSION}")
@@ -299,8 +571,17 @@ def main():
     # Seed cooldown từ file quyết định
     _seed_cooldown_from_file()
 
-    # Khởi động watcher nền
-    threading.Thread(target=_flag_watcher, daemon=True).start()
+    # Khởi động watcher cờ (inotify / polling) + worker close-all khẩn
+    _start_flag_watcher()
+
+    # Config service: snapshot bất biến + watcher config/, configs/
+    _start_config_service()
+
+    # Nguồn tick theo giờ đóng nến của sàn
+    _init_ticker()
+
+    # Metadata symbol cho executor (TTL + làm mới nền)
+    _warm_symbol_meta()
 
     env_path = ROOT / ".env"
     if not env_path.exists():
@@ -311,88 +592,28 @@ def main():
     try:
         while True:
             start = time.time()
+            ENGINE.new_tick()
 
             # Poll cờ ngay đầu vòng
             _wait_stop_if_needed()
+            _apply_config_changes()
             _consume_reload_flag()
             _check_closeall_if_any()
+            clear_interrupt()
             riskoff = _read_risk_state()
 
-            # 1) COLLECTOR
-            run_if_exists("core.collector.market_collector", timeout=300)
-
-            # 2) FEATURE ETL
-            run_if_exists("core.feature_etl.cleaner", timeout=120)
-            run_if_exists("core.feature_etl.alignment", timeout=120)
-            run_if_exists("core.feature_etl.selector", timeout=120)
-
-            # 3) ANALYZER
-            run_if_exists("core.analyzer.technical_analyzer", timeout=300)
-            if should_run("modules.analyzer.aggregators.left_agg.enabled", True) or \
-               should_run("modules.aggregators.left_agg.enabled", True):
-                run_if_exists("core.aggregators.left_agg", timeout=120)
-
-            # Nếu Risk-off vừa đổi giữa vòng → cập nhật & có thể bỏ qua Decision/Order
-            if _risk_changed_event.is_set():
-                _risk_changed_event.clear()
-                riskoff = _read_risk_state()
-                if riskoff:
-                    print(f"[{ts()}] ⏭️  RISK-OFF bật giữa vòng: bỏ qua decision & order.")
-
-            # 4) DECISION (bỏ qua khi risk-off) + COOLDOWN (seed từ file)
-            if not riskoff:
-                global _last_decision_wallclock
-                now_wall = time.time()
-                if (now_wall - _last_decision_wallclock) < COOLDOWN_DECISION_SEC:
-                    remain = COOLDOWN_DECISION_SEC - (now_wall - _last_decision_wallclock)
-                    print(f"[{ts()}] ⏳ Cooldown {COOLDOWN_DECISION_SEC}s (còn {remain:.1f}s): bỏ qua decision_* vòng này.")
-                else:
-                    run_if_exists("core.decision.decision_maker", timeout=120)
-                    if should_run("modules.decision.meta_controller.enabled", True):
-                        run_if_exists("core.decision.meta_controller", timeout=120)
-                    _last_decision_wallclock = time.time()
-            else:
-                print(f"[{ts()}] ⏭️  RISK-OFF: bỏ qua decision_*.")
-
-            # 5) CAPITAL / FUNDING (tùy chọn)
-            if should_run("modules.capital.capital_gate.enabled", True):
-                run_if_exists("core.capital.capital_gate", timeout=90)
-            if should_run("modules.capital.funding_optimizer.enabled", True):
-                run_if_exists("core.capital.funding_optimizer", timeout=90)
-
-            # Cập nhật Risk-off lần nữa trước EXECUTION
-            if _risk_changed_event.is_set():
-                _risk_changed_event.clear()
-                riskoff = _read_risk_state()
-                if riskoff:
-                    print(f"[{ts()}] ⏭️  RISK-OFF bật giữa vòng: bỏ qua order.")
-
-            # 6) EXECUTION & MONITOR
-            if ENABLE_EXECUTOR and not riskoff:
-                run_if_exists("core.execution.order_executor", timeout=180)
-            elif ENABLE_EXECUTOR and riskoff:
-                print(f"[{ts()}] ⏭️  RISK-OFF: bỏ qua order_executor.")
-            run_if_exists("core.execution.order_monitor", timeout=180)
-
-            # 7) EVALUATE
-            rc_eval = run_if_exists("core.evaluator.evaluate_latest", timeout=120)
-            if rc_eval != 0:
-                run_if_exists("core.evaluator.evaluate_decision", timeout=120)
-
-            # 8) PnL SYNC + NOTIFY / REPORT
-            _maybe_run_pnl_sync()  # <<< mới
-            if ENABLE_NOTIFY_DECISION:
-                run_if_exists("notifier.notify_decision", timeout=90)
-            if ENABLE_NOTIFY_FLAGS:
-                run_if_exists("notifier.notify_flags", timeout=60)
-            _maybe_run_daily_report()
+            # Chạy cả tick theo đồ thị phụ thuộc: stage độc lập chạy song song,
+            # chuỗi an toàn decision → meta_controller → executor giữ nguyên thứ tự.
+            tick = {"riskoff": riskoff, "decided": False, "close_event": _close_event}
+            report = SCHEDULER.run(StageGraph(_build_tick_stages(tick)))
+            print(f"[{ts()}] 🧭 {report.summary()}")
 
             # Tổng kết vòng
             dur = time.time() - start
             print(f"[{ts()}] ✅ Vòng chạy xong trong {dur:.1f}s")
 
             # Ngủ có polling cờ & thức dậy khi Risk-off thay đổi
-            woke_early = _sleep_until_next_tick(LOOP_MINUTES, poll_sec=2)
+            woke_early = _sleep_until_next_tick(LOOP_MINUTES)
             if woke_early:
                 continue
 
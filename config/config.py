@@ -1,59 +1,94 @@
 # config/config.py — shim tương thích: CONFIG đọc từ bundle YAML
+# Snapshot biên dịch: bundle đã validate + bọc _Node được pickle vào data/config_snapshot.pkl, khoá theo yaml_hash
+# (sha256 gộp 11 file YAML). Import thường chỉ stat 11 file + unpickle, không import pydantic/config_loader.
+# Snapshot chỉ dựng lại khi nội dung YAML đổi (stat đổi nhưng hash y nguyên → chỉ cập nhật stat)
+# hoặc khi config_loader.py (model/validate) đổi.
+# ENV: CRX_CONFIG_DIR (./config), CRX_CONFIG_SNAPSHOT=0 (tắt cache), CRX_CONFIG_SNAPSHOT_PATH
 from __future__ import annotations
 import os
-from typing import Any, Mapping
+import pickle
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional, Tuple
 
-# Nạp load_bundle bền vững (3 lớp: relative -> top-level -> path)
-try:
-    from .config_loader import load_bundle
-except Exception:
+CONFIG_FILES = ("central", "controller", "left", "right", "soul", "body", "executor",
+                "crx_report", "dataset_registry", "model_registry", "capital_policy")
+SNAPSHOT_VERSION = 2
+_LOADER = Path(__file__).resolve().parent / "config_loader.py"
+SNAPSHOT_PATH = Path(os.getenv("CRX_CONFIG_SNAPSHOT_PATH",
+                               str(Path(__file__).resolve().parents[1] / "data" / "config_snapshot.pkl")))
+
+def _load_bundle_fn():
+    # Nạp load_bundle bền vững (3 lớp: relative -> top-level -> path); chỉ gọi khi phải dựng lại snapshot
     try:
-        from config_loader import load_bundle  # khi chạy như package root
+        from .config_loader import load_bundle
     except Exception:
-        import importlib.util, pathlib, sys
-        _here = pathlib.Path(__file__).resolve().parent
-        _p = _here / "config_loader.py"
-        spec = importlib.util.spec_from_file_location("crx_cfg_loader", str(_p))
-        _m = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(_m)  # type: ignore
-        load_bundle = _m.load_bundle  # type: ignore
+        try:
+            from config_loader import load_bundle  # khi chạy như package root
+        except Exception:
+            import importlib.util, pathlib, sys
+            _here = pathlib.Path(__file__).resolve().parent
+            _p = _here / "config_loader.py"
+            spec = importlib.util.spec_from_file_location("crx_cfg_loader", str(_p))
+            _m = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(_m)  # type: ignore
+            load_bundle = _m.load_bundle  # type: ignore
+    return load_bundle
+
+def load_bundle(config_dir: str):
+    return _load_bundle_fn()(config_dir)
 
 class _Node(dict):
-    """Dict hỗ trợ truy cập cả attribute lẫn key, case-insensitive."""
+    """Dict hỗ trợ truy cập cả attribute lẫn key, case-insensitive.
+    Key lưu sẵn dạng chuẩn hoá và được gương vào __dict__ → truy cập attribute/key/get đi thẳng dict,
+    chỉ chuẩn hoá khi trượt (vd key viết hoa). Key trùng tên method của dict vẫn chỉ đọc được bằng [] như cũ."""
     def __init__(self, d: Mapping[str, Any] | None = None):
         super().__init__()
         if d:
             for k, v in d.items():
-                self[_normalize(k)] = self._wrap(v)
+                self[k] = self._wrap(v)
+    def __setitem__(self, key: str, value: Any) -> None:
+        key = _normalize(key)
+        dict.__setitem__(self, key, value)
+        if key not in _NODE_ATTRS and key.isidentifier():
+            self.__dict__[key] = value
     def __getattr__(self, name: str) -> Any:
         key = _normalize(name)
         if key in self:
-            return self[key]
+            return dict.__getitem__(self, key)
         raise AttributeError(name)
     def __getitem__(self, key: str) -> Any:
-        return super().__getitem__(_normalize(key))
+        try:
+            return dict.__getitem__(self, key)
+        except KeyError:
+            return dict.__getitem__(self, _normalize(key))
     def get(self, key: str, default=None) -> Any:
-        return super().get(_normalize(key), default)
+        v = dict.get(self, key, _MISSING)
+        if v is _MISSING:
+            v = dict.get(self, _normalize(key), default)
+        return v
     @staticmethod
     def _wrap(v: Any) -> Any:
         if isinstance(v, dict):
             return _Node(v)
         return v
 
+_NODE_ATTRS = frozenset(dir(_Node))
+_MISSING = object()
+
 def _normalize(s: str) -> str:
     return str(s).strip().lower()
 
-def _bundle_to_node() -> _Node:
-    cfg_dir = os.getenv("CRX_CONFIG_DIR", "./config")
-    b = load_bundle(cfg_dir)
+def _cfg_dir() -> str:
+    return os.path.abspath(os.getenv("CRX_CONFIG_DIR", "./config"))
 
+def _bundle_root(b) -> Dict[str, Any]:
     central = b.central.model_dump(); controller = b.controller.model_dump()
     left = b.left.model_dump(); right = b.right.model_dump(); soul = b.soul.model_dump()
     body = b.body.model_dump(); executor = b.executor.model_dump()
     crx_report = b.crx_report.model_dump(); dataset_registry = b.dataset_registry.model_dump()
     model_registry = b.model_registry.model_dump(); capital_policy = b.capital_policy.model_dump()
 
-    root = {
+    return {
         "central": central, "CENTRAL": central,
         "controller": controller, "CONTROLLER": controller,
         "left": left, "LEFT": left,
@@ -69,11 +104,90 @@ def _bundle_to_node() -> _Node:
         "order_policy": executor.get("order_policy", {}), "ORDER_POLICY": executor.get("order_policy", {}),
         "risk_hooks": executor.get("risk_hooks", {}), "RISK_HOOKS": executor.get("risk_hooks", {}),
     }
-    return _Node(root)
+
+# ----- snapshot -----
+def _stats(cfg_dir: str) -> Tuple[Tuple[str, int, int], ...]:
+    out = []
+    for name in CONFIG_FILES:
+        st = os.stat(os.path.join(cfg_dir, f"{name}.yaml"))
+        out.append((name, st.st_size, st.st_mtime_ns))
+    return tuple(out)
+
+def _loader_stat() -> Tuple[int, int]:
+    try:
+        st = os.stat(_LOADER)
+        return st.st_size, st.st_mtime_ns
+    except OSError:
+        return 0, 0
+
+def yaml_hash(cfg_dir: Optional[str] = None) -> str:
+    """sha256 gộp nội dung 11 file YAML (cùng thứ tự với load_bundle)."""
+    import hashlib
+    cfg_dir = cfg_dir or _cfg_dir()
+    h = hashlib.sha256()
+    for name in CONFIG_FILES:
+        with open(os.path.join(cfg_dir, f"{name}.yaml"), "rb") as f:
+            h.update(name.encode() + b"\0" + f.read() + b"\0")
+    return h.hexdigest()
+
+def _read_snapshot() -> Optional[Dict[str, Any]]:
+    try:
+        with open(SNAPSHOT_PATH, "rb") as f:
+            snap = pickle.load(f)
+        return snap if isinstance(snap, dict) and snap.get("version") == SNAPSHOT_VERSION else None
+    except Exception:
+        return None
+
+def _write_snapshot(snap: Dict[str, Any]) -> None:
+    try:
+        SNAPSHOT_PATH.parent.mkdir(parents=True, exist_ok=True)
+        tmp = SNAPSHOT_PATH.with_name(f"{SNAPSHOT_PATH.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(snap, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, SNAPSHOT_PATH)
+    except Exception as e:
+        print(f"[config] ⚠️ ghi snapshot lỗi: {e}")
+
+def build_snapshot(cfg_dir: Optional[str] = None, bundle=None) -> Dict[str, Any]:
+    """Đọc + validate bundle (pydantic) rồi ghi snapshot mới. Lỗi validate vẫn raise như trước.
+    bundle: bundle đã nạp sẵn (config service validate trước rồi mới ghi) → không đọc YAML lần nữa."""
+    cfg_dir = cfg_dir or _cfg_dir()
+    stats, digest = _stats(cfg_dir), yaml_hash(cfg_dir)
+    b = bundle if bundle is not None else load_bundle(cfg_dir)
+    snap = {"version": SNAPSHOT_VERSION, "dir": cfg_dir, "loader": _loader_stat(), "yaml_hash": digest, "stats": stats,
+            "hashes": dict(b.yaml_hashes), "config": _Node(_bundle_root(b))}
+    _write_snapshot(snap)
+    return snap
+
+def load_snapshot(cfg_dir: Optional[str] = None) -> Dict[str, Any]:
+    """Snapshot hợp lệ cho cfg_dir: stat khớp → dùng ngay; stat lệch mà hash khớp → dùng + cập nhật stat."""
+    cfg_dir = cfg_dir or _cfg_dir()
+    if os.getenv("CRX_CONFIG_SNAPSHOT", "1") == "0":
+        b = load_bundle(cfg_dir)
+        return {"dir": cfg_dir, "yaml_hash": yaml_hash(cfg_dir), "hashes": dict(b.yaml_hashes),
+                "config": _Node(_bundle_root(b))}
+    snap = _read_snapshot()
+    if snap is not None and snap.get("dir") == cfg_dir and snap.get("loader") == _loader_stat():
+        try:
+            stats = _stats(cfg_dir)
+        except OSError:
+            stats = None
+        if stats is not None and stats == snap.get("stats"):
+            return snap
+        if stats is not None and yaml_hash(cfg_dir) == snap.get("yaml_hash"):
+            snap["stats"] = stats
+            _write_snapshot(snap)
+            return snap
+    return build_snapshot(cfg_dir)
+
+_SNAPSHOT = load_snapshot()
 
 # Biến cấu hình tương thích
-CONFIG: _Node = _bundle_to_node()
+CONFIG: _Node = _SNAPSHOT["config"]
+YAML_HASH: str = _SNAPSHOT["yaml_hash"]
+
+def _bundle_to_node() -> _Node:
+    return load_snapshot()["config"]
 
 def get_bundle():
-    cfg_dir = os.getenv("CRX_CONFIG_DIR", "./config")
-    return load_bundle(cfg_dir)
\ No newline at end of file
+    return load_bundle(_cfg_dir())
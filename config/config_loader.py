@@ -99,8 +99,10 @@ class TelegramTemplate(BaseModel):
 
 class TelegramConfig(BaseModel):
     model_config = ConfigDict(extra="ignore")
+    enabled: bool = True
     chat_ids: List[str] = Field(default_factory=list)
     throttle_per_minute: Optional[int] = 6
+    dedupe_minutes: int = 30
     template: Optional[TelegramTemplate] = None
 
 class Notifications(BaseModel):
@@ -120,7 +122,7 @@ class CentralConfig(BaseModel):
 class SymbolFairness(BaseModel):
     model_config = ConfigDict(extra="ignore")
     max_symbols_per_cycle: int = 2
-    rotation: Literal["round_robin","random"] = "round_robin"
+    rotation: Literal["round_robin","confidence","random"] = "round_robin"
 
 class Routing(BaseModel):
     model_config = ConfigDict(extra="ignore")
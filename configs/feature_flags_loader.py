@@ -4,8 +4,9 @@ from __future__ import annotations
 import os
 import sys
 import argparse
+import threading
 from pathlib import Path
-from typing import Any, Dict, List, Tuple, Optional
+from typing import Any, Callable, Dict, List, Tuple, Optional
 
 try:
     import yaml  # pip install pyyaml
@@ -16,6 +17,8 @@ except Exception as e:
 ROOT = Path(__file__).resolve().parents[1]
 CFG_PATH = ROOT / "configs" / "feature_flags.yaml"
 
+_MISSING = object()
+
 # --------- Utilities ---------
 def deep_get(d: dict, path: str, default=None):
     cur = d
@@ -75,82 +78,190 @@ def env_overrides(prefix: str) -> Dict[str, Any]:
         deep_set(res, path, vv)
     return res
 
+def flatten_paths(d: dict, prefix: str = "", out: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Bảng phẳng "a.b.c" -> value cho mọi node (cả dict trung gian), cùng ngữ nghĩa deep_get:
+    key không phải str hoặc chứa '.' thì deep_get không với tới được → bỏ qua. Key được intern.
+    """
+    if out is None:
+        out = {}
+    for k, v in d.items():
+        if not isinstance(k, str) or "." in k:
+            continue
+        p = sys.intern(f"{prefix}.{k}" if prefix else k)
+        out[p] = v
+        if isinstance(v, dict):
+            flatten_paths(v, p, out)
+    return out
+
 # --------- Core Loader ---------
 class FeatureFlags:
-    def __init__(self, data: dict, effective: dict, chosen_phase: str, safety_fail_closed: bool, prefix: str):
+    """
+    Bảng cờ đã biên dịch: phase overrides + env overrides gộp sẵn vào bảng phẳng path → value,
+    kết quả is_on tính trước cho mọi path → get/is_on là 1 lần tra dict (O(1)).
+    reload() dựng lại bảng tại chỗ (cùng object) và báo subscriber các path lá đã đổi.
+    """
+    def __init__(self, data: dict, effective: dict, chosen_phase: str, safety_fail_closed: bool, prefix: str,
+                 path: Optional[Path] = None, phase_arg: Optional[str] = None):
+        self._path = path
+        self._phase_arg = phase_arg
+        self._subs: List[Tuple[str, Callable[[Dict[str, Tuple[Any, Any]]], None]]] = []
+        self._lock = threading.Lock()
+        self._compile(data, effective, chosen_phase, safety_fail_closed, prefix)
+
+    def _compile(self, data: dict, effective: dict, chosen_phase: str, safety_fail_closed: bool, prefix: str) -> None:
+        flat = flatten_paths(effective)
+        rules = compile_rules(flat)
+        problems = check_rules(rules, flat)
+        by_path: Dict[str, List[str]] = {}
+        for paths, msg in problems:
+            for p in paths:
+                by_path.setdefault(p, []).append(msg)
+        if problems:
+            effective["__validation_warnings"] = flat["__validation_warnings"] = [m for _, m in problems]
+        on = {p: self._truth(v, safety_fail_closed) for p, v in flat.items()}
+        # gán cuối cùng: thread đọc luôn thấy bảng cũ hoặc bảng mới, không lẫn
         self._raw = data
         self._eff = effective
         self._phase = chosen_phase
         self._safety_fail_closed = safety_fail_closed
         self._env_prefix = prefix
+        self._rules = rules
+        self._problems = by_path
+        self._flat = flat
+        self._on = on
+
+    @staticmethod
+    def _truth(val: Any, fail_closed: bool) -> bool:
+        if isinstance(val, bool):
+            return val
+        # Fail-closed: if not explicitly True/False, treat as False when safety is strict
+        if fail_closed:
+            return False
+        return bool(val)
 
     # Public API
     def phase(self) -> str:
         return self._phase
 
     def get(self, path: str, default=None):
-        return deep_get(self._eff, path, default)
+        val = self._flat.get(path, _MISSING)
+        return default if val is _MISSING else val
 
     def is_on(self, path: str, default: Optional[bool] = None) -> bool:
-        val = self.get(path, default)
-        if isinstance(val, bool):
-            return val
-        # Fail-closed: if not explicitly True/False, treat as False when safety is strict
-        if self._safety_fail_closed:
-            return False
-        return bool(val)
+        val = self._on.get(path, _MISSING)
+        if val is _MISSING:
+            return self._truth(default, self._safety_fail_closed)
+        return val
 
     def require(self, paths: List[str]) -> Tuple[bool, List[str]]:
         missing = [p for p in paths if not self.is_on(p, False)]
         return (len(missing) == 0, missing)
 
+    def problems(self, path: str) -> List[str]:
+        """Vi phạm requires/excludes (tính sẵn lúc nạp) có liên quan tới path."""
+        return self._problems.get(path, [])
+
     def raw(self) -> dict:
         return self._raw
 
     def effective(self) -> dict:
         return self._eff
 
+    def table(self) -> Dict[str, Any]:
+        return self._flat
+
+    # ----- thay đổi -----
+    def subscribe(self, fn: Callable[[Dict[str, Tuple[Any, Any]]], None], prefix: str = "") -> Callable[[], None]:
+        """
+        fn({path: (old, new)}) được gọi sau reload() nếu có path lá bắt đầu bằng prefix đổi giá trị.
+        Hot path giữ giá trị cờ trong biến cục bộ và cập nhật trong fn. Trả hàm huỷ đăng ký.
+        """
+        item = (prefix, fn)
+        self._subs.append(item)
+        def _unsubscribe() -> None:
+            try:
+                self._subs.remove(item)
+            except ValueError:
+                pass
+        return _unsubscribe
+
+    def reload(self, raw: Optional[dict] = None, phase: Optional[str] = None) -> Dict[str, Tuple[Any, Any]]:
+        """
+        Biên dịch lại (raw cho sẵn, vd từ config service; không thì đọc lại file) rồi báo subscriber.
+        Trả {path: (old, new)} các path lá đã đổi. Lỗi đọc/parse raise, bảng cũ giữ nguyên.
+        """
+        with self._lock:
+            if raw is None:
+                raw = _read_raw(self._path or CFG_PATH)
+            if phase is not None:
+                self._phase_arg = phase
+            old = self._flat
+            self._compile(*_build(raw, self._phase_arg))
+            new = self._flat
+            changes = {p: (old.get(p), new.get(p))
+                       for p in set(old) | set(new)
+                       if not isinstance(old.get(p), dict) and not isinstance(new.get(p), dict)
+                       and old.get(p, _MISSING) != new.get(p, _MISSING)}
+        for prefix, fn in list(self._subs):
+            sub = {p: v for p, v in changes.items() if p.startswith(prefix)} if prefix else changes
+            if sub:
+                try:
+                    fn(sub)
+                except Exception as e:
+                    print(f"[feature_flags] ⚠️  subscriber lỗi: {e}", file=sys.stderr)
+        return changes
+
 # --------- Validation ---------
-def validate_rules(eff: dict) -> List[str]:
+def compile_rules(flat: Dict[str, Any]) -> Dict[str, list]:
     """
-    Validate requires/excludes/safety_fail_closed rules.
-    Return list of warnings/errors (strings). Empty list means OK.
+    Chuẩn hoá rules.requires/excludes/safety_fail_closed thành tuple path (1 lần lúc nạp):
+    requires: [(cond, (then...))], excludes: [((path...), note)], fail_closed: [key]
     """
-    msgs: List[str] = []
-
-    reqs = deep_get(eff, "rules.requires", []) or []
-    for rule in reqs:
+    requires, excludes, fail_closed = [], [], []
+    for rule in flat.get("rules.requires") or []:
+        if not isinstance(rule, dict):
+            continue
         cond = rule.get("if")
         thens = rule.get("then") or []
-        if not cond or not isinstance(thens, list):
+        if cond and isinstance(thens, list):
+            requires.append((sys.intern(str(cond)), tuple(sys.intern(str(p)) for p in thens)))
+    for rule in flat.get("rules.excludes") or []:
+        if not isinstance(rule, dict):
             continue
-        cond_val = deep_get(eff, cond, False)
-        if cond_val:
-            for p in thens:
-                if not deep_get(eff, p, False):
-                    msgs.append(f"[requires] '{cond}' bật nhưng '{p}' đang OFF")
-
-    excludes = deep_get(eff, "rules.excludes", []) or []
-    for rule in excludes:
         any_of = rule.get("any_of") or []
-        if not isinstance(any_of, list) or len(any_of) < 2:
-            continue
-        on_count = sum(1 for p in any_of if deep_get(eff, p, False))
-        if on_count > 1:
-            note = rule.get("note", "")
-            msgs.append(f"[excludes] Các cờ loại trừ đang đồng thời ON: {any_of}. {note}")
-
+        if isinstance(any_of, list) and len(any_of) >= 2:
+            excludes.append((tuple(sys.intern(str(p)) for p in any_of), rule.get("note", "")))
+    for rule in flat.get("rules.safety_fail_closed") or []:
+        if isinstance(rule, dict) and rule.get("key") and rule.get("behavior") == "block_on_unknown":
+            fail_closed.append(sys.intern(str(rule["key"])))
+    return {"requires": requires, "excludes": excludes, "fail_closed": fail_closed}
+
+def check_rules(rules: Dict[str, list], flat: Dict[str, Any]) -> List[Tuple[Tuple[str, ...], str]]:
+    """Đánh giá rules đã biên dịch trên bảng phẳng. Trả [(các path liên quan, thông điệp)]."""
+    out: List[Tuple[Tuple[str, ...], str]] = []
+    for cond, thens in rules["requires"]:
+        if flat.get(cond, False):
+            for p in thens:
+                if not flat.get(p, False):
+                    out.append(((cond, p), f"[requires] '{cond}' bật nhưng '{p}' đang OFF"))
+    for any_of, note in rules["excludes"]:
+        if sum(1 for p in any_of if flat.get(p, False)) > 1:
+            out.append((any_of, f"[excludes] Các cờ loại trừ đang đồng thời ON: {list(any_of)}. {note}"))
     # safety_fail_closed: enforce behavior only by messaging; actual block happens at call sites
-    sfc = deep_get(eff, "rules.safety_fail_closed", []) or []
-    for rule in sfc:
-        key = rule.get("key")
-        behavior = rule.get("behavior")
-        if key and behavior == "block_on_unknown":
-            # if key path missing or not bool, warn (the caller should treat as blocked)
-            val = deep_get(eff, key, None)
-            if val is None:
-                msgs.append(f"[safety_fail_closed] '{key}' không xác định → nên block theo quy tắc.")
-    return msgs
+    for key in rules["fail_closed"]:
+        # if key path missing or not bool, warn (the caller should treat as blocked)
+        if flat.get(key) is None:
+            out.append(((key,), f"[safety_fail_closed] '{key}' không xác định → nên block theo quy tắc."))
+    return out
+
+def validate_rules(eff: dict) -> List[str]:
+    """
+    Validate requires/excludes/safety_fail_closed rules.
+    Return list of warnings/errors (strings). Empty list means OK.
+    """
+    flat = flatten_paths(eff)
+    return [msg for _, msg in check_rules(compile_rules(flat), flat)]
 
 # --------- Phase Resolution ---------
 def resolve_phase(data: dict, phase_arg: Optional[str]) -> str:
@@ -188,12 +299,12 @@ def apply_env_overrides(eff: dict, data: dict) -> dict:
     return eff
 
 # --------- Public load() ---------
-def load_flags(path: Optional[Path] = None, phase: Optional[str] = None) -> FeatureFlags:
-    cfg_path = path or CFG_PATH
+def _read_raw(cfg_path: Path) -> dict:
     if not cfg_path.exists():
         raise FileNotFoundError(f"Không tìm thấy file: {cfg_path}")
+    return yaml.safe_load(cfg_path.read_text(encoding="utf-8")) or {}
 
-    raw = yaml.safe_load(cfg_path.read_text(encoding="utf-8")) or {}
+def _build(raw: dict, phase: Optional[str]) -> Tuple[dict, dict, str, bool, str]:
     chosen = resolve_phase(raw, phase)
     eff = apply_phase(raw, chosen)
     eff = apply_env_overrides(eff, raw)
@@ -203,13 +314,24 @@ def load_flags(path: Optional[Path] = None, phase: Optional[str] = None) -> Feat
 
     # Attach defaults at root for easy reads (optional)
     eff["__defaults"] = raw.get("defaults") or {}
+    # Validation (warnings) chạy trong FeatureFlags._compile trên bảng phẳng
+    return raw, eff, chosen, safety_fail_closed, prefix
 
-    # Validation (warnings)
-    problems = validate_rules(eff)
-    if problems:
-        eff["__validation_warnings"] = problems
-
-    return FeatureFlags(raw, eff, chosen, safety_fail_closed, prefix)
+def load_flags(path: Optional[Path] = None, phase: Optional[str] = None) -> FeatureFlags:
+    cfg_path = path or CFG_PATH
+    return FeatureFlags(*_build(_read_raw(cfg_path), phase), path=cfg_path, phase_arg=phase)
+
+_SHARED: Optional[FeatureFlags] = None
+_SHARED_LOCK = threading.Lock()
+
+def get_flags() -> FeatureFlags:
+    """Bảng cờ dùng chung trong tiến trình (nạp 1 lần; runner gọi reload() khi config đổi)."""
+    global _SHARED
+    if _SHARED is None:
+        with _SHARED_LOCK:
+            if _SHARED is None:
+                _SHARED = load_flags()
+    return _SHARED
 
 # --------- CLI for quick check ---------
 def _print_summary(ff: FeatureFlags):
@@ -1,8 +1,8 @@
 # core/aggregators/left_agg.py
 from typing import Dict
 import pandas as pd
-from core.analyzer.left_strategies.ema_trend import signal_ema_trend
-from core.analyzer.left_strategies.atr_breakout import signal_atr_breakout
+from core.analyzer.left_strategies.ema_trend import signal_ema_trend, signal_ema_trend_from
+from core.analyzer.left_strategies.atr_breakout import signal_atr_breakout, signal_atr_breakout_from
 
 def _merge_same_dir(a: Dict, b: Dict) -> Dict:
     # Nếu cùng hướng BUY/SELL → tăng confidence + er
@@ -17,9 +17,13 @@ def aggregate(df: pd.DataFrame) -> Dict:
     Gộp 2 chiến lược kỹ thuật hiện có → 1 tín hiệu chuẩn:
     {decision, confidence, er, risk, reasons}
     """
-    s1 = signal_ema_trend(df)
-    s2 = signal_atr_breakout(df)
+    return _combine(signal_ema_trend(df), signal_atr_breakout(df))
 
+def aggregate_from(values: Dict) -> Dict:
+    """Như aggregate nhưng từ chỉ báo streaming (IndicatorEngine.values()) – không quét lại df."""
+    return _combine(signal_ema_trend_from(values), signal_atr_breakout_from(values))
+
+def _combine(s1: Dict, s2: Dict) -> Dict:
     # Nếu một trong hai WAIT → lấy cái còn lại
     if s1["decision"] == "WAIT" and s2["decision"] != "WAIT":
         return s2
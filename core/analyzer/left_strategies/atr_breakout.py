@@ -10,4 +10,32 @@ def signal_atr_breakout(df: pd.DataFrame):
         return {"decision":"BUY","confidence":0.5,"er":0.15,"risk":0.1,"reasons":["breakout_high_20"]}
     if last < low:
         return {"decision":"SELL","confidence":0.5,"er":0.15,"risk":0.1,"reasons":["breakdown_low_20"]}
-    return {"decision":"WAIT","confidence":0.0,"er":0.0,"risk":0.0,"reasons":["in_range"]}
\ No newline at end of file
+    return {"decision":"WAIT","confidence":0.0,"er":0.0,"risk":0.0,"reasons":["in_range"]}
+
+def signal_atr_breakout_batch(close, high, low, lengths):
+    """Bản vector hoá cho cả universe (mảng S×W căn phải, thiếu = NaN)."""
+    import numpy as np
+    hi = np.nanmax(high[:, -20:], axis=1)
+    lo = np.nanmin(low[:, -20:], axis=1)
+    last = close[:, -1]
+    out = []
+    for i, n in enumerate(lengths):
+        if n < 20:
+            out.append({"decision":"WAIT","confidence":0.0,"er":0.0,"risk":0.0,"reasons":["not_enough_data"]})
+        elif last[i] > hi[i]:
+            out.append({"decision":"BUY","confidence":0.5,"er":0.15,"risk":0.1,"reasons":["breakout_high_20"]})
+        elif last[i] < lo[i]:
+            out.append({"decision":"SELL","confidence":0.5,"er":0.15,"risk":0.1,"reasons":["breakdown_low_20"]})
+        else:
+            out.append({"decision":"WAIT","confidence":0.0,"er":0.0,"risk":0.0,"reasons":["in_range"]})
+    return out
+
+def signal_atr_breakout_from(v: dict):
+    """Từ giá trị chỉ báo streaming (n, close, hh20, ll20) – O(1)."""
+    if v.get("n", 0) < 20:
+        return {"decision":"WAIT","confidence":0.0,"er":0.0,"risk":0.0,"reasons":["not_enough_data"]}
+    if v["close"] > v["hh20"]:
+        return {"decision":"BUY","confidence":0.5,"er":0.15,"risk":0.1,"reasons":["breakout_high_20"]}
+    if v["close"] < v["ll20"]:
+        return {"decision":"SELL","confidence":0.5,"er":0.15,"risk":0.1,"reasons":["breakdown_low_20"]}
+    return {"decision":"WAIT","confidence":0.0,"er":0.0,"risk":0.0,"reasons":["in_range"]}
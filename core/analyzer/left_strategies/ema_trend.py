@@ -13,4 +13,34 @@ def signal_ema_trend(df: pd.DataFrame):
         return {"decision":"BUY","confidence":0.55,"er":0.2,"risk":0.1,"reasons":["ema20>ema50"]}
     if ema20.iloc[-1] < ema50.iloc[-1]:
         return {"decision":"SELL","confidence":0.55,"er":0.2,"risk":0.1,"reasons":["ema20<ema50"]}
-    return {"decision":"WAIT","confidence":0.0,"er":0.0,"risk":0.0,"reasons":["flat"]}
\ No newline at end of file
+    return {"decision":"WAIT","confidence":0.0,"er":0.0,"risk":0.0,"reasons":["flat"]}
+
+def signal_ema_trend_batch(close, lengths):
+    """
+    Bản vector hoá cho cả universe: close (S×W, căn phải, thiếu = NaN), lengths (S,) số nến thật.
+    Trả list dict giống signal_ema_trend cho từng symbol.
+    """
+    import numpy as np
+    ema20 = np.nanmean(close[:, -20:], axis=1)
+    ema50 = np.nanmean(close[:, -50:], axis=1)
+    out = []
+    for i, n in enumerate(lengths):
+        if n < 50:
+            out.append({"decision":"WAIT","confidence":0.0,"er":0.0,"risk":0.0,"reasons":["not_enough_data"]})
+        elif ema20[i] > ema50[i]:
+            out.append({"decision":"BUY","confidence":0.55,"er":0.2,"risk":0.1,"reasons":["ema20>ema50"]})
+        elif ema20[i] < ema50[i]:
+            out.append({"decision":"SELL","confidence":0.55,"er":0.2,"risk":0.1,"reasons":["ema20<ema50"]})
+        else:
+            out.append({"decision":"WAIT","confidence":0.0,"er":0.0,"risk":0.0,"reasons":["flat"]})
+    return out
+
+def signal_ema_trend_from(v: dict):
+    """Từ giá trị chỉ báo streaming (core.indicators.streaming: n, sma20, sma50) – O(1), không cần df."""
+    if v.get("n", 0) < 50:
+        return {"decision":"WAIT","confidence":0.0,"er":0.0,"risk":0.0,"reasons":["not_enough_data"]}
+    if v["sma20"] > v["sma50"]:
+        return {"decision":"BUY","confidence":0.55,"er":0.2,"risk":0.1,"reasons":["ema20>ema50"]}
+    if v["sma20"] < v["sma50"]:
+        return {"decision":"SELL","confidence":0.55,"er":0.2,"risk":0.1,"reasons":["ema20<ema50"]}
+    return {"decision":"WAIT","confidence":0.0,"er":0.0,"risk":0.0,"reasons":["flat"]}
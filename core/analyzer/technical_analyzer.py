@@ -1,6 +1,6 @@
 import pandas as pd
-from .left_strategies.ema_trend import signal_ema_trend
-from .left_strategies.atr_breakout import signal_atr_breakout
+from .left_strategies.ema_trend import signal_ema_trend, signal_ema_trend_batch, signal_ema_trend_from
+from .left_strategies.atr_breakout import signal_atr_breakout, signal_atr_breakout_batch, signal_atr_breakout_from
 
 def analyze(df: pd.DataFrame):
     # Trả về format chuẩn Phase CORE
@@ -8,4 +8,16 @@ def analyze(df: pd.DataFrame):
     s2 = signal_atr_breakout(df)
     # gộp cực đơn giản: ưu tiên s1, nếu WAIT thì lấy s2
     out = s1 if s1["decision"] != "WAIT" else s2
-    return out
\ No newline at end of file
+    return out
+
+def analyze_batch(close, high, low, lengths):
+    # Cả universe trong 1 lượt (numpy S×W), cùng luật gộp với analyze()
+    s1 = signal_ema_trend_batch(close, lengths)
+    s2 = signal_atr_breakout_batch(close, high, low, lengths)
+    return [a if a["decision"] != "WAIT" else b for a, b in zip(s1, s2)]
+
+def analyze_from(values: dict):
+    # Từ chỉ báo streaming (IndicatorEngine.values()) – O(1)/tick, cùng luật gộp
+    s1 = signal_ema_trend_from(values)
+    s2 = signal_atr_breakout_from(values)
+    return s1 if s1["decision"] != "WAIT" else s2
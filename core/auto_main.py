@@ -11,13 +11,10 @@ def load_flags():
 FLAGS = load_flags()
 
 def main():
-    from pathlib import Path
-    import pandas as pd
-    from utils.io_utils import read_json
-
     from core.collector.market_collector import run as collect_run
-    from core.risk.risk_intel import atr_percent
-    from core.aggregators.left_agg import aggregate as left_aggregate
+    from core.memory.feature_store import get_feature_store
+    from core.risk.risk_intel import atr_percent_from
+    from core.aggregators.left_agg import aggregate_from as left_aggregate_from
     from core.decision.meta_controller import meta_decide
     from core.risk.safety_layer import validate_order_basic
     from core.execution.order_executor import place_order
@@ -30,21 +27,18 @@ def main():
     from core.capital.funding_optimizer import adjust_size_by_funding
     from core.capital.bandit_optimizer import adjust_size_by_bandit
 
-    def _load_df(path: Path) -> pd.DataFrame:
-        data = read_json(path, {"open": [], "high": [], "low": [], "close": [], "volume": []})
-        return pd.DataFrame(data)
-
     # 1) Thu thập dữ liệu
     collect_run()
 
-    # 2) Tín hiệu LEFT
-    df_btc = _load_df(Path("data/btc_candles.json"))
-    if df_btc.empty or len(df_btc) < 50:
-        send_telegram_message("⚠️ Not enough data")
+    # 2) Tín hiệu LEFT (chỉ báo lấy 1 lần từ feature store, dùng chung cho left_agg & risk)
+    from configs.config import TIMEFRAME
+    feats = get_feature_store().values("BTCUSDT", str(TIMEFRAME or "15m"))
+    if feats["n"] < 50:
+        send_telegram_message("⚠️ Not enough data", kind="INFO")
         return
 
-    left_sig = left_aggregate(df_btc)
-    left_sig["risk"] = max(left_sig.get("risk", 0.0), atr_percent(df_btc) / 100.0)
+    left_sig = left_aggregate_from(feats)
+    left_sig["risk"] = max(left_sig.get("risk", 0.0), atr_percent_from(feats) / 100.0)
 
     # 3) KPI factor theo flag
     if FLAGS.get("core", {}).get("enable_kpi", True):
@@ -101,7 +95,7 @@ def main():
         "funding_rate": meta["funding_rate"],
         "kpi_note": kpi_reason
     })
-    send_telegram_message(f"🤖 Meta: {meta}")
+    send_telegram_message(f"🤖 Meta: {meta}", kind="INFO")
 
     # 8) Safety & Thực thi
     if meta["action"] in ("BUY", "SELL") and meta["suggested_size_funding"] > 0:
@@ -111,9 +105,14 @@ def main():
         desired = {"side": meta["action"], "size_pct": meta["suggested_size_funding"], "leverage": leverage}
         ok, reason = validate_order_basic(desired, RISK_LIMITS)
         if not ok:
-            send_telegram_message(f"⛔ Blocked by Safety: {reason}")
+            send_telegram_message(f"⛔ Blocked by Safety: {reason}", kind="RISK_ALERT")
             return
 
+        try:
+            from core.execution.user_stream import get_user_stream
+            get_user_stream(wait_sec=2.0)   # nối user data stream trước khi đặt lệnh → fill về qua push
+        except Exception:
+            pass
         r = place_order(symbol, meta["action"], size_pct=meta["suggested_size_funding"],
                         leverage=leverage, notional_usdt=notional)
         log_trade({"symbol": symbol, "side": meta["action"], **r})
@@ -130,4 +129,4 @@ def main():
             "client_order_id": r.get("client_order_id") or r.get("order_uid")
         }
         log_trade(merged)
-        send_telegram_message(f"📥 Order update: {merged}")
\ No newline at end of file
+        send_telegram_message(f"📥 Order update: {merged}", kind="EXECUTED")
\ No newline at end of file
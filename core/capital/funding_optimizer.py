@@ -1,28 +1,25 @@
 # core/capital/funding_optimizer.py
 from typing import Tuple, Dict
 import time
-import requests
 from configs.config import CONFIG
 from notifier.notify_telegram import send_telegram_message
+from core.execution.binance_client import get_client, DEFAULT_BASE
 
-BINANCE_FUTURES_TESTNET = "https://testnet.binancefuture.com"
+BINANCE_FUTURES_TESTNET = DEFAULT_BASE  # env BINANCE_FAPI_BASE
 
 def get_funding_info(symbol: str) -> Tuple[float, int]:
     """
     Trả về (lastFundingRate, nextFundingTime_ms)
     lastFundingRate dạng float (vd 0.0001 = 0.01%)
     """
-    url = BINANCE_FUTURES_TESTNET + "/fapi/v1/premiumIndex"
     try:
-        r = requests.get(url, params={"symbol": symbol}, timeout=10)
-        r.raise_for_status()
-        j = r.json()
+        j = get_client(BINANCE_FUTURES_TESTNET).get("/fapi/v1/premiumIndex", {"symbol": symbol}, timeout=10)
         rate = float(j.get("lastFundingRate", 0.0) or 0.0)
         nxt  = int(j.get("nextFundingTime", 0) or 0)
         return rate, nxt
     except Exception as e:
         # lỗi mạng → coi như 0
-        send_telegram_message(f"[funding] warn: {e}")
+        send_telegram_message(f"[funding] warn: {e}", kind="WARN")
         return 0.0, 0
 
 def adjust_size_by_funding(symbol: str, side: str, base_size: float) -> Dict:
@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+# core/collector/candle_store.py
+"""
+Kho nến dạng cột, append-only, memory-mapped (thay btc_candles.json / eth_candles.json).
+- Mỗi (symbol, timeframe) 1 thư mục data/candles/<SYMBOL>_<tf>/ gồm 1 file nhị phân/cột:
+    open_time.i8, close_time.i8 (int64 ms UTC) | open.f8, high.f8, low.f8, close.f8, volume.f8 (float64)
+  → dòng thứ i nằm ở offset i*8 trong mọi file; không header, không parse.
+- Ghi: append từng cột, close_time ghi SAU CÙNG (cột "commit"); số dòng = min độ dài các cột
+  → ghi dở (crash) tự bị bỏ qua và được cắt ở lần mở sau.
+- Đọc: view(n) trả numpy memmap của N dòng cuối (zero-copy); read(n) dựng DataFrame từ các view.
+- Cursor tăng dần = close_time dòng cuối (collector chỉ tải nến mới hơn).
+- Retention (dataset_registry.yaml → market_candles.retention_days): cắt đầu file khi phần quá hạn
+  đủ lớn (≥ 5% hoặc ≥ 1 ngày) để không phải rewrite mỗi tick. Bộ cột đã cắt ghi thành thế hệ mới
+  (<col>.g<N>.i8|f8), commit bằng 1 lần rename file GEN → crash giữa chừng vẫn giữ nguyên bộ cột cũ,
+  file thế hệ dở/cũ được dọn ở lần ghi sau. Không có GEN = thế hệ 0 (tên file như cũ).
+"""
+from __future__ import annotations
+
+import os
+import re
+import time
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+DATA_DIR = Path("data")
+STORE_DIR = DATA_DIR / "candles"
+
+INT_COLS = ("open_time", "close_time")
+FLOAT_COLS = ("open", "high", "low", "close", "volume")
+COLUMNS = ("open_time", "open", "high", "low", "close", "volume", "close_time")  # thứ tự ghi, close_time cuối
+_DTYPE = {c: np.int64 for c in INT_COLS} | {c: np.float64 for c in FLOAT_COLS}
+_EXT = {np.int64: ".i8", np.float64: ".f8"}
+_ROW = 8
+DEFAULT_RETENTION_DAYS = 60
+GEN_FILE = "GEN"
+_COL_FILE = re.compile(r"^(%s)(?:\.g(\d+))?\.(?:i8|f8)(?:\.tmp)?$" % "|".join(COLUMNS))
+
+
+def retention_days(dataset: str = "market_candles") -> int:
+    """retention_days của dataset trong dataset_registry (CONFIG nếu nạp được, không thì đọc YAML)."""
+    try:
+        from config.config import CONFIG  # type: ignore
+        return int(CONFIG["dataset_registry"]["datasets"][dataset]["retention_days"])
+    except Exception:
+        pass
+    try:
+        import yaml
+        path = Path(__file__).resolve().parents[2] / "config" / "dataset_registry.yaml"
+        with path.open("r", encoding="utf-8") as f:
+            reg = yaml.safe_load(f) or {}
+        return int(reg["datasets"][dataset]["retention_days"])
+    except Exception:
+        return DEFAULT_RETENTION_DAYS
+
+
+def key(symbol: str, tf: str) -> str:
+    return f"{symbol.upper()}_{tf}"
+
+
+@dataclass
+class CandleView:
+    """N nến cuối dạng cột numpy (memmap read-only, không copy)."""
+    open_time: np.ndarray
+    close_time: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.close_time)
+
+    def frame(self) -> pd.DataFrame:
+        """DataFrame time/open/high/low/close/volume (+ open_time/close_time) từ các view."""
+        df = pd.DataFrame({c: getattr(self, c) for c in ("open_time", "close_time") + FLOAT_COLS}, copy=False)
+        df.insert(0, "time", pd.to_datetime(self.close_time, unit="ms", utc=True).floor("s"))
+        return df
+
+
+class CandleStore:
+    def __init__(self, root: Path = STORE_DIR, retention: Optional[int] = None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.retention_ms = int((retention if retention is not None else retention_days()) * 86_400_000)
+        self._lock = threading.Lock()
+        # (key, col) -> ((st_ino, rows), memmap): file bị thay (inode mới, kể cả do process khác) → map lại
+        self._maps: Dict[Tuple[str, str], Tuple[Tuple[int, int], np.memmap]] = {}
+
+    # ----- đường dẫn & kích thước -----
+    def dir(self, symbol: str, tf: str) -> Path:
+        return self.root / key(symbol, tf)
+
+    def gen(self, symbol: str, tf: str) -> int:
+        """Thế hệ bộ cột đang hiệu lực (file GEN; thiếu = 0)."""
+        try:
+            return int((self.dir(symbol, tf) / GEN_FILE).read_text().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def path(self, symbol: str, tf: str, col: str = "close_time", gen: Optional[int] = None) -> Path:
+        g = self.gen(symbol, tf) if gen is None else gen
+        return self.dir(symbol, tf) / f"{col}{f'.g{g}' if g else ''}{_EXT[_DTYPE[col]]}"
+
+    def symbols(self, tf: Optional[str] = None) -> List[Tuple[str, str]]:
+        out = []
+        for d in sorted(self.root.iterdir()) if self.root.exists() else []:
+            if d.is_dir() and "_" in d.name:
+                sym, _, t = d.name.partition("_")
+                if tf is None or t == tf:
+                    out.append((sym, t))
+        return out
+
+    def _stat(self, symbol: str, tf: str) -> Tuple[int, Dict[str, Tuple[int, int]]]:
+        """(gen, {col: (st_ino, số dòng)}) – đọc GEN + 1 stat/cột; cột thiếu → (0, 0).
+        Writer vừa chuyển thế hệ (file cũ đã bị xoá) → đọc lại GEN."""
+        for _ in range(3):
+            g = self.gen(symbol, tf)
+            out, missing = {}, False
+            for c in COLUMNS:
+                try:
+                    st = self.path(symbol, tf, c, g).stat()
+                    out[c] = (st.st_ino, st.st_size // _ROW)
+                except FileNotFoundError:
+                    out[c], missing = (0, 0), True
+            if not missing or self.gen(symbol, tf) == g:
+                break
+        return g, out
+
+    def rows(self, symbol: str, tf: str) -> int:
+        """Số dòng đã commit = min độ dài các cột."""
+        if not self.dir(symbol, tf).exists():
+            return 0
+        return min(n for _, n in self._stat(symbol, tf)[1].values())
+
+    def stamp(self, symbol: str, tf: str) -> Tuple[int, int]:
+        """Dấu phiên bản dữ liệu (size, mtime_ns) của cột commit – đổi khi có nến mới/cắt retention. Đọc GEN + 1 stat."""
+        try:
+            st = self.path(symbol, tf, "close_time").stat()
+            return (st.st_size, st.st_mtime_ns)
+        except FileNotFoundError:
+            return (0, 0)
+
+    def last_close_ms(self, symbol: str, tf: str) -> Optional[int]:
+        v = self.view(symbol, tf, n=1)
+        return int(v.close_time[-1]) if v is not None and len(v) else None
+
+    # ----- ghi -----
+    def _repair(self, symbol: str, tf: str, n: int) -> None:
+        """Cắt các cột về đúng n dòng (dọn phần ghi dở sau crash) + xoá file của thế hệ khác."""
+        g = self.gen(symbol, tf)
+        for c in COLUMNS:
+            p = self.path(symbol, tf, c, g)
+            if p.exists() and p.stat().st_size != n * _ROW:
+                with p.open("r+b") as f:
+                    f.truncate(n * _ROW)
+        self._cleanup(symbol, tf, g)
+
+    def _cleanup(self, symbol: str, tf: str, keep_gen: int) -> None:
+        """Xoá file cột không thuộc thế hệ keep_gen (thế hệ cũ sau retention, thế hệ mới dở do crash)."""
+        try:
+            for p in self.dir(symbol, tf).iterdir():
+                m = _COL_FILE.match(p.name)
+                if m and (p.name.endswith(".tmp") or int(m.group(2) or 0) != keep_gen):
+                    try:
+                        p.unlink()
+                    except OSError:
+                        pass  # Windows: file còn đang được map → dọn ở lần sau
+        except OSError:
+            pass
+
+    def append(self, symbol: str, tf: str, rows: Iterable[Dict]) -> int:
+        """Append các nến có close_time > cursor (sắp tăng dần). Trả số nến mới."""
+        with self._lock:
+            self.dir(symbol, tf).mkdir(parents=True, exist_ok=True)
+            n = self.rows(symbol, tf)
+            self._repair(symbol, tf, n)
+            last = self.last_close_ms(symbol, tf) or 0
+            fresh = sorted((r for r in rows if int(r["close_time"]) > last), key=lambda r: int(r["close_time"]))
+            if not fresh:
+                return 0
+            self._write_columns(symbol, tf, {c: np.fromiter((r[c] for r in fresh), dtype=_DTYPE[c], count=len(fresh))
+                                             for c in COLUMNS})
+            self._apply_retention(symbol, tf)
+            return len(fresh)
+
+    def append_arrays(self, symbol: str, tf: str, cols: Dict[str, np.ndarray]) -> int:
+        """Append dạng cột (migration/backfill lớn). Bỏ dòng có close_time <= cursor."""
+        with self._lock:
+            self.dir(symbol, tf).mkdir(parents=True, exist_ok=True)
+            self._repair(symbol, tf, self.rows(symbol, tf))
+            last = self.last_close_ms(symbol, tf) or 0
+            ct = np.asarray(cols["close_time"], dtype=np.int64)
+            order = np.argsort(ct, kind="stable")
+            keep = order[ct[order] > last]
+            if keep.size:
+                _, first = np.unique(ct[keep], return_index=True)  # bỏ trùng close_time
+                keep = keep[np.sort(first)]
+            if not keep.size:
+                return 0
+            self._write_columns(symbol, tf, {c: np.asarray(cols[c], dtype=_DTYPE[c])[keep] for c in COLUMNS})
+            self._apply_retention(symbol, tf)
+            return int(keep.size)
+
+    def _write_columns(self, symbol: str, tf: str, cols: Dict[str, np.ndarray]) -> None:
+        g = self.gen(symbol, tf)
+        for c in COLUMNS:  # close_time ghi cuối → dòng chỉ "tồn tại" khi mọi cột đã có
+            with self.path(symbol, tf, c, g).open("ab") as f:
+                f.write(np.ascontiguousarray(cols[c]).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _apply_retention(self, symbol: str, tf: str) -> None:
+        g, st = self._stat(symbol, tf)
+        n = min(r for _, r in st.values())
+        if n == 0:
+            return
+        ct = self._map(symbol, tf, "close_time", g, st["close_time"][0], n)
+        cutoff = int(time.time() * 1000) - self.retention_ms
+        expired = int(np.searchsorted(ct, cutoff, side="left"))
+        if expired == 0:
+            return
+        if expired < n and expired < 0.05 * n and int(ct[expired] - ct[0]) < 86_400_000:
+            return  # phần quá hạn còn nhỏ → để dồn, tránh rewrite mỗi tick
+        # Ghi đủ bộ cột thế hệ g+1 rồi mới commit bằng 1 rename GEN: không bao giờ lẫn cột cắt/chưa cắt
+        new = g + 1
+        d = self.dir(symbol, tf)
+        try:
+            for c in COLUMNS:
+                arr = np.array(self._map(symbol, tf, c, g, st[c][0], n)[expired:])
+                with self.path(symbol, tf, c, new).open("wb") as f:
+                    f.write(arr.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+            tmp = d / f"{GEN_FILE}.tmp"
+            with tmp.open("w") as f:
+                f.write(str(new))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, d / GEN_FILE)
+        except Exception as e:
+            print(f"[candle_store] WARN: retention {key(symbol, tf)} lỗi: {e}")
+        finally:
+            self._maps = {k: v for k, v in self._maps.items() if k[0] != key(symbol, tf)}
+            self._cleanup(symbol, tf, self.gen(symbol, tf))
+
+    # ----- đọc -----
+    def _map(self, symbol: str, tf: str, col: str, gen: int, ino: int, n: int) -> np.memmap:
+        """memmap n dòng của cột; cache khoá theo (gen, inode, n) – cột bị thay bằng file mới luôn được map lại."""
+        k = (key(symbol, tf), col)
+        cached = self._maps.get(k)
+        if cached is not None and cached[0] == (gen, ino, n):
+            return cached[1]
+        mm = np.memmap(self.path(symbol, tf, col, gen), dtype=_DTYPE[col], mode="r", shape=(n,))
+        self._maps[k] = ((gen, ino, n), mm)
+        return mm
+
+    def view(self, symbol: str, tf: str, n: Optional[int] = None, since_ms: Optional[int] = None) -> Optional[CandleView]:
+        """Các cột của N nến cuối (hoặc từ since_ms) – slice memmap, không copy. None nếu chưa có dữ liệu."""
+        if not self.dir(symbol, tf).exists():
+            return None
+        for attempt in range(3):
+            try:
+                return self._view(symbol, tf, n, since_ms)
+            except FileNotFoundError:
+                if attempt == 2:  # writer (process khác) vừa chuyển thế hệ giữa stat và map → thử lại
+                    raise
+        return None
+
+    def _view(self, symbol: str, tf: str, n: Optional[int], since_ms: Optional[int]) -> Optional[CandleView]:
+        g, st = self._stat(symbol, tf)
+        total = min(r for _, r in st.values())
+        if total == 0:
+            return None
+        ct = self._map(symbol, tf, "close_time", g, st["close_time"][0], total)
+        start = 0
+        if since_ms is not None:
+            start = int(np.searchsorted(ct, since_ms, side="left"))
+        if n is not None:
+            start = max(start, total - int(n))
+        return CandleView(**{c: self._map(symbol, tf, c, g, st[c][0], total)[start:] for c in COLUMNS})
+
+    def read(self, symbol: str, tf: str, n: Optional[int] = None, since_ms: Optional[int] = None) -> pd.DataFrame:
+        """DataFrame time/open_time/close_time/open/high/low/close/volume của N nến cuối."""
+        v = self.view(symbol, tf, n=n, since_ms=since_ms)
+        if v is None:
+            return pd.DataFrame(columns=["time", "open_time", "close_time", *FLOAT_COLS])
+        return v.frame()
+
+    def records(self, symbol: str, tf: str, n: int) -> List[Dict]:
+        """N nến cuối ở dạng records cũ {time ISO, open, high, low, close, volume} (tương thích)."""
+        df = self.read(symbol, tf, n=n)
+        if df.empty:
+            return []
+        iso = df["time"].dt.strftime("%Y-%m-%dT%H:%M:%S%z").str.replace(
+            r"(\+|\-)(\d{2})(\d{2})$", r"\1\2:\3", regex=True
+        )
+        out = df[list(FLOAT_COLS)].copy()
+        out.insert(0, "time", iso)
+        return out.to_dict(orient="records")
+
+
+_STORE: Optional[CandleStore] = None
+
+
+def get_store() -> CandleStore:
+    global _STORE
+    if _STORE is None:
+        _STORE = CandleStore()
+    return _STORE
+
+
+def load_candles(symbol: str, tf: Optional[str] = None, n: Optional[int] = None) -> pd.DataFrame:
+    """
+    Đọc nến cho analyzer/decision: cột time, open, high, low, close, volume (như load_df cũ).
+    tf mặc định = timeframe trong config.
+    """
+    if tf is None:
+        try:
+            from configs.config import TIMEFRAME
+            tf = str(TIMEFRAME or "15m")
+        except Exception:
+            tf = "15m"
+    df = get_store().read(symbol, tf, n=n)
+    return df[["time", *FLOAT_COLS]]
@@ -2,24 +2,31 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import os
+import time
 from pathlib import Path
 from typing import List
-import time
-import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
 
-from utils.io_utils import write_json
 from configs.config import CONFIG
+from core.runtime.candle_clock import SERVER_CLOCK, interval_ms
+from core.collector.candle_store import get_store
+from core.execution.binance_client import get_client, DEFAULT_BASE, kline_weight
 
 # ====== Cấu hình nguồn ======
 # Binance Futures Testnet (không cần API key cho klines)
-BINANCE_FUTURES_TESTNET = "https://testnet.binancefuture.com"
+BINANCE_FUTURES_TESTNET = DEFAULT_BASE  # env BINANCE_FAPI_BASE
 KLINES_ENDPOINT = "/fapi/v1/klines"
 
 DATA_DIR = Path("data")
 DATA_DIR.mkdir(exist_ok=True)
-DATA_BTC = DATA_DIR / "btc_candles.json"
-DATA_ETH = DATA_DIR / "eth_candles.json"
+
+# ====== Thu song song ======
+# Số (symbol, timeframe) tải đồng thời (pool keep-alive + ngân sách weight: core/execution/binance_client.py)
+COLLECT_WORKERS = int(os.getenv("CRX_COLLECT_WORKERS", "8"))
+# Khung phụ cần thu thêm ngoài timeframe chính (vd "1h,4h")
+EXTRA_TIMEFRAMES = [t.strip() for t in os.getenv("CRX_COLLECT_TIMEFRAMES", "").split(",") if t.strip()]
 
 # Map timeframe hợp lệ của Binance
 _VALID_INTERVALS = {
@@ -34,61 +41,133 @@ def _symbols() -> List[str]:
     syms = CONFIG.get("symbols", ["BTCUSDT", "ETHUSDT"])
     return [s.strip().upper() for s in syms if isinstance(s, str)]
 
-def fetch_klines(symbol: str, interval: str, limit: int = 500) -> pd.DataFrame:
+_KLINE_COLS = [
+    "openTime","open","high","low","close","volume",
+    "closeTime","qVol","trades","tbBase","tbQuote","ignore"
+]
+_MAX_LIMIT = 1500   # giới hạn limit của /fapi/v1/klines
+
+def _interval_ms(tf: str) -> int:
+    try:
+        return interval_ms(tf)
+    except ValueError:
+        return 0  # "1M" – độ dài không cố định → phân trang với limit tối đa
+
+def _get_klines(params: dict) -> list:
+    return get_client(BINANCE_FUTURES_TESTNET).get(KLINES_ENDPOINT, params,
+                                                    weight=kline_weight(int(params.get("limit", 500))))
+
+def fetch_klines(symbol: str, interval: str, limit: int = 500, closed_only: bool = True) -> pd.DataFrame:
     """
     Lấy nến từ Binance Futures Testnet.
     Trả về DataFrame cột: time (UTC ISO), open, high, low, close, volume
+    closed_only: bỏ nến đang chạy (closeTime chưa qua theo giờ server) để decision không dùng nến mở.
+    """
+    raw = _get_klines({"symbol": symbol, "interval": interval, "limit": limit})
+    df = pd.DataFrame(raw, columns=_KLINE_COLS)
+
+    # Ép kiểu số
+    for col in ["open", "high", "low", "close", "volume"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    df["closeTime"] = pd.to_numeric(df["closeTime"], errors="coerce")
+    if closed_only:
+        df = df[df["closeTime"] < SERVER_CLOCK.now_ms()].copy()
+
+    # Tạo cột time (UTC ISO, dạng 2025-08-12T03:00:00+00:00) từ closeTime (ms)
+    t = pd.to_datetime(df["closeTime"], unit="ms", utc=True)
+    # chuyển %z (±HHMM) -> ±HH:MM cho đồng nhất
+    iso = t.dt.strftime("%Y-%m-%dT%H:%M:%S%z").str.replace(
+        r"(\+|\-)(\d{2})(\d{2})$", r"\1\2:\3", regex=True
+    )
+    df["time"] = iso
+
+    df = df[["time", "open", "high", "low", "close", "volume"]].dropna().reset_index(drop=True)
+    return df
+
+def fetch_klines_since(symbol: str, interval: str, after_close_ms: int | None) -> list[dict]:
+    """
+    Chỉ tải nến ĐÃ ĐÓNG có closeTime > after_close_ms (phân trang theo startTime).
+    Lần đầu (chưa có cursor) → backfill trong cửa sổ retention của kho.
+    """
+    now_ms = SERVER_CLOCK.now_ms()
+    start = (after_close_ms + 1) if after_close_ms else now_ms - get_store().retention_ms
+    out: list[dict] = []
+    iv = _interval_ms(interval)
+    while start < now_ms:
+        # limit vừa đủ số nến còn thiếu → tick thường chỉ tốn weight 1 thay vì 10
+        limit = int(min(_MAX_LIMIT, max(2, (now_ms - start) // iv + 2))) if iv else _MAX_LIMIT
+        raw = _get_klines({"symbol": symbol, "interval": interval, "startTime": int(start), "limit": limit})
+        if not raw:
+            break
+        for k in raw:
+            close_ms = int(k[6])
+            if close_ms >= now_ms:      # nến đang chạy
+                continue
+            out.append({"open_time": int(k[0]), "close_time": close_ms, "open": float(k[1]),
+                        "high": float(k[2]), "low": float(k[3]), "close": float(k[4]), "volume": float(k[5])})
+        if len(raw) < limit:
+            break
+        start = int(raw[-1][6]) + 1
+    return out
+
+def run_symbol(symbol: str, interval: str | None = None) -> dict:
+    """
+    Thu nến tăng dần cho 1 symbol (stage DAG có thể chạy song song theo symbol):
+    chỉ tải nến mới hơn cursor rồi append vào kho cột memory-mapped.
+    Trả {"symbol", "interval", "added"} (dict để stage engine không hiểu nhầm là return code).
+    Stage sau (decision) đọc thẳng kho (view memmap) nên không cần chuyền nến qua ctx.
     """
-    url = BINANCE_FUTURES_TESTNET + KLINES_ENDPOINT
-    params = {"symbol": symbol, "interval": interval, "limit": limit}
-    cols = [
-        "openTime","open","high","low","close","volume",
-        "closeTime","qVol","trades","tbBase","tbQuote","ignore"
-    ]
-    for attempt in range(3):
-        try:
-            r = requests.get(url, params=params, timeout=10)
-            r.raise_for_status()
-            raw = r.json()
-            df = pd.DataFrame(raw, columns=cols)
-
-            # Ép kiểu số
-            for col in ["open", "high", "low", "close", "volume"]:
-                df[col] = pd.to_numeric(df[col], errors="coerce")
-
-            # Tạo cột time (UTC ISO, dạng 2025-08-12T03:00:00+00:00) từ closeTime (ms)
-            t = pd.to_datetime(df["closeTime"], unit="ms", utc=True)
-            # chuyển %z (±HHMM) -> ±HH:MM cho đồng nhất
-            iso = t.dt.strftime("%Y-%m-%dT%H:%M:%S%z").str.replace(
-                r"(\+|\-)(\d{2})(\d{2})$", r"\1\2:\3", regex=True
-            )
-            df["time"] = iso
-
-            df = df[["time", "open", "high", "low", "close", "volume"]].dropna().reset_index(drop=True)
-            return df
-        except Exception as e:
-            if attempt == 2:
-                raise
-            time.sleep(0.8)
-    return pd.DataFrame()
-
-def save_candles(symbol: str, df: pd.DataFrame):
-    path = DATA_BTC if symbol.upper() == "BTCUSDT" else DATA_ETH
-    # Lưu tối đa 100 nến gần nhất, dạng records
-    records = df.tail(100).to_dict(orient="records")
-    write_json(path, records)
-    print(f"[collector] Saved {symbol} candles -> {path} (n={len(records)})")
-
-def run():
+    interval = interval or _timeframe()
+    store = get_store()
+    cursor = store.last_close_ms(symbol, interval)
+    fresh = fetch_klines_since(symbol, interval, cursor)
+    added = store.append(symbol, interval, fresh)
+    if added:
+        print(f"[collector] {symbol} {interval}: +{added} nến -> {store.dir(symbol, interval)} "
+              f"(tổng {store.rows(symbol, interval)})")
+    elif cursor is None:
+        print(f"[collector] WARN: không lấy được nến {symbol} ({interval}).")
+    else:
+        print(f"[collector] {symbol} {interval}: không có nến mới (cursor={cursor}).")
+    return {"symbol": symbol, "interval": interval, "added": added}
+
+def _timeframes() -> List[str]:
+    tfs = [_timeframe()] + [t for t in EXTRA_TIMEFRAMES if t in _VALID_INTERVALS]
+    return list(dict.fromkeys(tfs))
+
+def collect_all(symbols: List[str] | None = None, intervals: List[str] | None = None,
+                max_workers: int = COLLECT_WORKERS) -> dict:
+    """
+    Thu mọi (symbol, timeframe) trong 1 đợt song song (pool giới hạn, session keep-alive dùng chung,
+    tôn trọng weight/phút). Trả {(symbol, tf): số nến mới}; lỗi 1 cặp không chặn các cặp khác.
+    """
+    symbols = symbols or _symbols()
+    intervals = intervals or _timeframes()
+    jobs = [(s, tf) for s in symbols for tf in intervals]
+    added: dict = {}
+    t0 = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(jobs) or 1)),
+                            thread_name_prefix="collector") as pool:
+        futs = {pool.submit(run_symbol, s, tf): (s, tf) for s, tf in jobs}
+        for fut in as_completed(futs):
+            s, tf = futs[fut]
+            try:
+                added[(s, tf)] = fut.result()["added"]
+            except Exception as e:
+                print(f"[collector] ❌ {s} {tf}: {e}")
+                added[(s, tf)] = None
+    ok = sum(1 for v in added.values() if v is not None)
+    st = get_client(BINANCE_FUTURES_TESTNET).stats()
+    print(f"[collector] Đợt thu {ok}/{len(jobs)} cặp symbol×tf trong {time.time() - t0:.1f}s "
+          f"(workers={max_workers}, weight sàn={st.get('used_weight_1m')}/{st.get('budget_1m')}/phút)")
+    return added
+
+def run() -> dict:
+    """Thu nến cho mọi symbol (song song). Trả về {symbol: số nến mới của timeframe chính}."""
     interval = _timeframe()
-    symbols = _symbols()
-    for sym in symbols:
-        df = fetch_klines(sym, interval=interval, limit=200)
-        if df.empty:
-            print(f"[collector] WARN: không lấy được nến {sym} ({interval}).")
-            continue
-        save_candles(sym, df)
-    print("[collector] Đã lưu nến (records) từ Binance Futures Testnet.")
+    res = collect_all()
+    print("[collector] Đã lưu nến (kho cột data/candles) từ Binance Futures Testnet.")
+    return {s: n for (s, tf), n in res.items() if tf == interval}
 
 if __name__ == "__main__":
     run()
\ No newline at end of file
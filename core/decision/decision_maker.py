@@ -2,18 +2,27 @@
 # core/decision/decision_maker.py
 from __future__ import annotations
 
+import os
 from pathlib import Path
 from datetime import datetime, timezone, timedelta
 import json
 import pandas as pd
 
-from core.analyzer.technical_analyzer import analyze
-from core.risk.risk_intel import atr_percent
+import numpy as np
+
+from core.analyzer.technical_analyzer import analyze, analyze_batch, analyze_from
+from core.risk.risk_intel import atr_percent, atr_percent_batch, atr_percent_from
+from core.indicators.streaming import get_engine
+from core.memory.feature_store import get_feature_store, persist_enabled
+from core.collector.candle_store import get_store, load_candles
+from core.memory.decision_log import get_log
 from utils.io_utils import read_json
 
 DATA_DIR = Path("data")
-HISTORY_FILE = DATA_DIR / "decision_history.json"
-BTC_FILE = DATA_DIR / "btc_candles.json"   # records: [{time,open,high,low,close,volume}, ...]
+SYMBOL = "BTCUSDT"
+WINDOW = 100   # số nến cuối đưa vào analyze (như file JSON 100 nến trước đây)
+# stream | batch | features (mặc định features khi bật memory_logging.feature_store, không thì stream)
+INDICATOR_MODE = os.getenv("CRX_INDICATOR_MODE", "").strip().lower()
 
 # ========== Helpers ==========
 def utc_now_iso():
@@ -22,16 +31,17 @@ def utc_now_iso():
 
 def load_df(path: Path) -> pd.DataFrame:
     """
-    Đọc nến ở cả 2 định dạng:
+    Đọc nến từ file JSON (định dạng cũ, dùng cho công cụ/migration) ở cả 2 dạng:
       - list bản ghi: [{...}]
       - dict-cột: {"open":[...],...} (fallback)
     Trả về DataFrame gồm: time (nếu có), open, high, low, close, volume
     """
     obj = read_json(path, default={"open":[],"high":[],"low":[],"close":[],"volume":[]})
-    if isinstance(obj, list):
-        df = pd.DataFrame(obj)
-    else:
-        df = pd.DataFrame(obj)
+    return df_from_records(obj)
+
+def df_from_records(obj) -> pd.DataFrame:
+    """Chuẩn hoá list bản ghi / dict-cột (từ file) thành DataFrame."""
+    df = pd.DataFrame(obj)
     # chuẩn hoá kiểu số
     for c in ["open","high","low","close","volume"]:
         if c in df.columns:
@@ -73,6 +83,10 @@ def build_decision_record(btc: pd.DataFrame) -> dict:
     # 1) Tín hiệu cơ bản
     sig = analyze(btc)  # mong đợi có: decision, confidence, er, risk?, reasons
     risk_atr_pct = atr_percent(btc)         # % ATR
+    return _record_from_signal(sig, risk_atr_pct)
+
+def _record_from_signal(sig: dict, risk_atr_pct: float, symbol: str | None = None) -> dict:
+    """Gộp tín hiệu + ATR% thành bản ghi quyết định (dùng chung cho 1 symbol và cả universe)."""
     sig["risk"] = max(float(sig.get("risk", 0.0)), risk_atr_pct / 100.0)
 
     # 2) Kích thước đề xuất cơ bản (tạm thời cố định 0.2 như trước)
@@ -119,20 +133,17 @@ def build_decision_record(btc: pd.DataFrame) -> dict:
         # KPI note (để khớp các bản ghi trước)
         "kpi_note": ["kpi_enabled"],
     }
+    if symbol:
+        rec["symbol"] = symbol
     return rec
 
-def append_history(rec: dict):
-    try:
-        hist = read_json(HISTORY_FILE, default=[])
-        if not isinstance(hist, list):
-            hist = []
-    except Exception:
-        hist = []
-    hist.append(rec)
-    atomic_write_json(HISTORY_FILE, hist)
+def append_history(rec: dict | list):
+    """Append 1 bản ghi hoặc cả lô (universe) vào decision log (append-only, 1 lần ghi)."""
+    get_log().append(rec)
 
-def run_decision() -> dict:
-    btc = load_df(BTC_FILE)
+def run_decision(btc: pd.DataFrame | None = None) -> dict:
+    if btc is None:
+        btc = load_candles(SYMBOL, n=WINDOW)
     if btc.empty or len(btc) < 50:
         return {
             "decision": "WAIT",
@@ -145,9 +156,112 @@ def run_decision() -> dict:
     append_history(rec)
     return rec
 
+def _universe() -> list[str]:
+    try:
+        from configs.config import SYMBOLS
+        syms = [str(x).strip().upper() for x in (SYMBOLS or []) if str(x).strip()]
+    except Exception:
+        syms = []
+    return syms or [SYMBOL]
+
+def _timeframe() -> str:
+    try:
+        from configs.config import TIMEFRAME
+        return str(TIMEFRAME or "15m")
+    except Exception:
+        return "15m"
+
+def stack_universe(symbols: list[str], tf: str, window: int = WINDOW):
+    """
+    Xếp WINDOW nến cuối của mọi symbol thành mảng S×W (căn phải, thiếu = NaN) từ view memmap của kho.
+    Trả (symbols có dữ liệu, close, high, low, lengths).
+    """
+    store = get_store()
+    views = [(s, store.view(s, tf, n=window)) for s in symbols]
+    views = [(s, v) for s, v in views if v is not None and len(v)]
+    S = len(views)
+    close = np.full((S, window), np.nan)
+    high = np.full((S, window), np.nan)
+    low = np.full((S, window), np.nan)
+    lengths = np.zeros(S, dtype=np.int64)
+    for i, (_, v) in enumerate(views):
+        n = len(v)
+        close[i, window - n:] = v.close
+        high[i, window - n:] = v.high
+        low[i, window - n:] = v.low
+        lengths[i] = n
+    return [s for s, _ in views], close, high, low, lengths
+
+def _signals_stream(symbols: list[str], tf: str):
+    """Tín hiệu từ chỉ báo streaming: mỗi symbol chỉ tốn công cho nến mới kể từ tick trước."""
+    out = []
+    for sym in symbols:
+        v = get_engine(sym, tf).values()
+        if v["n"]:
+            out.append((sym, analyze_from(v), atr_percent_from(v), v["n"]))
+    return out
+
+def _signals_features(symbols: list[str], tf: str):
+    """Tín hiệu từ feature store (chuỗi chỉ báo dùng chung, cache RAM/đĩa theo dấu kho nến)."""
+    fs = get_feature_store()
+    out = []
+    for sym in symbols:
+        v = fs.values(sym, tf)
+        if v["n"]:
+            out.append((sym, analyze_from(v), atr_percent_from(v), v["n"]))
+    return out
+
+def _signals_batch(symbols: list[str], tf: str):
+    """Tín hiệu từ cửa sổ WINDOW nến (numpy S×W, tính lại mỗi tick)."""
+    syms, close, high, low, lengths = stack_universe(symbols, tf)
+    if not syms:
+        return []
+    sigs = analyze_batch(close, high, low, lengths)
+    atrs = atr_percent_batch(high, low, close, lengths)
+    return list(zip(syms, sigs, atrs, lengths))
+
+def run_universe(symbols: list[str] | None = None, tf: str | None = None) -> list[dict]:
+    """
+    Ra quyết định cho cả universe trong 1 lượt. CRX_INDICATOR_MODE=stream (chỉ báo O(1)/nến có state)
+    | batch (vector hoá trên cửa sổ) | features (feature store). Các chế độ cho cùng kết quả.
+    Symbol thiếu dữ liệu (< 50 nến) bị bỏ qua như run_decision. Symbol chính (đầu universe) được
+    append SAU CÙNG để các reader "bản ghi cuối" (meta_controller, notify, dashboard) vẫn thấy nó.
+    """
+    symbols = symbols or _universe()
+    tf = tf or _timeframe()
+    mode = INDICATOR_MODE or ("features" if persist_enabled() else "stream")
+    if mode == "batch":
+        sigs = _signals_batch(symbols, tf)
+    elif mode == "features":
+        sigs = _signals_features(symbols, tf)
+    else:
+        sigs = _signals_stream(symbols, tf)
+    recs = [_record_from_signal(sig, atr, sym) for sym, sig, atr, n in sigs if n >= 50]
+    ts = utc_now_iso()
+    for r in recs:  # cùng 1 timestamp cho cả lượt → executor gom đúng các quyết định của tick
+        r["timestamp"] = ts
+    primary = symbols[0]
+    recs.sort(key=lambda r: r["symbol"] == primary)
+    if recs:
+        append_history(recs)
+    return recs
+
 # Cho phép chạy trực tiếp: python -m core.decision.decision_maker
-def main():
-    rec = run_decision()
+def main(ctx: dict | None = None):
+    # Cả universe 1 lượt từ kho nến (view memmap, không copy)
+    universe = _universe()
+    recs = run_universe(universe)
+    primary = universe[0]
+    rec = next((r for r in recs if r.get("symbol") == primary), None)
+    if rec is None:
+        rec = {"decision": "WAIT", "confidence": 0.0, "er": 0.0, "risk": 0.0, "reasons": ["insufficient_data"]}
+    if ctx is not None and recs:  # chỉ bản ghi đã append vào history
+        ctx["decisions"] = recs
+        if "timestamp" in rec:
+            ctx["decision"] = rec
+    others = [f"{r['symbol']}={r['decision']}({r['confidence']:.2f})" for r in recs if r.get("symbol") != primary]
+    if others:
+        print(f"[decision] universe ({len(recs)}): " + ", ".join(others))
     print("[decision] record:", json.dumps(rec, ensure_ascii=False))
 
 if __name__ == "__main__":
@@ -4,12 +4,11 @@
 Meta-Controller cho Phase B:
 - BOTH tắt; chỉ quản trị tuyến {LEFT, RIGHT, WAIT} (mặc định LEFT).
 - Siết đổi tuyến: cooldown theo controller.yaml, đếm flips/giờ.
-- Ghi/đọc trạng thái tại data/meta_state.json để các module khác (executor)
-  có thể gate theo route hiện hành.
+- Ghi/đọc trạng thái tại state store, ns "meta" (core/memory/state_store.py) để các module khác
+  (executor, eod_kpi, dashboard) có thể gate theo route hiện hành.
 - Thông báo Telegram (nếu bật trong controller.yaml và đã cấu hình bot trong .env).
 
 Yêu cầu tối thiểu:
-- PyYAML (yaml)
 - Tồn tại thư mục dự án: /home/.../CrX17 với: config/controller.yaml, data/
 """
 
@@ -23,10 +22,7 @@ from datetime import datetime, timezone, timedelta
 from pathlib import Path
 from typing import Dict, Any, Optional
 
-try:
-    import yaml
-except Exception:  # fallback thô nếu thiếu PyYAML
-    yaml = None  # type: ignore
+from core.runtime.config_service import read_file
 
 # Optional: Telegram notifier
 def _notify(msg: str) -> None:
@@ -42,40 +38,19 @@ CFG_DIR = ROOT / "config"
 DATA_DIR = ROOT / "data"
 LOGS_DIR = ROOT / "logs"
 
-STATE_FILE = DATA_DIR / "meta_state.json"          # nơi lưu trạng thái Meta
-DECISION_FILE = DATA_DIR / "decision_history.json" # nơi các quyết định LEFT ghi vào
-
-# ---------- Đọc YAML / JSON ----------
-def _read_yaml(path: Path) -> Dict[str, Any]:
-    if not path.exists():
-        return {}
-    if yaml is None:
-        return {}
-    try:
-        return yaml.safe_load(path.read_text(encoding="utf-8")) or {}
-    except Exception:
-        return {}
+STATE_NS = "meta"                                  # ns trạng thái Meta trong state store
 
 def _read_last_left_decision() -> Dict[str, Any]:
     """
     Lấy bản ghi quyết định LEFT gần nhất:
-    - ưu tiên dòng cuối của data/decision_history.json (mỗi lần append một record JSON)
+    - bản ghi cuối của decision log (đọc qua offset index, không parse cả lịch sử)
     - nếu không có -> trả WAIT.
     """
     try:
-        if DECISION_FILE.exists():
-            # file có thể là mảng JSON hoặc mỗi dòng một JSON; xử lý cả 2
-            txt = DECISION_FILE.read_text(encoding="utf-8").strip()
-            if not txt:
-                raise ValueError("empty decision_history.json")
-            if txt.lstrip().startswith("["):
-                arr = json.loads(txt)
-                if isinstance(arr, list) and arr:
-                    return arr[-1]
-            else:
-                # lấy dòng cuối không rỗng
-                *_, last = [ln for ln in txt.splitlines() if ln.strip()]
-                return json.loads(last)
+        from core.memory.decision_log import get_log
+        rec = get_log().last()
+        if isinstance(rec, dict) and rec:
+            return rec
     except Exception:
         pass
     return {"decision": "WAIT", "confidence": 0.0, "er": 0.0, "risk": 0.0, "reasons": ["no_decision"]}
@@ -88,7 +63,8 @@ def _utc_iso() -> str:
 
 # ---------- Tải cấu hình controller ----------
 def _load_controller_cfg() -> Dict[str, Any]:
-    cfg = _read_yaml(CFG_DIR / "controller.yaml")
+    # snapshot config service (không parse YAML mỗi lượt); chưa có service → parse 1 lần theo mtime
+    cfg = read_file("config/controller.yaml", {})
 
     # Mặc định an toàn nếu thiếu khóa
     routing = (cfg.get("routing") or {}) if isinstance(cfg, dict) else {}
@@ -118,32 +94,30 @@ def _load_controller_cfg() -> Dict[str, Any]:
 
 # ---------- Lưu/đọc STATE ----------
 def _load_state(default_route: str) -> Dict[str, Any]:
-    if not STATE_FILE.exists():
-        return {
-            "current_route": default_route,
-            "last_switch_ts": 0.0,
-            "flip_window": [],  # list[float] các mốc đổi tuyến trong 1h
-            "last_notify_sw_ts": 0.0,
-        }
     try:
-        st = json.loads(STATE_FILE.read_text(encoding="utf-8"))
-        # vá thiếu khóa
-        st.setdefault("current_route", default_route)
-        st.setdefault("last_switch_ts", 0.0)
-        st.setdefault("flip_window", [])
-        st.setdefault("last_notify_sw_ts", 0.0)
-        return st
+        from core.memory.state_store import get_store
+        st = get_store().get_ns(STATE_NS)
+    except Exception as e:
+        print(f"[Meta-Controller] WARN: state store read error: {e}")
+        st = {}
+    # vá thiếu khóa
+    st.setdefault("current_route", default_route)
+    st.setdefault("last_switch_ts", 0.0)
+    st.setdefault("flip_window", [])  # list[float] các mốc đổi tuyến trong 1h
+    st.setdefault("last_notify_sw_ts", 0.0)
+    return st
+
+def _state_exists() -> bool:
+    try:
+        from core.memory.state_store import get_store
+        return get_store().has(STATE_NS, "current_route")
     except Exception:
-        return {
-            "current_route": default_route,
-            "last_switch_ts": 0.0,
-            "flip_window": [],
-            "last_notify_sw_ts": 0.0,
-        }
+        return False
 
 def _save_state(state: Dict[str, Any]) -> None:
-    STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
-    STATE_FILE.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+    # ghi nguyên tử mọi khóa (route + mốc đổi tuyến cùng 1 transaction)
+    from core.memory.state_store import get_store
+    get_store().put_many(STATE_NS, state)
 
 # ---------- Quyết định tuyến (Phase B giữ LEFT, có WAIT khi cần) ----------
 def _decide_target_route(cfg: Dict[str, Any], last_left: Dict[str, Any]) -> str:
@@ -192,19 +166,20 @@ def _maybe_notify_switch(cfg: Dict[str, Any], state: Dict[str, Any], from_route:
     _notify(f"🔁 Đổi tuyến: {from_route} → {to_route} (lý do: {reason})")
 
 # ---------- MAIN ----------
-def run_once() -> Dict[str, Any]:
+def run_once(last_left: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     cfg = _load_controller_cfg()
     allowed = cfg["allowed_routes"]
     default_route = cfg["default_route"]
     state = _load_state(default_route)
 
     # init lần đầu (in log cho dễ theo dõi)
-    if not STATE_FILE.exists():
+    if not _state_exists():
         _save_state(state)
         print(f"[Meta-Controller] init route = {state['current_route']} at { _utc_iso() }")
 
-    # lấy quyết định LEFT gần nhất
-    last_left = _read_last_left_decision()
+    # lấy quyết định LEFT gần nhất (stage engine truyền thẳng bản ghi vừa tạo)
+    if last_left is None:
+        last_left = _read_last_left_decision()
     target = _decide_target_route(cfg, last_left).upper()
     if target not in allowed:
         # an toàn: nếu file cấu hình không cho phép, lùi về default
@@ -236,9 +211,9 @@ def run_once() -> Dict[str, Any]:
         "max_flips_per_hour": cfg["max_flips_per_hour"],
     }
 
-def main() -> None:
+def main(ctx: Optional[Dict[str, Any]] = None) -> None:
     try:
-        out = run_once()
+        out = run_once((ctx or {}).get("decision"))
         print("[Meta-Controller] state:", json.dumps(out, ensure_ascii=False))
     except Exception as e:
         print("[Meta-Controller] ERROR:", e)
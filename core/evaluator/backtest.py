@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+# core/evaluator/backtest.py
+"""
+Backtest vector hoá (NumPy) cho các chiến lược LEFT trên toàn bộ lịch sử nến.
+- Tín hiệu mọi nến trong 1 lượt: ema_trend (SMA fast/slow), atr_breakout (max/min N nến),
+  gộp như technical_analyzer.analyze ("analyze") hoặc left_agg.aggregate ("left_agg").
+- Luật thực thi như order_executor: close-on-reversal trước (conf ≥ CLOSE floor, không mở mới
+  cùng nến), mở mới khi phẳng và conf ≥ OPEN floor. Floors mặc định đọc CRX_OPEN_CONF_FLOOR /
+  CRX_CLOSE_CONF_FLOOR như executor.
+- Khớp ở giá open nến kế tiếp (quyết định ra sau khi nến đóng) ± slippage; phí taker mỗi lượt;
+  funding mỗi mốc 8h (00/08/16 UTC) trên notional đang giữ (long trả khi rate > 0).
+- Máy trạng thái vị thế chỉ lặp theo số lệnh (nhảy bằng mảng "chỉ số kế tiếp"), phần còn lại là numpy
+  → 1 năm nến 15m (~35k nến) chạy cỡ vài chục ms.
+
+Dùng:
+    from core.evaluator.backtest import BacktestConfig, run_backtest, load_history
+    res = run_backtest(load_history("BTCUSDT", "15m"), BacktestConfig(open_floor=0.5))
+    res.stats, res.trades, res.equity
+"""
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+FUNDING_MS = 8 * 3_600_000
+_NONE = np.iinfo(np.int64).max
+
+
+@dataclass
+class BacktestConfig:
+    strategy: str = "analyze"          # analyze | left_agg | ema_trend | atr_breakout
+    fast: int = 20                     # ema_trend: SMA nhanh
+    slow: int = 50                     # ema_trend: SMA chậm (cũng là số nến tối thiểu)
+    breakout: int = 20                 # atr_breakout: lookback max/min
+    open_floor: float = field(default_factory=lambda: float(os.getenv("CRX_OPEN_CONF_FLOOR", "0.65")))
+    close_floor: float = field(default_factory=lambda: float(os.getenv("CRX_CLOSE_CONF_FLOOR", "0.60")))
+    notional: float = 50.0             # USDT mỗi lệnh (như executor default_order.notional_usdt)
+    initial_equity: float = 1000.0
+    fee_bps: float = 4.0               # phí taker mỗi chiều (bps)
+    slippage_bps: float = 0.0
+    funding_rate: float = 0.0001       # rate mỗi mốc 8h nếu không truyền chuỗi funding
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class BacktestResult:
+    equity: pd.Series
+    trades: pd.DataFrame
+    stats: Dict[str, float]
+    signals: pd.DataFrame
+
+
+# ========== Dữ liệu ==========
+def load_history(symbol: str, tf: str, since_ms: Optional[int] = None) -> pd.DataFrame:
+    """Toàn bộ lịch sử (hoặc từ since_ms) từ candle_store: open_time, close_time, open, high, low, close, volume."""
+    from core.collector.candle_store import get_store
+    return get_store().read(symbol, tf, since_ms=since_ms)
+
+
+# ========== Tín hiệu (vector hoá, cùng luật với các hàm signal_* theo df) ==========
+def _sma(x: np.ndarray, n: int) -> np.ndarray:
+    out = np.full(len(x), np.nan)
+    if len(x) >= n:
+        c = np.cumsum(np.r_[0.0, x])
+        out[n - 1:] = (c[n:] - c[:-n]) / n
+    return out
+
+
+def _rolling(x: np.ndarray, n: int, fn) -> np.ndarray:
+    out = np.full(len(x), np.nan)
+    if len(x) >= n:
+        out[n - 1:] = fn(np.lib.stride_tricks.sliding_window_view(x, n), axis=1)
+    return out
+
+
+def _sig(side: np.ndarray, conf: float, er: float) -> Dict[str, np.ndarray]:
+    on = side != 0
+    return {"side": side, "conf": np.where(on, conf, 0.0), "er": np.where(on, er, 0.0)}
+
+
+def ema_trend_signals(close: np.ndarray, fast: int = 20, slow: int = 50) -> Dict[str, np.ndarray]:
+    """signal_ema_trend cho mọi nến: BUY nếu SMA fast > SMA slow, SELL nếu <, cần ≥ slow nến (conf 0.55)."""
+    f, s = _sma(close, fast), _sma(close, slow)
+    side = np.where(f > s, 1, np.where(f < s, -1, 0)).astype(np.int8)
+    side[: max(slow, 50) - 1] = 0
+    return _sig(side, 0.55, 0.2)
+
+
+def atr_breakout_signals(close: np.ndarray, high: np.ndarray, low: np.ndarray, lookback: int = 20) -> Dict[str, np.ndarray]:
+    """signal_atr_breakout cho mọi nến: close > max(high N nến gồm nến hiện tại) → BUY; < min(low) → SELL (conf 0.5)."""
+    hi, lo = _rolling(high, lookback, np.max), _rolling(low, lookback, np.min)
+    side = np.where(close > hi, 1, np.where(close < lo, -1, 0)).astype(np.int8)
+    side[: lookback - 1] = 0
+    return _sig(side, 0.5, 0.15)
+
+
+def combine_analyze(s1: Dict[str, np.ndarray], s2: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """technical_analyzer.analyze: lấy s1 nếu không WAIT, không thì s2."""
+    use1 = s1["side"] != 0
+    return {k: np.where(use1, s1[k], s2[k]) for k in ("side", "conf", "er")}
+
+
+def combine_left_agg(s1: Dict[str, np.ndarray], s2: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """left_agg.aggregate: 1 bên WAIT → bên kia; cùng hướng → conf = min(0.95, tb + 0.1); xung đột → WAIT."""
+    a, b = s1["side"], s2["side"]
+    same = (a != 0) & (a == b)
+    conflict = (a != 0) & (b != 0) & (a != b)
+    side = np.where(a != 0, a, b)
+    conf = np.where(a != 0, s1["conf"], s2["conf"])
+    er = np.where(a != 0, s1["er"], s2["er"])
+    conf = np.where(same, np.minimum(0.95, (s1["conf"] + s2["conf"]) / 2 + 0.1), conf)
+    er = np.where(same, (s1["er"] + s2["er"]) / 2, er)
+    side = np.where(conflict, 0, side).astype(np.int8)
+    return {"side": side, "conf": np.where(conflict, 0.0, conf), "er": np.where(conflict, 0.0, er)}
+
+
+def compute_signals(df: pd.DataFrame, cfg: BacktestConfig) -> Dict[str, np.ndarray]:
+    close = df["close"].to_numpy(dtype=np.float64)
+    s1 = ema_trend_signals(close, cfg.fast, cfg.slow)
+    if cfg.strategy == "ema_trend":
+        return s1
+    s2 = atr_breakout_signals(close, df["high"].to_numpy(dtype=np.float64),
+                              df["low"].to_numpy(dtype=np.float64), cfg.breakout)
+    if cfg.strategy == "atr_breakout":
+        return s2
+    if cfg.strategy == "left_agg":
+        return combine_left_agg(s1, s2)
+    return combine_analyze(s1, s2)
+
+
+# ========== Mô phỏng ==========
+def _next_true(mask: np.ndarray) -> np.ndarray:
+    """nxt[i] = chỉ số j ≥ i nhỏ nhất có mask[j] (không có → _NONE). O(N) bằng minimum.accumulate ngược."""
+    idx = np.where(mask, np.arange(len(mask), dtype=np.int64), _NONE)
+    return np.minimum.accumulate(idx[::-1])[::-1] if len(idx) else idx
+
+
+def simulate(df: pd.DataFrame, sig: Dict[str, np.ndarray], cfg: BacktestConfig,
+             funding: Optional[Union[float, pd.Series]] = None) -> BacktestResult:
+    n = len(df)
+    open_ = df["open"].to_numpy(dtype=np.float64)
+    close = df["close"].to_numpy(dtype=np.float64)
+    open_time = df["open_time"].to_numpy(dtype=np.int64)
+    index = pd.DatetimeIndex(pd.to_datetime(df["close_time"].to_numpy(dtype=np.int64), unit="ms", utc=True))
+
+    side, conf = sig["side"].astype(np.int8), sig["conf"]
+    # Quyết định ở nến i → khớp open nến i+1; nến cuối không còn nến để khớp
+    can = np.zeros(n, dtype=bool)
+    can[:-1] = True
+    open_ok = can & (side != 0) & (conf >= cfg.open_floor)
+    next_open = _next_true(open_ok)
+    next_close = {1: _next_true(can & (side == -1) & (conf >= cfg.close_floor)),   # đóng LONG khi SELL
+                  -1: _next_true(can & (side == 1) & (conf >= cfg.close_floor))}   # đóng SHORT khi BUY
+
+    slip = cfg.slippage_bps / 1e4
+    fee_rate = cfg.fee_bps / 1e4
+    rows = []
+    i = 0
+    while i < n:
+        e = int(next_open[i])
+        if e == _NONE:
+            break
+        pos = int(side[e])
+        x = int(next_close[pos][e + 1]) if e + 1 < n else _NONE   # không đóng cùng nến vừa mở
+        fill_in = e + 1
+        px_in = open_[fill_in] * (1 + slip * pos)
+        qty = cfg.notional / px_in
+        if x == _NONE:
+            rows.append((pos, fill_in, n - 1, px_in, close[-1], qty, "open"))
+            break
+        fill_out = x + 1
+        px_out = open_[fill_out] * (1 - slip * pos)
+        rows.append((pos, fill_in, fill_out, px_in, px_out, qty, "reversal"))
+        i = x + 1  # nến đóng đảo chiều không mở mới (executor return ngay sau close)
+
+    # Vị thế theo nến (áp dụng từ nến khớp vào tới trước nến khớp ra)
+    qty_bar = np.zeros(n)
+    entry_bar = np.zeros(n)
+    cash = np.zeros(n)
+    funding_paid = np.zeros(n)
+    rate = _funding_rates(open_time, funding if funding is not None else cfg.funding_rate)
+    is_funding = (open_time % FUNDING_MS) == 0
+    trades = []
+    for pos, a, b, px_in, px_out, qty, reason in rows:
+        end = b if reason == "reversal" else n
+        qty_bar[a:end] = pos * qty
+        entry_bar[a:end] = px_in
+        fee_in = px_in * qty * fee_rate
+        cash[a] -= fee_in
+        seg = slice(a, end)
+        fund = np.where(is_funding[seg], pos * qty * open_[seg] * rate[seg], 0.0)
+        funding_paid[seg] += fund
+        gross = pos * qty * (px_out - px_in)
+        fee_out = px_out * qty * fee_rate if reason == "reversal" else 0.0
+        if reason == "reversal":
+            cash[b] += gross - fee_out
+        trades.append({
+            "side": "LONG" if pos > 0 else "SHORT",
+            "entry_time": index[a], "exit_time": index[b] if reason == "reversal" else pd.NaT,
+            "entry_price": px_in, "exit_price": px_out, "qty": qty,
+            "bars": int(end - a), "gross_pnl": gross, "fees": fee_in + fee_out,
+            "funding": float(fund.sum()), "net_pnl": gross - fee_in - fee_out - float(fund.sum()),
+            "exit_reason": reason,
+        })
+
+    unreal = qty_bar * (close - entry_bar)
+    equity = cfg.initial_equity + np.cumsum(cash - funding_paid) + unreal
+    eq = pd.Series(equity, index=index, name="equity")
+    tr = pd.DataFrame(trades, columns=["side", "entry_time", "exit_time", "entry_price", "exit_price", "qty",
+                                       "bars", "gross_pnl", "fees", "funding", "net_pnl", "exit_reason"])
+    sig_df = pd.DataFrame({"side": side, "conf": conf, "position": np.sign(qty_bar)}, index=index)
+    return BacktestResult(equity=eq, trades=tr, stats=_stats(eq, tr, open_time), signals=sig_df)
+
+
+def _funding_rates(open_time: np.ndarray, funding: Union[float, pd.Series]) -> np.ndarray:
+    """Rate áp cho từng nến: hằng số, hoặc chuỗi funding (index = fundingTime ms) lấy mốc gần nhất ≤ open_time."""
+    if isinstance(funding, (int, float)):
+        return np.full(len(open_time), float(funding))
+    s = funding.sort_index()
+    pos = np.searchsorted(s.index.to_numpy(dtype=np.int64), open_time, side="right") - 1
+    vals = s.to_numpy(dtype=np.float64)
+    return np.where(pos >= 0, vals[np.clip(pos, 0, None)], 0.0)
+
+
+def _stats(eq: pd.Series, tr: pd.DataFrame, open_time: np.ndarray) -> Dict[str, float]:
+    e = eq.to_numpy()
+    if not len(e):
+        return {}
+    peak = np.maximum.accumulate(e)
+    dd = (e - peak) / peak
+    ret = np.diff(e) / e[:-1] if len(e) > 1 else np.zeros(0)
+    bar_ms = float(np.median(np.diff(open_time))) if len(open_time) > 1 else 0.0
+    per_year = (365 * 86_400_000 / bar_ms) if bar_ms else 0.0
+    sharpe = float(ret.mean() / ret.std() * np.sqrt(per_year)) if len(ret) and ret.std() > 0 else 0.0
+    closed = tr[tr["exit_reason"] == "reversal"] if len(tr) else tr
+    return {
+        "bars": int(len(e)),
+        "final_equity": float(e[-1]),
+        "total_return": float(e[-1] / e[0] - 1),
+        "max_drawdown": float(dd.min()),
+        "sharpe": sharpe,
+        "trades": int(len(tr)),
+        "win_rate": float((closed["net_pnl"] > 0).mean()) if len(closed) else 0.0,
+        "fees": float(tr["fees"].sum()) if len(tr) else 0.0,
+        "funding": float(tr["funding"].sum()) if len(tr) else 0.0,
+        "exposure": float((tr["bars"].sum() / len(e))) if len(tr) else 0.0,
+    }
+
+
+def run_backtest(df: pd.DataFrame, cfg: Optional[BacktestConfig] = None,
+                 funding: Optional[Union[float, pd.Series]] = None) -> BacktestResult:
+    cfg = cfg or BacktestConfig()
+    df = df.reset_index(drop=True)
+    return simulate(df, compute_signals(df, cfg), cfg, funding)
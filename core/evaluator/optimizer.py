@@ -0,0 +1,515 @@
+# -*- coding: utf-8 -*-
+# core/evaluator/optimizer.py
+"""
+Quét tham số + walk-forward cho chiến lược LEFT, chạy song song trên process pool.
+- Lưới: mọi trường của BacktestConfig (fast/slow/breakout/open_floor/close_floor/strategy…),
+  vd "fast=10,20,30 slow=50,100 breakout=10,20,40". Ô không hợp lệ (fast ≥ slow) bị bỏ.
+- Dữ liệu nến đặt 1 lần vào multiprocessing.shared_memory (ma trận float64 theo cột); worker chỉ
+  attach theo tên và dựng DataFrame không copy → không pickle nến cho từng tác vụ.
+- Mỗi ô = (tham số, đoạn dữ liệu). Đoạn walk-forward: train N ngày → test M ngày, trượt theo M.
+  Tín hiệu được tính từ trước đoạn (warmup) để chỉ báo đã đủ nến, nhưng chỉ giao dịch trong đoạn.
+- Cache kết quả theo sha1(tham số đầy đủ + hash dữ liệu của đoạn gồm warmup) tại
+  data/optimizer/cache.json → chạy lại chỉ tính các ô mới/đổi dữ liệu.
+- Báo cáo xếp hạng theo metric out-of-sample trung bình qua các fold (kèm full-sample), fold-by-fold
+  chọn tham số tốt nhất trên train và kết quả ghép OOS; ghi thêm mảnh YAML cùng schema left.yaml
+  (strategies.TREND.ema_period, strategies.BO.lookback, output.signal_confidence_floor) để merge
+  (--apply ghi thẳng vào config/left.yaml, tăng meta.version).
+
+Cách dùng:
+  python -m core.evaluator.optimizer --symbol BTCUSDT --tf 15m --grid "fast=10,20 slow=50,100" --workers 4
+  python -m core.evaluator.optimizer --synthetic-years 2 --train-days 90 --test-days 30 --metric sharpe
+"""
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import fields
+from datetime import datetime, timezone
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from core.evaluator.backtest import BacktestConfig, compute_signals, simulate
+
+OUT_DIR = Path("data") / "optimizer"
+CACHE_FILE = OUT_DIR / "cache.json"
+ENGINE_VERSION = 1              # tăng khi đổi luật backtest → vô hiệu cache cũ
+COLUMNS = ("open_time", "close_time", "open", "high", "low", "close", "volume")
+DAY_MS = 86_400_000
+
+DEFAULT_GRID: Dict[str, List[Any]] = {
+    "fast": [10, 20],
+    "slow": [50, 100, 150],
+    "breakout": [10, 20, 40],
+    "open_floor": [0.5, 0.55],
+    "close_floor": [0.5, 0.6],       # 0.6 > conf tín hiệu → chỉ đóng khi left_agg cùng hướng
+}
+
+# Trường BacktestConfig → đường dẫn khoá trong left.yaml (feature flag ema_fast/ema_slow ghi kèm trong report)
+LEFT_MAP: Dict[str, Tuple[str, ...]] = {
+    "slow": ("strategies", "TREND", "ema_period"),
+    "breakout": ("strategies", "BO", "lookback"),
+    "open_floor": ("output", "signal_confidence_floor"),
+}
+FLAG_MAP: Dict[str, str] = {
+    "fast": "modules.left.strategies.ema_trend.flags.ema_fast",
+    "slow": "modules.left.strategies.ema_trend.flags.ema_slow",
+}
+
+_CFG_FIELDS = {f.name: f.type for f in fields(BacktestConfig)}
+
+
+# ========== Lưới ==========
+def _parse_value(raw: str) -> Any:
+    for cast in (int, float):
+        try:
+            return cast(raw)
+        except ValueError:
+            pass
+    return raw
+
+
+def parse_grid(spec: str) -> Dict[str, List[Any]]:
+    """'fast=10,20 slow=50,100' → {"fast": [10, 20], "slow": [50, 100]} (chỉ nhận trường BacktestConfig)."""
+    grid: Dict[str, List[Any]] = {}
+    for part in spec.replace(";", " ").split():
+        name, _, vals = part.partition("=")
+        if name not in _CFG_FIELDS:
+            raise ValueError(f"tham số không có trong BacktestConfig: {name}")
+        grid[name] = [_parse_value(v) for v in vals.split(",") if v.strip()]
+    return grid
+
+
+def expand_grid(grid: Dict[str, Sequence[Any]]) -> List[Dict[str, Any]]:
+    names = list(grid)
+    cells = [dict(zip(names, combo)) for combo in itertools.product(*(grid[n] for n in names))]
+    return [c for c in cells if c.get("fast", 0) < c.get("slow", float("inf"))]
+
+
+def _cfg(base: Dict[str, Any], params: Dict[str, Any]) -> BacktestConfig:
+    return BacktestConfig(**{**base, **params})
+
+
+def warmup_bars(cfg: BacktestConfig) -> int:
+    return max(cfg.slow, cfg.breakout, 50) + 1
+
+
+# ========== Dữ liệu chia sẻ ==========
+class SharedCandles:
+    """Nến trong shared memory: ma trận (len(COLUMNS), n) float64, mỗi cột liên tục trong bộ nhớ."""
+
+    def __init__(self, df: pd.DataFrame):
+        n = len(df)
+        self.shape = (len(COLUMNS), n)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, 8 * len(COLUMNS) * n))
+        arr = np.ndarray(self.shape, dtype=np.float64, buffer=self.shm.buf)
+        for j, c in enumerate(COLUMNS):
+            arr[j] = df[c].to_numpy(dtype=np.float64)
+        self.arr = arr
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def segment_hash(self, lo: int, hi: int) -> str:
+        return hashlib.sha1(np.ascontiguousarray(self.arr[:, lo:hi]).tobytes()).hexdigest()[:16]
+
+    def close(self) -> None:
+        self.arr = None
+        try:
+            self.shm.close()
+            self.shm.unlink()
+        except Exception:
+            pass
+
+
+_W_SHM: Optional[shared_memory.SharedMemory] = None
+_W_DF: Optional[pd.DataFrame] = None
+
+
+def _attach(name: str, shape: Tuple[int, int]) -> pd.DataFrame:
+    global _W_SHM, _W_DF
+    _W_SHM = shared_memory.SharedMemory(name=name)
+    arr = np.ndarray(shape, dtype=np.float64, buffer=_W_SHM.buf)
+    _W_DF = pd.DataFrame({c: arr[j] for j, c in enumerate(COLUMNS)}, copy=False)
+    return _W_DF
+
+
+def _init_worker(name: str, shape: Tuple[int, int]) -> None:
+    _attach(name, shape)
+
+
+# ========== Đánh giá 1 ô ==========
+def evaluate(df: pd.DataFrame, a: int, b: int, cfg: BacktestConfig) -> Dict[str, float]:
+    """Backtest trên nến [a, b): tín hiệu tính từ a - warmup, chỉ giao dịch trong đoạn."""
+    lo = max(0, a - warmup_bars(cfg))
+    sig = compute_signals(df.iloc[lo:b], cfg)
+    sig = {k: v[a - lo:] for k, v in sig.items()}
+    seg = df.iloc[a:b].reset_index(drop=True)
+    if len(seg) < 2:
+        return {}
+    return simulate(seg, sig, cfg).stats
+
+
+def _run_cell(task: Tuple[str, Dict[str, Any], int, int]) -> Tuple[str, Dict[str, float]]:
+    key, cfg_dict, a, b = task
+    try:
+        return key, evaluate(_W_DF, a, b, BacktestConfig(**cfg_dict))
+    except Exception as e:
+        return key, {"error": f"{type(e).__name__}: {e}"}
+
+
+# ========== Cache ==========
+def cell_key(cfg: BacktestConfig, data_hash: str) -> str:
+    raw = json.dumps({"v": ENGINE_VERSION, "cfg": cfg.to_dict(), "data": data_hash}, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def load_cache(path: Path = CACHE_FILE) -> Dict[str, Dict[str, float]]:
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+
+def save_cache(cache: Dict[str, Dict[str, float]], path: Path = CACHE_FILE) -> None:
+    try:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(cache, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(path)
+    except Exception as e:
+        print(f"[optimizer] WARN: không ghi được cache: {e}")
+
+
+# ========== Walk-forward ==========
+def walk_forward_folds(open_time: np.ndarray, train_days: float, test_days: float,
+                       step_days: Optional[float] = None) -> List[Tuple[int, int, int]]:
+    """[(train_start, test_start, test_end)] theo chỉ số nến; train/test liền nhau, trượt theo step (mặc định = test)."""
+    if not len(open_time) or train_days <= 0 or test_days <= 0:
+        return []
+    t0, t_end = int(open_time[0]), int(open_time[-1])
+    step = int((step_days or test_days) * DAY_MS)
+    tr, te = int(train_days * DAY_MS), int(test_days * DAY_MS)
+    folds = []
+    s = t0
+    while s + tr + te <= t_end + 1:
+        a, m, b = np.searchsorted(open_time, [s, s + tr, s + tr + te])
+        folds.append((int(a), int(m), int(b)))
+        s += step
+    return folds
+
+
+def _score(stats: Dict[str, float], metric: str, min_trades: int) -> float:
+    if not stats or "error" in stats or stats.get("trades", 0) < min_trades:
+        return float("-inf")
+    if metric == "calmar":
+        dd = abs(stats.get("max_drawdown", 0.0))
+        return stats.get("total_return", 0.0) / dd if dd > 0 else stats.get("total_return", 0.0) * 1e3
+    return float(stats.get(metric, float("-inf")))
+
+
+class Optimizer:
+    def __init__(self, df: pd.DataFrame, grid: Optional[Dict[str, Sequence[Any]]] = None,
+                 base: Optional[BacktestConfig] = None, metric: str = "sharpe", min_trades: int = 5,
+                 workers: Optional[int] = None, cache_path: Path = CACHE_FILE):
+        self.df = df.reset_index(drop=True)
+        self.cells = expand_grid(grid or DEFAULT_GRID)
+        self.base = (base or BacktestConfig()).to_dict()
+        self.metric = metric
+        self.min_trades = int(min_trades)
+        self.workers = int(workers or os.getenv("CRX_OPT_WORKERS", "0") or 0) or (os.cpu_count() or 1)
+        self.cache_path = Path(cache_path)
+        self.cache = load_cache(self.cache_path)
+        self.hits = self.misses = 0
+
+    # ----- chạy 1 lượt: mọi ô × mọi đoạn -----
+    def _evaluate_all(self, segments: List[Tuple[int, int]], shared: SharedCandles) -> Dict[Tuple[int, int], Dict]:
+        out: Dict[Tuple[int, int], Dict] = {}
+        todo: Dict[str, Tuple[str, Dict[str, Any], int, int]] = {}
+        where: Dict[str, List[Tuple[int, int]]] = {}
+        hashes: Dict[Tuple[int, int], str] = {}
+        for ci, params in enumerate(self.cells):
+            cfg = _cfg(self.base, params)
+            for si, (a, b) in enumerate(segments):
+                lo = max(0, a - warmup_bars(cfg))
+                if (lo, b) not in hashes:
+                    hashes[(lo, b)] = shared.segment_hash(lo, b)
+                k = cell_key(cfg, hashes[(lo, b)])
+                if k in self.cache:
+                    self.hits += 1
+                    out[(ci, si)] = self.cache[k]
+                    continue
+                where.setdefault(k, []).append((ci, si))
+                todo.setdefault(k, (k, cfg.to_dict(), a, b))
+        self.misses += len(todo)
+        if todo:
+            tasks = list(todo.values())
+            if self.workers <= 1:
+                _attach(shared.name, shared.shape)
+                done = list(map(_run_cell, tasks))
+            else:
+                chunk = max(1, len(tasks) // (self.workers * 4))
+                with ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                         initargs=(shared.name, shared.shape)) as ex:
+                    done = list(ex.map(_run_cell, tasks, chunksize=chunk))
+            for k, stats in done:
+                if "error" not in stats:
+                    self.cache[k] = stats
+                for pos in where[k]:
+                    out[pos] = stats
+            save_cache(self.cache, self.cache_path)
+        return out
+
+    def run(self, train_days: float = 90, test_days: float = 30, step_days: Optional[float] = None) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        open_time = self.df["open_time"].to_numpy(dtype=np.int64)
+        folds = walk_forward_folds(open_time, train_days, test_days, step_days)
+        segments: List[Tuple[int, int]] = [(0, len(self.df))]
+        for a, m, b in folds:
+            segments += [(a, m), (m, b)]
+        shared = SharedCandles(self.df)
+        try:
+            res = self._evaluate_all(segments, shared)
+        finally:
+            shared.close()
+            if _W_SHM is not None:
+                try:
+                    _W_SHM.close()
+                except Exception:
+                    pass
+
+        def stats(ci, si):
+            return res.get((ci, si), {})
+
+        # Fold-by-fold: chọn ô tốt nhất trên train, ghi kết quả test (OOS)
+        wf, oos_eq = [], 1.0
+        for fi, (a, m, b) in enumerate(folds):
+            tr_si, te_si = 1 + 2 * fi, 2 + 2 * fi
+            scores = [_score(stats(ci, tr_si), self.metric, self.min_trades) for ci in range(len(self.cells))]
+            if scores and not np.isfinite(max(scores)):   # train quá ngắn cho min_trades → nới về 1 lệnh
+                scores = [_score(stats(ci, tr_si), self.metric, 1) for ci in range(len(self.cells))]
+            span = {"fold": fi, "train": [_iso(open_time[a]), _iso(open_time[m - 1])],
+                    "test": [_iso(open_time[m]), _iso(open_time[b - 1])]}
+            if not scores or not np.isfinite(max(scores)):  # không ô nào có lệnh trên train → không chọn bừa
+                wf.append({**span, "params": {}, "train_score": None, "test_score": None, "test_stats": {}})
+                continue
+            best = int(np.argmax(scores))
+            test = stats(best, te_si)
+            oos_eq *= 1.0 + float(test.get("total_return", 0.0))
+            wf.append({**span, "params": self.cells[best], "train_score": _finite(scores[best]),
+                       "test_score": _finite(_score(test, self.metric, 0)), "test_stats": test})
+
+        # Xếp hạng: ô đủ min_trades trên full-sample trước; rồi metric OOS trung bình qua fold
+        # (ô không giao dịch có metric 0 không được vượt ô có lệnh); không có fold → full-sample
+        ranked = []
+        for ci, params in enumerate(self.cells):
+            full = stats(ci, 0)
+            tests = [_score(stats(ci, 2 + 2 * fi), self.metric, 1) for fi in range(len(folds))]
+            tests = [t for t in tests if np.isfinite(t)]
+            full_score = _score(full, self.metric, self.min_trades)
+            ranked.append({
+                "params": params,
+                "valid": bool(np.isfinite(full_score)),
+                "oos_mean": float(np.mean(tests)) if tests else None,
+                "oos_std": float(np.std(tests)) if tests else None,
+                "oos_folds": len(tests),
+                "chosen_in_folds": sum(1 for w in wf if w["params"] == params),
+                "full_score": _finite(full_score),
+                "full_stats": full,
+            })
+
+        def rank_key(r):
+            oos = r["oos_mean"] if r["oos_mean"] is not None else float("-inf")
+            full = r["full_score"] if r["full_score"] is not None else float("-inf")
+            return (r["valid"], oos, full) if folds else (r["valid"], full)
+
+        ranked.sort(key=rank_key, reverse=True)
+        for i, r in enumerate(ranked, 1):
+            r["rank"] = i
+        # Không ô nào đủ min_trades (score hữu hạn) → không có "best"; thứ hạng vẫn giữ để xem
+        best = ranked[0]["params"] if ranked and ranked[0]["valid"] else {}
+        return {
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "metric": self.metric, "min_trades": self.min_trades,
+            "bars": len(self.df), "range": [_iso(open_time[0]), _iso(open_time[-1])] if len(open_time) else None,
+            "base": self.base, "grid_cells": len(self.cells), "folds": len(folds),
+            "cache": {"hits": self.hits, "misses": self.misses}, "workers": self.workers,
+            "elapsed_sec": round(time.perf_counter() - t0, 2),
+            "walk_forward": wf, "walk_forward_oos_return": oos_eq - 1.0 if folds else None,
+            "best": best, "left_yaml": left_fragment(best), "feature_flags": {FLAG_MAP[k]: v for k, v in best.items()
+                                                                              if k in FLAG_MAP},
+            "ranked": ranked,
+        }
+
+
+def _finite(x: float) -> Optional[float]:
+    return float(x) if x is not None and np.isfinite(x) else None
+
+
+def _iso(ms) -> str:
+    return datetime.fromtimestamp(int(ms) / 1000, tz=timezone.utc).isoformat()
+
+
+# ========== left.yaml ==========
+def left_fragment(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Tham số tốt nhất → mảnh dict cùng schema left.yaml (chỉ các khoá có ánh xạ trong LEFT_MAP)."""
+    frag: Dict[str, Any] = {}
+    for k, v in params.items():
+        path = LEFT_MAP.get(k)
+        if not path:
+            continue
+        d = frag
+        for p in path[:-1]:
+            d = d.setdefault(p, {})
+        d[path[-1]] = v
+    return frag
+
+
+def _flatten(frag: Dict[str, Any], prefix: Tuple[str, ...] = ()) -> List[Tuple[Tuple[str, ...], Any]]:
+    out = []
+    for k, v in frag.items():
+        out += _flatten(v, prefix + (k,)) if isinstance(v, dict) else [(prefix + (k,), v)]
+    return out
+
+
+def _set_scalar(lines: List[str], path: Tuple[str, ...], value: Any) -> bool:
+    """Sửa tại chỗ dòng 'key: value' theo đường dẫn khoá (giữ nguyên comment/định dạng còn lại của file)."""
+    depth, indent = 0, -1
+    for i, line in enumerate(lines):
+        body = line.split("#", 1)[0].rstrip()
+        if not body.strip():
+            continue
+        ind = len(line) - len(line.lstrip(" "))
+        if depth and ind <= indent:
+            return False                      # ra khỏi khối cha mà chưa thấy khoá
+        key, sep, rest = body.strip().partition(":")
+        if not sep or key.strip("'\"") != path[depth]:
+            continue
+        if depth == len(path) - 1:
+            comment = line[len(body):] if "#" in line else ""
+            lines[i] = f"{line[:ind]}{key}: {json.dumps(value)}{comment}"
+            return True
+        depth, indent = depth + 1, ind
+    return False
+
+
+def apply_left(fragment: Dict[str, Any], path: Path = ROOT / "config" / "left.yaml") -> Dict[str, Any]:
+    """Ghi tham số vào left.yaml (sửa đúng các dòng khoá), tăng patch của meta.version, cập nhật meta.chg_id."""
+    import yaml
+    path = Path(path)
+    lines = path.read_text(encoding="utf-8").splitlines()
+    doc = yaml.safe_load("\n".join(lines)) or {}
+    version = str(doc.get("meta", {}).get("version", "0.0.0"))
+    try:
+        parts = version.split(".")
+        parts[-1] = str(int(parts[-1]) + 1)
+        version = ".".join(parts)
+    except Exception:
+        pass
+    updates = _flatten(fragment) + [(("meta", "version"), version),
+                                    (("meta", "chg_id"), datetime.now(timezone.utc).isoformat())]
+    missing = [".".join(k) for k, v in updates if not _set_scalar(lines, k, v)]
+    if missing:
+        raise KeyError(f"left.yaml thiếu khoá: {', '.join(missing)}")
+    text = "\n".join(lines) + "\n"
+    doc = yaml.safe_load(text)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    tmp.replace(path)
+    return doc
+
+
+# ========== CLI ==========
+def _default_tf() -> str:
+    try:
+        from configs.config import TIMEFRAME
+        return str(TIMEFRAME or "15m")
+    except Exception:
+        return "15m"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--symbol", default="BTCUSDT")
+    ap.add_argument("--tf", default=_default_tf())
+    ap.add_argument("--synthetic-years", type=float, default=0.0)
+    ap.add_argument("--grid", default="", help='vd "fast=10,20 slow=50,100 breakout=10,20"; trống → DEFAULT_GRID')
+    ap.add_argument("--strategy", default="analyze", choices=["analyze", "left_agg", "ema_trend", "atr_breakout"])
+    ap.add_argument("--metric", default="sharpe", choices=["sharpe", "total_return", "calmar", "final_equity"])
+    ap.add_argument("--min-trades", type=int, default=5)
+    ap.add_argument("--train-days", type=float, default=90)
+    ap.add_argument("--test-days", type=float, default=30)
+    ap.add_argument("--step-days", type=float, default=None)
+    ap.add_argument("--fee-bps", type=float, default=4.0)
+    ap.add_argument("--slippage-bps", type=float, default=0.0)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--top", type=int, default=10)
+    ap.add_argument("--apply", action="store_true", help="merge tham số tốt nhất vào config/left.yaml")
+    ap.add_argument("--out", default=str(OUT_DIR))
+    a = ap.parse_args()
+
+    if a.synthetic_years:
+        from core.evaluator.synthetic import random_candles
+        df = random_candles(int(a.synthetic_years * 365 * 96))
+        a.symbol = "SYNTH"
+    else:
+        from core.evaluator.backtest import load_history
+        df = load_history(a.symbol, a.tf)
+    if len(df) < 200:
+        print(f"[optimizer] ⚠️  {a.symbol} {a.tf}: chỉ có {len(df)} nến – cần thêm dữ liệu hoặc --synthetic-years.")
+        return
+
+    base = BacktestConfig(strategy=a.strategy, fee_bps=a.fee_bps, slippage_bps=a.slippage_bps)
+    opt = Optimizer(df, parse_grid(a.grid) if a.grid else DEFAULT_GRID, base=base, metric=a.metric,
+                    min_trades=a.min_trades, workers=a.workers)
+    rep = opt.run(a.train_days, a.test_days, a.step_days)
+    rep.update({"symbol": a.symbol, "tf": a.tf})
+
+    print(f"[optimizer] {a.symbol} {a.tf}: {rep['bars']} nến, {rep['grid_cells']} ô × {rep['folds']} fold, "
+          f"cache hit={rep['cache']['hits']} miss={rep['cache']['misses']}, {rep['workers']} worker, {rep['elapsed_sec']}s")
+    for r in rep["ranked"][: a.top]:
+        oos = f"{r['oos_mean']:.3f}±{r['oos_std']:.3f}" if r["oos_mean"] is not None else "-"
+        full = f"{r['full_score']:.3f}" if r["full_score"] is not None else "-"
+        print(f"  #{r['rank']:<3} {json.dumps(r['params'])}  oos={oos}  full={full}  "
+              f"chosen={r['chosen_in_folds']}/{rep['folds']}")
+    if rep["walk_forward_oos_return"] is not None:
+        print(f"[optimizer] walk-forward OOS return (ghép {rep['folds']} fold): {rep['walk_forward_oos_return']:+.4%}")
+
+    out = Path(a.out)
+    out.mkdir(parents=True, exist_ok=True)
+    stem = f"{a.symbol}_{a.tf}_{a.strategy}"
+    (out / f"{stem}_report.json").write_text(json.dumps(rep, ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+    if not rep["best"]:
+        print(f"[optimizer] ⚠️  Không ô nào đạt min_trades={a.min_trades} (score hữu hạn) → không có tham số tốt nhất"
+              f"{'; từ chối --apply' if a.apply else ''}. Report: {out}/{stem}_report.json")
+        return
+    try:
+        import yaml
+        (out / f"{stem}_left.yaml").write_text(
+            f"# sinh bởi core.evaluator.optimizer {rep['generated_at']} ({a.metric}, {rep['folds']} fold)\n"
+            + yaml.safe_dump(rep["left_yaml"], allow_unicode=True, sort_keys=False), encoding="utf-8")
+    except Exception as e:
+        print(f"[optimizer] WARN: không ghi được mảnh left.yaml: {e}")
+    print(f"[optimizer] ✅ ghi {out}/{stem}_report.json, {stem}_left.yaml → best={json.dumps(rep['best'])}")
+    if a.apply and rep["left_yaml"]:
+        doc = apply_left(rep["left_yaml"])
+        print(f"[optimizer] ✅ đã merge vào config/left.yaml (version {doc.get('meta', {}).get('version')})")
+
+
+if __name__ == "__main__":
+    main()
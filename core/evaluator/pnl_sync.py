@@ -1,8 +1,15 @@
 # -*- coding: utf-8 -*-
 """
-Đồng bộ PnL đã chốt (REALIZED_PNL) từ Binance Futures về file local cho dashboard.
-- Đầu ra:
-  data/pnl_summary.json:
+Đồng bộ PnL đã chốt (REALIZED_PNL) từ Binance Futures về local cho dashboard – tăng dần theo con trỏ.
+- Mỗi lần chạy chỉ tải income có time ≥ con trỏ (trừ CRX_PNL_SYNC_OVERLAP_SEC để bắt bản ghi đến trễ),
+  append vào data/history.db bảng income (core/memory/history_db.py), khử trùng lặp theo (tranId, incomeType).
+- Checkpoint (state store, ns "pnl_sync"): cursor_ms, last_tran_id, days và agg tổng dồn của cửa sổ
+  [now - DAYS, cursor]. Checkpoint được ghi nguyên tử sau khi append.
+- pnl_summary.json lấy từ agg: cộng phần mới, trừ phần vừa trượt khỏi cửa sổ (SUM trên chỉ mục ts),
+  không tải lại và không cộng lại 30 ngày.
+- Đồng bộ lại toàn bộ cửa sổ: python -m core.evaluator.pnl_sync --full (hoặc CRX_PNL_SYNC_FULL=1).
+  Chế độ này tự chạy khi chưa có checkpoint, khi đổi CRX_PNL_SYNC_DAYS, hoặc khi con trỏ đã rơi khỏi cửa sổ.
+- Đầu ra data/pnl_summary.json:
     {
       "updated_at": "...",
       "range_days": 30,
@@ -16,13 +23,12 @@
 ENV:
   BINANCE_API_KEY, BINANCE_API_SECRET  (bắt buộc)
   BINANCE_FAPI_BASE (mặc định testnet: https://testnet.binancefuture.com)
-  CRX_PNL_SYNC_DAYS (mặc định 30)
+  CRX_PNL_SYNC_DAYS (mặc định 30), CRX_PNL_SYNC_OVERLAP_SEC (mặc định 300), CRX_PNL_SYNC_FULL
 """
 
 from __future__ import annotations
-import os, time, json, hmac, hashlib, requests
+import os, sys, time, json
 from pathlib import Path
-from urllib.parse import urlencode
 from datetime import datetime, timedelta, timezone
 
 try:
@@ -31,42 +37,34 @@ try:
 except Exception:
     pass
 
+from core.execution.binance_client import get_client  # sau load_dotenv: client đọc ENV lúc import
+
 ROOT = Path(__file__).resolve().parents[2]  # .../core/evaluator -> repo root
 DATA = ROOT / "data"; DATA.mkdir(exist_ok=True)
 OUT_FILE = DATA / "pnl_summary.json"
-RAW_FILE = DATA / "pnl_income_raw.json"
+STATE_NS = "pnl_sync"
 
 API_KEY    = (os.getenv("BINANCE_API_KEY") or "").strip()
 API_SECRET = (os.getenv("BINANCE_API_SECRET") or "").strip()
 BASE       = (os.getenv("BINANCE_FAPI_BASE") or "https://testnet.binancefuture.com").strip()
 DAYS       = int(os.getenv("CRX_PNL_SYNC_DAYS", "30"))
-RECV       = int(os.getenv("BINANCE_RECVWINDOW", "5000"))
+OVERLAP_MS = int(float(os.getenv("CRX_PNL_SYNC_OVERLAP_SEC", "300")) * 1000)
 
 if not API_KEY or not API_SECRET:
     print("[pnl_sync] ❌ Thiếu BINANCE_API_KEY/BINANCE_API_SECRET trong .env")
     raise SystemExit(1)
 
 def _ts(): return int(time.time() * 1000)
-def _headers(): return {"X-MBX-APIKEY": API_KEY}
-def _sign(params: dict) -> str:
-    q = urlencode(params, doseq=True)
-    sig = hmac.new(API_SECRET.encode(), q.encode(), hashlib.sha256).hexdigest()
-    return f"{q}&signature={sig}"
 
 def _get_signed(path: str, params: dict):
-    params = dict(params or {})
-    params.update({"timestamp": _ts(), "recvWindow": RECV})
-    url = f"{BASE}{path}?{_sign(params)}"
-    r = requests.get(url, headers=_headers(), timeout=10)
-    r.raise_for_status()
-    return r.json()
+    return get_client(BASE).get(path, params, signed=True)
 
 def iso_utc(ms: int) -> str:
     return datetime.fromtimestamp(ms/1000, tz=timezone.utc).isoformat()
 
-def fetch_income_realized_pnl(days: int) -> list[dict]:
-    start_ms = int((datetime.now(timezone.utc) - timedelta(days=days)).timestamp() * 1000)
-    end_ms   = _ts()
+def fetch_income_realized_pnl(start_ms: int) -> list[dict]:
+    """REALIZED_PNL có time ≥ start_ms (phân trang 1000 dòng; thường chỉ 1 trang khi chạy tăng dần)."""
+    end_ms = _ts()
     out = []
     cursor = start_ms
     limit = 1000
@@ -87,45 +85,88 @@ def fetch_income_realized_pnl(days: int) -> list[dict]:
         time.sleep(0.2)
     return out
 
-def summarize(incomes: list[dict]) -> dict:
-    total = 0.0
-    wins = 0
-    losses = 0
-    last_ms = None
-    for it in incomes:
+def _add(agg: dict, part: dict, sign: int = 1) -> None:
+    agg["sum"] = float(agg.get("sum", 0.0)) + sign * float(part.get("sum", 0.0))
+    agg["wins"] = int(agg.get("wins", 0)) + sign * int(part.get("wins", 0))
+    agg["losses"] = int(agg.get("losses", 0)) + sign * int(part.get("losses", 0))
+    if sign > 0 and part.get("last_ms"):
+        agg["last_ms"] = max(int(agg.get("last_ms") or 0), int(part["last_ms"]))
+
+def _agg_rows(rows: list[dict]) -> dict:
+    part = {"sum": 0.0, "wins": 0, "losses": 0, "last_ms": None}
+    for it in rows:
         try:
             val = float(it.get("income", 0) or 0)
         except Exception:
             continue
-        total += val
-        if val > 0:
-            wins += 1
-        elif val < 0:
-            losses += 1
-        t = int(it.get("time", 0) or 0)
-        if not last_ms or t > last_ms:
-            last_ms = t
-
-    trades = wins + losses
+        part["sum"] += val
+        part["wins"] += val > 0
+        part["losses"] += val < 0
+        part["last_ms"] = max(part["last_ms"] or 0, int(it.get("time", 0) or 0))
+    return part
+
+def summarize(agg: dict) -> dict:
+    trades = int(agg.get("wins", 0)) + int(agg.get("losses", 0))
+    total = float(agg.get("sum", 0.0))
     avg = (total / trades) if trades else 0.0
+    last_ms = agg.get("last_ms")
     return {
         "updated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
         "range_days": DAYS,
         "total_trades": trades,
-        "wins": wins,
-        "losses": losses,
+        "wins": int(agg.get("wins", 0)),
+        "losses": int(agg.get("losses", 0)),
         "realized_pnl_sum": round(total, 6),
         "avg_pnl_per_trade": round(avg, 6),
         "last_trade_time": iso_utc(last_ms) if last_ms else None,
     }
 
-def main():
+def sync(full: bool = False) -> dict:
+    """1 lần đồng bộ; trả checkpoint mới. agg = tổng của income trong [window_start, cursor_ms]."""
+    from core.memory.history_db import get_db
+    from core.memory.state_store import get_store
+    db, store = get_db(), get_store()
+    st = store.get_ns(STATE_NS)
+    now_ms = _ts()
+    ws = now_ms - DAYS * 86_400_000
+    cursor = int(st.get("cursor_ms") or 0)
+    agg = st.get("agg")
+    if not full and (not isinstance(agg, dict) or st.get("days") != DAYS or cursor < ws):
+        full = True
+
+    start = ws if full else max(ws, cursor - OVERLAP_MS)
+    rows = fetch_income_realized_pnl(start)
+    new = db.insert_income(rows)
+    hi = max([cursor] + [int(r.get("time", 0) or 0) for r in rows])
+
+    if full:
+        agg = db.income_agg(since=ws, until=hi + 1)
+        agg["window_start_ms"] = ws
+    else:
+        _add(agg, _agg_rows([r for r in new if ws <= int(r.get("time", 0) or 0) <= cursor]))   # đến trễ
+        _add(agg, db.income_agg(since=cursor + 1, until=hi + 1))                             # sau con trỏ
+        old_ws = int(agg.get("window_start_ms") or ws)
+        if ws > old_ws:
+            _add(agg, db.income_agg(since=old_ws, until=ws), sign=-1)                        # trượt cửa sổ
+        agg["window_start_ms"] = ws
+
+    last = max(rows, key=lambda r: int(r.get("time", 0) or 0), default={})
+    ck = {"cursor_ms": hi, "last_tran_id": last.get("tranId", st.get("last_tran_id")), "days": DAYS, "agg": agg,
+          "synced_at": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+    store.put_many(STATE_NS, ck)
+    print(f"[pnl_sync] {'FULL' if full else 'incremental'}: fetched={len(rows)} new={len(new)} "
+          f"cursor={iso_utc(hi) if hi else '-'}")
+    return ck
+
+def main(full: bool | None = None, argv: list[str] | None = None):
+    if full is None:
+        args = sys.argv[1:] if argv is None else argv
+        full = ("--full" in args) or os.getenv("CRX_PNL_SYNC_FULL", "") in ("1", "true", "yes")
     print(f"[pnl_sync] Base={BASE} | days={DAYS}")
-    incomes = fetch_income_realized_pnl(DAYS)
-    RAW_FILE.write_text(json.dumps(incomes, ensure_ascii=False, indent=2), encoding="utf-8")
-    sm = summarize(incomes)
+    ck = sync(full=full)
+    sm = summarize(ck["agg"])
     OUT_FILE.write_text(json.dumps(sm, ensure_ascii=False, indent=2), encoding="utf-8")
     print(f"[pnl_sync] ✅ Đã cập nhật {OUT_FILE.name}: {sm}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
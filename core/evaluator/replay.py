@@ -0,0 +1,744 @@
+# -*- coding: utf-8 -*-
+# core/evaluator/replay.py
+"""
+Replay backtester theo sự kiện: chạy NGUYÊN code thật decision_maker.build_decision_record →
+meta_controller.run_once → order_executor.run trên nến đã ghi, với:
+- SimClock: datetime.now()/time.time() trong các module được thay bằng giờ mô phỏng
+  (mỗi tick = giờ đóng nến + độ trễ) → cooldown/flip limit, funding mins_left… chạy đúng theo lịch sử.
+- SimExchange: thay client REST dùng chung (core/execution/binance_client.get_client) của executor/funding_optimizer
+  bằng client chạy trên sàn giả lập: positionRisk, order MARKET (khớp giá open nến kế, slippage, phí taker, reduceOnly),
+  leverage, ticker/price, exchangeInfo, premiumIndex; kiểm tra chữ ký + timestamp/recvWindow;
+  funding mỗi mốc 8h.
+- MemFS: mọi đọc/ghi file trạng thái trong dự án (data/, logs/, *.json ở gốc) đi vào RAM → không
+  đụng trạng thái live; config/*.yaml vẫn đọc từ đĩa.
+- Sizing như auto_main (tuỳ chọn): bandit_optimizer.adjust_size_by_bandit + funding_optimizer.adjust_size_by_funding.
+Không sleep thật → vài tháng nến 15m chạy trong vài phút.
+
+Cách dùng:
+  python -m core.evaluator.replay --symbol BTCUSDT --tf 15m --days 90
+  python -m core.evaluator.replay --synthetic-days 60 --open-floor 0.5 --close-floor 0.5 --sizing
+"""
+from __future__ import annotations
+
+import io
+import os
+import sys
+import json
+import time
+import hmac
+import hashlib
+import builtins
+import argparse
+import contextlib
+import copy
+import importlib
+import pathlib
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlparse
+
+import pandas as pd
+import yaml
+
+ROOT = pathlib.Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+FUNDING_MS = 8 * 3_600_000
+SIM_KEY, SIM_SECRET = "replay-key", "replay-secret"
+
+
+# ========== Clock ==========
+class SimClock:
+    def __init__(self, now_ms: int = 0):
+        self.now_ms = int(now_ms)
+
+    def set(self, ms: int) -> None:
+        self.now_ms = max(self.now_ms, int(ms))
+
+    def time(self) -> float:
+        return self.now_ms / 1000.0
+
+    def sleep(self, sec: float) -> None:
+        self.now_ms += int(max(0.0, sec) * 1000)
+
+    def datetime_cls(self):
+        clock = self
+
+        class SimDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                d = datetime.fromtimestamp(clock.time(), tz=timezone.utc)
+                return d if tz is None or tz is timezone.utc else d.astimezone(tz)
+
+            @classmethod
+            def utcnow(cls):
+                return datetime.fromtimestamp(clock.time(), tz=timezone.utc).replace(tzinfo=None)
+
+        return SimDatetime
+
+    def time_module(self):
+        """Shim thay module `time` trong module mục tiêu: time()/sleep() mô phỏng, còn lại như thật."""
+        clock = self
+
+        class _T:
+            def __getattr__(self, name):
+                return getattr(time, name)
+
+            @staticmethod
+            def time():
+                return clock.time()
+
+            @staticmethod
+            def sleep(sec):
+                clock.sleep(sec)
+
+        return _T()
+
+
+# ========== In-memory FS ==========
+class MemFS:
+    """
+    Chặn Path.* và open() cho file trạng thái trong dự án. Đường dẫn "quản lý" (data/, logs/,
+    *.json|*.jsonl|*.flag|*.lock ở gốc) chỉ tồn tại trong RAM; ghi vào chỗ khác trong dự án cũng vào RAM
+    (đọc thì ưu tiên RAM rồi tới đĩa). Ngoài dự án → đĩa thật.
+    """
+    _ROOT_SUFFIX = (".json", ".jsonl", ".flag", ".lock", ".log", ".tmp")
+
+    def __init__(self, root: pathlib.Path = ROOT):
+        self.root = os.path.abspath(root)
+        self.files: Dict[str, bytes] = {}
+        self.dirs: set = set()
+        self.writes = 0
+        self._orig: Dict[Tuple[Any, str], Any] = {}
+
+    # ----- phân loại -----
+    def _abs(self, p) -> str:
+        return os.path.abspath(os.fspath(p))
+
+    def _inside(self, a: str) -> bool:
+        return a == self.root or a.startswith(self.root + os.sep)
+
+    def managed(self, a: str) -> bool:
+        if not self._inside(a):
+            return False
+        rel = os.path.relpath(a, self.root)
+        top = rel.split(os.sep, 1)[0]
+        return top in ("data", "logs") or (os.sep not in rel and rel.endswith(self._ROOT_SUFFIX))
+
+    def _is_dir(self, a: str) -> bool:
+        if a in self.dirs:
+            return True
+        pre = a + os.sep
+        return any(k.startswith(pre) for k in self.files)
+
+    # ----- thao tác -----
+    def read(self, a: str) -> bytes:
+        if a in self.files:
+            return self.files[a]
+        if self.managed(a):
+            raise FileNotFoundError(a)
+        with self._orig[(builtins, "open")](a, "rb") as f:
+            return f.read()
+
+    def write(self, a: str, data: bytes) -> None:
+        self.files[a] = data
+        self.writes += 1
+
+    def exists(self, a: str) -> bool:
+        if a in self.files or self._is_dir(a):
+            return True
+        return False if self.managed(a) else os.path.exists(a)
+
+    def open(self, a: str, mode: str = "r", encoding: Optional[str] = None, **kw):
+        binary = "b" in mode
+        enc = encoding or "utf-8"
+        if any(m in mode for m in ("w", "a", "x", "+")):
+            init = b""
+            if "a" in mode or "+" in mode:
+                try:
+                    init = self.read(a)
+                except FileNotFoundError:
+                    init = b""
+            fs = self
+            base = io.BytesIO if binary else io.StringIO
+
+            class _W(base):
+                def close(self_inner):
+                    if not self_inner.closed:
+                        v = self_inner.getvalue()
+                        fs.write(a, v if binary else v.encode(enc))
+                    super().close()
+
+            buf = _W(init if binary else init.decode(enc))
+            if "a" in mode:
+                buf.seek(0, io.SEEK_END)
+            return buf
+        data = self.read(a)
+        return io.BytesIO(data) if binary else io.StringIO(data.decode(enc), newline=kw.get("newline"))
+
+    # ----- cài / gỡ patch -----
+    def _patch(self, owner, name, fn):
+        self._orig[(owner, name)] = getattr(owner, name)
+        setattr(owner, name, fn)
+
+    def install(self) -> "MemFS":
+        fs = self
+        P = pathlib.Path
+        o_open = builtins.open
+
+        def mine(p) -> bool:
+            return fs._inside(fs._abs(p))
+
+        def p_open(self_p, mode="r", buffering=-1, encoding=None, errors=None, newline=None):
+            a = fs._abs(self_p)
+            if mine(a) and (a in fs.files or fs.managed(a) or any(m in mode for m in "wax+")):
+                return fs.open(a, mode, encoding=encoding, newline=newline)
+            return fs._orig[(P, "open")](self_p, mode, buffering, encoding, errors, newline)
+
+        def b_open(file, mode="r", *a, **kw):
+            if isinstance(file, (str, bytes, os.PathLike)) and not isinstance(file, int):
+                ab = fs._abs(file)
+                if mine(ab) and (ab in fs.files or fs.managed(ab) or any(m in mode for m in "wax+")):
+                    return fs.open(ab, mode, encoding=kw.get("encoding"), newline=kw.get("newline"))
+            return o_open(file, mode, *a, **kw)
+
+        def p_exists(self_p, *a, **kw):
+            ab = fs._abs(self_p)
+            return fs.exists(ab) if mine(ab) else fs._orig[(P, "exists")](self_p, *a, **kw)
+
+        def p_is_file(self_p):
+            ab = fs._abs(self_p)
+            if mine(ab) and (ab in fs.files or fs.managed(ab)):
+                return ab in fs.files
+            return fs._orig[(P, "is_file")](self_p)
+
+        def p_is_dir(self_p):
+            ab = fs._abs(self_p)
+            if mine(ab) and (fs._is_dir(ab) or fs.managed(ab)):
+                return fs._is_dir(ab)
+            return fs._orig[(P, "is_dir")](self_p)
+
+        def p_read_text(self_p, encoding=None, errors=None):
+            return fs.read(fs._abs(self_p)).decode(encoding or "utf-8", errors or "strict") if mine(self_p) \
+                else fs._orig[(P, "read_text")](self_p, encoding, errors)
+
+        def p_read_bytes(self_p):
+            return fs.read(fs._abs(self_p)) if mine(self_p) else fs._orig[(P, "read_bytes")](self_p)
+
+        def p_write_text(self_p, data, encoding=None, errors=None, newline=None):
+            if not mine(self_p):
+                return fs._orig[(P, "write_text")](self_p, data, encoding, errors, newline)
+            fs.write(fs._abs(self_p), data.encode(encoding or "utf-8"))
+            return len(data)
+
+        def p_write_bytes(self_p, data):
+            if not mine(self_p):
+                return fs._orig[(P, "write_bytes")](self_p, data)
+            fs.write(fs._abs(self_p), bytes(data))
+            return len(data)
+
+        def p_mkdir(self_p, mode=0o777, parents=False, exist_ok=False):
+            if not mine(self_p):
+                return fs._orig[(P, "mkdir")](self_p, mode, parents, exist_ok)
+            fs.dirs.add(fs._abs(self_p))
+
+        def p_replace(self_p, target):
+            if not mine(self_p):
+                return fs._orig[(P, "replace")](self_p, target)
+            src, dst = fs._abs(self_p), fs._abs(target)
+            fs.files[dst] = fs.read(src)
+            fs.files.pop(src, None)
+            return P(target)
+
+        def p_unlink(self_p, missing_ok=False):
+            if not mine(self_p):
+                return fs._orig[(P, "unlink")](self_p, missing_ok)
+            ab = fs._abs(self_p)
+            if ab not in fs.files and not missing_ok:
+                raise FileNotFoundError(ab)
+            fs.files.pop(ab, None)
+
+        def p_touch(self_p, mode=0o666, exist_ok=True):
+            if not mine(self_p):
+                return fs._orig[(P, "touch")](self_p, mode, exist_ok)
+            fs.files.setdefault(fs._abs(self_p), b"")
+
+        self._patch(P, "open", p_open)
+        self._patch(builtins, "open", b_open)
+        self._patch(P, "exists", p_exists)
+        self._patch(P, "is_file", p_is_file)
+        self._patch(P, "is_dir", p_is_dir)
+        self._patch(P, "read_text", p_read_text)
+        self._patch(P, "read_bytes", p_read_bytes)
+        self._patch(P, "write_text", p_write_text)
+        self._patch(P, "write_bytes", p_write_bytes)
+        self._patch(P, "mkdir", p_mkdir)
+        self._patch(P, "replace", p_replace)
+        self._patch(P, "rename", p_replace)
+        self._patch(P, "unlink", p_unlink)
+        self._patch(P, "touch", p_touch)
+        return self
+
+    def uninstall(self) -> None:
+        for (owner, name), fn in reversed(list(self._orig.items())):
+            setattr(owner, name, fn)
+        self._orig.clear()
+
+    def read_json(self, rel: str, default=None):
+        try:
+            return json.loads(self.files[os.path.join(self.root, rel)].decode("utf-8"))
+        except Exception:
+            return default
+
+
+# ========== Exchange ==========
+class _Resp:
+    def __init__(self, status: int, body: Any):
+        self.status_code = status
+        self._body = body
+        self.headers = {}
+
+    def json(self):
+        return self._body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import requests
+            raise requests.HTTPError(f"{self.status_code}: {self._body}", response=self)
+
+
+@dataclass
+class SimExchange:
+    clock: SimClock
+    fee_bps: float = 4.0
+    slippage_bps: float = 0.0
+    funding_rate: float = 0.0001
+    step: float = 0.001
+    min_qty: float = 0.001
+    recv_window_ms: int = 5000
+    price: Dict[str, float] = field(default_factory=dict)
+    positions: Dict[str, List[float]] = field(default_factory=dict)   # sym → [amt, entry]
+    wallet: float = 1000.0
+    fills: List[Dict[str, Any]] = field(default_factory=list)
+    fees: float = 0.0
+    funding_paid: float = 0.0
+    realized: float = 0.0
+    requests: int = 0
+    rejected: int = 0
+    _next_funding_ms: int = 0
+    _oid: int = 0
+
+    # ----- thời gian & giá -----
+    def advance(self, now_ms: int) -> None:
+        """Áp funding cho các mốc 8h đã qua (theo giá đánh dấu hiện tại)."""
+        if not self._next_funding_ms:
+            self._next_funding_ms = (now_ms // FUNDING_MS + 1) * FUNDING_MS
+        while now_ms >= self._next_funding_ms:
+            for sym, (amt, _) in self.positions.items():
+                if amt:
+                    pay = amt * self.price.get(sym, 0.0) * self.funding_rate
+                    self.wallet -= pay
+                    self.funding_paid += pay
+            self._next_funding_ms += FUNDING_MS
+
+    def set_price(self, symbol: str, px: float) -> None:
+        self.price[symbol] = float(px)
+
+    def equity(self) -> float:
+        return self.wallet + sum(amt * (self.price.get(s, e) - e) for s, (amt, e) in self.positions.items())
+
+    # ----- HTTP giả lập -----
+    def _check_sig(self, params: Dict[str, Any]) -> Optional[str]:
+        if "signature" not in params:
+            return "missing signature"
+        p = {k: v for k, v in params.items() if k != "signature"}
+        good = hmac.new(SIM_SECRET.encode(), urlencode(p, doseq=True).encode(), hashlib.sha256).hexdigest()
+        if params["signature"] != good:
+            return "bad signature"
+        ts = int(params.get("timestamp", 0))
+        if abs(self.clock.now_ms - ts) > int(params.get("recvWindow", self.recv_window_ms)):
+            return "timestamp outside recvWindow"
+        return None
+
+    def handle(self, method: str, url: str, params: Dict[str, Any]) -> _Resp:
+        self.requests += 1
+        path = urlparse(url).path
+        params = dict(params or {})
+        if path in ("/fapi/v2/positionRisk", "/fapi/v1/order", "/fapi/v1/leverage"):
+            err = self._check_sig(params)
+            if err:
+                self.rejected += 1
+                return _Resp(400, {"code": -1022, "msg": err})
+        sym = str(params.get("symbol", "BTCUSDT")).upper()
+        if path == "/fapi/v1/ticker/price":
+            return _Resp(200, {"symbol": sym, "price": f"{self.price.get(sym, 0.0):.8f}"})
+        if path == "/fapi/v1/exchangeInfo":
+            return _Resp(200, {"symbols": [{"symbol": s, "filters": [
+                {"filterType": "LOT_SIZE", "stepSize": str(self.step), "minQty": str(self.min_qty)}]}
+                for s in (self.price or {sym: 0})]})
+        if path == "/fapi/v1/premiumIndex":
+            nxt = (self.clock.now_ms // FUNDING_MS + 1) * FUNDING_MS
+            return _Resp(200, {"symbol": sym, "lastFundingRate": str(self.funding_rate), "nextFundingTime": nxt,
+                               "markPrice": str(self.price.get(sym, 0.0))})
+        if path == "/fapi/v2/positionRisk":
+            amt, entry = self.positions.get(sym, [0.0, 0.0])
+            return _Resp(200, [{"symbol": sym, "positionAmt": f"{amt:.8f}", "entryPrice": f"{entry:.8f}"}])
+        if path == "/fapi/v1/leverage":
+            return _Resp(200, {"symbol": sym, "leverage": int(params.get("leverage", 1))})
+        if path == "/fapi/v1/order" and method == "POST":
+            return self._order(sym, params)
+        return _Resp(404, {"code": -1, "msg": f"unknown endpoint {method} {path}"})
+
+    def _order(self, sym: str, p: Dict[str, Any], px: Optional[float] = None) -> _Resp:
+        """Khớp ngay theo giá hiện tại (+trượt giá); px != None → khớp đúng giá đó (lệnh LIMIT của tools/mock_exchange)."""
+        side = str(p.get("side", "")).upper()
+        qty = float(p.get("quantity", 0))
+        if qty < self.min_qty or side not in ("BUY", "SELL") or sym not in self.price:
+            self.rejected += 1
+            return _Resp(400, {"code": -4003, "msg": "invalid order"})
+        sgn = 1 if side == "BUY" else -1
+        amt, entry = self.positions.get(sym, [0.0, 0.0])
+        if str(p.get("reduceOnly", "")).lower() == "true":
+            if amt == 0 or sgn * amt > 0:
+                self.rejected += 1
+                return _Resp(400, {"code": -2022, "msg": "ReduceOnly Order is rejected."})
+            qty = min(qty, abs(amt))
+        px = self.price[sym] * (1 + sgn * self.slippage_bps / 1e4) if px is None else float(px)
+        fee = px * qty * self.fee_bps / 1e4
+        self.wallet -= fee
+        self.fees += fee
+        new_amt = amt + sgn * qty
+        if amt and sgn * amt < 0:                     # giảm/đóng/đảo
+            closed = min(abs(amt), qty)
+            pnl = closed * (px - entry) * (1 if amt > 0 else -1)
+            self.wallet += pnl
+            self.realized += pnl
+            entry = px if abs(new_amt) > 1e-12 and new_amt * amt < 0 else entry
+        else:                                         # mở/thêm
+            entry = (abs(amt) * entry + qty * px) / abs(new_amt) if new_amt else 0.0
+        self.positions[sym] = [0.0 if abs(new_amt) < 1e-12 else new_amt, 0.0 if abs(new_amt) < 1e-12 else entry]
+        self._oid += 1
+        cid = p.get("newClientOrderId") or f"sim-{self._oid}"
+        fill = {"orderId": self._oid, "clientOrderId": cid, "symbol": sym, "side": side, "status": "FILLED",
+                "executedQty": f"{qty:.8f}", "avgPrice": f"{px:.8f}", "updateTime": self.clock.now_ms,
+                "reduceOnly": p.get("reduceOnly") == "true"}
+        self.fills.append({**fill, "fee": fee, "wallet": self.wallet})
+        return _Resp(200, fill)
+
+    def session(self):
+        ex = self
+
+        class _Session:
+            headers: Dict[str, str] = {}
+
+            def get(self, url, params=None, timeout=None, **kw):
+                return ex.handle("GET", url, params)
+
+            def post(self, url, params=None, timeout=None, **kw):
+                return ex.handle("POST", url, params)
+
+        return _Session()
+
+    def client(self):
+        """BinanceClient thật (ký, bảng weight) trên session giả lập: giờ = SimClock, không limiter/sleep."""
+        from core.execution.binance_client import BinanceClient
+        clock = self.clock
+
+        class _Clock:
+            offset_ms = 0
+
+            @staticmethod
+            def now_ms():
+                return clock.now_ms
+
+            @staticmethod
+            def sync():
+                return True
+
+        return BinanceClient("https://replay.sim", SIM_KEY, SIM_SECRET, recv_window=self.recv_window_ms,
+                             session=self.session(), clock=_Clock(), limiter=None, max_skew_ms=0,
+                             log=lambda *a, **k: None)
+
+
+# ========== Harness ==========
+@dataclass
+class ReplayConfig:
+    symbol: str = "BTCUSDT"
+    tf: str = "15m"
+    window: int = 100
+    latency_ms: int = 2000            # tick chạy sau giờ đóng nến bao lâu
+    open_floor: Optional[float] = None
+    close_floor: Optional[float] = None
+    fee_bps: float = 4.0
+    slippage_bps: float = 0.0
+    funding_rate: float = 0.0001
+    initial_equity: float = 1000.0
+    sizing: bool = False              # chạy bandit/funding sizing như auto_main
+    executor_repeats: int = 1         # >1: gọi executor nhiều lần/tick (kiểm tra chặn trùng ts)
+    segment_kb: int = 256             # đoạn decision log nhỏ → mỗi lần append trong MemFS copy ít
+
+
+@dataclass
+class ReplayResult:
+    equity: pd.Series
+    fills: pd.DataFrame
+    stats: Dict[str, Any]
+    log: List[str]
+
+
+class Replay:
+    PATCH_DT = ("core.decision.decision_maker", "core.decision.meta_controller")
+    PATCH_TIME = ("core.execution.order_executor", "core.capital.funding_optimizer")
+
+    def __init__(self, candles: pd.DataFrame, cfg: Optional[ReplayConfig] = None):
+        self.cfg = cfg or ReplayConfig()
+        self.df = candles.reset_index(drop=True)
+        self.clock = SimClock(int(self.df["close_time"].iloc[0]) if len(self.df) else 0)
+        self.fs = MemFS()
+        self.ex = SimExchange(self.clock, fee_bps=self.cfg.fee_bps, slippage_bps=self.cfg.slippage_bps,
+                              funding_rate=self.cfg.funding_rate, wallet=self.cfg.initial_equity)
+        self.messages: List[str] = []
+        self._restore: List[Tuple[Any, str, Any]] = []
+        self._env: Dict[str, Optional[str]] = {}
+
+    # ----- patch module -----
+    def _set(self, obj, name, val):
+        self._restore.append((obj, name, getattr(obj, name)))
+        setattr(obj, name, val)
+
+    def _setenv(self, k, v):
+        self._env.setdefault(k, os.environ.get(k))
+        os.environ[k] = v
+
+    def _install(self):
+        self.fs.install()
+        self._setenv("CRX_ENABLE_ORDER_EXECUTOR", "1")
+        self.mods = {m: importlib.import_module(m) for m in (
+            "core.decision.decision_maker", "core.decision.meta_controller", "core.execution.order_executor")}
+        ex = self.mods["core.execution.order_executor"]
+        if self.cfg.open_floor is not None:
+            self._set(ex, "OPEN_CONF_FLOOR", float(self.cfg.open_floor))
+        if self.cfg.close_floor is not None:
+            self._set(ex, "CLOSE_CONF_FLOOR", float(self.cfg.close_floor))
+        self._set(ex, "API_KEY", SIM_KEY)
+        self._set(ex, "API_SECRET", SIM_SECRET)
+        sim = self.ex.client()
+
+        class _AnyBase(dict):
+            def __missing__(self, base):
+                return sim
+
+        self._set(importlib.import_module("core.execution.binance_client"), "_CLIENTS", _AnyBase())
+        self._set(importlib.import_module("core.execution.symbol_meta"), "_CACHES", {})   # metadata của sàn giả lập
+        dlog = importlib.import_module("core.memory.decision_log")
+        self._set(dlog, "SEGMENT_BYTES", int(self.cfg.segment_kb) * 1024)
+        self._set(dlog, "_LOG", None)     # log mới trên MemFS (không dính instance của live)
+        sstore = importlib.import_module("core.memory.state_store")
+        self.state = sstore.StateStore(":memory:")   # sqlite không đi qua MemFS → kho trạng thái trong RAM
+        self._set(sstore, "_STORE", self.state)
+        hdb = importlib.import_module("core.memory.history_db")
+        self._set(hdb, "_DB", hdb.HistoryDB(":memory:"))
+        send = lambda text, **kw: self.messages.append(str(text)) or True
+        self._set(ex, "send_telegram_message", send)
+        try:
+            import notifier.notify_telegram as nt
+            self._set(nt, "send_telegram_message", send)
+        except Exception:
+            pass
+        self._set(yaml, "safe_load", self._memo_yaml(yaml.safe_load))
+        for m in self.PATCH_DT:
+            self._set(self.mods[m], "datetime", self.clock.datetime_cls())
+        if self.cfg.sizing:
+            self._install_sizing(send)
+        for m in self.PATCH_TIME:
+            mod = sys.modules.get(m)
+            if mod is not None:
+                self._set(mod, "time", self.clock.time_module())
+
+    @staticmethod
+    def _memo_yaml(load):
+        """config/*.yaml không đổi trong lúc replay → parse 1 lần / nội dung (trả bản sao để module tự sửa thoải mái)."""
+        memo: Dict[str, Any] = {}
+
+        def safe_load(stream):
+            text = stream if isinstance(stream, str) else stream.read()
+            if isinstance(text, bytes):
+                text = text.decode("utf-8")
+            if text not in memo:
+                memo[text] = load(text)
+            return copy.deepcopy(memo[text])
+
+        return safe_load
+
+    def _install_sizing(self, send):
+        fo = importlib.import_module("core.capital.funding_optimizer")
+        bo = importlib.import_module("core.capital.bandit_optimizer")
+        tl = importlib.import_module("core.memory.trade_logger")
+        self._set(fo, "send_telegram_message", send)
+        self._set(tl, "now_utc_iso", lambda: datetime.fromtimestamp(self.clock.time(), tz=timezone.utc).isoformat())
+        self.sizing = (bo.adjust_size_by_bandit, fo.adjust_size_by_funding, tl.log_trade)
+
+    def _uninstall(self):
+        for obj, name, val in reversed(self._restore):
+            setattr(obj, name, val)
+        self._restore.clear()
+        for k, v in self._env.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+        self._env.clear()
+        self.fs.uninstall()
+
+    # ----- chạy -----
+    def run(self, progress_every: int = 0) -> ReplayResult:
+        cfg, df = self.cfg, self.df
+        n = len(df)
+        closes = df["close_time"].to_numpy()
+        opens = df["open"].to_numpy()
+        last_close = df["close"].to_numpy()
+        eq_t, eq_v, log = [], [], []
+        counters = {"ticks": 0, "decisions": {}, "meta_switch": 0, "meta_blocked": 0, "exec_dup": 0, "exec_none": 0,
+                    "exec_orders": 0, "exec_close": 0, "exec_skip": 0, "errors": 0}
+        runner_log = os.path.join(self.fs.root, "logs", "runner.log")
+        seen_fills = 0
+        self._install()
+        try:
+            dm = self.mods["core.decision.decision_maker"]
+            mc = self.mods["core.decision.meta_controller"]
+            ox = self.mods["core.execution.order_executor"]
+            t0 = time.perf_counter()
+            for i in range(cfg.window - 1, n):
+                now = int(closes[i]) + 1 + cfg.latency_ms
+                self.clock.set(now)
+                # giá thị trường lúc tick = open nến kế (giao dịch đầu tiên sau khi nến đóng)
+                self.ex.set_price(cfg.symbol, opens[i + 1] if i + 1 < n else last_close[i])
+                self.ex.advance(now)
+                out = io.StringIO()
+                rec: Dict[str, Any] = {}
+                with contextlib.redirect_stdout(out):
+                    try:
+                        rec = dm.build_decision_record(df.iloc[i + 1 - cfg.window: i + 1].reset_index(drop=True))
+                        rec["symbol"] = cfg.symbol
+                        if self.cfg.sizing and rec["decision"] in ("BUY", "SELL"):
+                            self._apply_sizing(rec)
+                        dm.append_history(rec)
+                        print("[decision] record:", json.dumps(rec, ensure_ascii=False))
+                        mc.run_once(rec)
+                        for _ in range(max(1, cfg.executor_repeats)):
+                            ox.run(ctx={"decisions": [rec]})
+                    except Exception as e:
+                        counters["errors"] += 1
+                        print(f"[replay] ❌ tick {i}: {type(e).__name__}: {e}")
+                txt = out.getvalue()
+                self.fs.files[runner_log] = self.fs.files.get(runner_log, b"")[-200_000:] + txt.encode()
+                counters["ticks"] += 1
+                d = rec.get("decision", "ERROR")
+                counters["decisions"][d] = counters["decisions"].get(d, 0) + 1
+                counters["meta_switch"] += txt.count("[Meta-Controller] switch")
+                counters["meta_blocked"] += txt.count("cooldown/limit block")
+                counters["exec_dup"] += txt.count("skip duplicate decision")
+                counters["exec_skip"] += txt.count("[executor] skip:")
+                counters["exec_none"] += txt.count("none actionable")
+                counters["exec_close"] += txt.count("🔻 CLOSE")
+                if "❌" in txt:
+                    log.append(txt)
+                if self.cfg.sizing and len(self.ex.fills) > seen_fills:
+                    for f in self.ex.fills[seen_fills:]:
+                        self.sizing[2]({k: f[k] for k in ("symbol", "side", "status", "executedQty", "avgPrice")}
+                                       | {"cumQty": f["executedQty"]})
+                seen_fills = len(self.ex.fills)
+                eq_t.append(pd.Timestamp(now, unit="ms", tz="UTC"))
+                eq_v.append(self.ex.equity())
+                if progress_every and counters["ticks"] % progress_every == 0:
+                    print(f"[replay] {counters['ticks']} ticks, equity={eq_v[-1]:.2f}, "
+                          f"{time.perf_counter() - t0:.1f}s", file=sys.__stdout__)
+            elapsed = time.perf_counter() - t0
+        finally:
+            self._uninstall()
+        counters["exec_orders"] = sum(1 for f in self.ex.fills if not f["reduceOnly"])
+        eq = pd.Series(eq_v, index=pd.DatetimeIndex(eq_t), name="equity")
+        stats = {
+            **counters,
+            "elapsed_sec": round(elapsed, 2),
+            "ticks_per_sec": round(counters["ticks"] / elapsed, 1) if elapsed else 0.0,
+            "final_equity": float(eq.iloc[-1]) if len(eq) else cfg.initial_equity,
+            "realized_pnl": self.ex.realized, "fees": self.ex.fees, "funding": self.ex.funding_paid,
+            "exchange_requests": self.ex.requests, "exchange_rejected": self.ex.rejected,
+            "telegram_msgs": len(self.messages), "memfs_writes": self.fs.writes,
+            "final_route": self.state.get("meta", "current_route"),
+        }
+        return ReplayResult(equity=eq, fills=pd.DataFrame(self.ex.fills), stats=stats, log=log)
+
+    def _apply_sizing(self, rec: Dict[str, Any]) -> None:
+        bandit, funding, _ = self.sizing
+        b = bandit(self.cfg.symbol, rec["decision"], rec["suggested_size"])
+        rec["suggested_size_bandit"], rec["bandit_reason"], rec["bandit_factor"] = b["size"], b["reason"], b["factor"]
+        f = funding(self.cfg.symbol, rec["decision"], rec["suggested_size_bandit"])
+        rec["suggested_size_funding"], rec["funding_reason"] = f["size"], f["reason"]
+        rec["funding_rate"] = f.get("rate", 0.0)
+
+
+def _default_tf() -> str:
+    try:
+        from configs.config import TIMEFRAME
+        return str(TIMEFRAME or "15m")
+    except Exception:
+        return "15m"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--symbol", default="BTCUSDT")
+    ap.add_argument("--tf", default=_default_tf())
+    ap.add_argument("--days", type=float, default=0.0, help="chỉ replay N ngày cuối của kho nến")
+    ap.add_argument("--synthetic-days", type=float, default=0.0)
+    ap.add_argument("--open-floor", type=float, default=None)
+    ap.add_argument("--close-floor", type=float, default=None)
+    ap.add_argument("--fee-bps", type=float, default=4.0)
+    ap.add_argument("--slippage-bps", type=float, default=0.0)
+    ap.add_argument("--funding-rate", type=float, default=0.0001)
+    ap.add_argument("--sizing", action="store_true", help="chạy bandit/funding sizing như auto_main")
+    ap.add_argument("--executor-repeats", type=int, default=1)
+    ap.add_argument("--out", default="data/replay")
+    a = ap.parse_args()
+
+    if a.synthetic_days:
+        from core.evaluator.synthetic import random_candles
+        df = random_candles(int(a.synthetic_days * 96) + 100)
+        a.symbol = "BTCUSDT"
+    else:
+        from core.collector.candle_store import get_store
+        since = None
+        if a.days:
+            last = get_store().last_close_ms(a.symbol, a.tf) or 0
+            since = last - int(a.days * 86_400_000)
+        df = get_store().read(a.symbol, a.tf, since_ms=since)
+    if "time" not in df.columns:
+        df.insert(0, "time", pd.to_datetime(df["close_time"], unit="ms", utc=True).dt.floor("s"))
+    if len(df) < 101:
+        print(f"[replay] ⚠️  {a.symbol} {a.tf}: cần ≥ 101 nến (có {len(df)}).")
+        return
+
+    cfg = ReplayConfig(symbol=a.symbol, tf=a.tf, open_floor=a.open_floor, close_floor=a.close_floor,
+                       fee_bps=a.fee_bps, slippage_bps=a.slippage_bps, funding_rate=a.funding_rate,
+                       sizing=a.sizing, executor_repeats=a.executor_repeats)
+    res = Replay(df, cfg).run(progress_every=1000)
+    print(f"[replay] {a.symbol} {a.tf}: {len(df)} nến")
+    for k, v in res.stats.items():
+        print(f"  {k:<18} {v}")
+    out = pathlib.Path(a.out)
+    out.mkdir(parents=True, exist_ok=True)
+    res.equity.to_csv(out / f"{a.symbol}_{a.tf}_equity.csv", header=True)
+    res.fills.to_csv(out / f"{a.symbol}_{a.tf}_fills.csv", index=False)
+    (out / f"{a.symbol}_{a.tf}_stats.json").write_text(json.dumps(res.stats, ensure_ascii=False, indent=2, default=str),
+                                                      encoding="utf-8")
+    for chunk in res.log[:5]:
+        print(chunk)
+    print(f"[replay] ✅ ghi {out}/{a.symbol}_{a.tf}_equity.csv, _fills.csv, _stats.json")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# core/evaluator/synthetic.py
+"""
+Nến giả lập (random walk log-normal, seed cố định) dùng chung cho backtest/optimizer/replay
+khi chạy --synthetic-* và cho các script trong tests/ – không cần dữ liệu sàn.
+
+Dùng:
+    from core.evaluator.synthetic import random_candles
+    df = random_candles(96 * 30)          # ~30 ngày nến 15m
+"""
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+
+def random_candles(n: int, seed: int = 7, tf_ms: int = 900_000) -> pd.DataFrame:
+    """n nến OHLCV liên tiếp khung `tf_ms` (cột như candle_store: open_time/close_time ms, open..volume)."""
+    rng = np.random.default_rng(seed)
+    close = 60000 * np.exp(np.cumsum(rng.normal(0, 0.002, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    spread = np.abs(rng.normal(0, 0.001, n)) * close
+    ot = 1_700_000_000_000 // tf_ms * tf_ms + np.arange(n) * tf_ms
+    return pd.DataFrame({"open_time": ot, "close_time": ot + tf_ms - 1, "open": open_,
+                         "high": np.maximum(open_, close) + spread, "low": np.minimum(open_, close) - spread,
+                         "close": close, "volume": rng.uniform(1, 50, n)})
@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+# core/execution/binance_client.py
+"""
+Client REST Binance Futures dùng chung cho mọi module. Nó thay các bản chép tay _get/_post/_get_signed
+trong executor, monitor, pnl_sync, close_all_positions, health_check, funding_optimizer và collector.
+- 1 requests.Session cho mỗi base URL: pool kết nối keep-alive (CRX_BINANCE_POOL) và header X-MBX-APIKEY.
+- Ký HMAC-SHA256. timestamp lấy theo giờ server (ServerClock của candle_clock: offset đo bằng /fapi/v1/time).
+  Lệch giờ máy/server > time_sync.max_clock_skew_ms (config/executor.yaml) sẽ được cảnh báo, và timestamp
+  luôn được bù theo offset. Nếu sàn trả -1021 (timestamp ngoài recvWindow) thì đồng bộ lại và gửi lại 1 lần.
+- Token bucket theo request weight, dùng chung cả process vì Binance tính weight theo IP:
+  dung lượng = CRX_WEIGHT_LIMIT_1M × CRX_WEIGHT_SAFETY, nạp lại đều trong 60s.
+  + Mỗi request trừ weight của endpoint trước khi gửi, thiếu token thì chờ.
+  + Header X-MBX-USED-WEIGHT-1M kéo token về đúng phần còn lại phía sàn.
+  + 429/418: khoá mọi request tới hết Retry-After, tránh 429 lặp lại thành ban 418.
+- GET được thử lại khi lỗi mạng/5xx/429. POST/DELETE chỉ gửi lại khi chắc chắn sàn chưa xử lý (429, -1021).
+- Lỗi HTTP → requests.HTTPError (như r.raise_for_status() cũ).
+
+Dùng:
+    c = get_client()                       # base = BINANCE_FAPI_BASE (mặc định testnet)
+    c.get("/fapi/v1/ticker/price", {"symbol": "BTCUSDT"})
+    c.get("/fapi/v2/positionRisk", {"symbol": "BTCUSDT"}, signed=True)
+    c.post("/fapi/v1/order", {...}, signed=True)
+    c.stats()                              # weight đã dùng, số lần bị chặn, offset giờ server
+
+ENV: BINANCE_API_KEY, BINANCE_API_SECRET, BINANCE_FAPI_BASE, BINANCE_RECVWINDOW (5000),
+     CRX_BINANCE_TIMEOUT (10), CRX_BINANCE_POOL (16), CRX_WEIGHT_LIMIT_1M (2400), CRX_WEIGHT_SAFETY (0.8)
+"""
+from __future__ import annotations
+
+import os
+import time
+import hmac
+import random
+import hashlib
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+from urllib.parse import urlencode
+
+import requests
+from requests.adapters import HTTPAdapter
+
+ROOT = Path(__file__).resolve().parents[2]
+EXECUTOR_YAML = ROOT / "config" / "executor.yaml"
+
+DEFAULT_BASE = (os.getenv("BINANCE_FAPI_BASE") or "https://testnet.binancefuture.com").strip().rstrip("/")
+RECV_WINDOW = int(os.getenv("BINANCE_RECVWINDOW", "5000"))
+TIMEOUT = float(os.getenv("CRX_BINANCE_TIMEOUT", "10"))
+POOL_SIZE = int(os.getenv("CRX_BINANCE_POOL", "16"))
+WEIGHT_LIMIT_1M = int(os.getenv("CRX_WEIGHT_LIMIT_1M", "2400"))
+WEIGHT_SAFETY = float(os.getenv("CRX_WEIGHT_SAFETY", "0.8"))
+
+# Weight theo tài liệu Binance USDⓈ-M Futures (endpoint không có trong bảng = 1)
+ENDPOINT_WEIGHTS = {
+    "/fapi/v2/positionRisk": 5,
+    "/fapi/v2/account": 5,
+    "/fapi/v2/balance": 5,
+    "/fapi/v1/income": 30,
+    "/fapi/v1/allOrders": 5,
+    "/fapi/v1/userTrades": 5,
+}
+# Bỏ tham số symbol → weight lớn hơn
+NO_SYMBOL_WEIGHTS = {
+    "/fapi/v1/ticker/price": 2,
+    "/fapi/v1/premiumIndex": 10,
+    "/fapi/v1/openOrders": 40,
+    "/fapi/v1/ticker/24hr": 40,
+}
+
+
+def kline_weight(limit: int) -> int:
+    """Weight của /fapi/v1/klines theo limit."""
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+
+def endpoint_weight(path: str, params: Optional[Dict[str, Any]] = None) -> int:
+    params = params or {}
+    if path in ("/fapi/v1/klines", "/fapi/v1/continuousKlines", "/fapi/v1/markPriceKlines"):
+        return kline_weight(int(params.get("limit", 500)))
+    if path in NO_SYMBOL_WEIGHTS and not params.get("symbol"):
+        return NO_SYMBOL_WEIGHTS[path]
+    return ENDPOINT_WEIGHTS.get(path, 1)
+
+
+def _max_skew_ms() -> int:
+    try:
+        import yaml
+        with open(EXECUTOR_YAML, "r", encoding="utf-8") as f:
+            cfg = yaml.safe_load(f) or {}
+        return int((cfg.get("time_sync") or {}).get("max_clock_skew_ms", 500))
+    except Exception:
+        return 500
+
+
+class RateLimiter:
+    """Token bucket theo request weight (nạp đều budget/60 mỗi giây) + khoá cứng khi sàn trả 429/418."""
+    def __init__(self, limit_1m: int = WEIGHT_LIMIT_1M, safety: float = WEIGHT_SAFETY, log=print):
+        self.limit = max(1, int(limit_1m))
+        self.budget = max(1, int(self.limit * safety))
+        self.rate = self.budget / 60.0
+        self.tokens = float(self.budget)
+        self.log = log
+        self._t = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self.used_weight_1m: Optional[int] = None
+        self.order_count_1m: Optional[int] = None
+        self.throttled = 0
+        self.bans = 0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(float(self.budget), self.tokens + (now - self._t) * self.rate)
+        self._t = now
+
+    def acquire(self, weight: int) -> float:
+        """Trừ weight, chờ nếu thiếu token hoặc đang bị khoá. Trả số giây đã chờ."""
+        waited = 0.0
+        weight = min(max(1, int(weight)), self.budget)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._blocked_until and self.tokens >= weight:
+                    self.tokens -= weight
+                    return waited
+                wait = max(self._blocked_until - now, (weight - self.tokens) / self.rate)
+                self.throttled += 1
+            if wait > 1.0:
+                self.log(f"[binance] ⏳ weight {self.budget - max(0, int(self.tokens))}/{self.budget} → chờ {wait:.1f}s")
+            time.sleep(wait)
+            waited += wait
+
+    def observe(self, headers) -> None:
+        """Đồng bộ theo weight sàn báo đã dùng trong phút (có thể gồm request của process khác cùng IP)."""
+        used = headers.get("X-MBX-USED-WEIGHT-1M") or headers.get("X-MBX-USED-WEIGHT")
+        orders = headers.get("X-MBX-ORDER-COUNT-1M")
+        with self._lock:
+            if orders is not None:
+                try:
+                    self.order_count_1m = int(orders)
+                except ValueError:
+                    pass
+            if used is None:
+                return
+            try:
+                used = int(used)
+            except ValueError:
+                return
+            self.used_weight_1m = used
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, float(self.budget - used))
+
+    def block(self, seconds: float, banned: bool = False) -> None:
+        """429/418: khoá mọi request tới hết Retry-After."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + max(0.0, seconds))
+            self.tokens = min(self.tokens, 0.0)
+            self.bans += bool(banned)
+        self.log(f"[binance] ⛔ {'418 ban' if banned else '429'} → tạm dừng request {seconds:.0f}s")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refill(time.monotonic())
+            return {"budget_1m": self.budget, "tokens": round(self.tokens, 1), "used_weight_1m": self.used_weight_1m,
+                    "order_count_1m": self.order_count_1m, "throttled": self.throttled, "bans": self.bans,
+                    "blocked_sec": round(max(0.0, self._blocked_until - time.monotonic()), 1)}
+
+
+LIMITER = RateLimiter()
+
+
+class BinanceClient:
+    def __init__(self, base: Optional[str] = None, api_key: Optional[str] = None, api_secret: Optional[str] = None,
+                 recv_window: int = RECV_WINDOW, timeout: float = TIMEOUT, session=None, clock=None,
+                 limiter: Optional[RateLimiter] = LIMITER, max_skew_ms: Optional[int] = None, log=print):
+        self.base = (base or DEFAULT_BASE).strip().rstrip("/")
+        self.api_key = (os.getenv("BINANCE_API_KEY", "") if api_key is None else api_key).strip()
+        self.api_secret = (os.getenv("BINANCE_API_SECRET", "") if api_secret is None else api_secret).strip()
+        self.recv_window = int(recv_window)
+        self.timeout = timeout
+        self.limiter = limiter
+        self.max_skew_ms = _max_skew_ms() if max_skew_ms is None else int(max_skew_ms)
+        self.log = log
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(4, POOL_SIZE))
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.session = session
+        if self.api_key:
+            self.session.headers.update({"X-MBX-APIKEY": self.api_key})
+        if clock is None:
+            from core.runtime.candle_clock import REST_BASE, SERVER_CLOCK, ServerClock
+            clock = SERVER_CLOCK if self.base == REST_BASE else ServerClock(self.base)
+        self.clock = clock
+        self._skew_warned_at = 0.0
+        self.requests = 0
+        self.errors = 0
+
+    @property
+    def has_keys(self) -> bool:
+        return bool(self.api_key and self.api_secret)
+
+    # ----- giờ server -----
+    def timestamp_ms(self) -> int:
+        ts = int(self.clock.now_ms())
+        off = int(getattr(self.clock, "offset_ms", 0) or 0)
+        if abs(off) > self.max_skew_ms and time.time() - self._skew_warned_at > 600:
+            self._skew_warned_at = time.time()
+            self.log(f"[binance] ⚠️ lệch giờ máy/server {off}ms > {self.max_skew_ms}ms → ký theo giờ server")
+        return ts
+
+    def resync_clock(self) -> bool:
+        sync = getattr(self.clock, "sync", None)
+        return bool(sync()) if callable(sync) else False
+
+    # ----- ký -----
+    def sign(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        p = {k: v for k, v in params.items() if k != "signature"}
+        p["timestamp"] = self.timestamp_ms()
+        p.setdefault("recvWindow", self.recv_window)
+        p["signature"] = hmac.new(self.api_secret.encode(), urlencode(p, doseq=True).encode(),
+                                  hashlib.sha256).hexdigest()
+        return p
+
+    # ----- HTTP -----
+    def request(self, method: str, path: str, params: Optional[Dict[str, Any]] = None, signed: bool = False,
+                weight: Optional[int] = None, timeout: Optional[float] = None, retries: Optional[int] = None) -> Any:
+        method = method.upper()
+        if signed and not self.has_keys:
+            raise RuntimeError("Thiếu BINANCE_API_KEY/BINANCE_API_SECRET")
+        params = {k: v for k, v in (params or {}).items() if v is not None}
+        w = endpoint_weight(path, params) if weight is None else int(weight)
+        idempotent = method == "GET"
+        tries = 1 + max(0, (2 if idempotent else 0) if retries is None else int(retries))
+        resynced = False
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.limiter is not None:
+                self.limiter.acquire(w)
+            q = self.sign(params) if signed else params
+            self.requests += 1
+            try:
+                r = getattr(self.session, method.lower())(self.base + path, params=q,
+                                                          timeout=timeout or self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                self.errors += 1
+                if idempotent and attempt < tries:
+                    time.sleep(self._backoff(attempt))
+                    continue
+                raise
+            if self.limiter is not None:
+                self.limiter.observe(r.headers)
+            if idempotent and r.status_code >= 500 and attempt < tries:
+                self.errors += 1
+                time.sleep(self._backoff(attempt))
+                continue
+            if r.status_code in (418, 429):
+                self.errors += 1
+                if self.limiter is not None:
+                    try:
+                        retry_after = float(r.headers.get("Retry-After", 0) or 0)
+                    except ValueError:
+                        retry_after = 0.0
+                    self.limiter.block(retry_after or 5.0 * 2 ** (attempt - 1), banned=r.status_code == 418)
+                if attempt < max(tries, 2) and r.status_code == 429:
+                    continue              # 429 = sàn chưa xử lý → gửi lại an toàn cả với POST
+            elif signed and r.status_code == 400 and not resynced and self._code(r) == -1021:
+                resynced = True
+                self.resync_clock()
+                continue
+            if r.status_code >= 400:
+                self.errors += 1
+            r.raise_for_status()
+            return r.json()
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        return 0.5 * 2 ** (attempt - 1) + random.uniform(0, 0.3)
+
+    @staticmethod
+    def _code(r) -> Optional[int]:
+        try:
+            return int((r.json() or {}).get("code"))
+        except Exception:
+            return None
+
+    def get(self, path: str, params: Optional[Dict[str, Any]] = None, signed: bool = False, **kw) -> Any:
+        return self.request("GET", path, params, signed=signed, **kw)
+
+    def post(self, path: str, params: Optional[Dict[str, Any]] = None, signed: bool = True, **kw) -> Any:
+        return self.request("POST", path, params, signed=signed, **kw)
+
+    def delete(self, path: str, params: Optional[Dict[str, Any]] = None, signed: bool = True, **kw) -> Any:
+        return self.request("DELETE", path, params, signed=signed, **kw)
+
+    def stats(self) -> Dict[str, Any]:
+        out = {"base": self.base, "requests": self.requests, "errors": self.errors,
+               "clock_offset_ms": int(getattr(self.clock, "offset_ms", 0) or 0), "max_skew_ms": self.max_skew_ms}
+        if self.limiter is not None:
+            out.update(self.limiter.stats())
+        return out
+
+
+_CLIENTS: Dict[str, BinanceClient] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def get_client(base: Optional[str] = None) -> BinanceClient:
+    """Client dùng chung theo base URL (1 session/pool cho cả process)."""
+    key = (base or DEFAULT_BASE).strip().rstrip("/")
+    try:
+        return _CLIENTS[key]
+    except KeyError:
+        pass
+    with _CLIENTS_LOCK:
+        if key not in _CLIENTS:
+            _CLIENTS[key] = BinanceClient(key)
+        return _CLIENTS[key]
+
+
+if __name__ == "__main__":
+    import json
+    c = get_client()
+    print(json.dumps({"serverTime": c.get("/fapi/v1/time").get("serverTime"), **c.stats()}, ensure_ascii=False))
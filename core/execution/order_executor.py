@@ -1,14 +1,15 @@
 # core/execution/order_executor.py
 from __future__ import annotations
 
-import os, time, hmac, json, hashlib, pathlib, sys, importlib.util
-from typing import Dict, Any, Tuple, Optional
-from urllib.parse import urlencode
-
-import requests
+import os, time, json, pathlib, sys, importlib.util
+from typing import Dict, Any, List, Tuple, Optional
 
 from notifier.notify_telegram import send_telegram_message
 from utils.uid import new_order_uid
+from core.runtime.flag_events import safe_point
+from core.execution.symbol_fairness import select_symbols
+from core.execution.binance_client import get_client, DEFAULT_BASE
+from core.execution.symbol_meta import get_symbol_meta
 
 # ---------- Paths & CONFIG ----------
 root = pathlib.Path(__file__).resolve().parents[2]  # .../CrX17
@@ -27,7 +28,7 @@ except Exception:
     CONFIG = _crx_cfg.CONFIG  # type: ignore
 
 # ---------- ENV / Constants ----------
-BINANCE_FUTURES_TESTNET = "https://testnet.binancefuture.com"
+BINANCE_FUTURES_TESTNET = DEFAULT_BASE  # BINANCE_FAPI_BASE (mặc định testnet; tools/mock_exchange.py khi test offline)
 
 API_KEY = os.getenv("BINANCE_API_KEY", "")
 API_SECRET = os.getenv("BINANCE_API_SECRET", "")
@@ -35,73 +36,42 @@ API_SECRET = os.getenv("BINANCE_API_SECRET", "")
 OPEN_CONF_FLOOR  = float(os.getenv("CRX_OPEN_CONF_FLOOR",  "0.65"))  # mở mới
 CLOSE_CONF_FLOOR = float(os.getenv("CRX_CLOSE_CONF_FLOOR", "0.60"))  # đóng đảo chiều
 
-SESSION = requests.Session()
-if API_KEY:
-    SESSION.headers.update({"X-MBX-APIKEY": API_KEY})
-
 # ---------- Helpers ----------
-def _sign(params: Dict[str, Any]) -> str:
-    q = urlencode(params, doseq=True)
-    return hmac.new(API_SECRET.encode(), q.encode(), hashlib.sha256).hexdigest()
-
+# HTTP/ký/giới hạn weight đi qua client dùng chung (core/execution/binance_client.py)
 def _get(path: str, params: Dict[str, Any] | None = None, signed: bool = False, timeout: int = 12):
-    params = dict(params or {})
-    if signed:
-        params.update({"timestamp": int(time.time() * 1000), "recvWindow": 5000})
-        params["signature"] = _sign(params)
-    url = BINANCE_FUTURES_TESTNET + path
-    r = SESSION.get(url, params=params, timeout=timeout)
-    r.raise_for_status()
-    return r.json()
+    return get_client(BINANCE_FUTURES_TESTNET).get(path, params, signed=signed, timeout=timeout)
 
 def _post(path: str, params: Dict[str, Any] | None = None, signed: bool = True, timeout: int = 12):
-    params = dict(params or {})
-    if signed:
-        params.update({"timestamp": int(time.time() * 1000), "recvWindow": 5000})
-        params["signature"] = _sign(params)
-    url = BINANCE_FUTURES_TESTNET + path
-    r = SESSION.post(url, params=params, timeout=timeout)
-    r.raise_for_status()
-    return r.json()
+    return get_client(BINANCE_FUTURES_TESTNET).post(path, params, signed=signed, timeout=timeout)
 
 def _get_price(symbol: str) -> float:
     data = _get("/fapi/v1/ticker/price", params={"symbol": symbol}, signed=False)
     return float(data["price"])
 
-def _round_step(value: float, step: float) -> float:
-    if step <= 0:
-        return float(value)
-    return float(int(value / step) * step)
-
-def _get_exchange_info(symbol: str) -> Dict[str, Any]:
-    data = _get("/fapi/v1/exchangeInfo", signed=False)
-    syms = {s["symbol"]: s for s in data.get("symbols", [])}
-    if symbol not in syms:
-        raise ValueError(f"{symbol} không có trên Binance Futures Testnet")
-    return syms[symbol]
-
-def _qty_filters(info: Dict[str, Any]) -> Tuple[float, float]:
-    step, min_qty = 0.001, 0.001
-    for f in info.get("filters", []):
-        if f.get("filterType") in ("LOT_SIZE", "MARKET_LOT_SIZE"):
-            step = float(f.get("stepSize", step))
-            min_qty = float(f.get("minQty", min_qty))
-    return step, min_qty
+# Đòn bẩy đã đặt trong process: symbol → (leverage, lúc đặt); đặt lại sau LEVERAGE_TTL_SEC
+_LEVERAGE_SET: Dict[str, Tuple[int, float]] = {}
+LEVERAGE_TTL_SEC = float(os.getenv("CRX_LEVERAGE_TTL_SEC", "3600"))
 
 def _ensure_leverage(symbol: str, leverage: int) -> None:
+    done = _LEVERAGE_SET.get(symbol)
+    if done and done[0] == int(leverage) and time.time() - done[1] < LEVERAGE_TTL_SEC:
+        return
     try:
         _post("/fapi/v1/leverage", params={"symbol": symbol, "leverage": leverage}, signed=True)
+        _LEVERAGE_SET[symbol] = (int(leverage), time.time())
     except Exception as e:
         print("[executor] leverage set warn:", e)
 
 def _compute_qty(symbol: str, notional_usdt: float) -> float:
+    # bộ lọc LOT_SIZE/MIN_NOTIONAL lấy từ cache (core/execution/symbol_meta.py) → không tải exchangeInfo mỗi lệnh
+    f = get_symbol_meta(BINANCE_FUTURES_TESTNET).get(symbol)
     price = _get_price(symbol)
     rough = notional_usdt / price if price > 0 else 0.0
-    info = _get_exchange_info(symbol)
-    step, min_qty = _qty_filters(info)
-    qty = _round_step(rough, step)
-    if qty < min_qty:
-        qty = min_qty
+    if f.min_notional > 0 and price > 0 and rough * price < f.min_notional:
+        rough = f.min_notional / price + f.market_step   # làm tròn xuống vẫn ≥ min notional
+    qty = f.round_qty(rough)
+    if qty < f.market_min_qty:
+        qty = f.market_min_qty
     return float(qty)
 
 def _guess_symbol() -> str:
@@ -136,7 +106,7 @@ def close_position(symbol: str) -> Dict[str, Any]:
         uid = new_order_uid()
         msg = f"🟠 CLOSE {symbol} (SIM reduceOnly) uid={uid}"
         print(msg)
-        try: send_telegram_message(msg)
+        try: send_telegram_message(msg, kind="EXECUTED")
         except Exception: pass
         return {"status": "SIMULATED", "order_uid": uid}
 
@@ -161,7 +131,7 @@ def close_position(symbol: str) -> Dict[str, Any]:
 
     msg = f"🔻 CLOSE {symbol} reduceOnly side={side} qty={abs(qty):.8f}"
     print(msg)
-    try: send_telegram_message(msg)
+    try: send_telegram_message(msg, kind="EXECUTED")
     except Exception: pass
     return {"status": resp.get("status", "NEW"), "resp": resp}
 
@@ -179,7 +149,7 @@ def place_order(
         uid = new_order_uid()
         msg = f"🟢 EXECUTE {side} {symbol} (SIM) size={size_pct:.2f}% lev={leverage} uid={uid}"
         print(msg)
-        try: send_telegram_message(msg)
+        try: send_telegram_message(msg, kind="EXECUTED")
         except Exception: pass
         return {"order_uid": uid, "status": "SIMULATED", "client_order_id": uid}
 
@@ -201,7 +171,7 @@ def place_order(
         uid = new_order_uid()
         msg = f"🔴 EXECUTE FAIL {side} {symbol} QTY={qty} (~{notional_usdt} USDT) lev={leverage} uid={uid} err={e}"
         print(msg)
-        try: send_telegram_message(msg)
+        try: send_telegram_message(msg, kind="ERROR")
         except Exception: pass
         return {"order_uid": uid, "status": "ERROR", "error": str(e)}
 
@@ -209,7 +179,7 @@ def place_order(
     order_id = resp.get("orderId")
     msg = f"🟢 EXECUTE {side} {symbol} QTY={qty} (~{notional_usdt} USDT) lev={leverage} uid={uid_client}"
     print(msg)
-    try: send_telegram_message(msg)
+    try: send_telegram_message(msg, kind="EXECUTED")
     except Exception: pass
 
     return {
@@ -229,7 +199,19 @@ def _load_json(path: pathlib.Path) -> Optional[Dict[str, Any]]:
     except Exception:
         return None
 
+def _read_override() -> Optional[Dict[str, Any]]:
+    """Quyết định đã qua gate do tools/append_latest_and_export.py đặt (state store: decision.override)."""
+    try:
+        from core.memory.state_store import get_store
+        dec = get_store().get("decision", "override")
+        return dec if isinstance(dec, dict) and dec else None
+    except Exception:
+        return None
+
 def _read_last_decision_file() -> Optional[Dict[str, Any]]:
+    dec = _read_override()
+    if dec:
+        return dec
     cands = [
         root / "last_decision.json",
         root / "data" / "last_decision.json",
@@ -239,14 +221,14 @@ def _read_last_decision_file() -> Optional[Dict[str, Any]]:
         j = _load_json(p)
         if isinstance(j, dict) and j:
             return j
-    # fallback JSONL
-    jl = root / "data" / "decision_history.jsonl"
-    if jl.exists():
-        try:
-            lines = [ln for ln in jl.read_text(encoding="utf-8").splitlines() if ln.strip()]
-            return json.loads(lines[-1])
-        except Exception:
-            pass
+    # fallback: bản ghi cuối của decision log
+    try:
+        from core.memory.decision_log import get_log
+        rec = get_log().last()
+        if isinstance(rec, dict) and rec:
+            return rec
+    except Exception:
+        pass
     return None
 
 def _read_last_decision_from_log() -> Optional[Dict[str, Any]]:
@@ -282,30 +264,76 @@ def _read_last_decision() -> Optional[Dict[str, Any]]:
 
 # ---------- Route state ----------
 def _current_route() -> str:
-    p = root / "data" / "meta_state.json"
     try:
-        j = json.loads(p.read_text(encoding="utf-8"))
-        return j.get("current_route", "LEFT")
+        from core.memory.state_store import get_store
+        return get_store().get("meta", "current_route", "LEFT")
     except Exception:
         return "LEFT"
 
 # ---------- Executor state ----------
-_STATE_FILE = root / "executor_state.json"
+_STATE_NS = "executor"
 
 def _load_state() -> Dict[str, Any]:
     try:
-        return json.loads(_STATE_FILE.read_text(encoding="utf-8"))
+        from core.memory.state_store import get_store
+        return get_store().get_ns(_STATE_NS)
     except Exception:
         return {}
 
 def _save_state(st: Dict[str, Any]) -> None:
     try:
-        _STATE_FILE.write_text(json.dumps(st, ensure_ascii=False, indent=2), encoding="utf-8")
+        from core.memory.state_store import get_store
+        get_store().put_many(_STATE_NS, st)
+    except Exception as e:
+        print("[executor] state store write error:", e)
+
+# ---------- Tick decisions (universe) ----------
+def _tick_decisions(ctx: Any = None) -> List[Dict[str, Any]]:
+    """
+    Các quyết định theo symbol của tick hiện tại (decision_maker.run_universe):
+    ctx["decisions"] khi chạy trong stage engine, không thì các bản ghi cuối decision log
+    cùng timestamp và có "symbol". Có override (decision.override trong state store, hoặc file
+    last_decision.json đặt tay) → giữ luồng 1 quyết định.
+    """
+    if _has_decision_override():
+        return []
+    decs = None
+    try:
+        decs = ctx.get("decisions") if ctx is not None else None
     except Exception:
-        pass
+        decs = None
+    if not decs:
+        try:
+            from core.memory.decision_log import get_log
+            decs = []
+            for rec in reversed(get_log().tail_group("timestamp")):
+                if not rec.get("symbol"):
+                    break
+                decs.append(rec)
+            decs.reverse()
+        except Exception as e:
+            print("[executor] decision log read error:", e)
+            decs = []
+    return [d for d in (decs or []) if isinstance(d, dict) and d.get("symbol")]
+
+def _has_decision_override() -> bool:
+    if _read_override():
+        return True
+    return any((p.exists() for p in (root / "last_decision.json", root / "data" / "last_decision.json")))
+
+def _actionable(dec: Dict[str, Any]) -> bool:
+    side = (dec.get("meta_action") or dec.get("decision") or "").upper()
+    return side in ("BUY", "SELL")
+
+def _universe() -> List[str]:
+    try:
+        from configs.config import SYMBOLS
+        return [str(x).upper() for x in SYMBOLS]
+    except Exception:
+        return [_guess_symbol()]
 
 # ---------- Main run ----------
-def run() -> None:
+def run(ctx: Any = None) -> None:
     # Gate by ENV
     if str(os.getenv("CRX_ENABLE_ORDER_EXECUTOR", "")).lower() not in ("1", "true", "yes"):
         print("[executor] disabled by env CRX_ENABLE_ORDER_EXECUTOR")
@@ -317,15 +345,54 @@ def run() -> None:
         print(f"[executor] skip: route={route} (Phase B chỉ thực thi khi route=LEFT)")
         return
 
+    decs = _tick_decisions(ctx)
+    if decs:
+        _run_universe(decs)
+        return
+
     dec = _read_last_decision()
     if not dec:
         print("[executor] no decision available")
         return
+    st = _load_state()
+    _execute_decision(dec, st)
 
-    # Duplicate ts guard
-    ts = dec.get("timestamp") or dec.get("ts")
+def _run_universe(decs: List[Dict[str, Any]]) -> None:
+    """Thực thi các quyết định của tick theo symbol, giới hạn bởi routing.symbol_fairness."""
     st = _load_state()
-    if ts and st.get("last_ts") == ts:
+    seen = st.get("last_ts_by_symbol") or {}
+    cands: Dict[str, float] = {}
+    by_sym: Dict[str, Dict[str, Any]] = {}
+    for d in decs:
+        sym = str(d["symbol"]).upper()
+        ts = d.get("timestamp") or d.get("ts")
+        if ts and seen.get(sym) == ts:
+            continue
+        if not _actionable(d):
+            continue
+        try:
+            conf = float(d.get("confidence", 0.0))
+        except Exception:
+            conf = 0.0
+        if conf < min(OPEN_CONF_FLOOR, CLOSE_CONF_FLOOR):
+            continue  # dưới cả 2 ngưỡng → không chiếm suất của symbol khác
+        cands[sym] = conf
+        by_sym[sym] = d
+    if not cands:
+        print(f"[executor] universe: {len(decs)} decisions, none actionable")
+        return
+    picked = select_symbols(cands, _universe())
+    print(f"[executor] universe: actionable={len(cands)} picked={picked} deferred={len(cands) - len(picked)}")
+    for sym in picked:
+        _execute_decision(by_sym[sym], st)
+
+def _execute_decision(dec: Dict[str, Any], st: Dict[str, Any]) -> None:
+    # Duplicate ts guard (theo symbol; bản ghi cũ không có symbol → last_ts chung)
+    ts = dec.get("timestamp") or dec.get("ts")
+    symbol = dec.get("symbol") or _guess_symbol()
+    by_sym = st.setdefault("last_ts_by_symbol", {})
+    last = by_sym.get(symbol) if dec.get("symbol") else st.get("last_ts")
+    if ts and last == ts:
         print("[executor] skip duplicate decision ts=", ts)
         return
 
@@ -339,7 +406,6 @@ def run() -> None:
     except Exception:
         conf = 0.0
 
-    symbol = dec.get("symbol") or _guess_symbol()
     size_pct = float(dec.get("suggested_size", 0.2))
     try:
         notional = float(
@@ -359,6 +425,7 @@ def run() -> None:
         close_position(symbol)
         # mark this decision consumed (không mở mới trong cùng tick)
         st["last_ts"] = ts
+        by_sym[symbol] = ts
         st["last_action"] = {"symbol": symbol, "action": "CLOSE", "conf": conf, "ts": ts}
         _save_state(st)
         return
@@ -366,17 +433,19 @@ def run() -> None:
     # 2) Open-new gate
     if conf < OPEN_CONF_FLOOR:
         src = "env"
-        print(f"[executor] skip: confidence {conf:.2f} < floor {OPEN_CONF_FLOOR:.2f} (src={src})")
+        print(f"[executor] skip: {symbol} confidence {conf:.2f} < floor {OPEN_CONF_FLOOR:.2f} (src={src})")
         return
 
     # 3) Only open if flat (tránh chồng vị thế)
     if pos_side != "FLAT":
-        print(f"[executor] skip: already in position ({pos_side})")
+        print(f"[executor] skip: {symbol} already in position ({pos_side})")
         return
 
-    # 4) Place order
+    # 4) Place order (safe point: risk-off/close-all bật giữa stage → không mở mới)
+    safe_point("executor.place_order")
     res = place_order(symbol=symbol, side=side, size_pct=size_pct, leverage=1, notional_usdt=notional)
     st["last_ts"] = ts
+    by_sym[symbol] = ts
     st["last_order"] = {"symbol": symbol, "side": side, "result": res}
     _save_state(st)
 
@@ -1,33 +1,16 @@
 # core/execution/order_monitor.py
 import os
 import time
-import hmac
-import hashlib
-from urllib.parse import urlencode
 from typing import Optional, Dict, Any
-import requests
 
-BINANCE_FUTURES_TESTNET = "https://testnet.binancefuture.com"
+from core.execution.binance_client import get_client, DEFAULT_BASE
+
+BINANCE_FUTURES_TESTNET = DEFAULT_BASE  # env BINANCE_FAPI_BASE
 API_KEY    = os.getenv("BINANCE_API_KEY", "")
 API_SECRET = os.getenv("BINANCE_API_SECRET", "")
 
-SESSION = requests.Session()
-if API_KEY:
-    SESSION.headers.update({"X-MBX-APIKEY": API_KEY})
-
-def _sign(params: Dict[str, Any]) -> str:
-    query = urlencode(params, doseq=True)
-    return hmac.new(API_SECRET.encode(), query.encode(), hashlib.sha256).hexdigest()
-
 def _get(path: str, params: Dict[str, Any] = None, signed: bool = False, timeout: int = 10):
-    params = dict(params or {})
-    if signed:
-        params.update({"timestamp": int(time.time() * 1000), "recvWindow": 5000})
-        params["signature"] = _sign(params)
-    url = BINANCE_FUTURES_TESTNET + path
-    r = SESSION.get(url, params=params, timeout=timeout)
-    r.raise_for_status()
-    return r.json()
+    return get_client(BINANCE_FUTURES_TESTNET).get(path, params, signed=signed, timeout=timeout)
 
 def get_order(symbol: str, order_id: Optional[int] = None, client_order_id: Optional[str] = None):
     if not API_KEY or not API_SECRET:
@@ -46,7 +29,22 @@ def poll_until_final(symbol: str, order_id: Optional[int], client_order_id: Opti
                      timeout_sec: int = 20, interval_sec: float = 1.0):
     """
     Chờ tới khi trạng thái là FILLED/CANCELED/REJECTED/EXPIRED hoặc hết timeout.
+    Có user data stream (core/execution/user_stream.py) → nhận fill qua push, REST chỉ khi stream không khoẻ.
+    Không có (thiếu key, CRX_USER_STREAM=0, lỗi khởi động) → poll REST mỗi interval_sec như cũ.
     """
+    if API_KEY and API_SECRET and (order_id is not None or client_order_id):
+        try:
+            from core.execution.user_stream import get_user_stream
+            us = get_user_stream()
+        except Exception as e:
+            print("[order_monitor] user stream không dùng được:", e)
+            us = None
+        if us is not None:
+            return us.wait_final(symbol, order_id, client_order_id, timeout_sec=timeout_sec, interval_sec=interval_sec)
+    return _poll_rest(symbol, order_id, client_order_id, timeout_sec, interval_sec)
+
+def _poll_rest(symbol: str, order_id: Optional[int], client_order_id: Optional[str],
+               timeout_sec: int = 20, interval_sec: float = 1.0):
     end = time.time() + timeout_sec
     last = {}
     while time.time() < end:
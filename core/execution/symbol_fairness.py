@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+# core/execution/symbol_fairness.py
+"""
+Chia lượt thực thi giữa các symbol khi cả universe có tín hiệu cùng tick.
+- Cấu hình: config/controller.yaml → routing.symbol_fairness
+    max_symbols_per_cycle: tối đa số symbol được đặt lệnh trong 1 tick
+    rotation: "round_robin" (con trỏ xoay vòng, lưu state store ns "fairness") | "confidence" (ưu tiên conf cao)
+- Round-robin: duyệt universe bắt đầu từ con trỏ, lấy các symbol có tín hiệu; con trỏ dời qua symbol
+  cuối cùng được chọn → tick sau symbol bị bỏ lượt được ưu tiên, không symbol nào bị "đói".
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Sequence
+
+from core.runtime.config_service import read_file
+
+STATE_NS = "fairness"
+
+DEFAULT_MAX = 2
+DEFAULT_ROTATION = "round_robin"
+
+
+def load_policy() -> Dict[str, Any]:
+    """(max_symbols_per_cycle, rotation) từ controller.yaml (snapshot config service); lỗi → mặc định."""
+    pol = {"max_symbols_per_cycle": DEFAULT_MAX, "rotation": DEFAULT_ROTATION}
+    try:
+        cfg = read_file("config/controller.yaml", {}) or {}
+        sf = (cfg.get("routing") or {}).get("symbol_fairness") or {}
+        pol["max_symbols_per_cycle"] = max(1, int(sf.get("max_symbols_per_cycle", DEFAULT_MAX)))
+        pol["rotation"] = str(sf.get("rotation", DEFAULT_ROTATION)).strip().lower()
+    except Exception:
+        pass
+    return pol
+
+
+def _load_cursor() -> int:
+    try:
+        from core.memory.state_store import get_store
+        return int(get_store().get(STATE_NS, "cursor", 0))
+    except Exception:
+        return 0
+
+
+def _save_cursor(cursor: int, picked: List[str]) -> None:
+    try:
+        from core.memory.state_store import get_store
+        get_store().put_many(STATE_NS, {"cursor": cursor, "last_picked": picked})
+    except Exception as e:
+        print(f"[fairness] WARN: không lưu được con trỏ: {e}")
+
+
+def select_symbols(candidates: Dict[str, float], universe: Sequence[str],
+                   max_per_cycle: Optional[int] = None, rotation: Optional[str] = None) -> List[str]:
+    """
+    candidates: {symbol: confidence} các symbol có tín hiệu hành động được trong tick.
+    Trả danh sách symbol được thực thi (≤ max_per_cycle), theo thứ tự thực thi.
+    """
+    if not candidates:
+        return []
+    pol = load_policy()
+    k = max_per_cycle if max_per_cycle is not None else pol["max_symbols_per_cycle"]
+    rot = rotation or pol["rotation"]
+    if len(candidates) <= k:
+        return sorted(candidates, key=lambda s: -candidates[s])
+
+    if rot != "round_robin":
+        return sorted(candidates, key=lambda s: -candidates[s])[:k]
+
+    order = list(universe) + [s for s in candidates if s not in universe]
+    n = len(order)
+    start = _load_cursor() % n
+    picked: List[str] = []
+    last_idx = start
+    for i in range(n):
+        idx = (start + i) % n
+        if order[idx] in candidates:
+            picked.append(order[idx])
+            last_idx = idx
+            if len(picked) >= k:
+                break
+    _save_cursor((last_idx + 1) % n, picked)
+    return picked
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+# core/execution/symbol_meta.py
+"""
+Cache metadata symbol (bộ lọc exchangeInfo) cho executor/close_all_positions.
+Trước đây mỗi lệnh tải cả /fapi/v1/exchangeInfo (vài trăm KB) chỉ để đọc LOT_SIZE.
+- Mỗi symbol giữ: step_size/min_qty (LOT_SIZE), market_step/market_min_qty (MARKET_LOT_SIZE),
+  tick_size (PRICE_FILTER), min_notional (MIN_NOTIONAL), precision và status.
+- Lưu đĩa tại data/symbol_meta.json (ghi tmp rồi replace). Process mới đọc file nên không cần gọi sàn.
+- TTL CRX_SYMBOL_META_TTL_SEC (mặc định 6h). Hết hạn thì vẫn trả bản cũ ngay, còn 1 thread nền tải lại
+  (stale-while-revalidate). Đặt lệnh không phải chờ round-trip metadata.
+  Chỉ khi chưa từng có dữ liệu cho symbol thì mới tải đồng bộ (1 lần).
+
+Dùng:
+    meta = get_symbol_meta()
+    f = meta.get("BTCUSDT")          # SymbolFilters
+    qty = f.round_qty(0.01234)       # làm tròn xuống theo step (lệnh MARKET)
+"""
+from __future__ import annotations
+
+import os
+import json
+import time
+import threading
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from core.execution.binance_client import get_client, DEFAULT_BASE
+
+ROOT = Path(__file__).resolve().parents[2]
+META_FILE = ROOT / "data" / "symbol_meta.json"
+TTL_SEC = float(os.getenv("CRX_SYMBOL_META_TTL_SEC", str(6 * 3600)))
+
+
+@dataclass
+class SymbolFilters:
+    symbol: str
+    step_size: float = 0.001
+    min_qty: float = 0.001
+    market_step: float = 0.001
+    market_min_qty: float = 0.001
+    tick_size: float = 0.0
+    min_notional: float = 0.0
+    price_precision: int = 8
+    quantity_precision: int = 8
+    status: str = "TRADING"
+
+    @classmethod
+    def from_exchange(cls, s: Dict[str, Any]) -> "SymbolFilters":
+        out = cls(symbol=str(s.get("symbol", "")).upper(), status=str(s.get("status", "TRADING")),
+                  price_precision=int(s.get("pricePrecision", 8)), quantity_precision=int(s.get("quantityPrecision", 8)))
+        market = False
+        for f in s.get("filters", []) or []:
+            t = f.get("filterType")
+            if t == "LOT_SIZE":
+                out.step_size = float(f.get("stepSize", out.step_size))
+                out.min_qty = float(f.get("minQty", out.min_qty))
+            elif t == "MARKET_LOT_SIZE":
+                market = True
+                out.market_step = float(f.get("stepSize", out.market_step))
+                out.market_min_qty = float(f.get("minQty", out.market_min_qty))
+            elif t == "PRICE_FILTER":
+                out.tick_size = float(f.get("tickSize", out.tick_size))
+            elif t in ("MIN_NOTIONAL", "NOTIONAL"):
+                out.min_notional = float(f.get("notional", f.get("minNotional", out.min_notional)))
+        if not market:
+            out.market_step, out.market_min_qty = out.step_size, out.min_qty
+        return out
+
+    @staticmethod
+    def _round(value: float, step: float) -> float:
+        if step <= 0:
+            return float(value)
+        return float(int(value / step) * step)
+
+    def round_qty(self, qty: float, market: bool = True) -> float:
+        return self._round(qty, self.market_step if market else self.step_size)
+
+    def round_price(self, price: float) -> float:
+        return self._round(price, self.tick_size)
+
+
+class SymbolMetaCache:
+    def __init__(self, base: Optional[str] = None, path: Path = META_FILE, ttl_sec: float = TTL_SEC):
+        self.base = (base or DEFAULT_BASE).strip().rstrip("/")
+        self.path = Path(path)
+        self.ttl_sec = float(ttl_sec)
+        self.symbols: Dict[str, SymbolFilters] = {}
+        self.fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing: Optional[threading.Thread] = None
+        self._load()
+
+    # ----- đĩa -----
+    def _load(self) -> None:
+        try:
+            js = json.loads(self.path.read_text(encoding="utf-8"))
+            if js.get("base") != self.base:
+                return
+            self.symbols = {k: SymbolFilters(**v) for k, v in (js.get("symbols") or {}).items()}
+            self.fetched_at = float(js.get("fetched_at", 0.0))
+        except Exception:
+            pass
+
+    def _save(self) -> None:
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".json.tmp")
+            tmp.write_text(json.dumps({"base": self.base, "fetched_at": self.fetched_at,
+                                       "symbols": {k: asdict(v) for k, v in self.symbols.items()}},
+                                      ensure_ascii=False), encoding="utf-8")
+            tmp.replace(self.path)
+        except Exception as e:
+            print(f"[symbol_meta] ⚠️ ghi {self.path.name} lỗi: {e}")
+
+    # ----- làm mới -----
+    def refresh(self) -> bool:
+        try:
+            info = get_client(self.base).get("/fapi/v1/exchangeInfo")
+            syms = {}
+            for s in info.get("symbols", []) or []:
+                f = SymbolFilters.from_exchange(s)
+                if f.symbol:
+                    syms[f.symbol] = f
+            if not syms:
+                return False
+            with self._lock:
+                self.symbols = syms
+                self.fetched_at = time.time()
+            self._save()
+            return True
+        except Exception as e:
+            print(f"[symbol_meta] ⚠️ tải exchangeInfo lỗi: {e}")
+            return False
+
+    def stale(self) -> bool:
+        return time.time() - self.fetched_at > self.ttl_sec
+
+    def refresh_async(self) -> None:
+        with self._lock:
+            if self._refreshing is not None and self._refreshing.is_alive():
+                return
+            self._refreshing = threading.Thread(target=self.refresh, name="symbol-meta", daemon=True)
+            self._refreshing.start()
+
+    # ----- đọc -----
+    def get(self, symbol: str) -> SymbolFilters:
+        """Bộ lọc của symbol. Không có trong cache → tải đồng bộ; có nhưng cũ → trả ngay + tải lại nền."""
+        symbol = symbol.upper()
+        f = self.symbols.get(symbol)
+        if f is None:
+            self.refresh()
+            f = self.symbols.get(symbol)
+            if f is None:
+                raise ValueError(f"{symbol} không có trên {self.base}")
+        elif self.stale():
+            self.refresh_async()
+        return f
+
+    def warm(self) -> None:
+        """Nạp trước (runner khởi động): chưa có dữ liệu → tải đồng bộ; cũ → tải nền."""
+        if not self.symbols:
+            self.refresh()
+        elif self.stale():
+            self.refresh_async()
+
+
+_CACHES: Dict[str, SymbolMetaCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_symbol_meta(base: Optional[str] = None) -> SymbolMetaCache:
+    key = (base or DEFAULT_BASE).strip().rstrip("/")
+    with _CACHES_LOCK:
+        if key not in _CACHES:
+            _CACHES[key] = SymbolMetaCache(key)
+        return _CACHES[key]
+
+
+if __name__ == "__main__":
+    m = get_symbol_meta()
+    ok = m.refresh()
+    print(f"[symbol_meta] refresh={ok} symbols={len(m.symbols)} → {m.path}")
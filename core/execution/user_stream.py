@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+# core/execution/user_stream.py
+"""
+Sổ lệnh/vị thế theo user data stream của Binance Futures. Thay vòng REST poll /fapi/v1/order
+(order_monitor.poll_until_final 1s × 20s, close_all_positions 0.25s).
+- listenKey: POST /fapi/v1/listenKey khi start, PUT mỗi CRX_USER_STREAM_KEEPALIVE_SEC (mặc định 30').
+  Binance trả CÙNG 1 listenKey đang hoạt động cho mọi stream của 1 tài khoản (runner, close-all…) → stop()
+  mặc định không DELETE; chỉ stop(release_key=True) khi chắc chắn là chủ duy nhất (stub/bench local).
+  Nhận listenKeyExpired hoặc PUT lỗi → xin key mới và nối lại.
+- WS {CRX_WS_BASE}/ws/<listenKey>:
+    ORDER_TRADE_UPDATE → orders (khoá orderId và clientOrderId, dạng giống REST /fapi/v1/order)
+    ACCOUNT_UPDATE     → positions / balances
+  Mất kết nối → nối lại với backoff. Vị thế được nạp lại bằng REST positionRisk sau mỗi lần nối,
+  vì sự kiện trong lúc đứt không được phát lại.
+- Chờ lệnh: future_for() trả concurrent.futures.Future, await_final() cho asyncio, wait_final() chặn có timeout.
+  Stream chưa nối/đứt thì wait_final tự hỏi REST mỗi interval. Stream khoẻ thì chỉ hỏi REST bảo hiểm
+  mỗi CRX_USER_STREAM_REST_SEC.
+
+Dùng:
+    us = get_user_stream()                       # None nếu thiếu API key hoặc CRX_USER_STREAM=0
+    fut = us.future_for(order_id=123)            # Future → dict lệnh khi FILLED/CANCELED/REJECTED/EXPIRED
+    final = us.wait_final("BTCUSDT", 123, None, timeout_sec=20)
+    amt = us.positions.get("BTCUSDT", {}).get("positionAmt")
+Thử local: python tools/user_stream_stub.py --selftest
+"""
+from __future__ import annotations
+
+import os
+import json
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+from core.execution.binance_client import BinanceClient, get_client
+from core.runtime.candle_clock import REST_BASE, WS_BASE
+
+FINAL_STATUSES = ("FILLED", "CANCELED", "REJECTED", "EXPIRED", "EXPIRED_IN_MATCH")
+KEEPALIVE_SEC = float(os.getenv("CRX_USER_STREAM_KEEPALIVE_SEC", "1800"))
+REST_SAFETY_SEC = float(os.getenv("CRX_USER_STREAM_REST_SEC", "5"))
+MAX_ORDERS = 2000
+
+
+def order_from_event(o: Dict[str, Any]) -> Dict[str, Any]:
+    """ORDER_TRADE_UPDATE.o → dict cùng khoá với REST /fapi/v1/order."""
+    return {
+        "symbol": o.get("s"), "orderId": o.get("i"), "clientOrderId": o.get("c"), "side": o.get("S"),
+        "type": o.get("o"), "status": o.get("X"), "origQty": o.get("q"), "price": o.get("p"),
+        "avgPrice": o.get("ap"), "executedQty": o.get("z"), "reduceOnly": o.get("R"),
+        "positionSide": o.get("ps"), "updateTime": o.get("T"),
+        "execType": o.get("x"), "lastFilledQty": o.get("l"), "lastFilledPrice": o.get("L"),
+        "realizedPnl": o.get("rp"), "commission": o.get("n"), "commissionAsset": o.get("N"),
+    }
+
+
+class UserStream:
+    def __init__(self, client: Optional[BinanceClient] = None, ws_base: str = WS_BASE,
+                 keepalive_sec: float = KEEPALIVE_SEC, log: Callable[[str], None] = print):
+        self.client = client or get_client(REST_BASE)
+        self.ws_base = ws_base.rstrip("/")
+        self.keepalive_sec = keepalive_sec
+        self.log = log
+        self.listen_key: Optional[str] = None
+        self.connected = False
+        self.orders: "OrderedDict[Any, Dict[str, Any]]" = OrderedDict()
+        self.positions: Dict[str, Dict[str, Any]] = {}
+        self.balances: Dict[str, Dict[str, Any]] = {}
+        self.events = 0
+        self.last_event_ms = 0
+        self._futures: Dict[Any, List[Future]] = {}
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._renew = threading.Event()
+        self._conn = None
+        self._threads: List[threading.Thread] = []
+        self._connected_evt = threading.Event()
+
+    # ----- vòng đời -----
+    def start(self, wait_sec: float = 0.0) -> "UserStream":
+        if not self._threads:
+            for name, fn in (("user-stream", self._ws_loop), ("user-stream-keepalive", self._keepalive_loop)):
+                t = threading.Thread(target=fn, name=name, daemon=True)
+                t.start()
+                self._threads.append(t)
+        if wait_sec > 0:
+            self._connected_evt.wait(wait_sec)
+        return self
+
+    def stop(self, release_key: bool = False) -> None:
+        """Dừng thread + đóng ws. release_key=True mới DELETE listenKey (key dùng chung cả tài khoản)."""
+        self._stop.set()
+        conn = self._conn
+        if conn is not None:
+            conn.close()
+        if release_key and self.listen_key:
+            try:
+                self.client.request("DELETE", "/fapi/v1/listenKey", {"listenKey": self.listen_key}, retries=0)
+            except Exception:
+                pass
+
+    def _new_listen_key(self) -> str:
+        js = self.client.request("POST", "/fapi/v1/listenKey")
+        self.listen_key = str(js["listenKey"])
+        return self.listen_key
+
+    def _keepalive_loop(self) -> None:
+        while not self._stop.wait(self.keepalive_sec):
+            if not self.listen_key:
+                continue
+            try:
+                self.client.request("PUT", "/fapi/v1/listenKey", {"listenKey": self.listen_key})
+            except Exception as e:
+                self.log(f"[user_stream] keepalive lỗi ({e}) → xin listenKey mới")
+                self._renew_key()
+
+    def _renew_key(self) -> None:
+        self._renew.set()
+        conn = self._conn
+        if conn is not None:
+            conn.close()
+
+    def _ws_loop(self) -> None:
+        from utils.ws_helpers import connect
+        backoff = 1.0
+        while not self._stop.is_set():
+            conn = None
+            try:
+                if not self.listen_key or self._renew.is_set():
+                    self._renew.clear()
+                    self._new_listen_key()
+                conn = connect(f"{self.ws_base}/ws/{self.listen_key}", timeout=10)
+                self._conn = conn
+                self._resync_rest()             # sự kiện tới trong lúc này nằm chờ trong socket
+                self.connected = True
+                self._connected_evt.set()
+                backoff = 1.0
+                self.log(f"[user_stream] ws kết nối ({self.ws_base})")
+                while not self._stop.is_set():
+                    msg = conn.recv(timeout=60)
+                    if msg is None:
+                        conn.ping()
+                        continue
+                    self._on_message(msg)
+            except Exception as e:
+                if self.connected and not self._stop.is_set():
+                    self.log(f"[user_stream] ws mất kết nối ({e}) → REST fallback, nối lại sau {backoff:.0f}s")
+            finally:
+                self.connected = False
+                self._connected_evt.clear()
+                self._conn = None
+                if conn is not None:
+                    conn.close()
+            if self._renew.is_set():
+                continue
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+    def _resync_rest(self) -> None:
+        """Sau khi (nối lại): nạp vị thế và hỏi REST các lệnh đang có người chờ (có thể đã khớp lúc đứt)."""
+        try:
+            rows = self.client.get("/fapi/v2/positionRisk", signed=True)
+            with self._lock:
+                for r in rows or []:
+                    self.positions[str(r.get("symbol"))] = {
+                        "positionAmt": float(r.get("positionAmt", 0) or 0), "entryPrice": float(r.get("entryPrice", 0) or 0),
+                        "unrealizedProfit": float(r.get("unRealizedProfit", 0) or 0),
+                        "positionSide": r.get("positionSide", "BOTH")}
+        except Exception as e:
+            self.log(f"[user_stream] nạp positionRisk lỗi: {e}")
+        with self._lock:
+            pending = [(o.get("symbol"), o.get("orderId"), o.get("clientOrderId")) for o in self._pending_orders()]
+        for sym, oid, cid in pending:
+            if sym and (oid is not None or cid):
+                self._check_rest(sym, oid, cid)
+
+    def _pending_orders(self) -> List[Dict[str, Any]]:
+        seen, out = set(), []
+        for k in self._futures:
+            o = self.orders.get(k)
+            if o is not None and id(o) not in seen and o.get("status") not in FINAL_STATUSES:
+                seen.add(id(o))
+                out.append(o)
+        return out
+
+    # ----- sự kiện -----
+    def _on_message(self, msg: str) -> None:
+        try:
+            data = json.loads(msg)
+        except Exception:
+            return
+        data = data.get("data", data)
+        ev = data.get("e")
+        self.events += 1
+        self.last_event_ms = int(data.get("E", 0) or 0)
+        if ev == "ORDER_TRADE_UPDATE":
+            self._apply_order(order_from_event(data.get("o") or {}))
+        elif ev == "ACCOUNT_UPDATE":
+            a = data.get("a") or {}
+            with self._lock:
+                for p in a.get("P", []) or []:
+                    self.positions[str(p.get("s"))] = {
+                        "positionAmt": float(p.get("pa", 0) or 0), "entryPrice": float(p.get("ep", 0) or 0),
+                        "unrealizedProfit": float(p.get("up", 0) or 0), "positionSide": p.get("ps", "BOTH")}
+                for b in a.get("B", []) or []:
+                    self.balances[str(b.get("a"))] = {"walletBalance": float(b.get("wb", 0) or 0),
+                                                      "crossWalletBalance": float(b.get("cw", 0) or 0)}
+        elif ev == "listenKeyExpired":
+            self.log("[user_stream] listenKey hết hạn → xin key mới")
+            self._renew_key()
+
+    def _apply_order(self, o: Dict[str, Any]) -> None:
+        keys = [k for k in (o.get("orderId"), o.get("clientOrderId")) if k not in (None, "")]
+        done: List[Future] = []
+        with self._lock:
+            cur = None
+            for k in keys:
+                cur = cur or self.orders.get(k)
+            if cur is not None:
+                # REST không có các trường execType/lastFilled… → không xoá giá trị cũ bằng None
+                cur.update({k: v for k, v in o.items() if v is not None})
+            else:
+                cur = dict(o)
+            for k in keys:
+                self.orders[k] = cur
+                self.orders.move_to_end(k)
+            while len(self.orders) > MAX_ORDERS:
+                self.orders.popitem(last=False)
+            if cur.get("status") in FINAL_STATUSES:
+                for k in keys:
+                    done.extend(self._futures.pop(k, []))
+        for f in done:
+            if not f.done():
+                f.set_result(dict(cur))
+
+    # ----- chờ lệnh -----
+    def future_for(self, order_id: Any = None, client_order_id: Optional[str] = None,
+                   symbol: Optional[str] = None) -> Future:
+        """Future → dict lệnh khi trạng thái cuối. Lệnh đã cuối trong sổ → Future xong ngay."""
+        keys = [k for k in (order_id, client_order_id) if k not in (None, "")]
+        if not keys:
+            raise ValueError("Cần order_id hoặc client_order_id")
+        fut: Future = Future()
+        with self._lock:
+            for k in keys:
+                o = self.orders.get(k)
+                if o is not None and o.get("status") in FINAL_STATUSES:
+                    fut.set_result(dict(o))
+                    return fut
+            for k in keys:
+                self._futures.setdefault(k, []).append(fut)
+                self.orders.setdefault(k, {"symbol": symbol, "orderId": order_id, "clientOrderId": client_order_id})
+        return fut
+
+    async def await_final(self, order_id: Any = None, client_order_id: Optional[str] = None,
+                          timeout_sec: Optional[float] = None, symbol: Optional[str] = None) -> Dict[str, Any]:
+        fut = asyncio.wrap_future(self.future_for(order_id, client_order_id, symbol))
+        return await asyncio.wait_for(fut, timeout_sec)
+
+    def _check_rest(self, symbol: str, order_id: Any, client_order_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        params: Dict[str, Any] = {"symbol": symbol}
+        if order_id is not None:
+            params["orderId"] = order_id
+        else:
+            params["origClientOrderId"] = client_order_id
+        try:
+            js = self.client.get("/fapi/v1/order", params, signed=True)
+        except Exception as e:
+            return {"error": str(e)}
+        if isinstance(js, dict) and js.get("status"):
+            self._apply_order(js)
+        return js
+
+    def wait_final(self, symbol: str, order_id: Any = None, client_order_id: Optional[str] = None,
+                   timeout_sec: float = 20.0, interval_sec: float = 1.0) -> Dict[str, Any]:
+        """Chặn tới khi lệnh ở trạng thái cuối (push từ stream), hỏi REST khi stream không khoẻ. Trả dict lệnh."""
+        fut = self.future_for(order_id, client_order_id, symbol)
+        end = time.time() + timeout_sec
+        last: Dict[str, Any] = {}
+        next_rest = time.time() + (REST_SAFETY_SEC if self.connected else 0.0)
+        while True:
+            left = end - time.time()
+            if fut.done():
+                return fut.result()
+            if left <= 0:
+                break
+            if time.time() >= next_rest:
+                last = self._check_rest(symbol, order_id, client_order_id) or last
+                if fut.done():
+                    return fut.result()
+                next_rest = time.time() + (REST_SAFETY_SEC if self.connected else interval_sec)
+            try:
+                return fut.result(timeout=max(0.0, min(left, next_rest - time.time())))
+            except Exception:
+                pass
+        with self._lock:
+            for k in (order_id, client_order_id):
+                lst = self._futures.get(k)
+                if lst and fut in lst:
+                    lst.remove(fut)
+                    if not lst:
+                        self._futures.pop(k, None)
+            known = self.orders.get(order_id) or self.orders.get(client_order_id) or {}
+        if known.get("status"):
+            return dict(known)
+        return last or {"status": "UNKNOWN"}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"connected": self.connected, "events": self.events, "last_event_ms": self.last_event_ms,
+                    "orders": len({id(o) for o in self.orders.values()}), "waiters": sum(map(len, self._futures.values())),
+                    "positions": {s: p["positionAmt"] for s, p in self.positions.items() if p.get("positionAmt")}}
+
+
+_STREAM: Optional[UserStream] = None
+_STREAM_LOCK = threading.Lock()
+
+
+def get_user_stream(wait_sec: float = 0.0) -> Optional[UserStream]:
+    """Stream dùng chung của process (khởi động lười). None nếu thiếu API key hoặc CRX_USER_STREAM=0."""
+    global _STREAM
+    if os.getenv("CRX_USER_STREAM", "1").strip().lower() in ("0", "false", "no", "off"):
+        return None
+    with _STREAM_LOCK:
+        if _STREAM is None:
+            client = get_client(REST_BASE)
+            if not client.has_keys:
+                return None
+            _STREAM = UserStream(client)
+        stream = _STREAM
+    return stream.start(wait_sec=wait_sec)
+
+
+def shutdown() -> None:
+    """Dừng stream dùng chung (ws + keepalive) trước khi module bị gỡ/nạp lại. Không DELETE listenKey."""
+    global _STREAM
+    with _STREAM_LOCK:
+        stream, _STREAM = _STREAM, None
+    if stream is not None:
+        stream.stop()
@@ -0,0 +1,533 @@
+# -*- coding: utf-8 -*-
+# core/indicators/streaming.py
+"""
+Chỉ báo streaming O(1)/nến cho chiến lược LEFT (thay rolling pandas tính lại từ đầu mỗi tick).
+- SMA (tổng trượt), EMA, RollingMax/RollingMin (deque đơn điệu), ATR (Wilder), RSI (Wilder),
+  Bollinger (mean/std trượt), VWAP (cộng dồn theo phiên UTC).
+- Mỗi chỉ báo: update(candle) → O(1) khấu hao; .value; state()/load(state) để lưu/nạp JSON.
+- IndicatorEngine gom nhiều chỉ báo cho 1 (symbol, timeframe): nuốt nến mới từ candle_store theo
+  cursor close_time, lưu trạng thái ở data/indicator_state/<SYMBOL>_<tf>.json → tick sau chỉ tốn
+  công cho nến mới, không phụ thuộc độ dài lịch sử.
+- Hàm batch_* là bản pandas tham chiếu (cùng định nghĩa); `python tests/indicator_parity.py`
+  so khớp streaming với batch trên dữ liệu ngẫu nhiên.
+
+Quy ước giá trị: NaN cho tới khi đủ `n` quan sát (như min_periods=n của pandas).
+"""
+from __future__ import annotations
+
+import json
+import math
+import hashlib
+from abc import ABC, abstractmethod
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import pandas as pd
+
+STATE_DIR = Path("data") / "indicator_state"
+_NAN = float("nan")
+_RESYNC_EVERY = 1000  # cộng lại tổng trượt từ buffer mỗi N nến (chặn sai số dồn float)
+
+
+def _src(c: Dict[str, Any], src: str) -> float:
+    if src == "range":
+        return float(c["high"]) - float(c["low"])
+    if src == "typical":
+        return (float(c["high"]) + float(c["low"]) + float(c["close"])) / 3.0
+    return float(c[src])
+
+
+# ========== Chỉ báo ==========
+class Indicator(ABC):
+    kind = ""
+
+    def __init__(self, n: int = 14, src: str = "close"):
+        self.n = int(n)
+        self.src = src
+        self.count = 0
+
+    @property
+    def params(self) -> Dict[str, Any]:
+        return {"n": self.n, "src": self.src}
+
+    @abstractmethod
+    def update(self, c: Dict[str, Any]) -> None:
+        ...
+
+    @property
+    @abstractmethod
+    def value(self):
+        ...
+
+    def state(self) -> Dict[str, Any]:
+        return {"count": self.count}
+
+    def load(self, st: Dict[str, Any]) -> None:
+        self.count = int(st.get("count", 0))
+
+
+class SMA(Indicator):
+    kind = "sma"
+
+    def __init__(self, n: int = 20, src: str = "close"):
+        super().__init__(n, src)
+        self.buf: Deque[float] = deque(maxlen=self.n)
+        self.sum = 0.0
+
+    def update(self, c):
+        x = _src(c, self.src)
+        if len(self.buf) == self.n:
+            self.sum -= self.buf[0]
+        self.buf.append(x)
+        self.sum += x
+        self.count += 1
+        if self.count % _RESYNC_EVERY == 0:
+            self.sum = math.fsum(self.buf)
+
+    @property
+    def value(self) -> float:
+        return self.sum / self.n if len(self.buf) == self.n else _NAN
+
+    def state(self):
+        return {"count": self.count, "buf": list(self.buf)}
+
+    def load(self, st):
+        super().load(st)
+        self.buf = deque((float(x) for x in st.get("buf", [])), maxlen=self.n)
+        self.sum = math.fsum(self.buf)
+
+
+class EMA(Indicator):
+    """ewm(span=n, adjust=False, min_periods=n)."""
+    kind = "ema"
+
+    def __init__(self, n: int = 20, src: str = "close"):
+        super().__init__(n, src)
+        self.alpha = 2.0 / (self.n + 1)
+        self.y = _NAN
+
+    def update(self, c):
+        x = _src(c, self.src)
+        self.y = x if self.count == 0 else self.y + self.alpha * (x - self.y)
+        self.count += 1
+
+    @property
+    def value(self) -> float:
+        return self.y if self.count >= self.n else _NAN
+
+    def state(self):
+        return {"count": self.count, "y": self.y}
+
+    def load(self, st):
+        super().load(st)
+        self.y = float(st.get("y", _NAN))
+
+
+class RollingMax(Indicator):
+    """Max trượt n nến bằng deque đơn điệu giảm: mỗi phần tử vào/ra đúng 1 lần → O(1) khấu hao."""
+    kind = "max"
+    _cmp = staticmethod(lambda old, new: old <= new)
+
+    def __init__(self, n: int = 20, src: str = "high"):
+        super().__init__(n, src)
+        self.dq: Deque[Tuple[int, float]] = deque()
+
+    def update(self, c):
+        x = _src(c, self.src)
+        i = self.count
+        while self.dq and self._cmp(self.dq[-1][1], x):
+            self.dq.pop()
+        self.dq.append((i, x))
+        while self.dq[0][0] <= i - self.n:
+            self.dq.popleft()
+        self.count += 1
+
+    @property
+    def value(self) -> float:
+        return self.dq[0][1] if self.count >= self.n else _NAN
+
+    def state(self):
+        return {"count": self.count, "dq": [list(p) for p in self.dq]}
+
+    def load(self, st):
+        super().load(st)
+        self.dq = deque((int(i), float(v)) for i, v in st.get("dq", []))
+
+
+class RollingMin(RollingMax):
+    kind = "min"
+    _cmp = staticmethod(lambda old, new: old >= new)
+
+    def __init__(self, n: int = 20, src: str = "low"):
+        super().__init__(n, src)
+
+
+class ATR(Indicator):
+    """Wilder: TR = max(h-l, |h-pc|, |l-pc|); ATR = ewm(alpha=1/n, adjust=False, min_periods=n)."""
+    kind = "atr"
+
+    def __init__(self, n: int = 14, src: str = "close"):
+        super().__init__(n, src)
+        self.prev_close = _NAN
+        self.y = _NAN
+
+    def update(self, c):
+        h, l, cl = float(c["high"]), float(c["low"]), float(c["close"])
+        tr = h - l
+        if self.count:
+            tr = max(tr, abs(h - self.prev_close), abs(l - self.prev_close))
+        self.y = tr if self.count == 0 else self.y + (tr - self.y) / self.n
+        self.prev_close = cl
+        self.count += 1
+
+    @property
+    def value(self) -> float:
+        return self.y if self.count >= self.n else _NAN
+
+    def state(self):
+        return {"count": self.count, "y": self.y, "prev_close": self.prev_close}
+
+    def load(self, st):
+        super().load(st)
+        self.y = float(st.get("y", _NAN))
+        self.prev_close = float(st.get("prev_close", _NAN))
+
+
+class RSI(Indicator):
+    """Wilder: trung bình gain/loss bằng ewm(alpha=1/n, adjust=False, min_periods=n) trên diff."""
+    kind = "rsi"
+
+    def __init__(self, n: int = 14, src: str = "close"):
+        super().__init__(n, src)
+        self.prev = _NAN
+        self.gain = 0.0
+        self.loss = 0.0
+        self.deltas = 0
+
+    def update(self, c):
+        x = _src(c, self.src)
+        if self.count:
+            d = x - self.prev
+            g, lo = max(d, 0.0), max(-d, 0.0)
+            if self.deltas == 0:
+                self.gain, self.loss = g, lo
+            else:
+                self.gain += (g - self.gain) / self.n
+                self.loss += (lo - self.loss) / self.n
+            self.deltas += 1
+        self.prev = x
+        self.count += 1
+
+    @property
+    def value(self) -> float:
+        if self.deltas < self.n:
+            return _NAN
+        if self.loss == 0:
+            return 100.0 if self.gain > 0 else _NAN
+        return 100.0 - 100.0 / (1.0 + self.gain / self.loss)
+
+    def state(self):
+        return {"count": self.count, "prev": self.prev, "gain": self.gain, "loss": self.loss,
+                "deltas": self.deltas}
+
+    def load(self, st):
+        super().load(st)
+        self.prev = float(st.get("prev", _NAN))
+        self.gain = float(st.get("gain", 0.0))
+        self.loss = float(st.get("loss", 0.0))
+        self.deltas = int(st.get("deltas", 0))
+
+
+class Bollinger(Indicator):
+    """mid = SMA(n); std trượt ddof=1 (như rolling.std); tổng dịch theo mốc ref để tránh triệt tiêu số."""
+    kind = "bollinger"
+
+    def __init__(self, n: int = 20, k: float = 2.0, src: str = "close"):
+        super().__init__(n, src)
+        self.k = float(k)
+        self.buf: Deque[float] = deque(maxlen=self.n)
+        self.ref = _NAN
+        self.s1 = 0.0
+        self.s2 = 0.0
+
+    @property
+    def params(self):
+        return {"n": self.n, "k": self.k, "src": self.src}
+
+    def _resync(self):
+        self.ref = self.buf[-1]
+        self.s1 = math.fsum(x - self.ref for x in self.buf)
+        self.s2 = math.fsum((x - self.ref) ** 2 for x in self.buf)
+
+    def update(self, c):
+        x = _src(c, self.src)
+        if self.count == 0:
+            self.ref = x
+        if len(self.buf) == self.n:
+            old = self.buf[0] - self.ref
+            self.s1 -= old
+            self.s2 -= old * old
+        self.buf.append(x)
+        d = x - self.ref
+        self.s1 += d
+        self.s2 += d * d
+        self.count += 1
+        if self.count % _RESYNC_EVERY == 0:
+            self._resync()
+
+    @property
+    def value(self) -> Dict[str, float]:
+        if len(self.buf) < self.n or self.n < 2:
+            return {"mid": _NAN, "upper": _NAN, "lower": _NAN, "std": _NAN}
+        mean_d = self.s1 / self.n
+        var = max(0.0, (self.s2 - self.s1 * mean_d) / (self.n - 1))
+        sd = math.sqrt(var)
+        mid = self.ref + mean_d
+        return {"mid": mid, "upper": mid + self.k * sd, "lower": mid - self.k * sd, "std": sd}
+
+    def state(self):
+        return {"count": self.count, "buf": list(self.buf)}
+
+    def load(self, st):
+        super().load(st)
+        self.buf = deque((float(x) for x in st.get("buf", [])), maxlen=self.n)
+        if self.buf:
+            self._resync()
+
+
+class VWAP(Indicator):
+    """Σ(typical·vol)/Σvol, reset đầu mỗi phiên (ngày UTC theo open_time) nếu session="day"."""
+    kind = "vwap"
+
+    def __init__(self, n: int = 1, src: str = "typical", session: Optional[str] = "day"):
+        super().__init__(n, src)
+        self.session = session
+        self.day = -1
+        self.pv = 0.0
+        self.v = 0.0
+
+    @property
+    def params(self):
+        return {"src": self.src, "session": self.session}
+
+    def update(self, c):
+        if self.session == "day":
+            day = int(c["open_time"]) // 86_400_000
+            if day != self.day:
+                self.day, self.pv, self.v = day, 0.0, 0.0
+        vol = float(c["volume"])
+        self.pv += _src(c, self.src) * vol
+        self.v += vol
+        self.count += 1
+
+    @property
+    def value(self) -> float:
+        return self.pv / self.v if self.v > 0 else _NAN
+
+    def state(self):
+        return {"count": self.count, "day": self.day, "pv": self.pv, "v": self.v}
+
+    def load(self, st):
+        super().load(st)
+        self.day = int(st.get("day", -1))
+        self.pv = float(st.get("pv", 0.0))
+        self.v = float(st.get("v", 0.0))
+
+
+KINDS = {cls.kind: cls for cls in (SMA, EMA, RollingMax, RollingMin, ATR, RSI, Bollinger, VWAP)}
+
+# Bộ chỉ báo mặc định cho LEFT (ema_trend dùng "ema" = rolling mean → sma20/sma50)
+DEFAULT_SPECS: Dict[str, Tuple[str, Dict[str, Any]]] = {
+    "sma20": ("sma", {"n": 20}),
+    "sma50": ("sma", {"n": 50}),
+    "hh20": ("max", {"n": 20, "src": "high"}),
+    "ll20": ("min", {"n": 20, "src": "low"}),
+    "range14": ("sma", {"n": 14, "src": "range"}),   # risk_intel.atr_percent
+    "atr14": ("atr", {"n": 14}),
+    "rsi14": ("rsi", {"n": 14}),
+    "bb20": ("bollinger", {"n": 20, "k": 2.0}),
+    "vwap": ("vwap", {"session": "day"}),
+}
+
+
+def make(kind: str, **params) -> Indicator:
+    return KINDS[kind](**params)
+
+
+# ========== Engine cho 1 (symbol, timeframe) ==========
+class IndicatorEngine:
+    def __init__(self, symbol: str, tf: str, specs: Optional[Dict[str, Tuple[str, Dict[str, Any]]]] = None):
+        self.symbol = symbol.upper()
+        self.tf = tf
+        self.specs = dict(specs or DEFAULT_SPECS)
+        self.ind: Dict[str, Indicator] = {name: make(kind, **p) for name, (kind, p) in self.specs.items()}
+        self.count = 0
+        self.last_close_ms = 0
+        self.last: Dict[str, float] = {}
+
+    @property
+    def spec_hash(self) -> str:
+        raw = json.dumps(self.specs, sort_keys=True, default=str)
+        return hashlib.sha1(raw.encode()).hexdigest()[:12]
+
+    def reset(self) -> None:
+        self.__init__(self.symbol, self.tf, self.specs)
+
+    def update(self, c: Dict[str, Any]) -> bool:
+        """Nuốt 1 nến đã đóng; bỏ qua nến cũ/trùng (close_time <= cursor). O(số chỉ báo)."""
+        ct = int(c["close_time"])
+        if ct <= self.last_close_ms:
+            return False
+        for ind in self.ind.values():
+            ind.update(c)
+        self.count += 1
+        self.last_close_ms = ct
+        self.last = {"open": float(c["open"]), "high": float(c["high"]), "low": float(c["low"]),
+                     "close": float(c["close"]), "volume": float(c["volume"])}
+        return True
+
+    def update_view(self, v) -> int:
+        """Nuốt các dòng của CandleView (candle_store) theo thứ tự."""
+        cols = {k: getattr(v, k).tolist() for k in ("open_time", "close_time", "open", "high", "low", "close", "volume")}
+        added = 0
+        for i in range(len(cols["close_time"])):
+            added += self.update({k: col[i] for k, col in cols.items()})
+        return added
+
+    def catch_up(self, store=None) -> int:
+        """Nuốt nến mới hơn cursor từ kho; lệch mạch (kho bị dựng lại/cắt qua cursor) → dựng lại từ đầu."""
+        if store is None:
+            from core.collector.candle_store import get_store
+            store = get_store()
+        v = store.view(self.symbol, self.tf, since_ms=self.last_close_ms + 1)
+        if v is None or not len(v):
+            return 0
+        if self.last_close_ms and int(v.open_time[0]) != self.last_close_ms + 1:
+            self.reset()
+            v = store.view(self.symbol, self.tf)
+        return self.update_view(v)
+
+    def values(self) -> Dict[str, float]:
+        """Giá trị hiện tại (phẳng): n, close…, <tên>, <tên>_mid/_upper/_lower/_std cho chỉ báo trả dict."""
+        out: Dict[str, float] = {"n": self.count, **self.last}
+        for name, ind in self.ind.items():
+            val = ind.value
+            if isinstance(val, dict):
+                out.update({f"{name}_{k}": x for k, x in val.items()})
+            else:
+                out[name] = val
+        return out
+
+    # ----- persist -----
+    def path(self, root: Path = STATE_DIR) -> Path:
+        return Path(root) / f"{self.symbol}_{self.tf}.json"
+
+    def state(self) -> Dict[str, Any]:
+        return {"symbol": self.symbol, "tf": self.tf, "spec_hash": self.spec_hash, "count": self.count,
+                "last_close_ms": self.last_close_ms, "last": self.last,
+                "indicators": {name: ind.state() for name, ind in self.ind.items()}}
+
+    def load_state(self, st: Dict[str, Any]) -> bool:
+        if st.get("spec_hash") != self.spec_hash:
+            return False  # bộ chỉ báo đã đổi → bỏ state cũ, dựng lại
+        for name, ind in self.ind.items():
+            ind.load((st.get("indicators") or {}).get(name, {}))
+        self.count = int(st.get("count", 0))
+        self.last_close_ms = int(st.get("last_close_ms", 0))
+        self.last = dict(st.get("last") or {})
+        return True
+
+    def save(self, root: Path = STATE_DIR) -> None:
+        try:
+            p = self.path(root)
+            p.parent.mkdir(parents=True, exist_ok=True)
+            tmp = p.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self.state(), allow_nan=True), encoding="utf-8")
+            tmp.replace(p)
+        except Exception as e:
+            print(f"[indicators] WARN: không lưu được state {self.symbol}_{self.tf}: {e}")
+
+    @classmethod
+    def load(cls, symbol: str, tf: str, specs=None, root: Path = STATE_DIR) -> "IndicatorEngine":
+        eng = cls(symbol, tf, specs)
+        try:
+            st = json.loads(eng.path(root).read_text(encoding="utf-8"))
+            if not eng.load_state(st):
+                eng.reset()
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"[indicators] WARN: state {symbol}_{tf} hỏng ({e}) → dựng lại.")
+            eng.reset()
+        return eng
+
+
+_ENGINES: Dict[Tuple[str, str], IndicatorEngine] = {}
+
+
+def get_engine(symbol: str, tf: str, store=None, save: bool = True) -> IndicatorEngine:
+    """Engine đã bắt kịp kho nến (cache trong tiến trình + state trên đĩa)."""
+    k = (symbol.upper(), tf)
+    eng = _ENGINES.get(k)
+    if eng is None:
+        eng = _ENGINES[k] = IndicatorEngine.load(symbol, tf)
+    if eng.catch_up(store) and save:
+        eng.save()
+    return eng
+
+
+# ========== Bản pandas tham chiếu ==========
+def _series(df: pd.DataFrame, src: str) -> pd.Series:
+    if src == "range":
+        return df["high"] - df["low"]
+    if src == "typical":
+        return (df["high"] + df["low"] + df["close"]) / 3.0
+    return df[src]
+
+
+def batch_sma(df, n=20, src="close"):
+    return _series(df, src).rolling(n).mean()
+
+
+def batch_ema(df, n=20, src="close"):
+    return _series(df, src).ewm(span=n, adjust=False, min_periods=n).mean()
+
+
+def batch_max(df, n=20, src="high"):
+    return _series(df, src).rolling(n).max()
+
+
+def batch_min(df, n=20, src="low"):
+    return _series(df, src).rolling(n).min()
+
+
+def batch_atr(df, n=14, src="close"):
+    pc = df["close"].shift()
+    tr = pd.concat([df["high"] - df["low"], (df["high"] - pc).abs(), (df["low"] - pc).abs()], axis=1).max(axis=1)
+    return tr.ewm(alpha=1.0 / n, adjust=False, min_periods=n).mean()
+
+
+def batch_rsi(df, n=14, src="close"):
+    d = _series(df, src).diff()
+    gain = d.clip(lower=0).ewm(alpha=1.0 / n, adjust=False, min_periods=n).mean()
+    loss = (-d.clip(upper=0)).ewm(alpha=1.0 / n, adjust=False, min_periods=n).mean()
+    return 100.0 - 100.0 / (1.0 + gain / loss)
+
+
+def batch_bollinger(df, n=20, k=2.0, src="close"):
+    s = _series(df, src)
+    mid, sd = s.rolling(n).mean(), s.rolling(n).std()
+    return pd.DataFrame({"mid": mid, "upper": mid + k * sd, "lower": mid - k * sd, "std": sd})
+
+
+def batch_vwap(df, n=1, src="typical", session="day"):
+    pv = _series(df, src) * df["volume"]
+    if session != "day":
+        return pv.cumsum() / df["volume"].cumsum()
+    day = df["open_time"] // 86_400_000
+    return pv.groupby(day).cumsum() / df["volume"].groupby(day).cumsum()
+
+
+BATCH = {"sma": batch_sma, "ema": batch_ema, "max": batch_max, "min": batch_min, "atr": batch_atr,
+         "rsi": batch_rsi, "bollinger": batch_bollinger, "vwap": batch_vwap}
@@ -1,6 +1,6 @@
 # core/kpi/kpi_tracker.py
 from pathlib import Path
-from typing import Dict, Tuple, List
+from typing import Dict, Tuple, List, Optional
 from datetime import datetime, timezone, timedelta
 import json
 from configs.config import KPI_POLICY
@@ -8,8 +8,13 @@ from utils.io_utils import read_json
 
 TRADE_PATH = Path("data/trade_history.json")
 
-def _load_trades() -> List[Dict]:
-    return read_json(TRADE_PATH, [])
+def _load_trades(since: Optional[datetime] = None, until: Optional[datetime] = None) -> List[Dict]:
+    """Trade trong [since, until) từ history_db (chỉ mục ts); lỗi → đọc trade_history.json như cũ."""
+    try:
+        from core.memory.history_db import get_db
+        return get_db().trades(since=since, until=until)
+    except Exception:
+        return read_json(TRADE_PATH, [])
 
 def _week_range_utc(dt: datetime) -> Tuple[datetime, datetime]:
     # tuần ISO: bắt đầu thứ Hai 00:00 UTC
@@ -54,13 +59,13 @@ def _pnl_usd_estimate(trades: List[Dict]) -> float:
     return float(pnl)
 
 def weekly_status() -> Dict:
-    trades = _load_trades()
+    now = datetime.now(timezone.utc)
+    ws, we = _week_range_utc(now)
+    trades = _load_trades(ws, we)
     if not trades:
         return {"achieved": False, "pnl_usd": 0.0, "target": KPI_POLICY.get("weekly", {}).get("min_target_usd", 50)}
 
-    now = datetime.now(timezone.utc)
-    ws, we = _week_range_utc(now)
-    # lọc trade tuần này
+    # lọc trade tuần này (history_db đã lọc; giữ lại cho nhánh fallback đọc file)
     week_trades = []
     for t in trades:
         ts = t.get("timestamp")
@@ -68,7 +73,9 @@ def weekly_status() -> Dict:
             dt = datetime.fromisoformat(ts)
         except Exception:
             continue
-        if ws <= dt.replace(tzinfo=timezone.utc) < we:
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        if ws <= dt < we:
             week_trades.append(t)
 
     pnl = _pnl_usd_estimate(week_trades)
@@ -0,0 +1,411 @@
+# -*- coding: utf-8 -*-
+# core/memory/decision_log.py
+"""
+Decision log append-only, chia đoạn (thay cho read-modify-write toàn bộ data/decision_history.json).
+Bố cục data/decision_log/:
+- seg_000001.jsonl  : mỗi dòng 1 bản ghi JSON (gọn, không indent); chỉ append.
+- seg_000001.idx    : uint64 little-endian – offset KẾT THÚC của từng bản ghi trong .jsonl
+                      → số bản ghi = size/8, bản ghi i = [end[i-1], end[i]) → đọc ngẫu nhiên O(1).
+- _manifest.json    : danh sách đoạn {id, first_seq, count(đã đóng), first_ts}; chỉ ghi khi xoay đoạn.
+- .lock             : flock khi ghi (nhiều process cùng append: runner + auto_main).
+Xoay đoạn khi .jsonl ≥ CRX_DECISION_SEGMENT_MB (mặc định 8MB); giữ CRX_DECISION_KEEP_SEGMENTS đoạn
+gần nhất (0 = giữ hết). Ghi lỗi giữa chừng (data có, idx chưa) → tự vá idx ở lần ghi/đọc kế tiếp.
+
+Dùng:
+    log = get_log()
+    log.append(rec) / log.append([rec1, rec2])      # O(bản ghi mới)
+    log.last()                                      # bản ghi cuối, O(1)
+    log.tail(50), log.tail_group()                  # n bản ghi cuối / nhóm cùng timestamp cuối (universe)
+    log.since("2025-08-17T00:00:00+00:00")          # đọc ngược từ cuối, dừng ở mốc
+    log.read_from(seq, limit)                       # theo seq toàn cục (đồng bộ sang core/memory/history_db.py)
+    log.read_all(), log.count(), log.mtime()
+    load_records(path)                              # tool phân tích: log mặc định / thư mục log / file JSON mảng
+Chuyển đổi: decision_history.json (mảng) / decision_history.jsonl cũ được migrate tự động lần đầu
+get_log() thấy log trống; hoặc chạy tay: python -m core.memory.decision_log --migrate
+"""
+from __future__ import annotations
+
+import os
+import io
+import sys
+import json
+import time
+import struct
+import argparse
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+ROOT = Path(__file__).resolve().parents[2]
+DATA_DIR = ROOT / "data"
+LOG_DIR = DATA_DIR / "decision_log"
+LEGACY_FILES = (DATA_DIR / "decision_history.json", DATA_DIR / "decision_history.jsonl")
+
+SEGMENT_BYTES = int(float(os.getenv("CRX_DECISION_SEGMENT_MB", "8")) * 1024 * 1024)
+KEEP_SEGMENTS = int(os.getenv("CRX_DECISION_KEEP_SEGMENTS", "0"))
+
+_OFF = struct.Struct("<Q")
+
+Record = Dict[str, Any]
+
+
+class DecisionLog:
+    def __init__(self, root: Path = LOG_DIR):
+        self.root = Path(root)
+        self._tlock = threading.Lock()
+
+    # ----- đường dẫn / manifest -----
+    def _seg(self, sid: int) -> Path:
+        return self.root / f"seg_{sid:06d}.jsonl"
+
+    def _idx(self, sid: int) -> Path:
+        return self.root / f"seg_{sid:06d}.idx"
+
+    def _manifest(self) -> Dict[str, Any]:
+        try:
+            with open(self.root / "_manifest.json", "r", encoding="utf-8") as f:
+                m = json.load(f)
+            if m.get("segments"):
+                return m
+        except Exception:
+            pass
+        return {"version": 1, "segments": [{"id": 1, "first_seq": 0, "count": 0, "first_ts": None}]}
+
+    def _save_manifest(self, m: Dict[str, Any]) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.root / "_manifest.tmp"
+        tmp.write_text(json.dumps(m, ensure_ascii=False, indent=2), encoding="utf-8")
+        tmp.replace(self.root / "_manifest.json")
+
+    @contextmanager
+    def _locked(self):
+        with self._tlock:
+            fh = None
+            try:
+                self.root.mkdir(parents=True, exist_ok=True)
+                fh = open(self.root / ".lock", "a+b")
+                import fcntl
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+            except Exception:
+                pass  # không có fcntl / FS ảo → chỉ khoá trong process
+            try:
+                yield
+            finally:
+                if fh is not None:
+                    fh.close()
+
+    # ----- offset index -----
+    @staticmethod
+    def _size(path: Path) -> int:
+        try:
+            with open(path, "rb") as f:
+                return f.seek(0, io.SEEK_END)
+        except FileNotFoundError:
+            return 0
+
+    def _ends(self, sid: int) -> List[int]:
+        try:
+            with open(self._idx(sid), "rb") as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return []
+        n = len(raw) // 8
+        return list(struct.unpack(f"<{n}Q", raw[: n * 8]))
+
+    def _last_ends(self, sid: int, k: int) -> List[int]:
+        """k offset cuối (+ offset trước đó nếu có) mà không đọc cả idx."""
+        try:
+            with open(self._idx(sid), "rb") as f:
+                size = f.seek(0, io.SEEK_END) // 8 * 8
+                start = max(0, size - 8 * (k + 1))
+                f.seek(start)
+                raw = f.read(size - start)
+        except FileNotFoundError:
+            return []
+        ends = list(struct.unpack(f"<{len(raw) // 8}Q", raw))
+        return ([0] if start == 0 else []) + ends
+
+    def _repair(self, sid: int) -> int:
+        """Đồng bộ idx với .jsonl (ghi dở do crash). Trả số bản ghi của đoạn."""
+        seg, idx = self._seg(sid), self._idx(sid)
+        data_size = self._size(seg)
+        idx_size = self._size(idx)
+        last = self._last_ends(sid, 0)[-1] if idx_size >= 8 else 0
+        if idx_size % 8 == 0 and last == data_size:
+            return idx_size // 8
+        ends = [e for e in self._ends(sid) if e <= data_size]
+        pos = ends[-1] if ends else 0
+        with open(seg, "rb") as f:
+            f.seek(pos)
+            tail = f.read()
+        for line in tail.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break
+            pos += len(line)
+            ends.append(pos)
+        if pos < data_size:
+            with open(seg, "r+b") as f:
+                f.truncate(pos)
+        with open(idx, "wb") as f:
+            f.write(b"".join(_OFF.pack(e) for e in ends))
+        print(f"[decision_log] repaired {seg.name}: {len(ends)} records")
+        return len(ends)
+
+    # ----- ghi -----
+    def append(self, rec: Union[Record, List[Record]]) -> int:
+        """Append 1 bản ghi hoặc cả lô (universe) – 1 lần ghi. Trả seq của bản ghi cuối."""
+        recs = rec if isinstance(rec, list) else [rec]
+        if not recs:
+            return self.count() - 1
+        lines = [json.dumps(r, ensure_ascii=False, default=str).encode("utf-8") + b"\n" for r in recs]
+        with self._locked():
+            m = self._manifest()
+            cur = m["segments"][-1]
+            sid = cur["id"]
+            n = self._repair(sid)
+            with open(self._seg(sid), "ab") as f:
+                start = f.seek(0, io.SEEK_END)
+                f.write(b"".join(lines))
+            ends, pos = [], start
+            for ln in lines:
+                pos += len(ln)
+                ends.append(pos)
+            with open(self._idx(sid), "ab") as f:
+                f.write(b"".join(_OFF.pack(e) for e in ends))
+            n += len(lines)
+            if n == len(lines) and cur.get("first_ts") is None:
+                cur["first_ts"] = recs[0].get("timestamp") if isinstance(recs[0], dict) else None
+                self._save_manifest(m)
+            if pos >= SEGMENT_BYTES:
+                self._rotate(m, n)
+            return cur["first_seq"] + n - 1
+
+    def _rotate(self, m: Dict[str, Any], count: int) -> None:
+        cur = m["segments"][-1]
+        cur["count"] = count
+        m["segments"].append({"id": cur["id"] + 1, "first_seq": cur["first_seq"] + count, "count": 0,
+                              "first_ts": None})
+        if KEEP_SEGMENTS > 0 and len(m["segments"]) > KEEP_SEGMENTS:
+            for old in m["segments"][:-KEEP_SEGMENTS]:
+                for p in (self._seg(old["id"]), self._idx(old["id"])):
+                    p.unlink(missing_ok=True)
+            m["segments"] = m["segments"][-KEEP_SEGMENTS:]
+        self._save_manifest(m)
+        print(f"[decision_log] rotate → seg_{cur['id'] + 1:06d} (đoạn trước {count} bản ghi)")
+
+    # ----- đọc -----
+    def _read_range(self, sid: int, a: int, b: int) -> List[Record]:
+        """Bản ghi theo khoảng byte [a, b) của đoạn sid."""
+        if b <= a:
+            return []
+        with open(self._seg(sid), "rb") as f:
+            f.seek(a)
+            raw = f.read(b - a)
+        out = []
+        for ln in raw.splitlines():
+            try:
+                out.append(json.loads(ln))
+            except Exception:
+                continue
+        return out
+
+    def _active_ends(self, sid: int, k: int) -> List[int]:
+        ends = self._last_ends(sid, k)
+        if ends and ends[-1] != self._size(self._seg(sid)):
+            with self._locked():
+                self._repair(sid)
+            ends = self._last_ends(sid, k)
+        return ends
+
+    def tail(self, n: int = 1) -> List[Record]:
+        """n bản ghi cuối theo thứ tự thời gian (đọc đúng n dòng qua idx)."""
+        out: List[Record] = []
+        for seg in reversed(self._manifest()["segments"]):
+            need = n - len(out)
+            if need <= 0:
+                break
+            ends = self._active_ends(seg["id"], need)
+            if len(ends) < 2:
+                continue
+            k = min(need, len(ends) - 1)
+            out = self._read_range(seg["id"], ends[-k - 1], ends[-1]) + out
+        return out[-n:] if n > 0 else []
+
+    def last(self) -> Optional[Record]:
+        t = self.tail(1)
+        return t[-1] if t else None
+
+    def tail_group(self, key: str = "timestamp", limit: int = 512) -> List[Record]:
+        """Các bản ghi cuối cùng giá trị `key` với bản ghi cuối (lô universe của tick gần nhất)."""
+        recs = self.tail(min(limit, 16))
+        if len(recs) == 16 and all(r.get(key) == recs[-1].get(key) for r in recs):
+            recs = self.tail(limit)
+        if not recs:
+            return []
+        v = recs[-1].get(key)
+        out = []
+        for r in reversed(recs):
+            if not isinstance(r, dict) or r.get(key) != v:
+                break
+            out.append(r)
+        return out[::-1]
+
+    def iter_reverse(self, chunk: int = 256) -> Iterator[Record]:
+        """Duyệt từ mới → cũ theo khối `chunk` bản ghi (dừng sớm được, không đọc cả log)."""
+        for seg in reversed(self._manifest()["segments"]):
+            sid = seg["id"]
+            ends = [0] + self._ends(sid)
+            hi = len(ends) - 1
+            while hi > 0:
+                lo = max(0, hi - chunk)
+                for r in reversed(self._read_range(sid, ends[lo], ends[hi])):
+                    yield r
+                hi = lo
+
+    def since(self, ts_iso: str, key: str = "timestamp") -> List[Record]:
+        """Bản ghi có key ≥ ts_iso (chuỗi ISO UTC so sánh được theo thứ tự), thứ tự thời gian."""
+        out = []
+        for r in self.iter_reverse():
+            if str(r.get(key) or "") < ts_iso:
+                break
+            out.append(r)
+        return out[::-1]
+
+    def read_from(self, seq: int, limit: int = 5000) -> Tuple[int, List[Record]]:
+        """(seq bản ghi đầu, tối đa `limit` bản ghi từ seq toàn cục `seq`); seq đã bị xoá theo KEEP → từ đoạn cũ nhất còn giữ."""
+        out: List[Record] = []
+        first = None
+        for seg in self._manifest()["segments"]:
+            if len(out) >= limit:
+                break
+            ends = [0] + self._ends(seg["id"])
+            n = len(ends) - 1
+            i = 0 if first is not None else max(0, seq - seg["first_seq"])
+            if i >= n:
+                continue
+            if first is None:
+                first = seg["first_seq"] + i
+            j = min(n, i + limit - len(out))
+            out += self._read_range(seg["id"], ends[i], ends[j])
+        return (first if first is not None else seq), out
+
+    def read_all(self) -> List[Record]:
+        out: List[Record] = []
+        for seg in self._manifest()["segments"]:
+            ends = self._ends(seg["id"])
+            if ends:
+                out += self._read_range(seg["id"], 0, ends[-1])
+        return out
+
+    def count(self) -> int:
+        seg = self._manifest()["segments"][-1]
+        return seg["first_seq"] + self._size(self._idx(seg["id"])) // 8
+
+    def mtime(self) -> Optional[float]:
+        try:
+            return os.path.getmtime(self._seg(self._manifest()["segments"][-1]["id"]))
+        except Exception:
+            return None
+
+    def empty(self) -> bool:
+        return self.count() == 0
+
+    # ----- migrate -----
+    def migrate(self, sources=LEGACY_FILES, batch: int = 5000) -> int:
+        """decision_history.json (mảng hoặc NDJSON) / .jsonl → log; file cũ đổi tên *.migrated. Trả số bản ghi."""
+        total = 0
+        for src in sources:
+            src = Path(src)
+            if not src.exists():
+                continue
+            try:
+                recs = _load_legacy(src)
+            except Exception as e:
+                print(f"[decision_log] WARN: không đọc được {src}: {e}")
+                continue
+            recs = [r for r in recs if isinstance(r, dict)]
+            for i in range(0, len(recs), batch):
+                self.append(recs[i: i + batch])
+            total += len(recs)
+            try:
+                src.replace(src.with_name(src.name + ".migrated"))
+            except Exception as e:
+                print(f"[decision_log] WARN: không đổi tên {src}: {e}")
+            print(f"[decision_log] migrated {len(recs)} records from {src.name}")
+        return total
+
+
+def _load_legacy(path: Path) -> List[Record]:
+    txt = path.read_text(encoding="utf-8", errors="ignore").strip()
+    if not txt:
+        return []
+    try:
+        obj = json.loads(txt)
+        return obj if isinstance(obj, list) else [obj]
+    except Exception:
+        rows = []
+        for ln in txt.splitlines():
+            try:
+                rows.append(json.loads(ln))
+            except Exception:
+                continue
+        return rows
+
+
+_LOG: Optional[DecisionLog] = None
+
+
+def get_log() -> DecisionLog:
+    """Log dùng chung; lần đầu thấy log trống mà còn file cũ → migrate tự động."""
+    global _LOG
+    if _LOG is None:
+        log = DecisionLog()
+        try:
+            if any(p.exists() for p in LEGACY_FILES) and log.empty():
+                log.migrate()
+        except Exception as e:
+            print(f"[decision_log] WARN: migrate lỗi: {e}")
+        _LOG = log
+    return _LOG
+
+
+def append(rec: Union[Record, List[Record]]) -> int:
+    return get_log().append(rec)
+
+
+def last() -> Optional[Record]:
+    return get_log().last()
+
+
+def load_records(path: Optional[Union[str, Path]] = None) -> Any:
+    """Bản ghi cho tool phân tích: không truyền path hoặc path là thư mục decision log → read_all();
+    path là file → JSON mảng (export cũ / decision_history.json)."""
+    if not path or os.path.isdir(path):
+        return DecisionLog(path or LOG_DIR).read_all()
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Decision log (append-only, chia đoạn)")
+    ap.add_argument("--migrate", action="store_true", help="chuyển decision_history.json/.jsonl cũ sang log")
+    ap.add_argument("--tail", type=int, default=0, help="in n bản ghi cuối")
+    ap.add_argument("--export", default="", help="xuất toàn bộ log ra 1 file JSON mảng (cho tool cũ)")
+    a = ap.parse_args()
+    log = DecisionLog()
+    if a.migrate:
+        t0 = time.perf_counter()
+        n = log.migrate()
+        print(f"[decision_log] ✅ migrate {n} bản ghi ({time.perf_counter() - t0:.2f}s)")
+    for r in log.tail(a.tail) if a.tail else []:
+        print(json.dumps(r, ensure_ascii=False))
+    if a.export:
+        Path(a.export).write_text(json.dumps(log.read_all(), ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"[decision_log] ✅ export → {a.export}")
+    m = log._manifest()
+    print(f"[decision_log] {log.count()} bản ghi, {len(m['segments'])} đoạn tại {log.root}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
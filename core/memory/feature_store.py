@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+# core/memory/feature_store.py
+"""
+Feature store (feature_flags: memory_logging.feature_store): mỗi chuỗi chỉ báo theo
+(symbol, timeframe, indicator, params) được tính 1 lần trên toàn bộ lịch sử kho nến rồi dùng chung
+cho strategies / risk_intel / decision_maker.
+- Tính lần đầu: bản pandas vector hoá batch_* của core.indicators.streaming.
+- Nến mới: nối thêm vào chuỗi bằng state streaming O(1)/nến cùng định nghĩa (make(kind, **params)) –
+  chỉ tốn công cho các dòng mới, không tính lại cả lịch sử. State dựng 1 lần khi cần nối lần đầu.
+- Cache 2 tầng: RAM (dict) + đĩa data/features/<SYMBOL>_<tf>/<indicator>_<hash>[.<col>].f8 + _index.json
+  (kèm state streaming → sau restart vẫn nối tiếp được, file .f8 chỉ append phần mới).
+- Vô hiệu hoá: dấu (size, mtime) của cột close_time trong candle_store (1 lần stat) – không đổi → đọc lại
+  gần như miễn phí; đổi → nối thêm nếu phần đầu kho còn nguyên (cùng open_time dòng đầu, cùng close_time
+  dòng cuối đã phủ), cắt retention/kho dựng lại → tính lại toàn bộ.
+- Flag tắt (mặc định tới phase B) → chỉ cache RAM, không ghi đĩa. CRX_FEATURE_STORE=1/0 ép bật/tắt.
+- Backtest/optimizer không đi qua đây: chúng chạy trên DataFrame bất kỳ (nến giả lập, đoạn walk-forward
+  trong shared memory của process con) chứ không phải kho nến sống → giữ chuỗi vector hoá riêng.
+
+Dùng:
+    fs = get_feature_store()
+    fs.get("BTCUSDT", "15m", "sma", n=20)           # np.ndarray căn theo dòng kho nến
+    fs.get("BTCUSDT", "15m", "bollinger", n=20)     # {"mid","upper","lower","std"} → ndarray
+    fs.values("BTCUSDT", "15m")                     # dict giá trị cuối như IndicatorEngine.values()
+"""
+from __future__ import annotations
+
+import os
+import json
+import hashlib
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+
+import numpy as np
+
+from core.collector.candle_store import get_store, key as store_key
+from core.indicators.streaming import BATCH, DEFAULT_SPECS, Indicator, make
+
+FEATURE_DIR = Path("data") / "features"
+FLAG_PATH = "modules.memory_logging.feature_store.enabled"
+
+Series = Union[np.ndarray, Dict[str, np.ndarray]]
+_CANDLE_COLS = ("open_time", "close_time", "open", "high", "low", "close", "volume")
+
+
+def persist_enabled() -> bool:
+    env = os.getenv("CRX_FEATURE_STORE", "").strip().lower()
+    if env:
+        return env in ("1", "true", "yes", "on")
+    try:
+        from configs.feature_flags_loader import get_flags
+        return get_flags().is_on(FLAG_PATH, False)
+    except Exception:
+        return False
+
+
+def feature_id(indicator: str, params: Dict[str, Any]) -> str:
+    raw = json.dumps(params, sort_keys=True, default=str)
+    return f"{indicator}_{hashlib.sha1(raw.encode()).hexdigest()[:10]}"
+
+
+def _rows(v, lo: int, hi: int) -> Iterator[Dict[str, Any]]:
+    """Dòng [lo, hi) của CandleView dạng dict nến (như IndicatorEngine.update_view)."""
+    cols = {c: getattr(v, c)[lo:hi].tolist() for c in _CANDLE_COLS}
+    for i in range(hi - lo):
+        yield {c: col[i] for c, col in cols.items()}
+
+
+@dataclass
+class _Entry:
+    """Chuỗi đã tính cho 1 feature + mốc phần lịch sử kho đã phủ (để nối thêm thay vì tính lại)."""
+    stamp: Tuple[int, int]
+    rows: int
+    first_open: int                      # open_time dòng đầu kho lúc tính
+    last_close: int                      # close_time dòng rows-1
+    cols: Dict[str, np.ndarray]          # "" = chuỗi 1 cột; len(mảng) ≥ rows (dư chỗ cho nến mới)
+    ind: Optional[Indicator] = None      # state streaming sau dòng rows-1 (None → dựng khi cần nối)
+
+    def data(self) -> Series:
+        if "" in self.cols:
+            return self.cols[""][:self.rows]
+        return {c: a[:self.rows] for c, a in self.cols.items()}
+
+    def covers(self, v) -> bool:
+        """Kho hiện tại = phần đã phủ + (có thể) nến mới ở đuôi."""
+        return (v is not None and self.rows > 0 and len(v) >= self.rows
+                and int(v.open_time[0]) == self.first_open and int(v.close_time[self.rows - 1]) == self.last_close)
+
+
+class FeatureStore:
+    def __init__(self, root: Path = FEATURE_DIR, candles=None, persist: Optional[bool] = None):
+        self.root = Path(root)
+        self.candles = candles or get_store()
+        self.persist = persist_enabled() if persist is None else persist
+        self._lock = threading.Lock()
+        self._mem: Dict[Tuple[str, str, str], _Entry] = {}
+        self.hits = self.misses = self.extends = 0
+
+    # ----- đọc -----
+    def get(self, symbol: str, tf: str, indicator: str, last: Optional[int] = None, **params) -> Series:
+        """Chuỗi chỉ báo cho toàn bộ nến trong kho (last → chỉ last dòng cuối). Dict nếu chỉ báo nhiều cột."""
+        sym = symbol.upper()
+        fid = feature_id(indicator, params)
+        k = (sym, tf, fid)
+        stamp = self.candles.stamp(sym, tf)
+        e = self._mem.get(k)
+        if e is None or e.stamp != stamp:
+            with self._lock:
+                e = self._mem.get(k)
+                if e is None or e.stamp != stamp:
+                    e = self._refresh(sym, tf, fid, indicator, params, stamp, e)
+                    self._mem[k] = e
+                else:
+                    self.hits += 1
+        else:
+            self.hits += 1
+        data = e.data()
+        if last is None:
+            return data
+        if isinstance(data, dict):
+            return {c: a[-last:] for c, a in data.items()}
+        return data[-last:]
+
+    def latest(self, symbol: str, tf: str, indicator: str, **params) -> Union[float, Dict[str, float]]:
+        s = self.get(symbol, tf, indicator, last=1, **params)
+        if isinstance(s, dict):
+            return {c: (float(a[-1]) if len(a) else float("nan")) for c, a in s.items()}
+        return float(s[-1]) if len(s) else float("nan")
+
+    def values(self, symbol: str, tf: str, specs=None) -> Dict[str, float]:
+        """Giá trị cuối của bộ chỉ báo (mặc định DEFAULT_SPECS) – cùng khoá với IndicatorEngine.values()."""
+        v = self.candles.view(symbol, tf, n=1)
+        total = self.candles.rows(symbol, tf)
+        out: Dict[str, float] = {"n": total}
+        if v is None or not len(v):
+            return out
+        out.update({c: float(getattr(v, c)[-1]) for c in ("open", "high", "low", "close", "volume")})
+        for name, (kind, p) in (specs or DEFAULT_SPECS).items():
+            val = self.latest(symbol, tf, kind, **p)
+            if isinstance(val, dict):
+                out.update({f"{name}_{c}": x for c, x in val.items()})
+            else:
+                out[name] = val
+        return out
+
+    def invalidate(self, symbol: Optional[str] = None, tf: Optional[str] = None) -> None:
+        with self._lock:
+            self._mem = {k: v for k, v in self._mem.items()
+                         if not ((symbol is None or k[0] == symbol.upper()) and (tf is None or k[1] == tf))}
+
+    # ----- tính -----
+    def _refresh(self, sym: str, tf: str, fid: str, indicator: str, params: Dict[str, Any],
+                 stamp: Tuple[int, int], base: Optional[_Entry]) -> _Entry:
+        """Kho đổi dấu → nối thêm nến mới vào chuỗi cũ (RAM, hoặc đĩa sau restart); không nối được → tính lại."""
+        if indicator not in BATCH:
+            raise KeyError(f"indicator không hỗ trợ: {indicator} (có: {', '.join(BATCH)})")
+        v = self.candles.view(sym, tf)
+        if base is None and self.persist:
+            base = self._load_disk(sym, tf, fid, indicator, params)
+        if base is not None and base.covers(v):
+            saved = base.rows
+            try:
+                if len(v) > base.rows:
+                    self.extends += 1
+                    self._extend(base, v, indicator, params)
+                else:
+                    self.hits += 1
+                base.stamp = stamp
+                if self.persist and base.rows > saved:
+                    self._save_disk(sym, tf, fid, base, indicator, params, saved)
+                return base
+            except Exception as ex:  # state có thể đã đi quá phần chuỗi đã ghi → bỏ, tính lại
+                print(f"[feature_store] WARN: nối {sym}_{tf}/{fid} lỗi ({ex}) → tính lại toàn bộ")
+        self.misses += 1
+        e = self._compute(v, stamp, indicator, params)
+        if self.persist:
+            self._save_disk(sym, tf, fid, e, indicator, params, 0)
+        return e
+
+    def _compute(self, v, stamp: Tuple[int, int], indicator: str, params: Dict[str, Any]) -> _Entry:
+        if v is None or not len(v):
+            return _Entry(stamp, 0, 0, 0, {"": np.empty(0)})
+        out = BATCH[indicator](v.frame(), **params)
+        if hasattr(out, "columns"):
+            cols = {c: out[c].to_numpy(dtype=np.float64) for c in out.columns}
+        else:
+            cols = {"": out.to_numpy(dtype=np.float64)}
+        return _Entry(stamp, len(v), int(v.open_time[0]), int(v.close_time[-1]), cols)
+
+    def _extend(self, e: _Entry, v, indicator: str, params: Dict[str, Any]) -> None:
+        """Nối dòng [e.rows, len(v)) bằng chỉ báo streaming; O(số nến mới) (+1 lần dựng state nếu chưa có)."""
+        if e.ind is None:
+            e.ind = make(indicator, **params)
+            for c in _rows(v, 0, e.rows):
+                e.ind.update(c)
+        n = len(v)
+        vals = []
+        for c in _rows(v, e.rows, n):
+            e.ind.update(c)
+            vals.append(e.ind.value)
+        for col, arr in list(e.cols.items()):
+            if len(arr) < n:
+                # mảng từ batch/memmap (vừa khít, có thể read-only) → chép sang buffer dư chỗ, lớn dần theo cấp số
+                buf = np.empty(max(n + 64, e.rows + e.rows // 4), dtype=np.float64)
+                buf[:e.rows] = arr[:e.rows]
+                e.cols[col] = arr = buf
+            arr[e.rows:n] = [x[col] for x in vals] if col else vals
+        e.rows = n
+        e.last_close = int(v.close_time[n - 1])
+
+    # ----- đĩa -----
+    def _dir(self, sym: str, tf: str) -> Path:
+        return self.root / store_key(sym, tf)
+
+    def _index(self, sym: str, tf: str) -> Dict[str, Any]:
+        try:
+            return json.loads((self._dir(sym, tf) / "_index.json").read_text(encoding="utf-8"))
+        except Exception:
+            return {}
+
+    def _load_disk(self, sym: str, tf: str, fid: str, indicator: str, params: Dict[str, Any]) -> Optional[_Entry]:
+        meta = self._index(sym, tf).get(fid)
+        if not meta or not meta.get("rows") or "first_open" not in meta:
+            return None
+        try:
+            d = self._dir(sym, tf)
+            rows = int(meta["rows"])
+            names = meta.get("cols") or [""]
+            cols = {c: np.memmap(d / (f"{fid}.{c}.f8" if c else f"{fid}.f8"), dtype=np.float64, mode="r", shape=(rows,))
+                    for c in names}
+            ind = None
+            if meta.get("state") is not None:
+                ind = make(indicator, **params)
+                ind.load(meta["state"])
+            return _Entry(tuple(meta.get("stamp", (0, 0))), rows, int(meta["first_open"]), int(meta["last_close"]),
+                          cols, ind)
+        except Exception:
+            return None
+
+    def _save_disk(self, sym: str, tf: str, fid: str, e: _Entry, indicator: str, params: Dict[str, Any],
+                   saved: int) -> None:
+        """Ghi chuỗi + state. saved > 0 và đĩa đang giữ đúng saved dòng đầu → chỉ append phần mới."""
+        try:
+            d = self._dir(sym, tf)
+            d.mkdir(parents=True, exist_ok=True)
+            idx = self._index(sym, tf)
+            meta = idx.get(fid) or {}
+            append = saved > 0 and meta.get("rows") == saved and meta.get("first_open") == e.first_open
+            for c, arr in e.cols.items():
+                p = d / (f"{fid}.{c}.f8" if c else f"{fid}.f8")
+                if append:
+                    with p.open("r+b") as f:
+                        f.truncate(saved * 8)  # bỏ phần ghi dở nếu lần trước chết giữa chừng
+                        f.seek(0, os.SEEK_END)
+                        f.write(np.ascontiguousarray(arr[saved:e.rows], dtype=np.float64).tobytes())
+                else:
+                    tmp = p.with_suffix(".tmp")
+                    tmp.write_bytes(np.ascontiguousarray(arr[:e.rows], dtype=np.float64).tobytes())
+                    tmp.replace(p)
+            idx[fid] = {"indicator": indicator, "params": params, "stamp": list(e.stamp), "rows": e.rows,
+                        "first_open": e.first_open, "last_close": e.last_close,
+                        "cols": [c for c in e.cols if c] or None,
+                        "state": e.ind.state() if e.ind is not None else None}
+            tmp = d / "_index.tmp"
+            tmp.write_text(json.dumps(idx, ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+            tmp.replace(d / "_index.json")
+        except Exception as ex:
+            print(f"[feature_store] WARN: không ghi được {sym}_{tf}/{fid}: {ex}")
+
+
+_FS: Optional[FeatureStore] = None
+
+
+def get_feature_store() -> FeatureStore:
+    global _FS
+    if _FS is None:
+        _FS = FeatureStore()
+    return _FS
@@ -0,0 +1,440 @@
+# -*- coding: utf-8 -*-
+# core/memory/history_db.py
+"""
+Kho lịch sử quan hệ có chỉ mục cho dashboard/tool: decisions, trades, income (data/history.db, SQLite WAL).
+Thay cho việc mỗi tool tự nạp rồi quét toàn bộ JSON/JSONL để lọc theo thời gian/symbol.
+- Mọi bảng có ts_ms (int64 ms UTC) + symbol, chỉ mục (symbol, ts_ms) và (ts_ms)
+  → "24h qua", "tuần này", "symbol X" là range scan theo chỉ mục, không phụ thuộc độ dài lịch sử.
+- decisions: chỉ mục của decision log (core/memory/decision_log.py, nguồn gốc); đồng bộ theo seq toàn cục
+  (khoá chính) → bắt kịp lười ở mỗi truy vấn, idempotent, không thêm ghi SQLite vào tick.
+- trades : trade_logger.log_trade ghi thêm 1 dòng (giữ data/trade_history.json cho tool cũ).
+- income : pnl_sync append tăng dần (insert_income bỏ qua (tranId, incomeType) đã có); income_agg cho tổng dồn.
+- candles: đã có kho cột memmap (core/collector/candle_store.py) – candles() chỉ cắt theo khoảng thời gian.
+Lần đầu thấy bảng trống → nhập trade_history.json / pnl_income_raw.json cũ (không đổi tên, tool cũ vẫn đọc).
+
+Truy vấn (since/until nhận datetime, chuỗi ISO, ms epoch hoặc None):
+    db = get_db()
+    db.decisions(since=now - 24h, symbol="BTCUSDT")       # bản ghi gốc, thứ tự thời gian
+    db.count_decisions(since=today, decisions=("BUY", "SELL"))
+    db.trades(since=week_start, until=week_end, status="FILLED")
+    db.income(since=d0, until=d1, symbols=["BTCUSDT"])     # dạng bản ghi /fapi/v1/income
+    db.income_bounds(), db.income_symbols(), db.candles("BTCUSDT", "15m", since=...)
+CLI: python -m core.memory.history_db [--sync] [--stats]
+"""
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+ROOT = Path(__file__).resolve().parents[2]
+DATA_DIR = ROOT / "data"
+HISTORY_DB = Path(os.getenv("CRX_HISTORY_DB", str(DATA_DIR / "history.db")))
+BUSY_MS = int(os.getenv("CRX_STATE_BUSY_MS", "5000"))
+LEGACY_TRADES = DATA_DIR / "trade_history.json"
+LEGACY_INCOME = DATA_DIR / "pnl_income_raw.json"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS decisions (
+    seq        INTEGER PRIMARY KEY,
+    ts_ms      INTEGER,
+    symbol     TEXT,
+    decision   TEXT,
+    confidence REAL,
+    rec        TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_decisions_sym_ts ON decisions(symbol, ts_ms);
+CREATE INDEX IF NOT EXISTS ix_decisions_ts ON decisions(ts_ms);
+CREATE TABLE IF NOT EXISTS trades (
+    id       INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts_ms    INTEGER,
+    symbol   TEXT,
+    side     TEXT,
+    status   TEXT,
+    qty      REAL,
+    price    REAL,
+    order_id TEXT,
+    rec      TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_trades_sym_ts ON trades(symbol, ts_ms);
+CREATE INDEX IF NOT EXISTS ix_trades_ts ON trades(ts_ms);
+CREATE TABLE IF NOT EXISTS income (
+    tran_id     TEXT NOT NULL,
+    income_type TEXT NOT NULL,
+    ts_ms       INTEGER,
+    symbol      TEXT,
+    income      REAL,
+    asset       TEXT,
+    rec         TEXT NOT NULL,
+    PRIMARY KEY (tran_id, income_type)
+);
+CREATE INDEX IF NOT EXISTS ix_income_sym_ts ON income(symbol, ts_ms);
+CREATE INDEX IF NOT EXISTS ix_income_ts ON income(ts_ms);
+CREATE TABLE IF NOT EXISTS meta (
+    k TEXT PRIMARY KEY,
+    v TEXT
+);
+"""
+
+Record = Dict[str, Any]
+TimeLike = Any   # datetime | date | str ISO | int/float epoch (s hoặc ms) | None
+
+
+def to_ms(x: TimeLike) -> Optional[int]:
+    """Mốc thời gian bất kỳ → ms epoch UTC (chuỗi/naive datetime không có tz coi là UTC). Lỗi → None."""
+    if x is None or x == "":
+        return None
+    try:
+        if isinstance(x, bool):
+            return None
+        if isinstance(x, (int, float)):
+            return int(x if x > 1e12 else x * 1000)
+        if isinstance(x, datetime):
+            dt = x
+        elif isinstance(x, date):
+            dt = datetime(x.year, x.month, x.day)
+        else:
+            s = str(x).strip()
+            if s.lstrip("-").isdigit():
+                return to_ms(int(s))
+            dt = datetime.fromisoformat(s.replace("Z", "+00:00"))
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return int(dt.timestamp() * 1000)
+    except Exception:
+        return None
+
+
+def _f(x: Any) -> Optional[float]:
+    try:
+        return float(x)
+    except Exception:
+        return None
+
+
+def _dumps(r: Record) -> str:
+    return json.dumps(r, ensure_ascii=False, default=str)
+
+
+def _where(since: TimeLike, until: TimeLike, symbol: Any, col: str = "symbol") -> Tuple[str, List[Any]]:
+    """WHERE theo symbol (chuỗi hoặc danh sách) + [since, until) trên ts_ms."""
+    conds, args = [], []
+    if symbol:
+        syms = [symbol] if isinstance(symbol, str) else list(symbol)
+        conds.append(f"{col} IN ({','.join('?' * len(syms))})")
+        args += [str(s).upper() for s in syms]
+    a, b = to_ms(since), to_ms(until)
+    if a is not None:
+        conds.append("ts_ms >= ?")
+        args.append(a)
+    if b is not None:
+        conds.append("ts_ms < ?")
+        args.append(b)
+    return (" WHERE " + " AND ".join(conds)) if conds else "", args
+
+
+class HistoryDB:
+    def __init__(self, path: Any = HISTORY_DB, decision_log: Any = None):
+        self.path = str(path)
+        self._local = threading.local()
+        self._shared_conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+        self._log = decision_log      # None → core.memory.decision_log.get_log()
+
+    # ----- connection -----
+    def _conn(self) -> sqlite3.Connection:
+        if self.path == ":memory:":
+            with self._lock:
+                if self._shared_conn is None:
+                    self._shared_conn = self._open()
+                return self._shared_conn
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._open()
+        return conn
+
+    def _open(self) -> sqlite3.Connection:
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=BUSY_MS / 1000.0, isolation_level=None,
+                               check_same_thread=self.path != ":memory:")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_MS}")
+        if self.path != ":memory:":
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def _write(self, sql: str, rows: Iterable[Sequence[Any]]) -> int:
+        rows = list(rows)
+        if not rows:
+            return 0
+        conn = self._conn()
+        with self._lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                cur = conn.executemany(sql, rows)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return cur.rowcount
+
+    def _query(self, sql: str, args: Sequence[Any] = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn().execute(sql, args).fetchall()
+
+    def _meta(self, k: str, default: Optional[str] = None) -> Optional[str]:
+        row = self._query("SELECT v FROM meta WHERE k=?", (k,))
+        return row[0][0] if row else default
+
+    def _set_meta(self, k: str, v: Any) -> None:
+        self._write("INSERT OR REPLACE INTO meta(k, v) VALUES (?, ?)", [(k, str(v))])
+
+    # ----- decisions (đồng bộ từ decision log) -----
+    def _decision_log(self):
+        if self._log is None:
+            from core.memory.decision_log import get_log
+            return get_log()
+        return self._log
+
+    def sync_decisions(self, batch: int = 5000) -> int:
+        """Nạp bản ghi mới của decision log (seq > seq đã nạp). O(bản ghi mới); trả số bản ghi nạp."""
+        try:
+            log = self._decision_log()
+            total = log.count()
+        except Exception as e:
+            print(f"[history_db] WARN: không đọc được decision log: {e}")
+            return 0
+        row = self._query("SELECT MAX(seq) FROM decisions")
+        nxt = (row[0][0] + 1) if row and row[0][0] is not None else 0
+        if nxt > total:          # log bị xoá/làm lại → làm lại chỉ mục
+            self._write("DELETE FROM decisions", [()])
+            nxt = 0
+        n = 0
+        while nxt < total:
+            first, recs = log.read_from(nxt, batch)
+            if not recs:
+                break
+            self._write(
+                "INSERT OR REPLACE INTO decisions(seq, ts_ms, symbol, decision, confidence, rec) VALUES (?,?,?,?,?,?)",
+                [(first + i, to_ms(r.get("timestamp") or r.get("time")), (r.get("symbol") or None),
+                  r.get("decision"), _f(r.get("confidence")), _dumps(r)) for i, r in enumerate(recs)])
+            n += len(recs)
+            nxt = first + len(recs)
+        return n
+
+    def decisions(self, since: TimeLike = None, until: TimeLike = None, symbol: Any = None,
+                  decisions: Optional[Sequence[str]] = None, limit: Optional[int] = None,
+                  newest_first: bool = False) -> List[Record]:
+        """Bản ghi quyết định gốc trong [since, until) / symbol; limit lấy N bản mới nhất."""
+        self.sync_decisions()
+        w, args = _where(since, until, symbol)
+        if decisions:
+            w += (" AND " if w else " WHERE ") + f"decision IN ({','.join('?' * len(decisions))})"
+            args += list(decisions)
+        sql = f"SELECT rec FROM decisions{w} ORDER BY seq DESC"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        rows = [json.loads(r[0]) for r in self._query(sql, args)]
+        return rows if newest_first else rows[::-1]
+
+    def count_decisions(self, since: TimeLike = None, until: TimeLike = None, symbol: Any = None,
+                        decisions: Optional[Sequence[str]] = None) -> int:
+        self.sync_decisions()
+        w, args = _where(since, until, symbol)
+        if decisions:
+            w += (" AND " if w else " WHERE ") + f"decision IN ({','.join('?' * len(decisions))})"
+            args += list(decisions)
+        return int(self._query(f"SELECT COUNT(*) FROM decisions{w}", args)[0][0])
+
+    def decision_times(self, since: TimeLike = None, until: TimeLike = None, symbol: Any = None) -> List[int]:
+        """ts_ms các quyết định (tăng dần) – chỉ đọc chỉ mục, không parse bản ghi."""
+        self.sync_decisions()
+        w, args = _where(since, until, symbol)
+        w += (" AND " if w else " WHERE ") + "ts_ms IS NOT NULL"
+        return [r[0] for r in self._query(f"SELECT ts_ms FROM decisions{w} ORDER BY ts_ms", args)]
+
+    # ----- trades -----
+    def add_trades(self, events: Iterable[Record]) -> int:
+        self._ensure_legacy()     # nhập trade_history.json cũ TRƯỚC dòng mới đầu tiên
+        rows = []
+        for e in events:
+            if not isinstance(e, dict):
+                continue
+            qty = e.get("cumQty") or e.get("executedQty") or e.get("executed_qty") or e.get("qty") or e.get("quantity")
+            px = e.get("avgPrice") or e.get("avg_price") or e.get("fill_price") or e.get("price")
+            rows.append((to_ms(e.get("timestamp") or e.get("ts") or e.get("time") or e.get("updateTime")),
+                         str(e.get("symbol") or e.get("pair") or "").upper() or None,
+                         str(e.get("side") or e.get("action") or "").upper() or None,
+                         str(e.get("status") or "").upper() or None,
+                         _f(qty), _f(px), str(e.get("orderId") or e.get("order_id") or "") or None, _dumps(e)))
+        return self._write(
+            "INSERT INTO trades(ts_ms, symbol, side, status, qty, price, order_id, rec) VALUES (?,?,?,?,?,?,?,?)", rows)
+
+    def trades(self, since: TimeLike = None, until: TimeLike = None, symbol: Any = None,
+               status: Optional[str] = None) -> List[Record]:
+        """Sự kiện lệnh gốc (như trade_history.json) trong [since, until) / symbol, thứ tự thời gian."""
+        self._ensure_legacy()
+        w, args = _where(since, until, symbol)
+        if status:
+            w += (" AND " if w else " WHERE ") + "status = ?"
+            args.append(status.upper())
+        return [json.loads(r[0]) for r in self._query(f"SELECT rec FROM trades{w} ORDER BY ts_ms, id", args)]
+
+    # ----- income (REALIZED_PNL, FUNDING_FEE, ...) -----
+    @staticmethod
+    def _income_row(it: Record) -> tuple:
+        tid = it.get("tranId") or f"{it.get('time')}:{it.get('symbol')}:{it.get('income')}"
+        return (str(tid), str(it.get("incomeType") or ""), to_ms(it.get("time")),
+                str(it.get("symbol") or "").upper() or None, _f(it.get("income")), it.get("asset"), _dumps(it))
+
+    def upsert_income(self, items: Iterable[Record]) -> int:
+        rows = [self._income_row(it) for it in items if isinstance(it, dict)]
+        return self._write(
+            "INSERT OR REPLACE INTO income(tran_id, income_type, ts_ms, symbol, income, asset, rec) "
+            "VALUES (?,?,?,?,?,?,?)", rows)
+
+    def insert_income(self, items: Iterable[Record]) -> List[Record]:
+        """Append income mới (bỏ qua (tranId, incomeType) đã có) trong 1 transaction. Trả các bản ghi thực sự mới."""
+        self._ensure_legacy()
+        items = [it for it in items if isinstance(it, dict)]
+        if not items:
+            return []
+        new: List[Record] = []
+        conn = self._conn()
+        with self._lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for it in items:
+                    cur = conn.execute(
+                        "INSERT OR IGNORE INTO income(tran_id, income_type, ts_ms, symbol, income, asset, rec) "
+                        "VALUES (?,?,?,?,?,?,?)", self._income_row(it))
+                    if cur.rowcount:
+                        new.append(it)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return new
+
+    def income_agg(self, since: TimeLike = None, until: TimeLike = None, symbols: Any = None,
+                   income_type: str = "REALIZED_PNL") -> Dict[str, Any]:
+        """{sum, wins, losses, last_ms} của income trong [since, until) – SUM/COUNT trên chỉ mục, không nạp bản ghi."""
+        self._ensure_legacy()
+        w, args = _where(since, until, symbols)
+        w += (" AND " if w else " WHERE ") + "income_type = ?"
+        args.append(income_type)
+        r = self._query("SELECT COALESCE(SUM(income), 0), COALESCE(SUM(income > 0), 0), "
+                        f"COALESCE(SUM(income < 0), 0), MAX(ts_ms) FROM income{w}", args)[0]
+        return {"sum": float(r[0]), "wins": int(r[1]), "losses": int(r[2]), "last_ms": r[3]}
+
+    def income(self, since: TimeLike = None, until: TimeLike = None, symbols: Any = None,
+               income_type: Optional[str] = "REALIZED_PNL") -> List[Record]:
+        self._ensure_legacy()
+        w, args = _where(since, until, symbols)
+        if income_type:
+            w += (" AND " if w else " WHERE ") + "income_type = ?"
+            args.append(income_type)
+        return [json.loads(r[0]) for r in self._query(f"SELECT rec FROM income{w} ORDER BY ts_ms", args)]
+
+    def income_bounds(self, income_type: str = "REALIZED_PNL") -> Tuple[Optional[int], Optional[int], int]:
+        """(ts_ms nhỏ nhất, lớn nhất, số bản ghi) của loại income."""
+        self._ensure_legacy()
+        r = self._query("SELECT MIN(ts_ms), MAX(ts_ms), COUNT(*) FROM income WHERE income_type=?", (income_type,))[0]
+        return r[0], r[1], int(r[2])
+
+    def income_symbols(self, income_type: str = "REALIZED_PNL") -> List[str]:
+        self._ensure_legacy()
+        return [r[0] for r in self._query(
+            "SELECT DISTINCT symbol FROM income WHERE income_type=? AND symbol IS NOT NULL ORDER BY symbol",
+            (income_type,))]
+
+    # ----- candles (ủy quyền kho cột memmap) -----
+    @staticmethod
+    def candles(symbol: str, tf: str, since: TimeLike = None, until: TimeLike = None):
+        """DataFrame nến [since, until) theo close_time từ candle_store (searchsorted trên memmap)."""
+        from core.collector.candle_store import get_store
+        df = get_store().read(symbol, tf, since_ms=to_ms(since))
+        b = to_ms(until)
+        if b is not None and not df.empty:
+            df = df.iloc[: int(df["close_time"].searchsorted(b, side="left"))]
+        return df
+
+    # ----- nhập dữ liệu cũ -----
+    def _ensure_legacy(self) -> None:
+        if getattr(self, "_legacy_done", False):
+            return
+        self._legacy_done = True
+        try:
+            self.import_legacy()
+        except Exception as e:
+            print(f"[history_db] WARN: nhập dữ liệu cũ lỗi: {e}")
+
+    def import_legacy(self) -> Dict[str, int]:
+        """trade_history.json / pnl_income_raw.json → bảng tương ứng, 1 lần (đánh dấu trong meta)."""
+        out = {}
+        for name, path, fn in (("trades", LEGACY_TRADES, self.add_trades),
+                               ("income", LEGACY_INCOME, self.upsert_income)):
+            if self._meta(f"legacy_{name}") or not path.exists():
+                continue
+            try:
+                obj = json.loads(path.read_text(encoding="utf-8") or "[]")
+            except Exception as e:
+                print(f"[history_db] WARN: không đọc được {path.name}: {e}")
+                continue
+            if isinstance(obj, dict):   # trade_history dạng dict → list dài nhất
+                obj = max((v for v in obj.values() if isinstance(v, list)), key=len, default=[])
+            has = self._query(f"SELECT COUNT(*) FROM {name}")[0][0]
+            out[name] = fn(obj if isinstance(obj, list) else []) if not has or name == "income" else 0
+            self._set_meta(f"legacy_{name}", int(time.time()))
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        self.sync_decisions()
+        self._ensure_legacy()
+        out: Dict[str, Any] = {"path": self.path}
+        for t in ("decisions", "trades", "income"):
+            r = self._query(f"SELECT COUNT(*), MIN(ts_ms), MAX(ts_ms) FROM {t}")[0]
+            out[t] = {"rows": r[0], "first_ms": r[1], "last_ms": r[2]}
+        return out
+
+
+_DB: Optional[HistoryDB] = None
+_DB_LOCK = threading.Lock()
+
+
+def get_db() -> HistoryDB:
+    global _DB
+    if _DB is None:
+        with _DB_LOCK:
+            if _DB is None:
+                _DB = HistoryDB()
+    return _DB
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Kho lịch sử có chỉ mục (decisions/trades/income)")
+    ap.add_argument("--sync", action="store_true", help="đồng bộ decision log + nhập file cũ")
+    ap.add_argument("--stats", action="store_true", help="in số dòng / khoảng thời gian từng bảng")
+    a = ap.parse_args()
+    db = get_db()
+    if a.sync:
+        t0 = time.perf_counter()
+        n = db.sync_decisions()
+        legacy = db.import_legacy()
+        print(f"[history_db] ✅ sync {n} quyết định, legacy={legacy} ({time.perf_counter() - t0:.2f}s)")
+    if a.stats or not a.sync:
+        print(json.dumps(db.stats(), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
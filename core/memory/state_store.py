@@ -0,0 +1,366 @@
+# -*- coding: utf-8 -*-
+# core/memory/state_store.py
+"""
+Kho trạng thái dùng chung (KV có transaction) cho runner / meta-controller / executor / notifier / dashboard.
+Thay các file JSON rời ghi đè cả file, không nguyên tử:
+    data/meta_state.json            → ns "meta"      (current_route, last_switch_ts, flip_window, ...)
+    executor_state.json             → ns "executor"  (last_ts, last_ts_by_symbol, last_order, ...)
+    .runner.lock/notify_state.json  → ns "notify"    (flags, last_ts)
+    last_decision.json (export)     → ns "decision"  key "override"
+    data/.eod_kpi_lock              → ns "eod_kpi"   key "sent_date"
+    data/fairness_state.json        → ns "fairness"  (cursor, last_picked)
+
+Lưu trữ: SQLite ở chế độ WAL tại data/state.db (CRX_STATE_DB).
+- Nhiều process cùng đọc/ghi an toàn, ví dụ runner + dashboard + cron tool. Mọi lần ghi là BEGIN IMMEDIATE
+  và chờ khoá tối đa CRX_STATE_BUSY_MS.
+- Mỗi key là 1 dòng (ns, key, value JSON, version). put_many()/transaction() cập nhật nhiều key nguyên tử.
+- Bảng changes ghi seq tăng dần cho mỗi key đổi. changes_since(seq) dùng cho process khác (dashboard).
+  watch(ns, fn) báo trong process: gọi ngay sau commit cục bộ, còn thay đổi từ process khác được báo khi poll().
+- Đọc rẻ: mỗi thread giữ 1 connection và cache theo ns. Cache được kiểm lại bằng PRAGMA data_version (đổi khi
+  process khác commit), nên get() lặp lại trong tick không chạm đĩa.
+
+Dùng:
+    st = get_store()
+    st.get("meta", "current_route", "LEFT")
+    st.get_ns("executor")                            # dict mọi key của ns
+    st.put("notify", "last_ts", ts)
+    st.put_many("executor", {"last_ts": ts, "last_order": {...}})
+    with st.transaction() as tx:                     # đọc-sửa-ghi nguyên tử giữa các process
+        if tx.get("eod_kpi", "sent_date") != today:
+            tx.put("eod_kpi", "sent_date", today)
+Lần đầu get_store() thấy kho trống thì tự nhập các file JSON cũ và đổi tên chúng thành *.migrated.
+CLI: python -m core.memory.state_store [dump [ns] | get ns key | set ns key JSON | del ns key | watch]
+"""
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parents[2]
+DATA_DIR = ROOT / "data"
+STATE_DB = Path(os.getenv("CRX_STATE_DB", str(DATA_DIR / "state.db")))
+BUSY_MS = int(os.getenv("CRX_STATE_BUSY_MS", "5000"))
+KEEP_CHANGES = int(os.getenv("CRX_STATE_KEEP_CHANGES", "5000"))
+
+# file cũ → (ns, hàm chuyển nội dung thành {key: value})
+LEGACY_FILES: Dict[Path, Tuple[str, Callable[[Any], Dict[str, Any]]]] = {
+    DATA_DIR / "meta_state.json": ("meta", lambda j: j if isinstance(j, dict) else {}),
+    ROOT / "executor_state.json": ("executor", lambda j: j if isinstance(j, dict) else {}),
+    ROOT / ".runner.lock" / "notify_state.json": ("notify", lambda j: j if isinstance(j, dict) else {}),
+    DATA_DIR / "fairness_state.json": ("fairness", lambda j: j if isinstance(j, dict) else {}),
+    DATA_DIR / ".eod_kpi_lock": ("eod_kpi", lambda s: {"sent_date": str(s).strip()} if str(s).strip() else {}),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    ns         TEXT NOT NULL,
+    key        TEXT NOT NULL,
+    value      TEXT NOT NULL,
+    version    INTEGER NOT NULL DEFAULT 1,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (ns, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    ns  TEXT NOT NULL,
+    key TEXT NOT NULL,
+    op  TEXT NOT NULL,
+    ts  REAL NOT NULL
+);
+"""
+
+Watcher = Callable[[str, str, Any], None]
+
+
+def _dumps(v: Any) -> str:
+    return json.dumps(v, ensure_ascii=False, separators=(",", ":"))
+
+
+class Txn:
+    """Transaction đang mở (BEGIN IMMEDIATE): get/put/delete thấy ngay các ghi trước đó trong cùng txn."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.touched: List[Tuple[str, str, str, Any]] = []
+        self.seqs: List[int] = []
+
+    def _log(self, ns: str, key: str, op: str, ts: float) -> None:
+        seq = self.conn.execute("INSERT INTO changes(ns, key, op, ts) VALUES (?,?,?,?)", (ns, key, op, ts)).lastrowid
+        self.seqs.append(seq)
+        if KEEP_CHANGES > 0 and seq % 256 == 0:
+            self.conn.execute("DELETE FROM changes WHERE seq <= ?", (seq - KEEP_CHANGES,))
+
+    def get(self, ns: str, key: str, default: Any = None) -> Any:
+        row = self.conn.execute("SELECT value FROM kv WHERE ns=? AND key=?", (ns, key)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def get_ns(self, ns: str) -> Dict[str, Any]:
+        return {k: json.loads(v) for k, v in self.conn.execute("SELECT key, value FROM kv WHERE ns=?", (ns,))}
+
+    def put(self, ns: str, key: str, value: Any) -> None:
+        now = time.time()
+        self.conn.execute(
+            "INSERT INTO kv(ns, key, value, version, updated_at) VALUES (?,?,?,1,?) "
+            "ON CONFLICT(ns, key) DO UPDATE SET value=excluded.value, version=kv.version+1, "
+            "updated_at=excluded.updated_at",
+            (ns, key, _dumps(value), now))
+        self._log(ns, key, "put", now)
+        self.touched.append((ns, key, "put", value))
+
+    def put_many(self, ns: str, values: Dict[str, Any]) -> None:
+        """Ghi nhiều key; key có giá trị không đổi thì bỏ qua (không tăng version, không sinh change)."""
+        cur = dict(self.conn.execute("SELECT key, value FROM kv WHERE ns=?", (ns,)).fetchall())
+        for k, v in values.items():
+            if cur.get(str(k)) != _dumps(v):
+                self.put(ns, str(k), v)
+
+    def delete(self, ns: str, key: Optional[str] = None) -> None:
+        keys = [key] if key is not None else [r[0] for r in self.conn.execute("SELECT key FROM kv WHERE ns=?", (ns,))]
+        for k in keys:
+            if self.conn.execute("DELETE FROM kv WHERE ns=? AND key=?", (ns, k)).rowcount:
+                self._log(ns, k, "del", time.time())
+                self.touched.append((ns, k, "del", None))
+
+
+class StateStore:
+    def __init__(self, path: Any = STATE_DB):
+        self.path = str(path)
+        self._local = threading.local()
+        self._shared = SimpleNamespace(conn=None)   # ":memory:" → 1 connection + cache chung mọi thread
+        self._shared_lock = threading.RLock()
+        self._watchers: Dict[str, List[Watcher]] = {}
+        self._seen_seq = 0
+        self._own: set = set()              # seq do chính process ghi (đã báo lúc commit, poll() bỏ qua)
+
+    # ----- connection / cache theo thread -----
+    def _open(self) -> sqlite3.Connection:
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=BUSY_MS / 1000.0, isolation_level=None,
+                               check_same_thread=self.path != ":memory:")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_MS}")
+        if self.path != ":memory:":
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def _state(self):
+        loc = self._shared if self.path == ":memory:" else self._local
+        if getattr(loc, "conn", None) is None:
+            with self._shared_lock:
+                if getattr(loc, "conn", None) is None:
+                    loc.cache = {}
+                    loc.data_version = None
+                    loc.conn = self._open()
+        return loc
+
+    @contextmanager
+    def _guard(self):
+        if self.path == ":memory:":
+            with self._shared_lock:
+                yield
+        else:
+            yield
+
+    def _ns_raw(self, ns: str) -> Dict[str, str]:
+        """{key: JSON text} của ns; cache hợp lệ tới khi process khác commit (data_version đổi)."""
+        loc = self._state()
+        with self._guard():
+            dv = loc.conn.execute("PRAGMA data_version").fetchone()[0]
+            if dv != loc.data_version:
+                loc.cache.clear()
+                loc.data_version = dv
+            raw = loc.cache.get(ns)
+            if raw is None:
+                raw = dict(loc.conn.execute("SELECT key, value FROM kv WHERE ns=?", (ns,)).fetchall())
+                loc.cache[ns] = raw
+        return raw
+
+    # ----- đọc -----
+    def get(self, ns: str, key: str, default: Any = None) -> Any:
+        raw = self._ns_raw(ns).get(key)
+        return json.loads(raw) if raw is not None else default
+
+    def get_ns(self, ns: str) -> Dict[str, Any]:
+        return {k: json.loads(v) for k, v in self._ns_raw(ns).items()}
+
+    def has(self, ns: str, key: Optional[str] = None) -> bool:
+        raw = self._ns_raw(ns)
+        return bool(raw) if key is None else key in raw
+
+    def namespaces(self) -> List[str]:
+        loc = self._state()
+        with self._guard():
+            return [r[0] for r in loc.conn.execute("SELECT DISTINCT ns FROM kv ORDER BY ns")]
+
+    # ----- ghi -----
+    @contextmanager
+    def transaction(self) -> Iterator[Txn]:
+        loc = self._state()
+        with self._guard():
+            conn = loc.conn
+            conn.execute("BEGIN IMMEDIATE")
+            tx = Txn(conn)
+            try:
+                yield tx
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            for ns in {t[0] for t in tx.touched}:
+                loc.cache.pop(ns, None)   # commit của chính connection không đổi data_version
+        if self._watchers:
+            self._own.update(tx.seqs)
+            self._dispatch(tx.touched)
+
+    def put(self, ns: str, key: str, value: Any) -> None:
+        with self.transaction() as tx:
+            tx.put(ns, key, value)
+
+    def put_many(self, ns: str, values: Dict[str, Any]) -> None:
+        with self.transaction() as tx:
+            tx.put_many(ns, values)
+
+    def delete(self, ns: str, key: Optional[str] = None) -> None:
+        with self.transaction() as tx:
+            tx.delete(ns, key)
+
+    # ----- thông báo thay đổi -----
+    def seq(self) -> int:
+        loc = self._state()
+        with self._guard():
+            row = loc.conn.execute("SELECT seq FROM sqlite_sequence WHERE name='changes'").fetchone()
+        return int(row[0]) if row else 0
+
+    def changes_since(self, seq: int, ns: Optional[str] = None) -> Tuple[int, List[Dict[str, Any]]]:
+        """(seq mới nhất, [{seq, ns, key, op, ts}]) các thay đổi sau seq (mọi process)."""
+        loc = self._state()
+        q = "SELECT seq, ns, key, op, ts FROM changes WHERE seq > ?"
+        args: Tuple[Any, ...] = (int(seq),)
+        if ns is not None:
+            q += " AND ns = ?"
+            args += (ns,)
+        with self._guard():
+            rows = loc.conn.execute(q + " ORDER BY seq", args).fetchall()
+        out = [{"seq": r[0], "ns": r[1], "key": r[2], "op": r[3], "ts": r[4]} for r in rows]
+        return (max(int(seq), self.seq()), out)
+
+    def watch(self, ns: str, fn: Watcher) -> None:
+        """fn(ns, key, value) khi key trong ns đổi (value=None nếu bị xoá). ns="*" → mọi ns."""
+        if not self._watchers:
+            self._seen_seq = self.seq()
+        self._watchers.setdefault(ns, []).append(fn)
+
+    def poll(self) -> int:
+        """Báo cho watcher các thay đổi do process khác commit kể từ lần poll trước. Trả số thay đổi."""
+        if not self._watchers:
+            return 0
+        self._seen_seq, rows = self.changes_since(self._seen_seq)
+        rows = [r for r in rows if r["seq"] not in self._own]
+        self._own = {s for s in self._own if s > self._seen_seq}
+        self._dispatch(((r["ns"], r["key"], r["op"], None) for r in rows), lookup=True)
+        return len(rows)
+
+    def _dispatch(self, events, lookup: bool = False) -> None:
+        if not self._watchers:
+            return
+        for ns, key, op, value in events:
+            if lookup and op == "put":
+                value = self.get(ns, key)
+            for fn in self._watchers.get(ns, []) + self._watchers.get("*", []):
+                try:
+                    fn(ns, key, value)
+                except Exception as e:
+                    print(f"[state_store] WARN: watcher {ns}.{key} lỗi: {e}")
+
+    # ----- chuyển đổi file cũ -----
+    def import_legacy(self, files: Optional[Dict[Path, Tuple[str, Callable[[Any], Dict[str, Any]]]]] = None) -> int:
+        """Nhập file JSON cũ vào ns tương ứng (chỉ khi ns còn trống), đổi tên file thành *.migrated."""
+        n = 0
+        for path, (ns, conv) in (files or LEGACY_FILES).items():
+            try:
+                if not path.exists():
+                    continue
+                text = path.read_text(encoding="utf-8")
+                try:
+                    vals = conv(json.loads(text))
+                except ValueError:
+                    vals = conv(text)
+                with self.transaction() as tx:
+                    fresh = not tx.get_ns(ns)     # ns đã có dữ liệu → kho là bản mới hơn, bỏ file cũ
+                    if fresh:
+                        tx.put_many(ns, vals)
+                path.replace(path.with_name(path.name + ".migrated"))
+                if fresh:
+                    n += len(vals)
+                    print(f"[state_store] migrate {path.name} → ns={ns} ({len(vals)} key)", file=sys.stderr)
+            except Exception as e:
+                print(f"[state_store] WARN: migrate {path} lỗi: {e}")
+        return n
+
+
+_STORE: Optional[StateStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_store() -> StateStore:
+    """Kho dùng chung của process; lần đầu tự nhập các file trạng thái cũ còn sót."""
+    global _STORE
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                st = StateStore()
+                try:
+                    if any(p.exists() for p in LEGACY_FILES):
+                        st.import_legacy()
+                except Exception as e:
+                    print(f"[state_store] WARN: migrate lỗi: {e}")
+                _STORE = st
+    return _STORE
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = list(sys.argv[1:] if argv is None else argv) or ["dump"]
+    st = get_store()
+    cmd = args[0]
+    if cmd == "dump":
+        for ns in args[1:2] or st.namespaces():
+            print(json.dumps({ns: st.get_ns(ns)}, ensure_ascii=False, indent=2))
+    elif cmd == "get" and len(args) == 3:
+        v = st.get(args[1], args[2])
+        if v is None:
+            return 1
+        print(json.dumps(v, ensure_ascii=False))
+    elif cmd == "set" and len(args) == 4:
+        st.put(args[1], args[2], json.loads(args[3]))
+    elif cmd == "del" and len(args) in (2, 3):
+        st.delete(args[1], args[2] if len(args) == 3 else None)
+    elif cmd == "watch":
+        seq = st.seq()
+        print(f"[state_store] watch {st.path} từ seq={seq} (Ctrl+C để dừng)")
+        try:
+            while True:
+                seq, rows = st.changes_since(seq)
+                for r in rows:
+                    val = st.get(r["ns"], r["key"]) if r["op"] == "put" else None
+                    print(f"{r['seq']:>8} {r['op']:<3} {r['ns']}.{r['key']} = {json.dumps(val, ensure_ascii=False)[:200]}")
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            pass
+    else:
+        print(__doc__.strip().splitlines()[-1])
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
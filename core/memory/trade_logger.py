@@ -5,7 +5,12 @@ from utils.time_utils import now_utc_iso
 PATH = Path("data/trade_history.json")
 
 def log_trade(event: dict):
-    history = read_json(PATH, [])
     item = {"timestamp": now_utc_iso(), **event}
+    try:
+        from core.memory.history_db import get_db
+        get_db().add_trades([item])
+    except Exception as e:
+        print(f"[trade_logger] WARN: history_db lỗi: {e}")
+    history = read_json(PATH, [])
     history.append(item)
-    write_json(PATH, history)
\ No newline at end of file
+    write_json(PATH, history)
@@ -5,4 +5,19 @@ def atr_percent(df: pd.DataFrame, period: int = 14) -> float:
     if len(df) < period+1: return 0.0
     tr = (df["high"] - df["low"]).rolling(period).mean().iloc[-1]
     close = df["close"].iloc[-1]
-    return float(tr / close * 100) if close else 0.0
\ No newline at end of file
+    return float(tr / close * 100) if close else 0.0
+
+def atr_percent_batch(high, low, close, lengths, period: int = 14):
+    # Bản vector hoá cho cả universe (S×W căn phải); symbol thiếu nến → 0.0 như atr_percent
+    import numpy as np
+    tr = np.nanmean(high[:, -period:] - low[:, -period:], axis=1)
+    last = close[:, -1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct = np.where(last != 0, tr / last * 100, 0.0)
+    return [float(pct[i]) if n >= period + 1 else 0.0 for i, n in enumerate(lengths)]
+
+def atr_percent_from(values: dict, period: int = 14) -> float:
+    # Từ chỉ báo streaming: range<period> = SMA(high-low, period) – cùng định nghĩa atr_percent
+    if values.get("n", 0) < period + 1: return 0.0
+    close = values.get("close", 0.0)
+    return float(values[f"range{period}"] / close * 100) if close else 0.0
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+# core/runtime/candle_clock.py
+"""
+Nguồn tick theo giờ đóng nến của sàn (thay cho ngủ theo đồng hồ máy).
+- ServerClock: đồng bộ lệch giờ với /fapi/v1/time, mọi mốc đóng nến tính theo giờ server.
+- CandleCloseTicker: bắn tick ngay khi nến `timeframe` đóng:
+    1) WebSocket kline stream (<symbol>@kline_<tf>, k.x = true) – nhanh nhất;
+    2) fallback REST /fapi/v1/klines lúc close + epsilon (ws chết/chậm);
+    3) REST cũng lỗi → bắn theo giờ server đã đồng bộ (không bao giờ kẹt vòng lặp).
+- Đo độ trễ close → decision, xuất ra data/tick_latency.json (mẫu gần nhất + p50/p95 theo nguồn).
+
+ENV:
+  CRX_TICK_SOURCE     candle (mặc định) | clock (hành vi cũ: ngủ theo phút máy)
+  CRX_TICK_INTERVAL   khung nến dùng làm nhịp (mặc định = timeframe trong config)
+  CRX_TICK_EPSILON_MS chờ thêm sau giờ đóng trước khi hỏi REST (mặc định 1500)
+  CRX_REST_BASE       mặc định Binance Futures Testnet
+  CRX_WS_BASE         mặc định wss://stream.binancefuture.com (trỏ về server giả lập khi test)
+"""
+from __future__ import annotations
+
+import os
+import json
+import time
+import queue
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import requests
+
+ROOT = Path(__file__).resolve().parents[2]
+LATENCY_FILE = ROOT / "data" / "tick_latency.json"
+
+TICK_SOURCE = os.getenv("CRX_TICK_SOURCE", "candle").strip().lower()
+REST_BASE = (os.getenv("CRX_REST_BASE") or os.getenv("BINANCE_FAPI_BASE") or "https://testnet.binancefuture.com").rstrip("/")
+WS_BASE = os.getenv("CRX_WS_BASE", "wss://stream.binancefuture.com").rstrip("/")
+EPSILON_MS = int(os.getenv("CRX_TICK_EPSILON_MS", "1500"))
+
+_UNIT_MS = {"m": 60_000, "h": 3_600_000, "d": 86_400_000, "w": 604_800_000}
+_MAX_SAMPLES = 200
+
+
+def interval_ms(tf: str) -> int:
+    """'15m' → 900000. Khung tháng ('1M') không có độ dài cố định → không hỗ trợ làm nhịp."""
+    tf = str(tf).strip()
+    unit = tf[-1:]
+    if unit not in _UNIT_MS or not tf[:-1].isdigit():
+        raise ValueError(f"timeframe không hỗ trợ làm nhịp tick: {tf}")
+    return int(tf[:-1]) * _UNIT_MS[unit]
+
+
+class ServerClock:
+    """Giờ server ước lượng = giờ máy + offset (đo bằng điểm giữa round-trip)."""
+    def __init__(self, rest_base: str = REST_BASE, refresh_sec: float = 600.0, retry_sec: float = 30.0):
+        self.rest_base = rest_base.rstrip("/")
+        self.refresh_sec = refresh_sec
+        self.retry_sec = retry_sec
+        self.offset_ms = 0
+        self.synced_at = 0.0
+        self._last_try = 0.0
+        self._lock = threading.Lock()
+
+    def sync(self) -> bool:
+        self._last_try = time.time()
+        try:
+            t0 = time.time()
+            r = requests.get(f"{self.rest_base}/fapi/v1/time", timeout=5)
+            t1 = time.time()
+            r.raise_for_status()
+            server_ms = int(r.json()["serverTime"])
+            self.offset_ms = server_ms - int((t0 + t1) * 500)
+            self.synced_at = t1
+            return True
+        except Exception:
+            return False
+
+    def now_ms(self) -> int:
+        now = time.time()
+        if now - self.synced_at > self.refresh_sec and now - self._last_try > self.retry_sec:
+            with self._lock:
+                if time.time() - self._last_try > self.retry_sec:
+                    self.sync()
+        return int(time.time() * 1000) + self.offset_ms
+
+
+SERVER_CLOCK = ServerClock()
+
+
+@dataclass
+class CloseEvent:
+    close_ms: int      # mốc đóng nến (= openTime nến kế tiếp, giờ server)
+    source: str        # ws | rest | clock
+    fired_ms: int      # lúc tick được bắn (giờ server)
+
+    @property
+    def detect_latency_ms(self) -> int:
+        return self.fired_ms - self.close_ms
+
+
+class CandleCloseTicker:
+    def __init__(self, symbol: str, interval: str, rest_base: str = REST_BASE, ws_base: str = WS_BASE,
+                 epsilon_ms: int = EPSILON_MS, clock: Optional[ServerClock] = None,
+                 use_ws: bool = True, log: Callable[[str], None] = print):
+        self.symbol = symbol.upper()
+        self.interval = interval
+        self.iv_ms = interval_ms(interval)
+        self.rest_base = rest_base.rstrip("/")
+        self.ws_base = ws_base.rstrip("/")
+        self.epsilon_ms = epsilon_ms
+        self.clock = clock or (SERVER_CLOCK if self.rest_base == REST_BASE else ServerClock(self.rest_base))
+        self.use_ws = use_ws
+        self.log = log
+        self._events: "queue.Queue[Optional[CloseEvent]]" = queue.Queue()
+        self._stop = threading.Event()
+        self._ws_thread: Optional[threading.Thread] = None
+        self.ws_connected = False
+        self._samples: List[Dict] = []
+
+    # ----- vòng đời -----
+    def start(self) -> "CandleCloseTicker":
+        self.clock.sync()
+        if self.use_ws and self._ws_thread is None:
+            self._ws_thread = threading.Thread(target=self._ws_loop, name="kline-ws", daemon=True)
+            self._ws_thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def interrupt(self) -> None:
+        """Đánh thức wait() ngay để gọi poll() (vd cờ vừa đổi) thay vì chờ hết poll_sec."""
+        self._events.put(None)
+
+    def next_close_ms(self) -> int:
+        now = self.clock.now_ms()
+        return (now // self.iv_ms + 1) * self.iv_ms
+
+    # ----- chờ tick -----
+    def wait(self, poll: Optional[Callable[[], bool]] = None, poll_sec: float = 2.0) -> Optional[CloseEvent]:
+        """
+        Chờ nến hiện tại đóng. Trả CloseEvent khi đóng; None nếu `poll()` trả True (dậy sớm).
+        poll được gọi mỗi poll_sec giây, hoặc ngay khi interrupt(), để runner xử lý cờ STOP/RELOAD/RISK-OFF.
+        """
+        target = self.next_close_ms()
+        last_poll = 0.0
+        while not self._stop.is_set():
+            if poll is not None and time.time() - last_poll >= poll_sec:
+                last_poll = time.time()
+                if poll():
+                    return None
+            now = self.clock.now_ms()
+            deadline = target + self.epsilon_ms
+            wait_s = max(0.0, min(poll_sec - (time.time() - last_poll), (deadline - now) / 1000.0))
+            try:
+                ev = self._events.get(timeout=wait_s) if wait_s > 0 else self._events.get_nowait()
+                if ev is None:
+                    last_poll = 0.0  # interrupt() → poll ngay vòng sau
+                    continue
+                if ev.close_ms >= target:
+                    return ev
+                continue  # sự kiện cũ (nến trước) → bỏ
+            except queue.Empty:
+                pass
+            if self.clock.now_ms() >= deadline:
+                return self._confirm_rest(target)
+        return None
+
+    def _confirm_rest(self, target: int, tries: int = 4) -> CloseEvent:
+        for i in range(tries):
+            try:
+                from core.execution.binance_client import get_client   # import muộn: client dùng ServerClock của module này
+                rows = get_client(self.rest_base).get(
+                    "/fapi/v1/klines", {"symbol": self.symbol, "interval": self.interval, "limit": 2},
+                    timeout=5, retries=0)
+                # nến đã đóng khi sàn đã mở nến mới tại target
+                if any(int(k[0]) >= target for k in rows):
+                    return CloseEvent(target, "rest", self.clock.now_ms())
+            except Exception:
+                break
+            time.sleep(0.3 * (i + 1))
+        return CloseEvent(target, "clock", self.clock.now_ms())
+
+    # ----- websocket -----
+    def _ws_loop(self) -> None:
+        from utils.ws_helpers import connect
+        url = f"{self.ws_base}/ws/{self.symbol.lower()}@kline_{self.interval}"
+        backoff = 1.0
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = connect(url, timeout=10)
+                self.ws_connected = True
+                backoff = 1.0
+                self.log(f"[candle_clock] ws kết nối {url}")
+                while not self._stop.is_set():
+                    msg = conn.recv(timeout=60)
+                    if msg is None:
+                        conn.ping()
+                        continue
+                    self._on_message(msg)
+            except Exception as e:
+                if self.ws_connected:
+                    self.log(f"[candle_clock] ws mất kết nối ({e}) → fallback REST, thử lại sau {backoff:.0f}s")
+            finally:
+                self.ws_connected = False
+                if conn is not None:
+                    conn.close()
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+    def _on_message(self, msg: str) -> None:
+        try:
+            data = json.loads(msg)
+            data = data.get("data", data)  # combined stream bọc trong {"stream","data"}
+            k = data.get("k") or {}
+            if data.get("e") == "kline" and k.get("x"):
+                self._events.put(CloseEvent(int(k["T"]) + 1, "ws", self.clock.now_ms()))
+        except Exception:
+            pass
+
+    # ----- đo độ trễ -----
+    def record_latency(self, ev: CloseEvent, stage: str = "decision") -> int:
+        """Ghi độ trễ close → `stage` (ms) và xuất data/tick_latency.json."""
+        lat = self.clock.now_ms() - ev.close_ms
+        self._samples.append({"close_ms": ev.close_ms, "source": ev.source, "stage": stage,
+                              "detect_ms": ev.detect_latency_ms, "latency_ms": lat})
+        self._samples = self._samples[-_MAX_SAMPLES:]
+        try:
+            LATENCY_FILE.parent.mkdir(parents=True, exist_ok=True)
+            tmp = LATENCY_FILE.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self.latency_summary(), ensure_ascii=False, indent=2), encoding="utf-8")
+            tmp.replace(LATENCY_FILE)
+        except Exception:
+            pass
+        return lat
+
+    def latency_summary(self) -> Dict:
+        def _stats(vals: List[int]) -> Dict:
+            if not vals:
+                return {}
+            s = sorted(vals)
+            pick = lambda q: s[min(len(s) - 1, int(q * (len(s) - 1) + 0.5))]
+            return {"n": len(s), "p50_ms": pick(0.5), "p95_ms": pick(0.95), "max_ms": s[-1]}
+        by_source: Dict[str, List[int]] = {}
+        for x in self._samples:
+            by_source.setdefault(x["source"], []).append(x["latency_ms"])
+        return {
+            "symbol": self.symbol,
+            "interval": self.interval,
+            "clock_offset_ms": self.clock.offset_ms,
+            "overall": _stats([x["latency_ms"] for x in self._samples]),
+            "by_source": {k: _stats(v) for k, v in by_source.items()},
+            "last": self._samples[-1] if self._samples else None,
+            "samples": self._samples,
+        }
@@ -0,0 +1,451 @@
+# -*- coding: utf-8 -*-
+# core/runtime/config_service.py
+"""
+Config service in-process: nạp lại YAML/JSON trong config/ + configs/ khi đang chạy, không restart stage.
+- Watcher: stat các file *.yaml|*.json mỗi CRX_CONFIG_WATCH_SEC (mặc định 2s); file phải đứng yên 1 nhịp
+  (tránh đọc file đang ghi dở) rồi mới báo thay đổi qua on_change – runner áp dụng ở ranh giới tick.
+- reload(): validate qua config_loader.load_bundle (+ validators.cross_validate), parse chặt các file còn lại.
+  Lỗi → giữ nguyên snapshot đang chạy (rollback), ghi "rejected"; nội dung lỗi đó không thử lại tới khi file đổi tiếp.
+- Snapshot bất biến (dict bị khoá, list giữ nguyên kiểu để tương thích), version tăng dần.
+  Publish = đổi tham chiếu CONFIG/YAML_HASH (config.config), CONFIG/RISK_LIMITS/... (configs.config) và mọi module
+  dự án đang giữ object cũ → stage ấm đọc config mới ở lần gọi kế, không parse lại trên hot path.
+- Mỗi lần áp dụng: diff có cấu trúc (file:đường.dẫn, op, old, new) + chg_id (meta.chg_id của file đổi)
+  → logs/config_changes.jsonl và log tóm tắt.
+ENV: CRX_CONFIG_WATCH_SEC (2; 0 = tắt watcher), CRX_CONFIG_CROSS_VALIDATE (1), CRX_CONFIG_DIFF_PRINT (20)
+"""
+from __future__ import annotations
+
+import os
+import sys
+import json
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parents[2]
+CONFIGS_DIR = ROOT / "configs"
+LOG_PATH = ROOT / "logs" / "config_changes.jsonl"
+
+WATCH_SEC = float(os.getenv("CRX_CONFIG_WATCH_SEC", "2"))
+CROSS_VALIDATE = os.getenv("CRX_CONFIG_CROSS_VALIDATE", "1") not in ("0", "false", "False", "")
+DIFF_PRINT = int(os.getenv("CRX_CONFIG_DIFF_PRINT", "20"))
+
+_PROJECT_PKGS = ("core", "config", "configs", "notifier", "report", "tools", "utils")
+# Tên biến module nhận snapshot mới; object cũ (dict/list) ở module khác được thay theo identity
+_CONFIGS_NAMES = ("CONFIG", "RISK_LIMITS", "FEATURE_FLAGS", "KPI_POLICY", "SYMBOLS")
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+# ----- snapshot bất biến -----
+def _readonly(self, *a, **k):
+    raise TypeError("config snapshot chỉ đọc – sửa YAML rồi để config service nạp lại")
+
+
+class FrozenDict(dict):
+    """dict chỉ đọc (nội dung configs/*)."""
+    __setitem__ = __delitem__ = update = pop = popitem = clear = setdefault = __ior__ = _readonly
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+def _freeze(v: Any) -> Any:
+    if isinstance(v, dict):
+        return FrozenDict((k, _freeze(x)) for k, x in v.items())
+    if isinstance(v, list):
+        return [_freeze(x) for x in v]
+    return v
+
+
+def _frozen_node_cls():
+    """_Node chỉ đọc (CONFIG): vẫn attribute/key case-insensitive như config.config._Node."""
+    from config.config import _Node, _normalize
+
+    class FrozenNode(_Node):
+        def __init__(self, d: Optional[Mapping[str, Any]] = None):
+            dict.__init__(self)
+            for k, v in (d or {}).items():
+                k = _normalize(k)
+                v = FrozenNode(v) if isinstance(v, dict) else _freeze(v)
+                dict.__setitem__(self, k, v)
+                if k not in _FROZEN_ATTRS and k.isidentifier():
+                    self.__dict__[k] = v
+
+        __setitem__ = __delitem__ = update = pop = popitem = clear = setdefault = __ior__ = _readonly
+        __setattr__ = __delattr__ = _readonly
+
+        def __reduce__(self):
+            return (_Node, (dict(self),))
+
+    _FROZEN_ATTRS = frozenset(dir(FrozenNode))
+    return FrozenNode
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    version: int
+    chg_id: str                       # meta.chg_id của (các) file đổi ở lần nạp này
+    yaml_hash: str                    # hash bundle config/ (như config.config.YAML_HASH)
+    digest: str                       # hash gộp mọi file đang theo dõi
+    config: Any                       # CONFIG (FrozenNode, cùng cấu trúc config.config.CONFIG)
+    files: Mapping[str, Any]          # "config/x.yaml" | "configs/y.json" -> nội dung bất biến
+    chg_ids: Mapping[str, str] = field(default_factory=dict)
+    loaded_at: str = ""
+
+    def get(self, relpath: str, default: Any = None) -> Any:
+        return self.files.get(relpath, default)
+
+
+# ----- diff -----
+def _flatten(v: Any, prefix: str, out: Dict[str, Any]) -> Dict[str, Any]:
+    if isinstance(v, dict) and v:
+        for k, x in v.items():
+            _flatten(x, f"{prefix}.{k}" if prefix else str(k), out)
+    else:
+        out[prefix] = v
+    return out
+
+
+def diff_files(old: Mapping[str, Any], new: Mapping[str, Any]) -> List[Dict[str, Any]]:
+    """Diff theo đường dẫn lá: [{"path": "config/executor.yaml:order_policy.x", "op": add|remove|change, ...}]."""
+    out: List[Dict[str, Any]] = []
+    for rel in sorted(set(old) | set(new)):
+        a = _flatten(old[rel], "", {}) if rel in old else {}
+        b = _flatten(new[rel], "", {}) if rel in new else {}
+        for key in sorted(set(a) | set(b)):
+            path = f"{rel}:{key}" if key else rel
+            if key not in b:
+                out.append({"path": path, "op": "remove", "old": a[key]})
+            elif key not in a:
+                out.append({"path": path, "op": "add", "new": b[key]})
+            elif a[key] != b[key]:
+                out.append({"path": path, "op": "change", "old": a[key], "new": b[key]})
+    return out
+
+
+def _short(v: Any, n: int = 80) -> str:
+    s = json.dumps(v, ensure_ascii=False, default=str)
+    return s if len(s) <= n else s[: n - 1] + "…"
+
+
+# ----- service -----
+class ConfigService:
+    def __init__(self, dirs: Optional[List[Path]] = None, log: Callable[[str], None] = print,
+                 watch_sec: float = WATCH_SEC, log_path: Path = LOG_PATH):
+        self.cfg_dir: Optional[Path] = None
+        self._dirs = dirs
+        self.log = log
+        self.watch_sec = watch_sec
+        self.log_path = Path(log_path)
+        self._snap: Optional[ConfigSnapshot] = None
+        self._lock = threading.RLock()
+        self._subs: List[Callable[[Optional[ConfigSnapshot], ConfigSnapshot], None]] = []
+        self._stats: Optional[Tuple] = None          # stat của lần nạp gần nhất (áp dụng hoặc bị từ chối)
+        self._applied: Dict[str, List[int]] = {}      # rel -> [size, mtime_ns] của snapshot đang chạy
+        self._broken: set = set()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._frozen_node = None
+
+    # ----- truy cập -----
+    def current(self) -> Optional[ConfigSnapshot]:
+        return self._snap
+
+    @property
+    def version(self) -> int:
+        return self._snap.version if self._snap is not None else 0
+
+    def subscribe(self, fn: Callable[[Optional[ConfigSnapshot], ConfigSnapshot], None]) -> None:
+        """fn(old, new) gọi sau mỗi lần publish (thread gọi reload)."""
+        self._subs.append(fn)
+
+    # ----- file theo dõi -----
+    def dirs(self) -> List[Path]:
+        if self._dirs is not None:
+            return list(self._dirs)
+        cfg = Path(os.path.abspath(os.getenv("CRX_CONFIG_DIR", "./config")))
+        return [cfg, CONFIGS_DIR]
+
+    def _files(self) -> List[Tuple[str, Path]]:
+        out = []
+        for d in self.dirs():
+            try:
+                for p in sorted(d.iterdir()):
+                    if p.suffix in (".yaml", ".yml", ".json") and p.is_file():
+                        out.append((f"{d.name}/{p.name}", p))
+            except OSError:
+                continue
+        return out
+
+    def _scan(self) -> Tuple:
+        out = []
+        for rel, p in self._files():
+            try:
+                st = p.stat()
+                out.append((rel, st.st_size, st.st_mtime_ns))
+            except OSError:
+                continue
+        return tuple(out)
+
+    # ----- nạp + validate -----
+    @staticmethod
+    def _cross_validate(bundle) -> Optional[str]:
+        import config.config_loader as _cl
+        sys.modules.setdefault("config_loader", _cl)  # validators.py import kiểu top-level
+        from config.validators import cross_validate
+        return cross_validate(bundle)
+
+    def _build(self, stats: Tuple) -> Tuple[Any, str, Dict[str, Any], Dict[str, str]]:
+        """Nạp toàn bộ file; raise nếu bundle hoặc file vừa đổi bị lỗi. Trả (config, yaml_hash, files, chg_ids).
+        File ngoài bundle đã hỏng sẵn từ trước (không đổi so với bản đang chạy) giữ giá trị cũ như configs.config
+        (mặc định {}) – chỉ cảnh báo 1 lần, không chặn reload của file khác."""
+        import yaml
+        import config.config as cc
+        cfg_dir = cc._cfg_dir()
+        self.cfg_dir = Path(cfg_dir)
+        b = cc.load_bundle(cfg_dir)
+        if CROSS_VALIDATE:
+            err = self._cross_validate(b)
+            if err:
+                raise ValueError(err)
+        snap = cc.build_snapshot(cfg_dir, bundle=b)
+        if self._frozen_node is None:
+            self._frozen_node = _frozen_node_cls()
+        node = self._frozen_node(snap["config"])
+
+        files: Dict[str, Any] = {}
+        for rel, p in self._files():
+            if p.parent == self.cfg_dir and p.stem in cc.CONFIG_FILES:
+                files[rel] = node[p.stem]     # file bundle: đã validate, dùng lại node
+                continue
+            try:
+                with open(p, "r", encoding="utf-8") as f:
+                    data = json.load(f) if p.suffix == ".json" else yaml.safe_load(f)
+            except Exception as e:
+                cur = {r: st for r, *st in stats}.get(rel)
+                if self._snap is not None and cur != self._applied.get(rel):
+                    raise ValueError(f"{rel}: {e}") from e
+                if rel not in self._broken:
+                    self._broken.add(rel)
+                    self.log(f"[config_service] ⚠️  {rel} lỗi parse (giữ giá trị cũ): {str(e).splitlines()[0]}")
+                files[rel] = self._snap.files.get(rel, FrozenDict()) if self._snap is not None else FrozenDict()
+                continue
+            self._broken.discard(rel)
+            files[rel] = _freeze(data if data is not None else {})
+
+        chg_ids: Dict[str, str] = {}
+        for rel, data in files.items():
+            meta = data.get("meta") if isinstance(data, dict) else None
+            if isinstance(meta, dict) and meta.get("chg_id"):
+                chg_ids[rel] = str(meta["chg_id"])
+        return node, snap["yaml_hash"], FrozenDict(files), chg_ids
+
+    @staticmethod
+    def _digest(files: Mapping[str, Any]) -> str:
+        h = hashlib.sha256()
+        for rel in sorted(files):
+            h.update(rel.encode() + b"\0" + json.dumps(files[rel], sort_keys=True, default=str).encode() + b"\0")
+        return h.hexdigest()
+
+    def reload(self, reason: str = "manual", republish: bool = False) -> bool:
+        """Nạp lại + validate; True nếu đã publish snapshot mới. Lỗi → giữ snapshot cũ (rollback)."""
+        with self._lock:
+            stats = self._scan()
+            old = self._snap
+            try:
+                node, yhash, files, chg_ids = self._build(stats)
+            except Exception as e:
+                self._stats = stats
+                self.log(f"[config_service] ❌ Config mới không hợp lệ ({reason}) → giữ v{self.version}: {e}")
+                self._record({"status": "rejected", "reason": reason, "version": self.version,
+                              "error": str(e)[:2000]})
+                return False
+            self._stats = stats
+            self._applied = {r: st for r, *st in stats}
+            digest = self._digest(files)
+            if old is not None and digest == old.digest:
+                if republish:
+                    self._publish(old, old)
+                return False
+
+            diff = diff_files(old.files if old is not None else {}, files)
+            changed = sorted({d["path"].split(":", 1)[0] for d in diff})
+            version = (old.version if old is not None else 0) + 1
+            new_ids = [chg_ids[r] for r in changed if r in chg_ids and old is not None and old.chg_ids.get(r) != chg_ids[r]]
+            chg_id = ",".join(dict.fromkeys(new_ids)) or f"v{version}"
+            snap = ConfigSnapshot(version=version, chg_id=chg_id, yaml_hash=yhash, digest=digest, config=node,
+                                  files=files, chg_ids=FrozenDict(chg_ids), loaded_at=_now())
+            try:
+                self._publish(snap, old)
+            except Exception as e:
+                if old is not None:
+                    try:
+                        self._publish(old, snap)
+                    except Exception:
+                        pass
+                self.log(f"[config_service] ❌ Publish v{version} lỗi ({e}) → rollback v{self.version}.")
+                self._record({"status": "rollback", "reason": reason, "version": self.version, "error": str(e)})
+                return False
+            self._snap = snap
+
+            if old is None:
+                self.log(f"[config_service] ✅ v{version} nạp {len(files)} file (yaml_hash={yhash[:12]}).")
+            else:
+                self.log(f"[config_service] ✅ v{old.version} → v{version} chg_id={chg_id} "
+                         f"({len(diff)} thay đổi trong {', '.join(changed)}) [{reason}]")
+                for d in diff[:DIFF_PRINT]:
+                    if d["op"] == "change":
+                        self.log(f"[config_service]   ~ {d['path']}: {_short(d['old'])} → {_short(d['new'])}")
+                    elif d["op"] == "add":
+                        self.log(f"[config_service]   + {d['path']}: {_short(d['new'])}")
+                    else:
+                        self.log(f"[config_service]   - {d['path']}: {_short(d['old'])}")
+                if len(diff) > DIFF_PRINT:
+                    self.log(f"[config_service]   … +{len(diff) - DIFF_PRINT} thay đổi (xem {self.log_path.name})")
+            self._record({"status": "applied", "reason": reason, "version": version, "prev_version":
+                          old.version if old is not None else 0, "chg_id": chg_id, "yaml_hash": yhash,
+                          "files": changed, "diff": diff if old is not None else []})
+
+        for fn in list(self._subs):
+            try:
+                fn(old, snap)
+            except Exception as e:
+                self.log(f"[config_service] ⚠️  subscriber lỗi: {e}")
+        return True
+
+    # ----- publish -----
+    def _publish(self, snap: ConfigSnapshot, old: Optional[ConfigSnapshot]) -> None:
+        """Đổi tham chiếu ở config.config / configs.config và ở module dự án đang giữ object cũ."""
+        swap: Dict[int, Any] = {}
+
+        if snap.config is not None:
+            import config.config as cc
+            if old is not None and old.config is not None:
+                swap[id(old.config)] = snap.config
+            swap[id(cc.CONFIG)] = snap.config
+            cc.CONFIG = snap.config
+            cc.YAML_HASH = snap.yaml_hash
+
+        import configs.config as cs
+        cfg_json = snap.files.get("configs/config.json", FrozenDict())
+        new_vals = {
+            "CONFIG": cfg_json,
+            "RISK_LIMITS": snap.files.get("configs/risk_limits.yaml", FrozenDict()),
+            "FEATURE_FLAGS": snap.files.get("configs/feature_flags.yaml", FrozenDict()),
+            "KPI_POLICY": snap.files.get("configs/kpi_policy.yaml", FrozenDict()),
+            "SYMBOLS": cfg_json.get("symbols", ["BTCUSDT", "ETHUSDT"]),
+        }
+        for name in _CONFIGS_NAMES:
+            cur = getattr(cs, name, None)
+            if isinstance(cur, (dict, list)):
+                swap[id(cur)] = new_vals[name]
+            setattr(cs, name, new_vals[name])
+        cs.TIMEFRAME = cfg_json.get("timeframe", "15m")
+        cs.REPORT_TIME_UTC = cfg_json.get("report_time_utc", "15:55")
+
+        # module đã `from ... import CONFIG` (executor, collector, auto_main…) → thay object theo identity
+        for mname, mod in list(sys.modules.items()):
+            if mod is None or mname.split(".", 1)[0] not in _PROJECT_PKGS or mname in ("config.config", "configs.config"):
+                continue
+            d = getattr(mod, "__dict__", None)
+            if not d:
+                continue
+            for name in _CONFIGS_NAMES:
+                v = d.get(name)
+                if v is not None and id(v) in swap:
+                    d[name] = swap[id(v)]
+
+    def _record(self, rec: Dict[str, Any]) -> None:
+        try:
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"ts": _now(), **rec}, ensure_ascii=False, default=str) + "\n")
+        except Exception as e:
+            self.log(f"[config_service] ⚠️ ghi {self.log_path.name} lỗi: {e}")
+
+    # ----- watcher -----
+    def changed(self) -> bool:
+        """File theo dõi đã đổi so với lần nạp gần nhất? (chỉ stat, không đọc nội dung)"""
+        return self._scan() != self._stats
+
+    def start(self, on_change: Optional[Callable[[], None]] = None) -> "ConfigService":
+        """Nạp snapshot đầu + chạy watcher. on_change=None → watcher tự reload ngay."""
+        if self._snap is None:
+            self.reload(reason="startup")
+        if self.watch_sec <= 0 or self._thread is not None:
+            return self
+        cb = on_change or (lambda: self.reload(reason="watch"))
+
+        def _loop():
+            pending = None
+            while not self._stop.wait(self.watch_sec):
+                try:
+                    cur = self._scan()
+                    if cur == self._stats:
+                        pending = None
+                        continue
+                    if cur != pending:          # vừa đổi → chờ 1 nhịp cho file ghi xong
+                        pending = cur
+                        continue
+                    pending = None
+                    cb()
+                except Exception as e:
+                    self.log(f"[config_service] ⚠️  watcher lỗi: {e}")
+
+        self._thread = threading.Thread(target=_loop, name="config-watch", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+_SERVICE: Optional[ConfigService] = None
+
+
+def get_service() -> ConfigService:
+    global _SERVICE
+    if _SERVICE is None:
+        _SERVICE = ConfigService()
+    return _SERVICE
+
+
+def current() -> Optional[ConfigSnapshot]:
+    """Snapshot đang hiệu lực (None nếu service chưa nạp). Stage đọc 1 lần đầu hàm để nhất quán."""
+    return _SERVICE.current() if _SERVICE is not None else None
+
+
+_FALLBACK: Dict[str, Tuple[Tuple[int, int], Any]] = {}   # relpath -> ((size, mtime_ns), nội dung) khi chưa có service
+
+
+def read_file(relpath: str, default: Any = None) -> Any:
+    """Nội dung 1 file config cho stage ("config/controller.yaml"): lấy từ snapshot đang chạy (file bundle → node
+    đã validate). Service chưa nạp (stage chạy subprocess/standalone) → parse file 1 lần, chỉ parse lại khi
+    size/mtime đổi. Thiếu file/lỗi parse → default."""
+    snap = current()
+    if snap is not None:
+        cfg_dir = _SERVICE.cfg_dir if _SERVICE is not None else None
+        if cfg_dir is not None and relpath.startswith("config/"):
+            relpath = f"{cfg_dir.name}/{relpath[len('config/'):]}"   # CRX_CONFIG_DIR đổi tên thư mục
+        return snap.get(relpath, default)
+    p = ROOT / relpath
+    try:
+        st = p.stat()
+        key = (st.st_size, st.st_mtime_ns)
+        hit = _FALLBACK.get(relpath)
+        if hit is not None and hit[0] == key:
+            return hit[1]
+        import yaml
+        with open(p, "r", encoding="utf-8") as f:
+            data = json.load(f) if p.suffix == ".json" else yaml.safe_load(f)
+    except Exception:
+        return default
+    data = _freeze(data if data is not None else {})
+    _FALLBACK[relpath] = (key, data)
+    return data
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+# core/runtime/dag_scheduler.py
+"""
+Lập lịch stage theo đồ thị phụ thuộc (DAG) cho 1 tick của auto_runner.
+- Mỗi Stage khai báo inputs/outputs (tên artefact: "candles.BTCUSDT", "decision", ...);
+  cạnh phụ thuộc suy ra từ đó: B chờ A nếu B đọc thứ A ghi, hoặc cả hai cùng ghi một thứ
+  (ghi trùng → chạy tuần tự theo thứ tự khai báo). `after` để ép thứ tự an toàn tường minh.
+- Stage sẵn sàng được chạy song song trên pool giới hạn (CRX_STAGE_WORKERS, mặc định 4).
+- `when` được đánh giá lúc stage sẵn sàng (không phải lúc dựng đồ thị) → các gate như risk-off
+  phản ánh trạng thái mới nhất ngay trước khi chạy.
+- Cuối tick trả TickReport: thời gian từng stage + critical path (chuỗi phụ thuộc dài nhất).
+"""
+from __future__ import annotations
+
+import os
+import time
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+MAX_WORKERS = int(os.getenv("CRX_STAGE_WORKERS", "4"))
+
+
+@dataclass
+class Stage:
+    name: str
+    fn: Callable[[], Any]
+    inputs: Tuple[str, ...] = ()
+    outputs: Tuple[str, ...] = ()
+    after: Tuple[str, ...] = ()
+    when: Optional[Callable[[], bool]] = None
+
+
+@dataclass
+class StageRun:
+    name: str
+    rc: Any = None
+    skipped: bool = False
+    start: float = 0.0
+    end: float = 0.0
+
+    @property
+    def duration(self) -> float:
+        return max(0.0, self.end - self.start)
+
+
+@dataclass
+class TickReport:
+    runs: Dict[str, StageRun] = field(default_factory=dict)
+    wall_sec: float = 0.0
+    critical_path: List[str] = field(default_factory=list)
+    critical_sec: float = 0.0
+
+    def summary(self) -> str:
+        busy = sum(r.duration for r in self.runs.values())
+        path = " → ".join(self.critical_path) or "-"
+        return (f"critical path {self.critical_sec:.1f}s: {path} | wall={self.wall_sec:.1f}s "
+                f"| tổng stage={busy:.1f}s")
+
+
+class StageGraph:
+    def __init__(self, stages: List[Stage]):
+        self.stages: Dict[str, Stage] = {}
+        for st in stages:
+            if st.name in self.stages:
+                raise ValueError(f"Stage trùng tên: {st.name}")
+            self.stages[st.name] = st
+        self.deps: Dict[str, set] = self._build_deps(stages)
+
+    def _build_deps(self, stages: List[Stage]) -> Dict[str, set]:
+        deps: Dict[str, set] = {st.name: set(st.after) for st in stages}
+        for i, b in enumerate(stages):
+            for a in stages[:i]:
+                reads = set(b.inputs) & set(a.outputs)
+                writes = set(b.outputs) & set(a.outputs)
+                if reads or writes:
+                    deps[b.name].add(a.name)
+        for name, ds in deps.items():
+            unknown = ds - set(self.stages)
+            if unknown:
+                raise ValueError(f"Stage {name} phụ thuộc stage không tồn tại: {sorted(unknown)}")
+        self._check_acyclic(deps)
+        return deps
+
+    @staticmethod
+    def _check_acyclic(deps: Dict[str, set]) -> None:
+        state: Dict[str, int] = {}
+
+        def visit(n: str, trail: List[str]):
+            if state.get(n) == 1:
+                raise ValueError(f"Đồ thị stage có chu trình: {' → '.join(trail + [n])}")
+            if state.get(n) == 2:
+                return
+            state[n] = 1
+            for d in deps[n]:
+                visit(d, trail + [n])
+            state[n] = 2
+
+        for n in deps:
+            visit(n, [])
+
+
+class DagScheduler:
+    def __init__(self, max_workers: int = MAX_WORKERS, log: Callable[[str], None] = print):
+        self.max_workers = max(1, int(max_workers))
+        self.log = log
+
+    def run(self, graph: StageGraph) -> TickReport:
+        report = TickReport()
+        order = list(graph.stages)  # thứ tự khai báo = ưu tiên khi cùng sẵn sàng
+        pending = set(order)
+        done: set = set()
+        running: Dict[Any, str] = {}
+        t0 = time.time()
+
+        def _exec(name: str) -> StageRun:
+            run = StageRun(name, start=time.time())
+            try:
+                run.rc = graph.stages[name].fn()
+            except Exception as e:
+                self.log(f"❌ Stage {name} lỗi: {e}")
+                run.rc = 1
+            run.end = time.time()
+            return run
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="crx-stage") as pool:
+            while pending or running:
+                for name in order:
+                    if name not in pending or not graph.deps[name] <= done:
+                        continue
+                    st = graph.stages[name]
+                    if st.when is not None and not _safe_when(st, self.log):
+                        now = time.time()
+                        report.runs[name] = StageRun(name, skipped=True, start=now, end=now)
+                        pending.discard(name)
+                        done.add(name)
+                        continue
+                    if len(running) >= self.max_workers:
+                        break
+                    pending.discard(name)
+                    running[pool.submit(_exec, name)] = name
+                if not running:
+                    continue  # vừa có stage bị skip → quét lại để mở khoá stage phía sau
+                finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    name = running.pop(fut)
+                    report.runs[name] = fut.result()
+                    done.add(name)
+
+        report.wall_sec = time.time() - t0
+        report.critical_path, report.critical_sec = _critical_path(graph, report)
+        return report
+
+
+def _safe_when(st: Stage, log: Callable[[str], None]) -> bool:
+    try:
+        return bool(st.when())
+    except Exception as e:
+        log(f"⚠️  Gate của stage {st.name} lỗi ({e}) → bỏ qua stage.")
+        return False
+
+
+def _critical_path(graph: StageGraph, report: TickReport) -> Tuple[List[str], float]:
+    """Chuỗi phụ thuộc có tổng thời gian chạy thực tế lớn nhất (stage skip = 0s)."""
+    best: Dict[str, Tuple[float, Optional[str]]] = {}
+
+    def cost(n: str) -> Tuple[float, Optional[str]]:
+        if n in best:
+            return best[n]
+        prev, acc = None, 0.0
+        for d in graph.deps[n]:
+            c, _ = cost(d)
+            if c > acc:
+                prev, acc = d, c
+        run = report.runs.get(n)
+        best[n] = (acc + (run.duration if run else 0.0), prev)
+        return best[n]
+
+    if not graph.stages:
+        return [], 0.0
+    tail = max(graph.stages, key=lambda n: cost(n)[0])
+    total = cost(tail)[0]
+    path: List[str] = []
+    cur: Optional[str] = tail
+    while cur is not None:
+        path.append(cur)
+        cur = best[cur][1]
+    return list(reversed(path)), total
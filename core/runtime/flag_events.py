@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+# core/runtime/flag_events.py
+"""
+Theo dõi file cờ (reload/stop/riskoff/closeall) theo sự kiện thay cho vòng stat 1–2s.
+- Linux: inotify (ctypes, không thêm thư viện) – block trên select → CPU nhàn rỗi = 0,
+  cờ đổi được phát hiện trong vài ms.
+- Nơi khác / inotify lỗi / CRX_FLAG_WATCH=poll: polling stat mỗi CRX_FLAG_POLL_SEC (mặc định 1s).
+- Mỗi thay đổi → callback on_change(name, exists) trên thread watcher + đánh thức wait_change().
+
+Ngắt stage tại safe point:
+- request_interrupt(reason) bật cờ ngắt; stage dài gọi safe_point("…") ở chỗ an toàn
+  (vd ngay trước khi gửi lệnh mở mới) → StageInterrupted; stage engine ghi rc=130.
+- clear_interrupt() ở đầu mỗi tick.
+- request_interrupt(reason, thread=th): ngắt riêng 1 thread (stage quá timeout vẫn chạy nền) – không bị
+  clear_interrupt() xoá, thread đó luôn dừng ở safe point kế tiếp.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import errno
+import ctypes
+import ctypes.util
+import select
+import struct
+import threading
+import weakref
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional
+
+WATCH_MODE = os.getenv("CRX_FLAG_WATCH", "auto").strip().lower()   # auto | inotify | poll
+POLL_SEC = float(os.getenv("CRX_FLAG_POLL_SEC", "1"))
+
+# inotify mask (linux/inotify.h)
+_IN_ATTRIB, _IN_CLOSE_WRITE = 0x004, 0x008
+_IN_MOVED_FROM, _IN_MOVED_TO = 0x040, 0x080
+_IN_CREATE, _IN_DELETE = 0x100, 0x200
+_IN_DELETE_SELF, _IN_MOVE_SELF, _IN_IGNORED = 0x400, 0x800, 0x8000
+_IN_NONBLOCK, _IN_CLOEXEC = 0o4000, 0o2000000
+_MASK = (_IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+         | _IN_DELETE_SELF | _IN_MOVE_SELF)
+_EV_HEAD = struct.Struct("iIII")
+
+
+class StageInterrupted(Exception):
+    """Stage dừng tại safe point vì có yêu cầu ngắt (risk-off / close-all)."""
+
+
+_interrupt = threading.Event()
+_interrupt_reason = ""
+_cancelled: "weakref.WeakKeyDictionary[threading.Thread, str]" = weakref.WeakKeyDictionary()
+
+
+def request_interrupt(reason: str, thread: Optional[threading.Thread] = None) -> None:
+    global _interrupt_reason
+    if thread is not None:
+        _cancelled[thread] = reason
+        return
+    _interrupt_reason = reason
+    _interrupt.set()
+
+
+def clear_interrupt() -> None:
+    _interrupt.clear()
+
+
+def interrupt_requested() -> bool:
+    return _interrupt.is_set()
+
+
+def safe_point(where: str = "") -> None:
+    """Gọi ở điểm an toàn trong stage: có yêu cầu ngắt → raise StageInterrupted."""
+    own = _cancelled.get(threading.current_thread())
+    if own is not None:
+        raise StageInterrupted(f"{own} @ {where or '?'}")
+    if _interrupt.is_set():
+        raise StageInterrupted(f"{_interrupt_reason or 'interrupt'} @ {where or '?'}")
+
+
+def _load_inotify():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        return libc
+    except Exception:
+        return None
+
+
+class FlagWatcher:
+    def __init__(self, flag_dir: Path, names: Iterable[str],
+                 on_change: Optional[Callable[[str, bool], None]] = None,
+                 mode: str = WATCH_MODE, poll_sec: float = POLL_SEC,
+                 log: Callable[[str], None] = print):
+        self.dir = Path(flag_dir)
+        self.names = tuple(names)
+        self.on_change = on_change
+        self.mode = mode if mode in ("auto", "inotify", "poll") else "auto"
+        self.poll_sec = poll_sec
+        self.log = log
+        self.state: Dict[str, bool] = {}
+        self.backend = "poll"
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._fd = -1
+        self._wake_r, self._wake_w = -1, -1
+
+    # ----- vòng đời -----
+    def start(self) -> "FlagWatcher":
+        if self._thread is not None:
+            return self
+        self._scan()  # trạng thái ban đầu (phát callback cho cờ đang tồn tại)
+        if self.mode != "poll" and self._open_inotify():
+            self.backend = "inotify"
+            target = self._inotify_loop
+        else:
+            if self.mode == "inotify":
+                self.log("[flag_events] ⚠️  inotify không khả dụng → polling.")
+            target = self._poll_loop
+        self._thread = threading.Thread(target=target, name=f"flag-watch:{self.backend}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._wake_w >= 0:
+            try:
+                os.write(self._wake_w, b"x")
+            except OSError:
+                pass
+
+    def exists(self, name: str) -> bool:
+        return self.state.get(name, False)
+
+    def wait_change(self, timeout: Optional[float] = None) -> bool:
+        """Block tới khi có cờ đổi (True) hoặc hết timeout (False). Không tốn CPU."""
+        with self._cond:
+            seq = self._seq
+            return self._cond.wait_for(lambda: self._seq != seq, timeout=timeout)
+
+    # ----- phát hiện thay đổi -----
+    def _scan(self) -> None:
+        for name in self.names:
+            cur = (self.dir / name).exists()
+            if self.state.get(name) is cur:
+                continue
+            self.state[name] = cur
+            if self.on_change is not None:
+                try:
+                    self.on_change(name, cur)
+                except Exception as e:
+                    self.log(f"[flag_events] ⚠️  callback {name} lỗi: {e}")
+            with self._cond:
+                self._seq += 1
+                self._cond.notify_all()
+
+    def _poll_loop(self) -> None:
+        while not self._stop.wait(self.poll_sec):
+            self._scan()
+
+    # ----- inotify -----
+    def _open_inotify(self) -> bool:
+        libc = _load_inotify()
+        if libc is None:
+            return False
+        fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if fd < 0:
+            return False
+        wd = libc.inotify_add_watch(fd, str(self.dir).encode(), _MASK)
+        if wd < 0:
+            os.close(fd)
+            return False
+        self._fd = fd
+        self._wake_r, self._wake_w = os.pipe()
+        return True
+
+    def _inotify_loop(self) -> None:
+        try:
+            while not self._stop.is_set():
+                ready, _, _ = select.select([self._fd, self._wake_r], [], [])
+                if self._wake_r in ready:
+                    break
+                try:
+                    buf = os.read(self._fd, 64 * 1024)
+                except OSError as e:
+                    if e.errno == errno.EAGAIN:
+                        continue
+                    raise
+                if self._dir_gone(buf):
+                    self.log(f"[flag_events] ⚠️  thư mục cờ {self.dir} bị xoá/đổi tên → chuyển polling.")
+                    self.backend = "poll"
+                    self._scan()
+                    self._poll_loop()
+                    return
+                self._scan()
+        except Exception as e:
+            self.log(f"[flag_events] ⚠️  inotify lỗi ({e}) → chuyển polling.")
+            self.backend = "poll"
+            self._poll_loop()
+        finally:
+            for fd in (self._fd, self._wake_r, self._wake_w):
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+
+    @staticmethod
+    def _dir_gone(buf: bytes) -> bool:
+        i = 0
+        while i + _EV_HEAD.size <= len(buf):
+            _, mask, _, ln = _EV_HEAD.unpack_from(buf, i)
+            if mask & (_IN_DELETE_SELF | _IN_MOVE_SELF | _IN_IGNORED):
+                return True
+            i += _EV_HEAD.size + ln
+        return False
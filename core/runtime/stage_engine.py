@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+# core/runtime/stage_engine.py
+"""
+Stage engine in-process cho auto_runner (thay cho `python -m` mỗi stage/tick).
+- Import mỗi module stage 1 lần, giữ runtime "ấm" (pandas/requests/CONFIG) qua các tick.
+- Gọi entry point của stage (hàm mà `if __name__ == "__main__"` vẫn gọi) thay vì tạo interpreter mới.
+- Truyền dữ liệu giữa các stage trong bộ nhớ qua TickContext (vd: quyết định của decision →
+  meta_controller / order_executor). Nến không đi qua ctx: decision đọc thẳng kho nến (memmap).
+- Giữ timeout từng stage bằng watchdog thread; stage treo → rc=124, các lần sau chạy subprocess
+  cho tới khi thread treo kết thúc (cách ly crash).
+- Stage đặt lệnh (EXCLUSIVE_STAGES) quá timeout: thread bị ngắt riêng (dừng ở safe_point kế tiếp) và
+  không bao giờ chạy bản thứ 2 song song (kể cả subprocess) – các lần sau trả 124 tới khi thread thoát.
+- CRX_STAGE_MODE=subprocess để quay về hành vi cũ (mỗi stage 1 tiến trình).
+
+Lưu ý: module không có entry point (vd feature_etl.*) chỉ được import – giống hệt `python -m`
+với module không có khối __main__.
+Tham số dòng lệnh không đi qua sys.argv (dùng chung cả process, các stage chạy song song sẽ đọc lẫn
+argv của nhau): entry point nhận `argv=[...]` nếu khai báo tham số argv; stage có args mà không nhận
+argv → chạy subprocess.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import runpy
+import inspect
+import importlib
+import threading
+import traceback
+import subprocess
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from core.runtime.flag_events import StageInterrupted, request_interrupt
+
+ROOT = Path(__file__).resolve().parents[2]
+PYTHON = sys.executable
+
+# inproc (mặc định) | subprocess
+STAGE_MODE = os.getenv("CRX_STAGE_MODE", "inproc").strip().lower()
+
+# Entry point của từng stage: tên hàm trong module, None = chỉ import (module không có __main__).
+# Module không có trong bảng → chạy bằng runpy (run_name="__main__"), phụ thuộc vẫn ấm.
+ENTRYPOINTS: Dict[str, Optional[str]] = {
+    "core.collector.market_collector": "run",
+    "core.feature_etl.cleaner": None,
+    "core.feature_etl.alignment": None,
+    "core.feature_etl.selector": None,
+    "core.analyzer.technical_analyzer": None,
+    "core.aggregators.left_agg": None,
+    "core.decision.decision_maker": "main",
+    "core.decision.meta_controller": "main",
+    "core.capital.funding_optimizer": None,
+    "core.execution.order_executor": "run",
+    "core.execution.order_monitor": None,
+    "core.evaluator.pnl_sync": "main",
+    "notifier.notify_decision": "main",
+    "notifier.notify_flags": "main",
+    "report.report_daily": None,
+    "tools.close_all_positions": "main",
+}
+
+# Stage đặt lệnh: bản treo còn sống → bỏ qua (rc 124), không chạy subprocess bên cạnh (tránh đặt trùng lệnh)
+EXCLUSIVE_STAGES = frozenset({"core.execution.order_executor", "tools.close_all_positions"})
+
+# Các package của dự án: bị gỡ khỏi sys.modules khi reset() để nạp lại code/config
+_PROJECT_PKGS = ("core", "config", "configs", "notifier", "report", "tools", "utils")
+# Hạ tầng runtime (engine, cờ sự kiện, nguồn tick) giữ nguyên qua reset – trạng thái dùng chung với runner
+_KEEP_PREFIX = "core.runtime"
+
+# Module có singleton chạy nền (thread/ws): gọi shutdown() trước khi gỡ, tránh rò thread mỗi lần reload
+_SHUTDOWN_BEFORE_RESET = ("core.execution.user_stream", "notifier.outbox")
+
+# rc khi stage dừng tại safe point (giống tiến trình bị SIGINT)
+RC_INTERRUPTED = 130
+
+
+class TickContext(dict):
+    """Kho dữ liệu in-memory dùng chung giữa các stage trong 1 tick."""
+    def __init__(self, tick_id: int = 0):
+        super().__init__()
+        self.tick_id = tick_id
+        self.results: Dict[str, Any] = {}
+
+
+def _rc_from(value: Any) -> int:
+    """Quy đổi giá trị trả về của entry point sang return code kiểu tiến trình."""
+    if value is None or value is True:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, int):
+        return value
+    return 0
+
+
+class StageEngine:
+    def __init__(self, mode: str = STAGE_MODE, log: Callable[[str], None] = print):
+        self.mode = mode if mode in ("inproc", "subprocess") else "inproc"
+        self.log = log
+        self.ctx = TickContext()
+        self._tick = 0
+        self._hung: Dict[str, threading.Thread] = {}   # stage đang treo sau timeout
+        self._sig_cache: Dict[Any, frozenset] = {}
+
+    # ----- vòng đời -----
+    def new_tick(self) -> TickContext:
+        self._tick += 1
+        self.ctx = TickContext(self._tick)
+        return self.ctx
+
+    def reset(self) -> None:
+        """Gỡ module dự án đã import (trừ core.runtime) để tick sau nạp lại code & config."""
+        for name in _SHUTDOWN_BEFORE_RESET:
+            m = sys.modules.get(name)
+            fn = getattr(m, "shutdown", None)
+            if fn is None:
+                continue
+            try:
+                fn()
+            except Exception as e:
+                self.log(f"⚠️  {name}.shutdown() lỗi: {e}")
+        for name in list(sys.modules):
+            if name.startswith(_KEEP_PREFIX):
+                continue
+            top = name.split(".", 1)[0]
+            if top in _PROJECT_PKGS:
+                sys.modules.pop(name, None)
+        self._sig_cache.clear()
+        importlib.invalidate_caches()
+
+    # ----- chạy stage -----
+    def run(self, mod: str, args: Optional[List[str]] = None, timeout: int = 300) -> int:
+        args = list(args or [])
+        if self.mode == "subprocess":
+            return self._run_subprocess(mod, args, timeout)
+        if self._still_hung(mod):
+            if mod in EXCLUSIVE_STAGES:
+                self.log(f"⚠️  {mod} lần trước vẫn chạy (chờ dừng ở safe point) → bỏ qua vòng này.")
+                return 124
+            self.log(f"⚠️  {mod} vẫn treo từ lần trước → chạy subprocess (cách ly).")
+            return self._run_subprocess(mod, args, timeout)
+        if args and not self._accepts_argv(mod):
+            return self._run_subprocess(mod, args, timeout)
+        return self._run_guarded(mod, lambda: self._call_stage(mod, args), timeout)
+
+    def hung_thread(self, label: str) -> Optional[threading.Thread]:
+        """Thread của stage đã quá timeout mà chưa thoát (None nếu không có)."""
+        return self._hung.get(label) if self._still_hung(label) else None
+
+    def _still_hung(self, label: str) -> bool:
+        th = self._hung.get(label)
+        if th is None:
+            return False
+        if th.is_alive():
+            return True
+        self._hung.pop(label, None)
+        return False
+
+    def _run_subprocess(self, mod: str, args: List[str], timeout: int) -> int:
+        try:
+            res = subprocess.run([PYTHON, "-m", mod, *args], capture_output=False, check=False, timeout=timeout)
+            return res.returncode
+        except subprocess.TimeoutExpired:
+            self.log(f"⚠️  TIMEOUT: {mod}")
+            return 124
+        except Exception as e:
+            self.log(f"❌ Lỗi chạy {mod}: {e}")
+            return 1
+
+    def _run_guarded(self, label: str, target: Callable[[], int], timeout: int) -> int:
+        box: Dict[str, Any] = {"rc": 1}
+
+        def _worker():
+            box["rc"] = target()
+
+        th = threading.Thread(target=_worker, name=f"stage:{label}", daemon=True)
+        th.start()
+        th.join(timeout)
+        if th.is_alive():
+            self._hung[label] = th
+            self.log(f"⚠️  TIMEOUT: {label}")
+            if label in EXCLUSIVE_STAGES:
+                request_interrupt(f"timeout {label}", thread=th)
+            return 124
+        return int(box["rc"])
+
+    def _call_stage(self, mod: str, args: List[str]) -> int:
+        try:
+            if mod not in ENTRYPOINTS:
+                runpy.run_module(mod, run_name="__main__", alter_sys=False)
+                return 0
+            m = importlib.import_module(mod)
+            entry = ENTRYPOINTS[mod]
+            if entry is None:
+                return 0
+            fn = getattr(m, entry)
+            params = self._params(fn)
+            kw: Dict[str, Any] = {}
+            if "ctx" in params:
+                kw["ctx"] = self.ctx
+            if "argv" in params:
+                kw["argv"] = list(args)
+            out = fn(**kw)
+            self.ctx.results[mod] = out
+            return _rc_from(out)
+        except SystemExit as e:
+            if e.code is None:
+                return 0
+            return e.code if isinstance(e.code, int) else 1
+        except StageInterrupted as e:
+            self.log(f"⏹️  {mod} dừng tại safe point: {e}")
+            return RC_INTERRUPTED
+        except Exception as e:
+            self.log(f"❌ Lỗi chạy {mod}: {e}")
+            traceback.print_exc()
+            return 1
+
+    def _params(self, fn: Callable) -> frozenset:
+        if fn not in self._sig_cache:
+            try:
+                self._sig_cache[fn] = frozenset(inspect.signature(fn).parameters)
+            except (TypeError, ValueError):
+                self._sig_cache[fn] = frozenset()
+        return self._sig_cache[fn]
+
+    def _accepts_argv(self, mod: str) -> bool:
+        """Entry point của stage nhận argv tường minh? (không → stage có args phải chạy subprocess)"""
+        entry = ENTRYPOINTS.get(mod)
+        if not entry:
+            return False
+        try:
+            return "argv" in self._params(getattr(importlib.import_module(mod), entry))
+        except (Exception, SystemExit):
+            return False
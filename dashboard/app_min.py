@@ -5,11 +5,13 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import streamlit as st
 from pathlib import Path
 from utils.io_utils import read_json
+from core.memory.decision_log import get_log
+from core.memory.state_store import get_store
 
 st.set_page_config(page_title="CrX Dashboard (Core)", layout="wide")
 st.title("CrX Dashboard — Phase CORE")
 
-dec = read_json(Path("data/decision_history.json"), [])
+dec = get_log().tail(10)
 trd = read_json(Path("data/trade_history.json"), [])
 
 st.subheader("Decision History")
@@ -18,4 +20,8 @@ st.json(dec[-10:] if dec else [])
 st.subheader("Trade History")
 st.json(trd[-10:] if trd else [])
 
+st.subheader("Runner State")
+store = get_store()
+st.json({ns: store.get_ns(ns) for ns in ("meta", "executor", "fairness")})
+
 st.caption("Phase CORE scaffold — realtime PnL sẽ bổ sung ở Phase A/B.")
\ No newline at end of file
@@ -1,12 +1,12 @@
 # -*- coding: utf-8 -*-
 """
 Gửi thông báo Telegram khi có quyết định mới (MarkdownV2 tiếng Việt, escape an toàn).
-- Đọc: data/decision_history.json (list hoặc NDJSON)
-- Lưu mốc: .runner.lock/notify_state.json -> last_ts
+- Đọc: decision log (core.memory.decision_log) – chỉ các bản ghi cuối
+- Lưu mốc: state store, ns "notify" -> last_ts
 ENV: TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID (hoặc TELEGRAM_USER_ID)
 """
 from __future__ import annotations
-import os, json, re
+import os, sys, re
 from pathlib import Path
 from datetime import datetime
 from dotenv import load_dotenv
@@ -16,10 +16,12 @@ load_dotenv(override=True)
 from notifier.notify_telegram import send_telegram_message
 
 ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+from core.memory.decision_log import get_log  # noqa: E402
+
 DATA = ROOT / "data"
-DATA_FILE = DATA / "decision_history.json"
-LOCK = ROOT / ".runner.lock"; LOCK.mkdir(exist_ok=True)
-STATE_FILE = LOCK / "notify_state.json"
+TAIL = 50   # số bản ghi cuối cần xét để tìm bản mới nhất
+STATE_NS = "notify"
 
 # Các ký tự phải escape theo MarkdownV2
 MDV2 = r"_*\[\]()~`>#+\-=|{}.!\\"
@@ -37,29 +39,21 @@ def fnum(x, n=2) -> str:
     return esc(s)
 
 def _read_decisions() -> list[dict]:
-    if not DATA_FILE.exists(): return []
-    raw = DATA_FILE.read_text(encoding="utf-8", errors="ignore")
     try:
-        obj = json.loads(raw)
-        return obj if isinstance(obj, list) else [obj]
+        return get_log().tail(TAIL)
     except Exception:
-        # NDJSON fallback
-        rows = []
-        for line in raw.splitlines():
-            line = line.strip()
-            if not line: continue
-            try: rows.append(json.loads(line))
-            except Exception: pass
-        return rows
+        return []
 
 def _load_state() -> dict:
-    if STATE_FILE.exists():
-        try: return json.loads(STATE_FILE.read_text(encoding="utf-8"))
-        except Exception: return {}
-    return {}
+    try:
+        from core.memory.state_store import get_store
+        return get_store().get_ns(STATE_NS)
+    except Exception:
+        return {}
 
 def _save_state(s: dict):
-    STATE_FILE.write_text(json.dumps(s, ensure_ascii=False, indent=2), encoding="utf-8")
+    from core.memory.state_store import get_store
+    get_store().put_many(STATE_NS, s)
 
 def _join_list(d: dict, key: str) -> str:
     arr = d.get(key) or []
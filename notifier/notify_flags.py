@@ -2,10 +2,10 @@
 """
 Gửi Telegram khi cờ điều khiển thay đổi (MarkdownV2 tiếng Việt).
 - Theo dõi: reload.flag, stop.flag, riskoff.flag
-- Lưu trạng thái: .runner.lock/notify_state.json -> flags
+- Lưu trạng thái: state store, ns "notify" -> flags
 """
 from __future__ import annotations
-import os, json, re
+import os, re
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -14,8 +14,7 @@ load_dotenv(override=True)
 from notifier.notify_telegram import send_telegram_message
 
 ROOT = Path(__file__).resolve().parents[1]
-LOCK = ROOT / ".runner.lock"; LOCK.mkdir(exist_ok=True)
-STATE_FILE = LOCK / "notify_state.json"
+STATE_NS = "notify"
 
 FLAG_DIR = Path(os.getenv("CRX_FLAG_DIR", str(ROOT))).resolve()
 RELOAD = FLAG_DIR / "reload.flag"
@@ -27,13 +26,15 @@ def esc(x: object) -> str:
     return re.sub(rf"([{MDV2}])", r"\\\1", str(x))
 
 def _load_state() -> dict:
-    if STATE_FILE.exists():
-        try: return json.loads(STATE_FILE.read_text(encoding="utf-8"))
-        except Exception: return {}
-    return {}
+    try:
+        from core.memory.state_store import get_store
+        return get_store().get_ns(STATE_NS)
+    except Exception:
+        return {}
 
 def _save_state(s: dict):
-    STATE_FILE.write_text(json.dumps(s, ensure_ascii=False, indent=2), encoding="utf-8")
+    from core.memory.state_store import get_store
+    get_store().put_many(STATE_NS, s)
 
 def _status(p: Path) -> str:
     return "BẬT" if p.exists() else "TẮT"
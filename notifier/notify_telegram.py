@@ -4,11 +4,15 @@ Gửi Telegram an toàn:
 - Không đặt parse_mode mặc định (tránh lỗi Markdown).
 - Trả True chỉ khi HTTP 200 và body.ok == True.
 - In status/resp để debug nhanh.
+- Mặc định không gọi mạng trong luồng gọi: tin vào outbox bền (notifier/outbox.py), thread nền gửi có throttle,
+  gom digest và retry. send_telegram_message trả True khi đã xếp hàng.
+  kind (EXECUTED/ERROR/RISK_ALERT/INFO/...) quyết định gửi ngay hay gom theo bundling.notify_on của central.yaml.
+  sync=True hoặc CRX_TG_OUTBOX=0 → gửi đồng bộ như cũ, trả kết quả HTTP.
 ENV: TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID (hoặc TELEGRAM_USER_ID)
 """
 from __future__ import annotations
-import os, json
-from typing import Optional
+import os, json, threading
+from typing import Optional, Tuple
 try:
     from dotenv import load_dotenv
     load_dotenv(override=True)
@@ -16,25 +20,39 @@ except Exception:
     pass
 
 import requests  # pip install requests
+from requests.adapters import HTTPAdapter
+
+_SESSION: Optional[requests.Session] = None
+_SESSION_LOCK = threading.Lock()
+
+def _session() -> requests.Session:
+    global _SESSION
+    if _SESSION is None:
+        with _SESSION_LOCK:
+            if _SESSION is None:
+                s = requests.Session()
+                s.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+                _SESSION = s
+    return _SESSION
 
 def _get_env():
     token = (os.getenv("TELEGRAM_BOT_TOKEN") or "").strip()
     chat  = (os.getenv("TELEGRAM_CHAT_ID") or os.getenv("TELEGRAM_USER_ID") or "").strip()
     return token, chat
 
-def send_telegram_message(
+def post_telegram(
     text: str,
-    *,
     chat_id: Optional[str] = None,
     parse_mode: Optional[str] = None,
     disable_web_page_preview: bool = True,
     timeout: int = 12,
-) -> bool:
+) -> Tuple[bool, Optional[int], float]:
+    """Gọi sendMessage (session dùng chung). Trả (ok, http_status | None nếu lỗi mạng, retry_after giây)."""
     token, default_chat = _get_env()
     chat = chat_id or default_chat
     if not token or not chat:
         print("[notify_telegram] ⚠️ Thiếu TELEGRAM_BOT_TOKEN/CHAT_ID trong .env")
-        return False
+        return False, 400, 0.0
 
     url = f"https://api.telegram.org/bot{token}/sendMessage"
     data = {"chat_id": chat, "text": text}
@@ -45,7 +63,7 @@ def send_telegram_message(
         data["disable_web_page_preview"] = True
 
     try:
-        r = requests.post(url, data=data, timeout=timeout)
+        r = _session().post(url, data=data, timeout=timeout)
         body = None
         ok = False
         try:
@@ -54,9 +72,37 @@ def send_telegram_message(
         except Exception:
             body = r.text
             ok = bool(r.ok)
+        retry_after = 0.0
+        if isinstance(body, dict):
+            retry_after = float((body.get("parameters") or {}).get("retry_after", 0) or 0)
         body_preview = json.dumps(body)[:200] if isinstance(body, dict) else repr(body)[:200]
         print(f"[notify_telegram] status={r.status_code} ok={ok} resp={body_preview}")
-        return ok
+        return ok, r.status_code, retry_after
     except Exception as e:
         print(f"[notify_telegram] ❌ HTTP error: {e}")
-        return False
\ No newline at end of file
+        return False, None, 0.0
+
+def send_telegram_message(
+    text: str,
+    *,
+    chat_id: Optional[str] = None,
+    parse_mode: Optional[str] = None,
+    disable_web_page_preview: bool = True,
+    timeout: int = 12,
+    kind: Optional[str] = None,
+    sync: bool = False,
+) -> bool:
+    token, default_chat = _get_env()
+    if not token or not (chat_id or default_chat):
+        print("[notify_telegram] ⚠️ Thiếu TELEGRAM_BOT_TOKEN/CHAT_ID trong .env")
+        return False
+
+    if not sync and os.getenv("CRX_TG_OUTBOX", "1") != "0":
+        try:
+            from notifier.outbox import get_outbox
+            get_outbox().enqueue(text, chat_id=chat_id, parse_mode=parse_mode,
+                                 disable_web_page_preview=disable_web_page_preview, kind=kind)
+            return True
+        except Exception as e:
+            print(f"[notify_telegram] ⚠️ outbox lỗi, gửi trực tiếp: {e}")
+    return post_telegram(text, chat_id, parse_mode, disable_web_page_preview, timeout)[0]
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""
+Outbox Telegram bất đồng bộ. Code giao dịch chỉ trả chi phí enqueue: 1 lần ghi SQLite WAL, không gọi mạng.
+- Hàng đợi bền: mỗi tin là 1 key trong ns "tg_outbox" của state store (data/state.db). Crash/restart không mất tin,
+  và tin do tool ngắn hạn (eod_kpi, anomaly_watcher...) xếp hàng sẽ được runner gửi nếu tool thoát sớm.
+- 1 thread nền mỗi process rút hàng đợi. Tin được "thuê" (lease) trong transaction trước khi gửi nên nhiều process
+  dùng chung hàng đợi không gửi trùng. Process chết giữa chừng → hết lease → tin được gửi lại.
+- Session requests dùng chung (keep-alive tới api.telegram.org).
+- Throttle: token bucket notifications.telegram.throttle_per_minute (central.yaml), trạng thái bucket nằm trong
+  state store (ns "notify") nên áp cho mọi process. Telegram trả 429 → tôn trọng retry_after.
+- Gom tin (bundling.* trong central.yaml):
+  + Tin có kind không thuộc notify_on (vd INFO/WARN) được gom thành digest khi tin cũ nhất đã chờ
+    interval_minutes, hoặc sớm hơn khi đủ max_events_per_bundle.
+  + Tin khẩn (kind thuộc notify_on, hoặc không có kind) gửi ngay. Nếu tồn đọng nhiều hơn số token còn lại
+    thì gộp thành digest, mỗi digest ≤ max_events_per_bundle tin và ≤ 4000 ký tự.
+- Lỗi mạng/5xx/429: thử lại với backoff mũ (tối đa CRX_TG_MAX_ATTEMPTS lần). 400 do parse_mode → gửi lại dạng text thường.
+
+ENV: CRX_TG_OUTBOX=0 (gửi đồng bộ như cũ), CRX_TG_MAX_ATTEMPTS (8), CRX_TG_FLUSH_SEC (10, chờ gửi nốt lúc thoát),
+     CRX_TG_LEASE_SEC (60)
+"""
+from __future__ import annotations
+
+import os
+import re
+import time
+import atexit
+import random
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+CENTRAL_YAML = ROOT / "config" / "central.yaml"
+
+NS = "tg_outbox"
+MAX_ATTEMPTS = int(os.getenv("CRX_TG_MAX_ATTEMPTS", "8"))
+FLUSH_SEC = float(os.getenv("CRX_TG_FLUSH_SEC", "10"))
+LEASE_SEC = float(os.getenv("CRX_TG_LEASE_SEC", "60"))
+CLAIM_BATCHES = 4        # số tin/digest thuê mỗi lượt: 4 × timeout 12s vẫn < LEASE_SEC
+MAX_TEXT = 4000          # Telegram giới hạn 4096 ký tự/tin
+_MD2_SPECIAL = re.compile(r"([_*\[\]()~`>#+\-=|{}.!\\])")
+
+
+def _load_policy() -> Dict[str, Any]:
+    pol = {"enabled": True, "interval_sec": 12 * 60.0, "max_events": 30,
+           "notify_on": {"EXECUTED", "ERROR", "RISK_ALERT"}, "per_minute": 6.0,
+           "header": "🧠 CrX Central", "footer": ""}
+    try:
+        import yaml
+        with open(CENTRAL_YAML, "r", encoding="utf-8") as f:
+            cfg = yaml.safe_load(f) or {}
+        b = cfg.get("bundling") or {}
+        tg = (cfg.get("notifications") or {}).get("telegram") or {}
+        tpl = tg.get("template") or {}
+        pol.update(enabled=bool(b.get("enabled", True)),
+                   interval_sec=float(b.get("interval_minutes", 12)) * 60.0,
+                   max_events=max(1, int(b.get("max_events_per_bundle", 30))),
+                   notify_on={str(k).upper() for k in (b.get("notify_on") or pol["notify_on"])},
+                   per_minute=max(0.1, float(tg.get("throttle_per_minute", 6))),
+                   header=str(tpl.get("header", pol["header"]) or ""),
+                   footer=str(tpl.get("footer", "") or ""))
+    except Exception as e:
+        print(f"[outbox] ⚠️ đọc central.yaml lỗi, dùng mặc định: {e}")
+    return pol
+
+
+def _escape_md2(s: str) -> str:
+    return _MD2_SPECIAL.sub(r"\\\1", s)
+
+
+def compose(msgs: List[Dict[str, Any]], header: str = "", footer: str = "") -> str:
+    """Ghép nhiều tin (cùng chat/parse_mode) thành 1 digest."""
+    if len(msgs) == 1:
+        return msgs[0]["text"]
+    md2 = (msgs[0].get("parse_mode") or "").lower() == "markdownv2"
+    head = f"{header} — {len(msgs)} sự kiện".strip(" —") if header else f"{len(msgs)} sự kiện"
+    parts = [_escape_md2(head) if md2 else head]
+    parts += [m["text"] for m in msgs]
+    if footer:
+        parts.append(_escape_md2(footer) if md2 else footer)
+    return "\n\n".join(parts)
+
+
+def _chunks(msgs: List[Dict[str, Any]], max_events: int) -> List[List[Dict[str, Any]]]:
+    """Chia theo (chat, parse_mode), mỗi nhóm ≤ max_events tin và ≤ MAX_TEXT ký tự (giữ thứ tự)."""
+    out: List[List[Dict[str, Any]]] = []
+    cur: List[Dict[str, Any]] = []
+    size = 0
+    for m in msgs:
+        same = cur and (cur[0].get("chat_id"), cur[0].get("parse_mode")) == (m.get("chat_id"), m.get("parse_mode"))
+        if cur and (not same or len(cur) >= max_events or size + len(m["text"]) + 2 > MAX_TEXT):
+            out.append(cur)
+            cur, size = [], 0
+        cur.append(m)
+        size += len(m["text"]) + 2
+    if cur:
+        out.append(cur)
+    return out
+
+
+class TelegramOutbox:
+    def __init__(self, send_fn: Callable[..., Tuple[bool, Optional[int], float]], store=None,
+                 policy: Optional[Dict[str, Any]] = None, poll_sec: float = 1.0):
+        """send_fn(text, chat_id, parse_mode, disable_web_page_preview) → (ok, http_status, retry_after_sec)."""
+        self.send_fn = send_fn
+        self._store = store
+        self.policy = policy or _load_policy()
+        self.poll_sec = poll_sec
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._seq = 0
+        self.stats = {"enqueued": 0, "sent": 0, "digests": 0, "retries": 0, "dropped": 0}
+
+    @property
+    def store(self):
+        if self._store is None:
+            from core.memory.state_store import get_store
+            self._store = get_store()
+        return self._store
+
+    # ----- phía gọi -----
+    def enqueue(self, text: str, *, chat_id: Optional[str] = None, parse_mode: Optional[str] = None,
+                disable_web_page_preview: bool = True, kind: Optional[str] = None) -> str:
+        with self._lock:
+            self._seq += 1
+            key = f"{time.time_ns():020d}-{os.getpid()}-{self._seq}"
+        kind = (kind or "").upper()
+        bundle = bool(kind) and self.policy["enabled"] and kind not in self.policy["notify_on"]
+        self.store.put(NS, key, {"text": str(text), "chat_id": chat_id, "parse_mode": parse_mode,
+                                 "preview": not disable_web_page_preview, "kind": kind, "bundle": bundle,
+                                 "ts": time.time(), "attempts": 0, "next_try": 0.0, "lease": 0.0})
+        self.stats["enqueued"] += 1
+        self.start()
+        if not bundle:
+            self._wake.set()
+        return key
+
+    def pending(self) -> int:
+        return len(self.store.get_ns(NS))
+
+    # ----- thread nền -----
+    def start(self) -> "TelegramOutbox":
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._stop.clear()
+                    self._thread = threading.Thread(target=self._loop, name="tg-outbox", daemon=True)
+                    self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                sent = self.drain_once()
+            except Exception as e:
+                print(f"[outbox] ⚠️ lỗi vòng gửi: {e}")
+                sent = 0
+            if not sent:
+                self._wake.wait(self.poll_sec)
+                self._wake.clear()
+
+    def flush(self, timeout: float = FLUSH_SEC) -> int:
+        """Gửi nốt tin khẩn (bỏ qua chờ gom) trong tối đa timeout giây; trả số tin còn lại."""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if not self.drain_once(force_bundle=True) and not self._due(time.time(), any_lease=True):
+                break
+            time.sleep(0.2)
+        return self.pending()
+
+    # ----- lập lịch gửi -----
+    def _due(self, now: float, any_lease: bool = False) -> List[Tuple[str, Dict[str, Any]]]:
+        rows = sorted(self.store.get_ns(NS).items())
+        return [(k, m) for k, m in rows if (any_lease or m.get("lease", 0) <= now) and m.get("next_try", 0) <= now]
+
+    def _claim(self, force_bundle: bool = False) -> List[Tuple[List[str], List[Dict[str, Any]]]]:
+        """Trong 1 transaction: nạp token, chọn tin đến hạn, gom digest, đặt lease. Trả [(keys, msgs)]."""
+        pol = self.policy
+        now = time.time()
+        with self.store.transaction() as tx:
+            rows = sorted(tx.get_ns(NS).items())
+            ready = [(k, m) for k, m in rows if m.get("lease", 0) <= now and m.get("next_try", 0) <= now]
+            if not ready:
+                return []
+            rate = pol["per_minute"] / 60.0
+            cap = max(1.0, pol["per_minute"])
+            b = tx.get("notify", "tg_bucket") or {"tokens": cap, "ts": now}
+            tokens = min(cap, float(b.get("tokens", cap)) + (now - float(b.get("ts", now))) * rate)
+            urgent = [(k, m) for k, m in ready if not m.get("bundle")]
+            lazy = [(k, m) for k, m in ready if m.get("bundle")]
+            batches: List[List[Tuple[str, Dict[str, Any]]]] = []
+            if urgent:
+                if len(urgent) <= int(tokens):
+                    batches += [[x] for x in urgent]
+                else:                            # tồn đọng vượt throttle → gộp thành digest
+                    groups = _chunks([dict(m, _k=k) for k, m in urgent], pol["max_events"])
+                    batches += [[(m["_k"], m) for m in g] for g in groups]
+            oldest = min((float(m.get("ts", now)) for _, m in lazy), default=now)
+            if lazy and (force_bundle or now - oldest >= pol["interval_sec"] or len(lazy) >= pol["max_events"]):
+                groups = _chunks([dict(m, _k=k) for k, m in lazy], pol["max_events"])
+                batches += [[(m["_k"], m) for m in g] for g in groups]
+            batches = batches[:max(0, min(CLAIM_BATCHES, int(tokens)))]
+            if not batches:
+                return []
+            for batch in batches:
+                for k, m in batch:
+                    m.pop("_k", None)
+                    tx.put(NS, k, dict(m, lease=now + LEASE_SEC))
+            tx.put("notify", "tg_bucket", {"tokens": tokens - len(batches), "ts": now})
+        return [([k for k, _ in batch], [m for _, m in batch]) for batch in batches]
+
+    def drain_once(self, force_bundle: bool = False) -> int:
+        batches = self._claim(force_bundle)
+        for keys, msgs in batches:
+            self._deliver(keys, msgs)
+        return len(batches)
+
+    def _deliver(self, keys: List[str], msgs: List[Dict[str, Any]]) -> None:
+        pol = self.policy
+        text = compose(msgs, pol["header"], pol["footer"])
+        m0 = msgs[0]
+        ok, status, retry_after = self.send_fn(text, m0.get("chat_id"), m0.get("parse_mode"), not m0.get("preview"))
+        if not ok and status == 400 and m0.get("parse_mode"):
+            ok, status, retry_after = self.send_fn(text, m0.get("chat_id"), None, not m0.get("preview"))
+        if ok:
+            with self.store.transaction() as tx:
+                for k in keys:
+                    tx.delete(NS, k)
+            self.stats["sent"] += len(msgs)
+            self.stats["digests"] += 1 if len(msgs) > 1 else 0
+            return
+        permanent = status is not None and 400 <= status < 500 and status != 429
+        now = time.time()
+        with self.store.transaction() as tx:
+            if status == 429 and retry_after:
+                tx.put("notify", "tg_bucket", {"tokens": 0.0, "ts": now + retry_after})
+            for k, m in zip(keys, msgs):
+                attempts = int(m.get("attempts", 0)) + 1
+                if permanent or attempts >= MAX_ATTEMPTS:
+                    tx.delete(NS, k)
+                    self.stats["dropped"] += 1
+                    print(f"[outbox] ❌ bỏ tin sau {attempts} lần (status={status}): {m['text'][:80]!r}")
+                    continue
+                delay = max(retry_after, min(300.0, 2.0 ** attempts)) * random.uniform(1.0, 1.2)
+                tx.put(NS, k, dict(m, attempts=attempts, next_try=now + delay, lease=0.0))
+                self.stats["retries"] += 1
+
+
+_OUTBOX: Optional[TelegramOutbox] = None
+_OUTBOX_LOCK = threading.Lock()
+
+
+def get_outbox() -> TelegramOutbox:
+    global _OUTBOX
+    if _OUTBOX is None:
+        with _OUTBOX_LOCK:
+            if _OUTBOX is None:
+                from notifier.notify_telegram import post_telegram
+                _OUTBOX = TelegramOutbox(post_telegram)
+                atexit.register(_flush_at_exit)
+    return _OUTBOX
+
+
+def shutdown() -> None:
+    """Dừng thread gửi của outbox dùng chung (tin chưa gửi vẫn nằm trong state store cho outbox mới)."""
+    global _OUTBOX
+    with _OUTBOX_LOCK:
+        ob, _OUTBOX = _OUTBOX, None
+    if ob is not None:
+        ob.stop()
+
+
+def _flush_at_exit() -> None:
+    ob = _OUTBOX
+    if ob is None or not ob.stats["enqueued"]:
+        return
+    try:
+        left = ob.flush()
+        if left:
+            print(f"[outbox] còn {left} tin trong hàng đợi (process khác/lần chạy sau sẽ gửi)")
+    except Exception:
+        pass
@@ -2,14 +2,14 @@
 """
 CrX 1.7 – Dashboard (Minimal, nâng cấp)
 - KPI từ data/pnl_summary.json (REALIZED_PNL).
-- Biểu đồ Equity/PnL & Bảng lệnh đã đóng từ data/pnl_income_raw.json.
+- Biểu đồ Equity/PnL & Bảng lệnh đã đóng từ history_db, bảng income (chỉ đọc symbol + khoảng ngày đã lọc).
 - Lọc symbol + khoảng ngày, tải CSV.
 - Equity có offset từ .env: CRX_PNL_INIT (tuỳ chọn).
-- Hiển thị quyết định gần nhất từ data/decision_history.json.
+- Hiển thị quyết định gần nhất từ history_db, bảng decisions (chỉ mục ts, đồng bộ từ decision log).
 - Điều khiển runner qua cờ: reload / stop / riskoff / resume / closeall.
 """
 from __future__ import annotations
-import os, json
+import os, sys, json
 from pathlib import Path
 from datetime import datetime, timedelta, timezone, date
 import pandas as pd
@@ -27,10 +27,11 @@ DATA_DIR = ROOT / "data"
 LOGS_DIR = ROOT / "logs"
 FLAG_DIR = Path(os.getenv("CRX_FLAG_DIR", str(ROOT))).resolve()
 DATA_DIR.mkdir(exist_ok=True); LOGS_DIR.mkdir(exist_ok=True)
+sys.path.append(str(ROOT))
+from core.memory.history_db import get_db  # noqa: E402
 
-DECISION_FILE     = DATA_DIR / "decision_history.json"
+DECISION_LIMIT    = 5000   # trần số bản ghi quyết định đọc cho bảng
 PNL_SUMMARY_FILE  = DATA_DIR / "pnl_summary.json"
-PNL_INCOME_RAW    = DATA_DIR / "pnl_income_raw.json"
 
 PNL_INIT = float(os.getenv("CRX_PNL_INIT", "0") or 0.0)  # vốn khởi điểm (tuỳ chọn)
 
@@ -41,19 +42,27 @@ def read_json(path: Path):
     except Exception:
         return None
 
-def read_decisions() -> list[dict]:
-    if not DECISION_FILE.exists(): return []
-    txt = DECISION_FILE.read_text(encoding="utf-8", errors="ignore")
+def read_decisions(minutes: int = 0) -> list[dict]:
+    """Quyết định trong `minutes` phút gần nhất (range scan chỉ mục ts); 0 → DECISION_LIMIT bản ghi cuối."""
     try:
-        obj = json.loads(txt);  return obj if isinstance(obj, list) else [obj]
+        since = datetime.now(timezone.utc) - timedelta(minutes=minutes) if minutes > 0 else None
+        return get_db().decisions(since=since, limit=DECISION_LIMIT)
     except Exception:
-        rows=[]
-        for line in txt.splitlines():
-            line=line.strip()
-            if not line: continue
-            try: rows.append(json.loads(line))
-            except Exception: pass
-        return rows
+        return []
+
+def read_income(symbols=None, start=None, end=None) -> pd.DataFrame:
+    """REALIZED_PNL trong [start, end) / symbols từ history_db → DataFrame (time UTC, income float)."""
+    try:
+        rows = get_db().income(since=start, until=end, symbols=symbols or None)
+    except Exception:
+        rows = []
+    df = pd.DataFrame(rows)
+    if df.empty:
+        return df
+    df["income"] = pd.to_numeric(df["income"], errors="coerce").fillna(0.0)
+    df["time"] = pd.to_datetime(pd.to_numeric(df["time"]), unit="ms", utc=True)
+    df["symbol"] = df.get("symbol", "").astype(str)
+    return df
 
 def to_dt(s: str):
     try: return datetime.fromisoformat(s.replace("Z","+00:00"))
@@ -101,20 +110,15 @@ with st.sidebar:
 
     st.markdown("---")
     st.subheader("Bộ lọc PnL")
-    _raw = read_json(PNL_INCOME_RAW) or []
-    _df0 = pd.DataFrame(_raw) if isinstance(_raw, list) and _raw else pd.DataFrame()
-    if not _df0.empty:
-        _df0 = _df0[_df0.get("incomeType","") == "REALIZED_PNL"].copy()
-        if not _df0.empty:
-            _df0["time"] = pd.to_datetime(_df0["time"], unit="ms", utc=True)
-            _symbols = sorted([s for s in _df0.get("symbol","").dropna().unique().tolist() if s])
-            selected_symbols = st.multiselect("Symbol", _symbols, default=_symbols)
-            min_d = _df0["time"].min().date()
-            max_d = _df0["time"].max().date()
-        else:
-            selected_symbols = []
-            min_d = date.today() - timedelta(days=30)
-            max_d = date.today()
+    try:
+        _lo, _hi, _n = get_db().income_bounds()
+        _symbols = get_db().income_symbols()
+    except Exception:
+        _lo, _hi, _n, _symbols = None, None, 0, []
+    if _n:
+        selected_symbols = st.multiselect("Symbol", _symbols, default=_symbols)
+        min_d = datetime.fromtimestamp(_lo / 1000, tz=timezone.utc).date()
+        max_d = datetime.fromtimestamp(_hi / 1000, tz=timezone.utc).date()
     else:
         selected_symbols = []
         min_d = date.today() - timedelta(days=30)
@@ -159,60 +163,44 @@ st.caption(f"Nguồn KPI: {PNL_SUMMARY_FILE} {'✅' if PNL_SUMMARY_FILE.exists()
 
 # ========= BIỂU ĐỒ EQUITY / PnL =========
 st.subheader("📈 Equity / PnL theo thời gian")
-if not PNL_INCOME_RAW.exists():
-    st.info("Chưa có dữ liệu `pnl_income_raw.json`. Hãy đợi runner chạy `pnl_sync` hoặc chạy tay: `python -m core.evaluator.pnl_sync`.")
+if not _n:
+    st.info("Chưa có dữ liệu income trong history_db. Hãy đợi runner chạy `pnl_sync` hoặc chạy tay: `python -m core.evaluator.pnl_sync`.")
 else:
-    raw = read_json(PNL_INCOME_RAW) or []
-    if not isinstance(raw, list) or not raw:
-        st.info("`pnl_income_raw.json` chưa có dữ liệu phù hợp.")
+    # Áp bộ lọc symbol + khoảng ngày ngay trong truy vấn (chỉ mục symbol, ts)
+    start_ts = pd.Timestamp(start_d, tz="UTC")
+    end_ts   = pd.Timestamp(end_d + timedelta(days=1), tz="UTC")
+    df = read_income(selected_symbols, start_ts.to_pydatetime(), end_ts.to_pydatetime())
+    if df.empty:
+        st.info("Không có khoản PnL sau khi áp bộ lọc.")
     else:
-        df = pd.DataFrame(raw)
-        df = df[(df.get("incomeType","") == "REALIZED_PNL")].copy()
-        if df.empty:
-            st.info("Không có khoản PnL REALIZED_PNL.")
-        else:
-            df["income"] = pd.to_numeric(df["income"], errors="coerce").fillna(0.0)
-            df["time"] = pd.to_datetime(df["time"], unit="ms", utc=True)
-            df["symbol"] = df.get("symbol", "").astype(str)
-
-            # Áp bộ lọc symbol + khoảng ngày
-            if selected_symbols:
-                df = df[df["symbol"].isin(selected_symbols)]
-            start_ts = pd.Timestamp(start_d, tz="UTC")
-            end_ts   = pd.Timestamp(end_d + timedelta(days=1), tz="UTC") - pd.Timedelta(microseconds=1)
-            df = df[(df["time"] >= start_ts) & (df["time"] <= end_ts)].copy()
-
-            if df.empty:
-                st.info("Không có khoản PnL sau khi áp bộ lọc.")
-            else:
-                df.sort_values("time", inplace=True)
-                df["equity"] = PNL_INIT + df["income"].cumsum()
-                st.line_chart(df.set_index("time")[["equity","income"]], use_container_width=True)
-                st.caption(
-                    f"Nguồn PnL: {PNL_INCOME_RAW} ✅ | Symbol={', '.join(selected_symbols) if selected_symbols else 'ALL'} | "
-                    f"Khoảng: {start_d.isoformat()} → {end_d.isoformat()} | Offset={fmt0(PNL_INIT,2)}"
-                )
-
-                # ----- Bảng lệnh đã đóng (đÃ FIX) -----
-                st.markdown("### 🔒 Lệnh đã đóng (REALIZED_PNL)")
-                try:
-                    view = df.rename(columns={"time":"closed_at","income":"realized_pnl"})
-                    desired = ["closed_at","symbol","realized_pnl","asset","info","tranId","tradeId"]
-                    # chọn cột dựa trên view.columns (sau rename)
-                    view_cols = [c for c in desired if c in view.columns]
-                    view = view[view_cols].sort_values("closed_at", ascending=False)
-                    if "realized_pnl" in view.columns:
-                        view["realized_pnl"] = view["realized_pnl"].map(lambda x: float(x))
-                    st.dataframe(view, use_container_width=True, hide_index=True)
-                    csv = view.to_csv(index=False).encode("utf-8")
-                    st.download_button("⬇️ Tải CSV (bản đã lọc)", data=csv,
-                                       file_name="closed_trades_filtered.csv", mime="text/csv")
-                except Exception as e:
-                    st.warning(f"Không thể hiển thị bảng lệnh đã đóng: {e}")
+        df.sort_values("time", inplace=True)
+        df["equity"] = PNL_INIT + df["income"].cumsum()
+        st.line_chart(df.set_index("time")[["equity","income"]], use_container_width=True)
+        st.caption(
+            f"Nguồn PnL: history_db.income ✅ | Symbol={', '.join(selected_symbols) if selected_symbols else 'ALL'} | "
+            f"Khoảng: {start_d.isoformat()} → {end_d.isoformat()} | Offset={fmt0(PNL_INIT,2)}"
+        )
+
+        # ----- Bảng lệnh đã đóng (đÃ FIX) -----
+        st.markdown("### 🔒 Lệnh đã đóng (REALIZED_PNL)")
+        try:
+            view = df.rename(columns={"time":"closed_at","income":"realized_pnl"})
+            desired = ["closed_at","symbol","realized_pnl","asset","info","tranId","tradeId"]
+            # chọn cột dựa trên view.columns (sau rename)
+            view_cols = [c for c in desired if c in view.columns]
+            view = view[view_cols].sort_values("closed_at", ascending=False)
+            if "realized_pnl" in view.columns:
+                view["realized_pnl"] = view["realized_pnl"].map(lambda x: float(x))
+            st.dataframe(view, use_container_width=True, hide_index=True)
+            csv = view.to_csv(index=False).encode("utf-8")
+            st.download_button("⬇️ Tải CSV (bản đã lọc)", data=csv,
+                               file_name="closed_trades_filtered.csv", mime="text/csv")
+        except Exception as e:
+            st.warning(f"Không thể hiển thị bảng lệnh đã đóng: {e}")
 
 # ========= QUYẾT ĐỊNH GẦN NHẤT =========
 st.subheader("🧠 Quyết định gần nhất")
-rows = read_decisions()
+rows = read_decisions(int(lookback_min))
 rows_f = filter_by_minutes(rows, int(lookback_min))
 if not rows_f:
     st.info("Chưa có dữ liệu quyết định phù hợp khoảng thời gian lọc.")
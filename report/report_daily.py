@@ -1,9 +1,10 @@
 from pathlib import Path
 from utils.io_utils import read_json
 from notifier.notify_report import send_daily_report
+from core.memory.decision_log import get_log
 
 def run_daily_report():
-    dec = read_json(Path("data/decision_history.json"), [])
+    n_dec = get_log().count()
     trd = read_json(Path("data/trade_history.json"), [])
-    text = f"- Decisions: {len(dec)}\n- Trades: {len(trd)}\n"
+    text = f"- Decisions: {n_dec}\n- Trades: {len(trd)}\n"
     send_daily_report(text)
\ No newline at end of file
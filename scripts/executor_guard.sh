@@ -14,6 +14,7 @@ import os, json, sys, time
 from datetime import datetime, timezone
 
 ROOT = "/home/crx/CrX17"
+sys.path.insert(0, ROOT)
 fn = os.path.join(ROOT, "last_decision.json")
 
 open_floor  = float(os.getenv("CRX_OPEN_CONF_FLOOR", "0.65"))
@@ -27,11 +28,19 @@ def parse_ts(s):
     except Exception:
         return None
 
-if not os.path.exists(fn):
-    print("[guard] no last_decision.json -> skip")
+# quyết định đã qua gate nằm trong state store (decision.override); file đặt tay là dự phòng
+try:
+    from core.memory.state_store import get_store
+    dec = get_store().get("decision", "override")
+except Exception as e:
+    print(f"[guard] state store read error: {e}")
+    dec = None
+if not dec and os.path.exists(fn):
+    dec = json.load(open(fn, encoding="utf-8"))
+if not dec:
+    print("[guard] no decision override -> skip")
     sys.exit(2)
 
-dec = json.load(open(fn, encoding="utf-8"))
 conf = float(dec.get("confidence") or 0.0)
 sym  = dec.get("symbol") or "N/A"
 is_close = any(k in str(dec.get("meta_action","")).upper() for k in ("CLOSE","FLIP")) \
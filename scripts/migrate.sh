@@ -2,7 +2,10 @@
 set -e
 echo "[migrate] Kiểm tra & tạo file dữ liệu mặc định..."
 mkdir -p data
-touch data/decision_history.json data/trade_history.json data/system_health.log data/risk_incidents.log
-echo "[]" > data/decision_history.json
+touch data/trade_history.json data/system_health.log data/risk_incidents.log
 echo "[]" > data/trade_history.json
+# decision_history.json (mảng) cũ → decision log append-only (data/decision_log/)
+python -m core.memory.decision_log --migrate
+# chỉ mục truy vấn (decisions/trades/income) cho dashboard & tool
+python -m core.memory.history_db --sync
 echo "[migrate] Done."
\ No newline at end of file
@@ -17,7 +17,7 @@ python -m core.analyzer.technical_analyzer
 # 2) Tổng hợp LEFT để ra quyết định thô
 python -m core.aggregators.left_agg
 
-# 3) GATE theo floor + ép symbol (chỉ xuất last_decision.json khi đạt ngưỡng)
+# 3) GATE theo floor + ép symbol (chỉ đặt decision.override trong state store khi đạt ngưỡng)
 python tools/append_latest_and_export.py || true
 
 # 4) Tối ưu funding + thực thi + giám sát + đồng bộ PnL
@@ -47,13 +47,20 @@ FRESH_SEC="$(get_env CRX_DECISION_FRESH_SEC)"
 DEC="last_decision.json"
 PREV="last_decision_preview.json"
 
-# Nguồn quyết định hiện có?
-if [ -f "$DEC" ]; then
-  conf="$(jq -r '.confidence // empty' "$DEC")"
-  sym="$(jq -r '.symbol // empty' "$DEC")"
-  meta="$(jq -r '.meta_action // empty' "$DEC")"
-  decs="$(jq -r '.decision // empty' "$DEC")"
-  ts="$(jq -r '.timestamp // empty' "$DEC")"
+# Nguồn quyết định hiện có? (state store decision.override, dự phòng file đặt tay)
+DEC_JSON="$(python -m core.memory.state_store get decision override 2>/dev/null || true)"
+if [ -n "$DEC_JSON" ]; then
+  DEC="state store decision.override"
+elif [ -f "$DEC" ]; then
+  DEC_JSON="$(cat "$DEC")"
+fi
+
+if [ -n "$DEC_JSON" ]; then
+  conf="$(jq -r '.confidence // empty' <<<"$DEC_JSON")"
+  sym="$(jq -r '.symbol // empty' <<<"$DEC_JSON")"
+  meta="$(jq -r '.meta_action // empty' <<<"$DEC_JSON")"
+  decs="$(jq -r '.decision // empty' <<<"$DEC_JSON")"
+  ts="$(jq -r '.timestamp // empty' <<<"$DEC_JSON")"
 
   if [ -n "$sym" ]; then pass "symbol trong $DEC: $sym"; else fail "Thiếu 'symbol' trong $DEC"; fi
   typ="open"; floor="$OPEN_FLOOR"
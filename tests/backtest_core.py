@@ -1,2 +1,133 @@
-# Placeholder: Phase CORE chỉ kiểm tra basic
-print("[backtest_core] Placeholder OK")
\ No newline at end of file
+# tests/backtest_core.py
+"""
+Chạy backtest vector hoá (core/evaluator/backtest.py) và kiểm tra:
+- có lệnh (ngưỡng mặc định 0.5/0.5 – các chiến lược ra conf ≤ 0.55, ngưỡng live 0.65/0.60 sẽ không có lệnh nào);
+- từng lệnh: net_pnl == gross_pnl - fees - funding;
+- equity cuối == initial_equity + tổng net_pnl (lệnh còn mở tính theo close nến cuối);
+- tín hiệu vector hoá khớp analyze()/aggregate() chạy theo df.
+Mặc định dùng nến giả lập (không cần kho nến); --history để chạy trên candle_store.
+
+Cách dùng:
+  python tests/backtest_core.py                                  # nến giả lập ~3 tháng 15m
+  python tests/backtest_core.py --history --symbol BTCUSDT       # timeframe theo config, từ candle_store
+  python tests/backtest_core.py --strategy left_agg --fee-bps 5 --out data/backtest
+Kết quả: in stats + từng kiểm tra; chỉ ghi <out>/<SYMBOL>_<tf>_equity.csv và _trades.csv khi có --out.
+"""
+from __future__ import annotations
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from core.evaluator.backtest import BacktestConfig, compute_signals, load_history, run_backtest
+from core.evaluator.synthetic import random_candles
+
+
+def _default_tf() -> str:
+    try:
+        from configs.config import TIMEFRAME
+        return str(TIMEFRAME or "15m")
+    except Exception:
+        return "15m"
+
+
+def check_parity(df: pd.DataFrame, cfg: BacktestConfig, samples: int = 200, window: int = 100) -> int:
+    """So tín hiệu vector hoá với analyze()/aggregate() chạy trên cửa sổ 100 nến như live. Trả số lệch."""
+    from core.analyzer.technical_analyzer import analyze
+    from core.aggregators.left_agg import aggregate
+    fn = aggregate if cfg.strategy == "left_agg" else analyze
+    sig = compute_signals(df, BacktestConfig(strategy=cfg.strategy))
+    rng = np.random.default_rng(1)
+    bars = rng.choice(np.arange(len(df)), size=min(samples, len(df)), replace=False)
+    side_of = {"BUY": 1, "SELL": -1}
+    bad = 0
+    for i in bars:
+        ref = fn(df.iloc[max(0, i + 1 - window): i + 1].reset_index(drop=True))
+        if side_of.get(ref["decision"], 0) != sig["side"][i] or abs(ref["confidence"] - sig["conf"][i]) > 1e-12:
+            bad += 1
+    return bad
+
+
+def check_pnl(res, cfg: BacktestConfig, tol: float = 1e-9) -> tuple:
+    """(lệnh sai net_pnl, sai lệch equity cuối so với initial + tổng net_pnl)."""
+    tr = res.trades
+    expect = tr["gross_pnl"] - tr["fees"] - tr["funding"]
+    bad = int(((tr["net_pnl"] - expect).abs() > tol * np.maximum(1.0, tr["gross_pnl"].abs())).sum())
+    drift = abs(float(res.equity.iloc[-1]) - (cfg.initial_equity + float(tr["net_pnl"].sum())))
+    return bad, drift
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--history", action="store_true", help="dùng kho nến (candle_store) thay nến giả lập")
+    ap.add_argument("--symbol", default="BTCUSDT")
+    ap.add_argument("--tf", default=_default_tf())
+    ap.add_argument("--synthetic-years", type=float, default=0.25)
+    ap.add_argument("--strategy", default="analyze", choices=["analyze", "left_agg", "ema_trend", "atr_breakout"])
+    ap.add_argument("--open-floor", type=float, default=0.5)
+    ap.add_argument("--close-floor", type=float, default=0.5)
+    ap.add_argument("--fee-bps", type=float, default=4.0)
+    ap.add_argument("--slippage-bps", type=float, default=0.0)
+    ap.add_argument("--funding-rate", type=float, default=0.0001)
+    ap.add_argument("--notional", type=float, default=50.0)
+    ap.add_argument("--tol", type=float, default=1e-9)
+    ap.add_argument("--out", default=None, help="thư mục ghi equity/trades CSV (mặc định không ghi)")
+    a = ap.parse_args()
+
+    if a.history:
+        df = load_history(a.symbol, a.tf)
+    else:
+        df = random_candles(int(a.synthetic_years * 365 * 96))
+        a.symbol, a.tf = "SYNTH", "15m"
+    if len(df) < 60:
+        print(f"[backtest_core] ❌ {a.symbol} {a.tf}: chỉ có {len(df)} nến trong kho – chạy collector/migrate trước "
+              f"hoặc bỏ --history.")
+        sys.exit(1)
+
+    cfg = BacktestConfig(strategy=a.strategy, fee_bps=a.fee_bps, slippage_bps=a.slippage_bps,
+                         funding_rate=a.funding_rate, notional=a.notional,
+                         open_floor=a.open_floor, close_floor=a.close_floor)
+
+    t0 = time.perf_counter()
+    res = run_backtest(df, cfg)
+    dt = time.perf_counter() - t0
+    print(f"[backtest_core] {a.symbol} {a.tf} {len(df)} nến | {a.strategy} | "
+          f"open≥{cfg.open_floor:.2f} close≥{cfg.close_floor:.2f} | {dt * 1000:.1f} ms")
+    for k, v in res.stats.items():
+        print(f"  {k:<14} {v:.6g}" if isinstance(v, float) else f"  {k:<14} {v}")
+
+    ok = True
+
+    def report(name: str, good: bool, info: str = "") -> None:
+        nonlocal ok
+        ok &= good
+        print(f"[backtest_core] {'✅' if good else '❌'} {name} {info}")
+
+    report("có lệnh", len(res.trades) > 0, f"({len(res.trades)} lệnh)")
+    bad_pnl, drift = check_pnl(res, cfg, a.tol)
+    report("net_pnl = gross - fees - funding", bad_pnl == 0, f"({bad_pnl} lệnh sai)")
+    report("equity cuối = initial + Σnet_pnl", drift <= a.tol * max(1.0, cfg.initial_equity), f"(lệch {drift:.2e})")
+    if a.strategy in ("analyze", "left_agg"):   # ema_trend/atr_breakout không có bản theo df riêng để so
+        bad = check_parity(df, cfg)
+        report(f"parity vs {'left_agg.aggregate' if a.strategy == 'left_agg' else 'analyze'}", bad == 0, f"({bad} lệch)")
+
+    if a.out:
+        out = Path(a.out)
+        out.mkdir(parents=True, exist_ok=True)
+        res.equity.to_csv(out / f"{a.symbol}_{a.tf}_equity.csv", header=True)
+        res.trades.to_csv(out / f"{a.symbol}_{a.tf}_trades.csv", index=False)
+        print(f"[backtest_core] ghi {out}/{a.symbol}_{a.tf}_equity.csv, _trades.csv")
+    print(f"[backtest_core] {'OK' if ok else 'FAIL'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+tests/candle_tick_stub.py
+Chạy CandleCloseTicker với server giả lập tools/kline_stream_stub.py (local, không cần mạng):
+  1) ws    : nến đóng qua kline stream (k.x = true) trước khi hết epsilon;
+  2) rest  : stream không gửi sự kiện đóng → xác nhận bằng REST /fapi/v1/klines sau close + epsilon;
+  3) clock : không có WS lẫn REST → bắn theo giờ server đã đồng bộ (không kẹt vòng lặp).
+Giờ server của stub được lệch (skew) để nến 1m đóng sau vài giây → mỗi kịch bản chỉ mất ~5s.
+
+Cách dùng:
+  python tests/candle_tick_stub.py
+"""
+from __future__ import annotations
+
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from core.runtime.candle_clock import CandleCloseTicker, ServerClock, interval_ms
+from tools.kline_stream_stub import serve
+
+INTERVAL = "1m"
+LEAD_MS = 4000       # server "đang" cách mốc đóng nến bao nhiêu ms
+EPSILON_MS = 1000
+DEAD = "127.0.0.1:9"  # cổng discard: không có gì lắng nghe → lỗi kết nối ngay
+
+
+def _skew_for_lead(lead_ms: int = LEAD_MS) -> int:
+    """Độ lệch giờ server sao cho nến hiện tại đóng sau đúng `lead_ms`."""
+    iv = interval_ms(INTERVAL)
+    now = int(time.time() * 1000)
+    return (iv - lead_ms) - now % iv
+
+
+def _run(ticker: CandleCloseTicker, want_ws: bool) -> tuple:
+    ticker.start()
+    if want_ws:
+        t0 = time.time()
+        while not ticker.ws_connected and time.time() - t0 < 3:
+            time.sleep(0.05)
+    target = ticker.next_close_ms()
+    ev = ticker.wait(poll=lambda: False, poll_sec=0.5)
+    ticker.stop()
+    return target, ev
+
+
+def case_ws() -> tuple:
+    _, ws, http = serve(skew_ms=_skew_for_lead())
+    try:
+        t = CandleCloseTicker("BTCUSDT", INTERVAL, rest_base=f"http://127.0.0.1:{http.server_address[1]}",
+                              ws_base=ws.url, epsilon_ms=EPSILON_MS, log=lambda m: None)
+        target, ev = _run(t, want_ws=True)
+        ok = t.clock.synced_at > 0 and ev is not None and ev.source == "ws" and ev.close_ms == target \
+            and 0 <= ev.detect_latency_ms < EPSILON_MS
+        return ok, target, ev
+    finally:
+        ws.stop()
+        http.shutdown()
+
+
+def case_rest() -> tuple:
+    _, ws, http = serve(skew_ms=_skew_for_lead(), ws_close=False)
+    try:
+        t = CandleCloseTicker("BTCUSDT", INTERVAL, rest_base=f"http://127.0.0.1:{http.server_address[1]}",
+                              ws_base=ws.url, epsilon_ms=EPSILON_MS, log=lambda m: None)
+        target, ev = _run(t, want_ws=True)
+        ok = ev is not None and ev.source == "rest" and ev.close_ms == target \
+            and ev.detect_latency_ms >= EPSILON_MS
+        return ok, target, ev
+    finally:
+        ws.stop()
+        http.shutdown()
+
+
+def case_clock() -> tuple:
+    # REST chết → sync() thất bại, giữ offset đã đo trước đó (ở đây gán sẵn)
+    clock = ServerClock(f"http://{DEAD}")
+    clock.offset_ms = _skew_for_lead()
+    clock.synced_at = time.time()
+    t = CandleCloseTicker("BTCUSDT", INTERVAL, rest_base=f"http://{DEAD}", ws_base=f"ws://{DEAD}",
+                          epsilon_ms=EPSILON_MS, clock=clock, log=lambda m: None)
+    target, ev = _run(t, want_ws=False)
+    ok = ev is not None and ev.source == "clock" and ev.close_ms == target \
+        and ev.detect_latency_ms >= EPSILON_MS
+    return ok, target, ev
+
+
+def main():
+    ok_all = True
+    for name, fn in (("ws", case_ws), ("rest", case_rest), ("clock", case_clock)):
+        t0 = time.time()
+        try:
+            ok, target, ev = fn()
+            info = f"target={target} source={getattr(ev, 'source', None)} detect={getattr(ev, 'detect_latency_ms', None)}ms"
+        except Exception as e:
+            ok, info = False, f"lỗi: {e}"
+        ok_all &= ok
+        print(f"[candle_tick_stub] {'✅' if ok else '❌'} {name}: {info} ({time.time() - t0:.1f}s)")
+    print(f"[candle_tick_stub] {'OK' if ok_all else 'FAIL'}")
+    sys.exit(0 if ok_all else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+tests/indicator_parity.py
+So khớp chỉ báo streaming (core.indicators.streaming, O(1)/nến) với bản batch pandas ở MỌI bước:
+- cập nhật từng nến qua IndicatorEngine, giữa chừng lưu/nạp state qua JSON (giả lập khởi động lại);
+- mỗi cột phải cùng vị trí NaN và sai số tương đối ≤ --tol.
+
+Cách dùng:
+  python tests/indicator_parity.py [--n 3000] [--tol 1e-9]
+"""
+from __future__ import annotations
+
+import sys
+import json
+import argparse
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from core.indicators.streaming import BATCH, DEFAULT_SPECS, Indicator, IndicatorEngine
+from core.evaluator.synthetic import random_candles
+
+
+def check(n: int = 3000, tol: float = 1e-9) -> bool:
+    df = random_candles(n)
+    eng = IndicatorEngine("CHECK", "15m")
+    rows = df.to_dict(orient="records")
+    got: Dict[str, list] = {}
+    for i, c in enumerate(rows):
+        if i == n // 2:
+            st = json.loads(json.dumps(eng.state()))
+            eng = IndicatorEngine("CHECK", "15m")
+            eng.load_state(st)
+        eng.update(c)
+        for k, x in eng.values().items():
+            got.setdefault(k, []).append(x)
+    ok = True
+    for name, (kind, p) in DEFAULT_SPECS.items():
+        ref = BATCH[kind](df, **p)
+        cols = {f"{name}_{c}": ref[c] for c in ref.columns} if isinstance(ref, pd.DataFrame) else {name: ref}
+        for col, exp in cols.items():
+            a, b = np.asarray(got[col], dtype=float), exp.to_numpy(dtype=float)
+            same_nan = np.array_equal(np.isnan(a), np.isnan(b))
+            m = ~np.isnan(b)
+            err = float(np.max(np.abs(a[m] - b[m]) / np.maximum(1.0, np.abs(b[m])))) if m.any() else 0.0
+            good = same_nan and err <= tol
+            ok &= good
+            print(f"[indicator_parity] {'✅' if good else '❌'} {col:<14} max_rel_err={err:.2e} nan_match={same_nan}")
+    return ok
+
+
+def check_abstract() -> bool:
+    """Indicator là lớp trừu tượng: thiếu update/value thì không khởi tạo được."""
+    try:
+        Indicator()
+    except TypeError:
+        ok = True
+    else:
+        ok = False
+    print(f"[indicator_parity] {'✅' if ok else '❌'} Indicator trừu tượng")
+    return ok
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=3000)
+    ap.add_argument("--tol", type=float, default=1e-9)
+    a = ap.parse_args()
+    ok = check_abstract()
+    ok &= check(a.n, a.tol)
+    print(f"[indicator_parity] {'OK' if ok else 'FAIL'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
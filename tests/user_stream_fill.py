@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+tests/user_stream_fill.py
+Chạy UserStream với server giả lập tools/user_stream_stub.py (local, không cần mạng):
+  1) push    : wait_final trả FILLED từ ORDER_TRADE_UPDATE, không hỏi REST /order;
+  2) rest    : WS đang đứt → wait_final hỏi REST ngay, không chờ nối lại;
+  3) resync  : lệnh khớp trong lúc đứt (không có push) → nối lại, _resync_rest giải phóng người chờ + nạp vị thế;
+  4) renew   : listenKeyExpired → xin key mới, nối lại, fill tiếp theo vẫn tới qua push.
+
+Cách dùng:
+  python tests/user_stream_fill.py
+"""
+from __future__ import annotations
+
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from core.execution.binance_client import BinanceClient
+from core.execution.user_stream import UserStream
+from core.runtime.candle_clock import ServerClock
+from tools.user_stream_stub import serve
+
+
+def _until(cond, timeout: float = 5.0) -> bool:
+    end = time.time() + timeout
+    while time.time() < end:
+        if cond():
+            return True
+        time.sleep(0.02)
+    return cond()
+
+
+def main():
+    stub, ws, http = serve(fill_delay_ms=80)
+    rest = f"http://127.0.0.1:{http.server_address[1]}"
+    client = BinanceClient(rest, "stub", "stub-secret", clock=ServerClock(rest), limiter=None, log=lambda m: None)
+    us = UserStream(client, ws_base=ws.url, log=lambda m: None).start(wait_sec=5)
+    fails = []
+
+    def check(name: str, ok: bool, info: str = "") -> None:
+        print(f"[user_stream_fill] {'✅' if ok else '❌'} {name} {info}")
+        if not ok:
+            fails.append(name)
+
+    def order(side: str = "BUY", qty: str = "0.010") -> dict:
+        return client.post("/fapi/v1/order", {"symbol": "BTCUSDT", "side": side, "type": "MARKET", "quantity": qty})
+
+    def rest_gets() -> int:
+        return stub.rest_calls.get("GET /fapi/v1/order", 0)
+
+    def drop() -> bool:
+        stub.drop_ws()
+        return _until(lambda: not us.connected, 2.0)
+
+    try:
+        check("kết nối", us.connected)
+
+        # 1) fill qua push
+        before = rest_gets()
+        o = order()
+        final = us.wait_final("BTCUSDT", o["orderId"], None, timeout_sec=5)
+        check("push", final.get("status") == "FILLED" and rest_gets() == before,
+              f"(status={final.get('status')}, REST GET order={rest_gets() - before})")
+
+        # 2) WS đứt → REST ngay (backoff nối lại 1s, REST phải trả trước đó)
+        down = drop()
+        before, t0 = rest_gets(), time.time()
+        o = order()
+        final = us.wait_final("BTCUSDT", o["orderId"], None, timeout_sec=5, interval_sec=0.1)
+        dt = time.time() - t0
+        check("rest khi đứt", down and final.get("status") == "FILLED" and rest_gets() > before and dt < 0.9,
+              f"(status={final.get('status')}, {dt * 1000:.0f}ms, REST GET order={rest_gets() - before})")
+        check("nối lại", _until(lambda: us.connected))
+
+        # 3) lệnh khớp trong lúc đứt, chỉ có Future chờ (không poll REST) → resync khi nối lại
+        down = drop()
+        o = order("SELL")
+        fut = us.future_for(o["orderId"], symbol="BTCUSDT")
+        time.sleep(0.2)                      # fill (80ms) xảy ra khi chưa có kết nối → không có push
+        missed = not fut.done()
+        before = rest_gets()
+        try:
+            res = fut.result(timeout=5)
+        except Exception as e:
+            res = {"error": str(e)}
+        check("resync", down and missed and res.get("status") == "FILLED" and rest_gets() > before,
+              f"(status={res.get('status')}, REST GET order={rest_gets() - before})")
+        amt = us.positions.get("BTCUSDT", {}).get("positionAmt")
+        check("resync vị thế", amt is not None and abs(amt - stub.positions["BTCUSDT"][0]) < 1e-9, f"(positionAmt={amt})")
+
+        # 4) listenKeyExpired → key mới
+        _until(lambda: us.connected)
+        key0 = us.listen_key
+        stub.expire_keys()
+        renewed = _until(lambda: us.connected and us.listen_key != key0)
+        check("renew", renewed and us.listen_key in stub.keys and key0 not in stub.keys)
+        before = rest_gets()
+        o = order()
+        final = us.wait_final("BTCUSDT", o["orderId"], None, timeout_sec=5)
+        check("push sau renew", final.get("status") == "FILLED" and rest_gets() == before)
+    finally:
+        us.stop(release_key=True)
+        ws.stop()
+        http.shutdown()
+    print(f"[user_stream_fill] REST calls: {stub.rest_calls} | stream: {us.stats()}")
+    print(f"[user_stream_fill] {'FAIL: ' + ', '.join(fails) if fails else 'OK'}")
+    sys.exit(1 if fails else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,15 @@
 # tools/anomaly_watcher.py
 # -*- coding: utf-8 -*-
-import time, json, os
+import time, json, os, sys
+from pathlib import Path
 from datetime import datetime, timezone
 from typing import Optional, Dict, Any
 
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
 # Dùng notifier sẵn có của bạn
 from notifier.notify_telegram import send_telegram_message
-
-JSON_PATH = "data/decision_history.json"
+from core.memory.decision_log import get_log
 INTERVAL_SEC = 60  # kiểm tra mỗi 60s
 # Ngưỡng cảnh báo
 THRESHOLDS = {
@@ -18,24 +20,21 @@ THRESHOLDS = {
 
 _last_alert_sig = None  # tránh spam khi bản ghi không đổi
 
-def load_last_record(path: str) -> Optional[Dict[str, Any]]:
-    if not os.path.exists(path): return None
+def load_last_record() -> Optional[Dict[str, Any]]:
+    """Bản ghi cuối của decision log (O(1) qua offset index)."""
     try:
-        data = json.load(open(path, "r", encoding="utf-8"))
-        if isinstance(data, list) and data:
-            return data[-1]
+        return get_log().last()
     except Exception:
         return None
-    return None
 
 def fmt_ts():
     return datetime.now(timezone.utc).isoformat(timespec="seconds")
 
 def main():
     global _last_alert_sig
-    print(f"🔎 anomaly_watcher start… watching {JSON_PATH} every {INTERVAL_SEC}s")
+    print(f"🔎 anomaly_watcher start… watching {get_log().root} every {INTERVAL_SEC}s")
     while True:
-        rec = load_last_record(JSON_PATH)
+        rec = load_last_record()
         if rec:
             sig = rec.get("timestamp")
             triggered = []
@@ -1,13 +1,16 @@
 # tools/append_latest_and_export.py
-# v1.4 – Gate theo floor + ép symbol + .env override + dọn decision cũ khi không có nguồn
+# v1.5 – Gate theo floor + ép symbol + .env override + dọn decision cũ khi không có nguồn
+#        Quyết định qua gate → state store (decision.override) thay cho ghi đè last_decision.json
 
-import os, json
+import os, sys, json
 from pathlib import Path
 from datetime import datetime, timezone
 from dotenv import load_dotenv
 
 ROOT = Path(__file__).resolve().parents[1]
 load_dotenv(dotenv_path=ROOT / ".env", override=True)
+sys.path.append(str(ROOT))
+from core.memory.state_store import get_store  # noqa: E402
 
 DATA = ROOT / "data"
 OPEN_FLOOR  = float(os.getenv("CRX_OPEN_CONF_FLOOR", "0.65"))
@@ -23,9 +26,9 @@ CANDIDATE_INPUTS = [
     ROOT / "last_decision.json",
 ]
 
-LAST_DECISION = ROOT / "last_decision.json"
+LAST_DECISION = ROOT / "last_decision.json"          # override đặt tay (nguồn), không còn là đích ghi
 PREVIEW_DECISION = ROOT / "last_decision_preview.json"
-EXECUTOR_STATE = ROOT / "executor_state.json"
+OVERRIDE_NS, OVERRIDE_KEY = "decision", "override"
 
 def now_utc():
     return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
@@ -56,7 +59,7 @@ def ensure_symbol(dec: dict) -> str:
     sym = dec.get("symbol") or dec.get("pair") or dec.get("asset")
     if isinstance(sym, str) and sym.strip():
         return sym.strip()
-    st = read_json(EXECUTOR_STATE) or {}
+    st = get_store().get_ns("executor")
     sym2 = st.get("symbol") or st.get("pair")
     if isinstance(sym2, str) and sym2.strip():
         return sym2.strip()
@@ -69,17 +72,18 @@ def is_close_or_flip(dec: dict) -> bool:
     return d.startswith(("CLOSE","FLIP"))
 
 def cleanup_stale():
-    dec = read_json(LAST_DECISION)
+    store = get_store()
+    dec = store.get(OVERRIDE_NS, OVERRIDE_KEY)
     if not isinstance(dec, dict): return
     ts = parse_ts(dec.get("timestamp",""))
     if not ts: return
     age = (datetime.now(timezone.utc) - ts).total_seconds()
     if age > FRESH_SEC:
         try:
-            LAST_DECISION.unlink(missing_ok=True)
-            print(f"[export] INFO: xoá last_decision.json cũ (age={int(age)}s > {FRESH_SEC}s).")
+            store.delete(OVERRIDE_NS, OVERRIDE_KEY)
+            print(f"[export] INFO: xoá decision override cũ (age={int(age)}s > {FRESH_SEC}s).")
         except Exception as e:
-            print(f"[export] WARN: không xoá được last_decision.json: {e}")
+            print(f"[export] WARN: không xoá được decision override: {e}")
 
 def main():
     src = next((p for p in CANDIDATE_INPUTS if p.exists()), None)
@@ -101,7 +105,8 @@ def main():
     reason = f"{'close/flip' if is_close_or_flip(dec) else 'open'} floor={floor}"
 
     if conf >= floor:
-        write_json(LAST_DECISION, dec)
+        get_store().put(OVERRIDE_NS, OVERRIDE_KEY, dec)
+        print(f"[export] ✅ Đã ghi state store {OVERRIDE_NS}.{OVERRIDE_KEY}")
         out = dict(dec, export_note=f"exported_at={now_utc()} reason={reason}")
         write_json(PREVIEW_DECISION, out)
         print(f"[export] PASS gate ({reason}); confidence={conf:.2f}; symbol={dec['symbol']}")
@@ -111,11 +116,12 @@ def main():
         if src.samefile(LAST_DECISION):
             try:
                 LAST_DECISION.unlink(missing_ok=True)
-                print("[export] BLOCK: đã xoá last_decision.json để tránh Executor đọc dưới ngưỡng.")
+                get_store().delete(OVERRIDE_NS, OVERRIDE_KEY)
+                print("[export] BLOCK: đã xoá last_decision.json + override để tránh Executor đọc dưới ngưỡng.")
             except Exception as e:
                 print(f"[export] WARN: không xoá được last_decision.json: {e}")
         else:
-            print("[export] INFO: Giữ nguyên last_decision.json hiện tại (nếu có).")
+            print("[export] INFO: Giữ nguyên decision override hiện tại (nếu có).")
         print(f"[export] BLOCK gate ({reason}); confidence={conf:.2f}; symbol={dec['symbol']}")
 
 if __name__ == "__main__":
@@ -1,8 +1,8 @@
 # tools/close_all_positions.py
 # Đóng tất cả vị thế USDT-M Futures (Testnet/Prod) bằng lệnh MARKET reduceOnly và CHỜ FILLED
 from __future__ import annotations
-import os, time, hmac, hashlib, requests, argparse
-from urllib.parse import urlencode
+import os, sys, time, requests, argparse
+from pathlib import Path
 from decimal import Decimal, getcontext
 
 try:
@@ -11,53 +11,42 @@ try:
 except Exception:
     pass
 
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from core.execution.binance_client import get_client  # noqa: E402
+from core.execution.symbol_meta import get_symbol_meta  # noqa: E402
+from core.execution.user_stream import get_user_stream  # noqa: E402
+
 getcontext().prec = 18
 
 API_KEY    = (os.getenv("BINANCE_API_KEY") or "").strip()
 API_SECRET = (os.getenv("BINANCE_API_SECRET") or "").strip()
 BASE       = (os.getenv("BINANCE_FAPI_BASE") or "https://testnet.binancefuture.com").strip()
-RECV       = int(os.getenv("BINANCE_RECVWINDOW", "5000"))
 SYMBOLS_ENV = os.getenv("CRX_SYMBOLS", "BTCUSDT,ETHUSDT")
 
 def _mask(s: str) -> str: return f"{s[:4]}...{s[-4:]}" if s and len(s) > 8 else s
-def _ts(): return int(time.time() * 1000)
-def _headers(): return {"X-MBX-APIKEY": API_KEY}
-def _sign(params: dict) -> str:
-    q = urlencode(params, doseq=True)
-    sig = hmac.new(API_SECRET.encode(), q.encode(), hashlib.sha256).hexdigest()
-    return f"{q}&signature={sig}"
-
 def _get(path: str, params: dict = None):
-    params = params or {}
-    url = f"{BASE}{path}?{urlencode(params)}" if params else f"{BASE}{path}"
-    r = requests.get(url, headers=_headers(), timeout=10); r.raise_for_status(); return r.json()
+    return get_client(BASE).get(path, params)
 
 def _get_signed(path: str, params: dict):
-    params = dict(params or {}); params.update({"timestamp": _ts(), "recvWindow": RECV})
-    url = f"{BASE}{path}?{_sign(params)}"
-    r = requests.get(url, headers=_headers(), timeout=10); r.raise_for_status(); return r.json()
+    return get_client(BASE).get(path, params, signed=True)
 
 def _post_signed(path: str, params: dict):
-    params = dict(params or {}); params.update({"timestamp": _ts(), "recvWindow": RECV})
-    body = _sign(params); url  = f"{BASE}{path}"
-    r = requests.post(url, headers=_headers(), data=body, timeout=10)
-    ok = r.status_code == 200
-    try: js = r.json()
-    except Exception: js = r.text
-    print(f"[order] {path} status={r.status_code} ok={ok} resp={str(js)[:240]}")
-    r.raise_for_status(); return js
+    try:
+        js = get_client(BASE).post(path, params, signed=True)
+    except requests.HTTPError as e:
+        r = e.response
+        print(f"[order] {path} status={r.status_code} ok=False resp={r.text[:240]}")
+        raise
+    print(f"[order] {path} status=200 ok=True resp={str(js)[:240]}")
+    return js
 
 def query_order(symbol: str, order_id: int):
     return _get_signed("/fapi/v1/order", {"symbol": symbol, "orderId": order_id})
 
 def _step_size_map():
-    info = _get("/fapi/v1/exchangeInfo"); out = {}
-    for s in info.get("symbols", []):
-        sym = s["symbol"]; step = None
-        for f in s.get("filters", []):
-            if f.get("filterType") == "LOT_SIZE": step = f.get("stepSize"); break
-        if step: out[sym] = Decimal(step)
-    return out
+    # bước khối lượng lệnh MARKET từ cache metadata (data/symbol_meta.json), chỉ tải exchangeInfo khi cache trống
+    meta = get_symbol_meta(BASE); meta.warm()
+    return {sym: Decimal(repr(f.market_step)) for sym, f in meta.symbols.items() if f.market_step > 0}
 
 def _round_qty(q: Decimal, step: Decimal) -> Decimal:
     return (q // step) * step if step != 0 else q
@@ -69,7 +58,7 @@ def get_open_positions():
         if amt != 0: out[p["symbol"]] = amt
     return out
 
-def close_symbol(sym: str, amt: Decimal, step_map: dict, dry: bool, wait_sec: float):
+def close_symbol(sym: str, amt: Decimal, step_map: dict, dry: bool, wait_sec: float, stream=None):
     side = "SELL" if amt > 0 else "BUY"
     qty  = abs(amt); step = step_map.get(sym, Decimal("0.001"))
     qty_rounded = _round_qty(qty, step)
@@ -90,7 +79,10 @@ def close_symbol(sym: str, amt: Decimal, step_map: dict, dry: bool, wait_sec: fl
     order_id = int(res.get("orderId"))
 
     # Chờ đến khi FILLED/CANCELED/REJECTED/EXPIRED hoặc hết thời gian
-    if wait_sec > 0:
+    if wait_sec > 0 and stream is not None:
+        od = stream.wait_final(sym, order_id, None, timeout_sec=wait_sec, interval_sec=0.25)
+        print(f"[order] {sym} order {order_id} status={od.get('status')} exec={od.get('executedQty')} (user stream)")
+    elif wait_sec > 0:
         deadline = time.time() + wait_sec
         last_status = res.get("status")
         while time.time() < deadline:
@@ -110,12 +102,12 @@ def ping_keys():
     except Exception as e:
         print(f"[auth] Lỗi: {e}"); return False
 
-def main():
+def main(argv=None):
     ap = argparse.ArgumentParser(description="Đóng tất cả vị thế USDT-M Futures (reduceOnly)")
     ap.add_argument("--symbols", default=SYMBOLS_ENV, help="VD: BTCUSDT,ETHUSDT")
     ap.add_argument("--dryrun", action="store_true", help="Chỉ in thao tác, KHÔNG gửi lệnh")
     ap.add_argument("--wait", type=float, default=5, help="Số giây chờ order về FILLED (mặc định 5)")
-    args = ap.parse_args()
+    args = ap.parse_args(argv)
 
     print(f"🐍 Close All | base={BASE}")
     print(f"[env] KEY={_mask(API_KEY)} SECRET={_mask(API_SECRET)}")
@@ -131,9 +123,18 @@ def main():
         print("✅ Không có vị thế mở."); return
 
     print(f"[open] {open_pos}")
+    # user data stream: fill về qua push thay vì poll /fapi/v1/order mỗi 0.25s.
+    # Dùng stream chung của process (runner chạy close-all in-process) và KHÔNG stop/DELETE listenKey:
+    # key là của cả tài khoản, xoá đi sẽ làm chết stream fill của runner.
+    stream = None
+    if not args.dryrun and args.wait > 0:
+        try:
+            stream = get_user_stream(wait_sec=3)
+        except Exception as e:
+            print(f"[stream] không dùng được user stream ({e}) → poll REST")
     for sym in symbols:
         if sym in open_pos:
-            close_symbol(sym, Decimal(open_pos[sym]), step_map, args.dryrun, args.wait)
+            close_symbol(sym, Decimal(open_pos[sym]), step_map, args.dryrun, args.wait, stream)
         else:
             print(f"[info] Không có vị thế ở {sym}.")
 
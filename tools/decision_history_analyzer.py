@@ -1,9 +1,15 @@
 # tools/decision_history_analyzer.py
 # -*- coding: utf-8 -*-
-import json, argparse, os, statistics as stats
-from datetime import datetime
+import json, argparse, os, sys, statistics as stats
+from datetime import datetime, timedelta, timezone
 from collections import Counter, defaultdict
 
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from core.memory.decision_log import load_records
+
 try:
     import matplotlib.pyplot as plt  # chỉ dùng nếu --plot
 except Exception:
@@ -22,14 +28,22 @@ def safe_mean(arr):
     return round(stats.mean(arr), 6) if arr else None
 
 def main():
-    ap = argparse.ArgumentParser(description="Phân tích nhanh decision_history.json")
-    ap.add_argument("path", help="data/decision_history.json")
+    ap = argparse.ArgumentParser(description="Phân tích nhanh lịch sử quyết định")
+    ap.add_argument("path", nargs="?", default=None,
+                    help="Thư mục decision log hoặc file JSON mảng (mặc định: history_db)")
+    ap.add_argument("--hours", type=float, default=0.0, help="chỉ xét N giờ gần nhất (0 = toàn bộ)")
+    ap.add_argument("--since", default=None, help="mốc ISO, vd 2025-08-01 (ưu tiên hơn --hours)")
+    ap.add_argument("--symbol", default=None, help="lọc 1 symbol (chỉ với history_db)")
     ap.add_argument("--outdir", default="report", help="Thư mục xuất kết quả (csv/png)")
     ap.add_argument("--plot", action="store_true", help="Vẽ biểu đồ PNG (cần matplotlib)")
     args = ap.parse_args()
 
-    with open(args.path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    since = args.since or (datetime.now(timezone.utc) - timedelta(hours=args.hours) if args.hours > 0 else None)
+    if args.path:          # thư mục decision log hoặc file JSON → đọc trực tiếp như cũ
+        data = load_records(args.path)
+    else:                  # history_db: lọc since/symbol theo chỉ mục
+        from core.memory.history_db import get_db
+        data = get_db().decisions(since=since, symbol=args.symbol)
     if not isinstance(data, list):
         raise SystemExit("File không phải list JSON.")
 
@@ -6,13 +6,12 @@ ROOT = pathlib.Path(__file__).resolve().parents[1]
 sys.path.append(str(ROOT))
 
 from notifier.notify_telegram import send_telegram_message  # noqa: E402
+from core.memory.history_db import get_db  # noqa: E402
+from core.memory.state_store import get_store  # noqa: E402
 
 UTC = getattr(dt, "UTC", dt.timezone.utc)
 
 P_PNL   = ROOT / "data" / "pnl_summary.json"
-P_HIST  = ROOT / "data" / "decision_history.jsonl"
-P_STATE = ROOT / "data" / "meta_state.json"
-P_LOCK  = ROOT / "data" / ".eod_kpi_lock"
 
 def _load_json(p: pathlib.Path):
     try:
@@ -20,30 +19,20 @@ def _load_json(p: pathlib.Path):
     except Exception:
         return {}
 
-def _count_today(hist_path: pathlib.Path) -> int:
-    if not hist_path.exists():
+def _count_today() -> int:
+    today = dt.datetime.now(UTC).date()
+    try:
+        return get_db().count_decisions(since=today, decisions=("BUY", "SELL"))
+    except Exception:
         return 0
-    today = dt.datetime.now(UTC).date().isoformat()
-    n = 0
-    for ln in hist_path.read_text(encoding="utf-8").splitlines():
-        try:
-            o = json.loads(ln)
-            ts = str(o.get("timestamp", ""))
-            if ts.startswith(today) and o.get("decision") in ("BUY", "SELL"):
-                n += 1
-        except Exception:
-            continue
-    return n
 
 def _can_send_today() -> bool:
+    """Đánh dấu đã gửi hôm nay trong 1 transaction → 2 process chạy cùng lúc chỉ 1 bên gửi."""
     today = dt.datetime.now(UTC).date().isoformat()
-    try:
-        if P_LOCK.exists() and P_LOCK.read_text(encoding="utf-8").strip() == today:
+    with get_store().transaction() as tx:
+        if tx.get("eod_kpi", "sent_date") == today:
             return False
-    except Exception:
-        pass
-    P_LOCK.parent.mkdir(parents=True, exist_ok=True)
-    P_LOCK.write_text(today, encoding="utf-8")
+        tx.put("eod_kpi", "sent_date", today)
     return True
 
 def main():
@@ -52,13 +41,12 @@ def main():
         return
 
     pnl = _load_json(P_PNL)
-    st  = _load_json(P_STATE)
     trades   = pnl.get("total_trades", "?")
     wins     = pnl.get("wins", "?")
     losses   = pnl.get("losses", "?")
     realized = pnl.get("realized_pnl_sum", "?")
-    tday     = _count_today(P_HIST)
-    route    = st.get("current_route", "?")
+    tday     = _count_today()
+    route    = get_store().get("meta", "current_route", "?")
 
     msg = (
         "📊 EOD KPI\n"
@@ -1,10 +1,9 @@
 # tools/health_check.py
 # CrX 1.7 – Health Check (24h readiness)
 from __future__ import annotations
-import os, hmac, hashlib, time, json, argparse
+import os, sys, time, json, argparse
 from pathlib import Path
 from datetime import datetime, timedelta, timezone
-import requests
 
 try:
     from dotenv import load_dotenv
@@ -13,13 +12,19 @@ except Exception:
     pass
 
 ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+from core.memory.decision_log import get_log  # noqa: E402
+from core.memory.history_db import get_db  # noqa: E402
+from core.memory.state_store import get_store  # noqa: E402
+from core.execution.binance_client import get_client  # noqa: E402
+
 DATA = ROOT / "data"
 LOGS = ROOT / "logs"
 DATA.mkdir(exist_ok=True); LOGS.mkdir(exist_ok=True)
 
 API_KEY    = os.getenv("BINANCE_API_KEY", "")
 API_SECRET = os.getenv("BINANCE_API_SECRET", "")
-BASE       = os.getenv("BINANCE_BASE_URL", "https://testnet.binancefuture.com").rstrip("/")
+BASE       = (os.getenv("BINANCE_BASE_URL") or os.getenv("BINANCE_FAPI_BASE") or "https://testnet.binancefuture.com").rstrip("/")
 
 def now_utc() -> datetime:
     return datetime.now(timezone.utc)
@@ -27,31 +32,13 @@ def now_utc() -> datetime:
 def ms() -> int:
     return int(time.time() * 1000)
 
-def sign_params(params: dict) -> str:
-    # Build query string sorted
-    qs = "&".join([f"{k}={params[k]}" for k in sorted(params.keys())])
-    sig = hmac.new(API_SECRET.encode(), qs.encode(), hashlib.sha256).hexdigest()
-    return qs + "&signature=" + sig
-
 def get_public(path: str, params=None):
-    url = f"{BASE}{path}"
-    r = requests.get(url, params=params or {}, timeout=10)
-    r.raise_for_status()
-    return r.json()
+    return get_client(BASE).get(path, params or {})
 
 def get_signed(path: str, params: dict):
     if not API_KEY or not API_SECRET:
         raise RuntimeError("Thiếu BINANCE_API_KEY/SECRET trong .env")
-    # add timestamp
-    params = dict(params or {})
-    params["timestamp"] = ms()
-    params.setdefault("recvWindow", 5000)
-    qs = sign_params(params)
-    url = f"{BASE}{path}?{qs}"
-    headers = {"X-MBX-APIKEY": API_KEY}
-    r = requests.get(url, headers=headers, timeout=15)
-    r.raise_for_status()
-    return r.json()
+    return get_client(BASE).get(path, params, signed=True, timeout=15)
 
 def read_json(p: Path):
     try:
@@ -103,32 +90,25 @@ def check_positions():
 
 def check_files_fresh():
     p_sum  = DATA / "pnl_summary.json"
-    p_raw  = DATA / "pnl_income_raw.json"
-    p_dec  = DATA / "decision_history.json"
     a_sum = file_age_minutes(p_sum)
-    a_raw = file_age_minutes(p_raw)
-    a_dec = file_age_minutes(p_dec)
-    ok = (a_sum <= 30) and (a_raw <= 30) and (a_dec <= 180)  # dec không nhất thiết 15' 1 lần
-    msg = (f"pnl_summary age={a_sum:.1f}m, pnl_income_raw age={a_raw:.1f}m, "
+    a_ck = 1e9  # checkpoint pnl_sync (state store) thay cho tuổi pnl_income_raw.json
+    try:
+        synced = get_store().get("pnl_sync", "synced_at")
+        if synced:
+            a_ck = (now_utc() - datetime.fromisoformat(synced)).total_seconds() / 60.0
+    except Exception:
+        pass
+    m_dec = get_log().mtime()
+    a_dec = (time.time() - m_dec) / 60.0 if m_dec else 1e9
+    ok = (a_sum <= 30) and (a_ck <= 30) and (a_dec <= 180)  # dec không nhất thiết 15' 1 lần
+    msg = (f"pnl_summary age={a_sum:.1f}m, pnl_sync checkpoint age={a_ck:.1f}m, "
            f"decision_history age={a_dec:.1f}m")
     return ok, msg
 
 def analyze_decisions(hours: int=24):
-    p_dec = DATA / "decision_history.json"
-    obj = read_json(p_dec) or []
-    if not isinstance(obj, list): return False, "decision_history.json không phải list."
-    # lọc 24h
+    # lọc 24h qua chỉ mục ts_ms của history_db (không parse bản ghi)
     cutoff = now_utc() - timedelta(hours=hours)
-    ts_list=[]
-    for r in obj:
-        ts = r.get("timestamp")
-        try:
-            dt = datetime.fromisoformat(ts.replace("Z","+00:00")) if ts else None
-        except Exception:
-            dt = None
-        if dt and dt >= cutoff:
-            ts_list.append(dt)
-    ts_list.sort()
+    ts_list = [datetime.fromtimestamp(t / 1000.0, tz=timezone.utc) for t in get_db().decision_times(since=cutoff)]
     if len(ts_list) < 3:
         return False, f"Quyết định 24h={len(ts_list)} (<3)."
     gaps = [(t2 - t1).total_seconds()/60.0 for t1,t2 in zip(ts_list, ts_list[1:])]
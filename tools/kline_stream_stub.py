@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+tools/kline_stream_stub.py
+Server giả lập stream nến Binance Futures (local) để test nguồn tick theo giờ đóng nến.
+- WS  : /ws/<symbol>@kline_<tf>  → gửi kline mỗi giây, nến đóng (k.x=true) đúng mốc đóng
+- REST: /fapi/v1/time, /fapi/v1/klines (đủ cho ServerClock & fallback REST)
+- --skew-ms giả lập giờ server lệch giờ máy; --no-ws-close bỏ sự kiện đóng để ép fallback REST
+
+Cách dùng:
+  python tools/kline_stream_stub.py --port 8765 --skew-ms 700
+  CRX_WS_BASE=ws://127.0.0.1:8765 CRX_REST_BASE=http://127.0.0.1:8766 CRX_TICK_INTERVAL=1m python auto_runner.py
+"""
+from __future__ import annotations
+
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from utils.ws_helpers import WSServer, WSConn
+from core.runtime.candle_clock import interval_ms
+
+
+class KlineStub:
+    def __init__(self, skew_ms: int = 0, ws_close: bool = True, seed: int = 7):
+        self.skew_ms = skew_ms
+        self.ws_close = ws_close
+        self._rng = random.Random(seed)
+        self._price = 60000.0
+
+    def now_ms(self) -> int:
+        return int(time.time() * 1000) + self.skew_ms
+
+    def kline(self, symbol: str, tf: str, open_ms: int) -> list:
+        iv = interval_ms(tf)
+        o = self._price
+        c = o * (1 + self._rng.uniform(-0.002, 0.002))
+        self._price = c
+        return [open_ms, f"{o:.2f}", f"{max(o, c) * 1.0005:.2f}", f"{min(o, c) * 0.9995:.2f}", f"{c:.2f}",
+                "12.5", open_ms + iv - 1, "750000", 100, "6.2", "372000", "0"]
+
+    def klines(self, symbol: str, tf: str, limit: int, start_ms: int | None = None) -> list:
+        iv = interval_ms(tf)
+        cur = self.now_ms() // iv * iv
+        if start_ms is None:
+            return [self.kline(symbol, tf, cur - i * iv) for i in reversed(range(limit))]
+        first = -(-start_ms // iv) * iv
+        return [self.kline(symbol, tf, t) for t in range(first, cur + 1, iv)][:limit]
+
+    # ----- WS -----
+    def ws_handler(self, conn: WSConn, path: str) -> None:
+        stream = path.rsplit("/", 1)[-1]
+        symbol, _, tf = stream.partition("@kline_")
+        iv = interval_ms(tf)
+        open_ms = self.now_ms() // iv * iv
+        while not conn.closed:
+            now = self.now_ms()
+            closed = now >= open_ms + iv
+            if closed and not self.ws_close:
+                open_ms += iv
+                continue
+            k = self.kline(symbol, tf, open_ms)
+            msg = {"e": "kline", "E": now, "s": symbol.upper(),
+                   "k": {"t": k[0], "T": k[6], "s": symbol.upper(), "i": tf, "o": k[1], "c": k[4],
+                         "h": k[2], "l": k[3], "v": k[5], "x": closed}}
+            conn.send_text(json.dumps(msg))
+            if closed:
+                open_ms += iv
+                continue
+            time.sleep(max(0.0, min(1.0, (open_ms + iv - self.now_ms()) / 1000.0)))
+
+    # ----- REST -----
+    def http_handler(self):
+        stub = self
+
+        class H(BaseHTTPRequestHandler):
+            def log_message(self, *a):
+                pass
+
+            def do_GET(self):
+                u = urlparse(self.path)
+                q = {k: v[0] for k, v in parse_qs(u.query).items()}
+                if u.path == "/fapi/v1/time":
+                    body = {"serverTime": stub.now_ms()}
+                elif u.path == "/fapi/v1/klines":
+                    start = int(q["startTime"]) if "startTime" in q else None
+                    body = stub.klines(q.get("symbol", "BTCUSDT"), q.get("interval", "1m"),
+                                       min(int(q.get("limit", 500)), 1500), start)
+                else:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                raw = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+        return H
+
+
+def serve(port: int = 0, rest_port: int = 0, skew_ms: int = 0, ws_close: bool = True):
+    """Khởi động WS + REST giả lập (thread nền). Trả (stub, ws_server, http_server)."""
+    stub = KlineStub(skew_ms=skew_ms, ws_close=ws_close)
+    ws = WSServer(stub.ws_handler, port=port).start()
+    http = ThreadingHTTPServer(("127.0.0.1", rest_port), stub.http_handler())
+    threading.Thread(target=http.serve_forever, daemon=True).start()
+    return stub, ws, http
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8765, help="cổng WS")
+    ap.add_argument("--rest-port", type=int, default=8766, help="cổng REST")
+    ap.add_argument("--skew-ms", type=int, default=0)
+    ap.add_argument("--no-ws-close", action="store_true")
+    a = ap.parse_args()
+    _, ws, http = serve(a.port, a.rest_port, a.skew_ms, ws_close=not a.no_ws_close)
+    print(f"✅ Stub stream: WS {ws.url} | REST http://127.0.0.1:{http.server_address[1]} (skew={a.skew_ms}ms)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        ws.stop()
+        http.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+tools/migrate_candles.py
+Chuyển nến cũ sang kho cột memory-mapped (core/collector/candle_store.py):
+- data/btc_candles.json → BTCUSDT, data/eth_candles.json → ETHUSDT
+  (records {time ISO = closeTime, open, high, low, close, volume}; closeTime khôi phục = time + 999ms)
+- data/candles/<SYMBOL>_<tf>.csv (kho CSV tạm của collector tăng dần) → <SYMBOL>_<tf>/
+Idempotent: chỉ append nến có close_time > cursor của kho; chạy lại không nhân đôi dữ liệu.
+
+Cách dùng:
+  python -m tools.migrate_candles --tf 15m            # migrate
+  python -m tools.migrate_candles --dry-run           # chỉ in kế hoạch
+  python -m tools.migrate_candles --archive           # đổi tên file cũ → *.migrated sau khi xong
+"""
+from __future__ import annotations
+
+import sys
+import json
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from core.collector.candle_store import CandleStore, COLUMNS, STORE_DIR
+from core.runtime.candle_clock import interval_ms
+
+LEGACY_JSON = {"BTCUSDT": Path("data/btc_candles.json"), "ETHUSDT": Path("data/eth_candles.json")}
+
+
+def _default_tf() -> str:
+    try:
+        from configs.config import TIMEFRAME
+        return str(TIMEFRAME or "15m")
+    except Exception:
+        return "15m"
+
+
+def columns_from_json(path: Path, tf: str) -> dict:
+    obj = json.loads(path.read_text(encoding="utf-8"))
+    df = pd.DataFrame(obj)
+    if df.empty or "time" not in df.columns:
+        return {}
+    t = pd.to_datetime(df["time"], errors="coerce", utc=True)
+    df = df.assign(_t=t).dropna(subset=["_t", "open", "high", "low", "close", "volume"])
+    sec = (df["_t"] - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(seconds=1)  # giây, bất kể đơn vị datetime64
+    close_ms = sec.to_numpy(dtype=np.int64) * 1000 + 999
+    out = {"close_time": close_ms, "open_time": close_ms + 1 - interval_ms(tf)}
+    for c in ("open", "high", "low", "close", "volume"):
+        out[c] = pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=np.float64)
+    return out
+
+
+def columns_from_csv(path: Path) -> dict:
+    df = pd.read_csv(path)
+    return {c: df[c].to_numpy() for c in COLUMNS}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tf", default=_default_tf(), help="timeframe của file JSON cũ (mặc định theo config)")
+    ap.add_argument("--dry-run", action="store_true")
+    ap.add_argument("--archive", action="store_true", help="đổi tên file nguồn → *.migrated")
+    a = ap.parse_args()
+
+    store = CandleStore(retention=10**6)  # không cắt retention khi migrate; collector sẽ cắt sau
+    # CSV trước (đủ lịch sử), JSON sau (100 nến cuối) – append chỉ nhận nến mới hơn cursor
+    jobs = [(p.stem.partition("_")[0], p.stem.partition("_")[2], p, "csv")
+            for p in sorted(STORE_DIR.glob("*_*.csv"))]
+    jobs += [(sym, a.tf, p, "json") for sym, p in LEGACY_JSON.items() if p.exists()]
+    if not jobs:
+        print("[migrate_candles] Không có file nến cũ cần chuyển.")
+        return
+
+    for sym, tf, path, kind in jobs:
+        try:
+            cols = columns_from_json(path, tf) if kind == "json" else columns_from_csv(path)
+        except Exception as e:
+            print(f"[migrate_candles] ❌ {path}: {e}")
+            continue
+        n_src = len(cols.get("close_time", []))
+        if a.dry_run:
+            print(f"[migrate_candles] (dry-run) {path} → {store.dir(sym, tf)} ({n_src} nến)")
+            continue
+        added = store.append_arrays(sym, tf, cols) if n_src else 0
+        print(f"[migrate_candles] ✅ {path} → {store.dir(sym, tf)}: +{added}/{n_src} nến "
+              f"(tổng {store.rows(sym, tf)})")
+        if a.archive:
+            path.rename(path.with_suffix(path.suffix + ".migrated"))
+
+
+if __name__ == "__main__":
+    main()
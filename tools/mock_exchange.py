@@ -0,0 +1,871 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+tools/mock_exchange.py
+Sàn Binance USDⓈ-M Futures giả lập (local) để chạy executor/monitor/close_all/pnl_sync/health_check
+offline và đo tải: throughput đặt lệnh, độ trễ fill qua user stream, độ trễ tick đóng nến.
+- REST: /fapi/v1/ping, time, klines, ticker/price, exchangeInfo, premiumIndex, order (POST/GET/DELETE),
+        openOrders, leverage, income, listenKey (POST/PUT/DELETE), /fapi/v2/positionRisk, /fapi/v2/balance
+- WS  : /ws/<symbol>@kline_<tf> (mỗi giây + nến đóng k.x=true đúng mốc), /ws/<listenKey> (ORDER_TRADE_UPDATE,
+        ACCOUNT_UPDATE, listenKeyExpired), /stream?streams=a/b (combined, bọc {"stream","data"})
+- Giá: nến 1m tất định theo (seed, symbol, phút); klines mọi khung gộp từ nến 1m, ticker = nội suy trong phút
+  → klines, ticker, giá khớp và giá đánh dấu luôn nhất quán.
+- Khớp lệnh: MARKET khớp ngay (+trượt giá), LIMIT khớp ngay nếu vượt giá, không thì nằm sổ tới khi giá chạm.
+  Vị thế/ví/phí/funding dùng chung SimExchange của core/evaluator/replay.py; REALIZED_PNL, COMMISSION,
+  FUNDING_FEE ghi vào lịch sử /fapi/v1/income.
+- Kiểm tra như sàn: X-MBX-APIKEY (-2015), chữ ký HMAC (-1022), timestamp/recvWindow (-1021), LOT_SIZE/
+  MIN_NOTIONAL, reduceOnly, clientOrderId trùng.
+- Weight theo IP/phút (bảng endpoint_weight của binance_client): header X-MBX-USED-WEIGHT-1M /
+  X-MBX-ORDER-COUNT-1M, vượt → 429 + Retry-After, cố gửi tiếp khi đã 429 → 418 (ban --ban-sec).
+- Bơm sự cố: --latency-ms/--jitter-ms, --error-rate (503 -1001), --reject-rate (lệnh bị -2019),
+  --stall-rate/--stall-ms (treo request), --ws-drop-sec (cắt mọi WS định kỳ), --skew-ms (lệch giờ server).
+
+Cách dùng:
+  python tools/mock_exchange.py --port 8765 --rest-port 8766 --latency-ms 20 --error-rate 0.01
+  BINANCE_FAPI_BASE=http://127.0.0.1:8766 CRX_WS_BASE=ws://127.0.0.1:8765 \\
+    BINANCE_API_KEY=mock-key BINANCE_API_SECRET=mock-secret CRX_TICK_INTERVAL=1m python auto_runner.py
+  python tools/mock_exchange.py --bench --bench-orders 2000 --bench-threads 16 [--bench-ticks 2]
+"""
+from __future__ import annotations
+
+import sys
+import hmac
+import json
+import time
+import uuid
+import random
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qsl
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from utils.ws_helpers import WSServer, WSConn
+from core.runtime.candle_clock import interval_ms
+from core.execution.binance_client import endpoint_weight
+from core.evaluator.replay import SimExchange, FUNDING_MS
+
+MINUTE_MS = 60_000
+START_PRICES = {"BTCUSDT": 60000.0, "ETHUSDT": 3000.0, "BNBUSDT": 550.0, "SOLUSDT": 150.0, "XRPUSDT": 0.6}
+SIGNED_PATHS = ("/fapi/v1/order", "/fapi/v1/openOrders", "/fapi/v1/leverage", "/fapi/v1/income",
+                "/fapi/v2/positionRisk", "/fapi/v2/balance")
+LISTEN_KEY_TTL_MS = 60 * MINUTE_MS
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, code: int, msg: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(msg)
+        self.status, self.code, self.msg = status, code, msg
+        self.headers = headers or {}
+
+
+def _tick_size(px: float) -> float:
+    if px >= 1000:
+        return 0.1
+    if px >= 10:
+        return 0.01
+    return 0.0001
+
+
+def _fmt(x: float, step: float) -> str:
+    dec = max(0, len(f"{step:.10f}".rstrip("0").split(".")[1]))
+    return f"{x:.{dec}f}"
+
+
+def _pct(vals: List[float], q: float) -> float:
+    if not vals:
+        return 0.0
+    s = sorted(vals)
+    return s[min(len(s) - 1, int(q * (len(s) - 1) + 0.5))]
+
+
+# ========== Giá ==========
+class PriceFeed:
+    """Nến 1m tất định theo (seed, symbol, phút), sinh lười quanh mốc neo (lúc khởi động) theo cả 2 chiều."""
+
+    def __init__(self, symbols: List[str], seed: int = 7, vol: float = 0.0012, anchor_ms: Optional[int] = None):
+        self.start = {s: START_PRICES.get(s, 100.0) for s in symbols}
+        self.tick = {s: _tick_size(p) for s, p in self.start.items()}
+        self.seed = seed
+        self.vol = vol
+        self.anchor = int(anchor_ms if anchor_ms is not None else time.time() * 1000) // MINUTE_MS
+        self._bars: Dict[str, Dict[int, Tuple[float, float, float, float, float]]] = {s: {} for s in symbols}
+        self._span: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def symbols(self) -> List[str]:
+        return list(self.start)
+
+    def _bar(self, sym: str, m: int, o: Optional[float] = None, c: Optional[float] = None):
+        rng = random.Random(f"{self.seed}:{sym}:{m}")
+        r = rng.gauss(0.0, self.vol)
+        if o is None:
+            o = c / (1 + r)
+        else:
+            c = o * (1 + r)
+        wick = abs(rng.gauss(0.0, self.vol / 2))
+        return (o, max(o, c) * (1 + wick), min(o, c) * (1 - wick), c, rng.uniform(5.0, 50.0))
+
+    def minute(self, sym: str, m: int) -> Tuple[float, float, float, float, float]:
+        bars = self._bars[sym]
+        b = bars.get(m)
+        if b is not None:
+            return b
+        with self._lock:
+            span = self._span.get(sym)
+            if span is None:
+                bars[self.anchor] = self._bar(sym, self.anchor, o=self.start[sym])
+                span = self._span[sym] = [self.anchor, self.anchor]
+            for k in range(span[1] + 1, m + 1):
+                bars[k] = self._bar(sym, k, o=bars[k - 1][3])
+            for k in range(span[0] - 1, m - 1, -1):
+                bars[k] = self._bar(sym, k, c=bars[k + 1][0])
+            span[0], span[1] = min(span[0], m), max(span[1], m)
+            return bars[m]
+
+    def price(self, sym: str, now_ms: int) -> float:
+        o, _, _, c, _ = self.minute(sym, now_ms // MINUTE_MS)
+        return o + (c - o) * (now_ms % MINUTE_MS) / MINUTE_MS
+
+    def kline(self, sym: str, tf: str, open_ms: int, now_ms: int) -> list:
+        iv = interval_ms(tf)
+        m0, cur = open_ms // MINUTE_MS, now_ms // MINUTE_MS
+        rows = [self.minute(sym, k) for k in range(m0, min(m0 + max(1, iv // MINUTE_MS), cur + 1))]
+        if not rows:
+            rows = [self.minute(sym, m0)]
+        o, h, l, c = rows[0][0], max(r[1] for r in rows), min(r[2] for r in rows), rows[-1][3]
+        v = sum(r[4] for r in rows)
+        if open_ms + iv > now_ms and m0 + len(rows) - 1 == cur:    # nến đang chạy: phút cuối mới đi một phần
+            p = self.price(sym, now_ms)
+            c = p
+            h = max(max([r[1] for r in rows[:-1]], default=o), o, p)
+            l = min(min([r[2] for r in rows[:-1]], default=o), o, p)
+            v -= rows[-1][4] * (1 - (now_ms % MINUTE_MS) / MINUTE_MS)
+        t = self.tick[sym]
+        return [open_ms, _fmt(o, t), _fmt(h, t), _fmt(l, t), _fmt(c, t), f"{v:.3f}", open_ms + iv - 1,
+                f"{v * c:.2f}", len(rows) * 60, f"{v / 2:.3f}", f"{v * c / 2:.2f}", "0"]
+
+    def klines(self, sym: str, tf: str, limit: int, now_ms: int,
+               start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> list:
+        iv = interval_ms(tf)
+        cur = now_ms // iv * iv
+        last = min(cur, end_ms // iv * iv) if end_ms is not None else cur
+        if start_ms is not None:
+            first = -(-start_ms // iv) * iv
+            opens = list(range(first, last + 1, iv))[:limit]
+        else:
+            opens = [last - i * iv for i in reversed(range(limit))]
+        return [self.kline(sym, tf, t, now_ms) for t in opens]
+
+
+# ========== Sàn ==========
+class _Clock:
+    """Giờ server (giờ máy + skew) dạng thuộc tính now_ms như SimClock mà SimExchange cần."""
+
+    def __init__(self, skew_ms: int = 0):
+        self.skew_ms = skew_ms
+
+    @property
+    def now_ms(self) -> int:
+        return int(time.time() * 1000) + self.skew_ms
+
+
+class MockExchange:
+    def __init__(self, symbols: Optional[List[str]] = None, api_key: str = "mock-key", secret: str = "mock-secret",
+                 seed: int = 7, wallet: float = 10000.0, fee_bps: float = 4.0, slippage_bps: float = 1.0,
+                 funding_rate: float = 0.0001, min_notional: float = 5.0, step: float = 0.001,
+                 latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0, reject_rate: float = 0.0,
+                 stall_rate: float = 0.0, stall_ms: float = 15000.0, weight_limit: int = 2400,
+                 order_limit: int = 1200, ban_after: int = 10, ban_sec: float = 120.0, skew_ms: int = 0):
+        self.clock = _Clock(skew_ms)
+        self.feed = PriceFeed(symbols or ["BTCUSDT", "ETHUSDT"], seed=seed)
+        self.sim = SimExchange(clock=self.clock, fee_bps=fee_bps, slippage_bps=slippage_bps,
+                               funding_rate=funding_rate, step=step, min_qty=step, wallet=wallet)
+        self.api_key, self.secret = api_key, secret
+        self.min_notional = min_notional
+        self.latency_ms, self.jitter_ms = latency_ms, jitter_ms
+        self.error_rate, self.reject_rate = error_rate, reject_rate
+        self.stall_rate, self.stall_ms = stall_rate, stall_ms
+        self.weight_limit, self.order_limit = weight_limit, order_limit
+        self.ban_after, self.ban_sec = ban_after, ban_sec
+        self._rng = random.Random(seed)
+        self._lock = threading.RLock()
+        self.orders: Dict[int, Dict[str, Any]] = {}
+        self.book: Dict[str, List[int]] = {s: [] for s in self.feed.symbols}      # LIMIT đang chờ
+        self.leverage: Dict[str, int] = {s: 20 for s in self.feed.symbols}
+        self.income: List[Dict[str, Any]] = []
+        self.listen_keys: Dict[str, int] = {}                                      # key → hạn (ms)
+        self.user_conns: Dict[str, List[WSConn]] = {}
+        self.market_conns: List[WSConn] = []
+        self._usage: Dict[str, List[int]] = {}     # ip → [phút, weight, lệnh, số lần 429]
+        self._banned: Dict[str, float] = {}
+        self._oid = 0
+        self._tran = 0
+        self.stats: Dict[str, int] = {"requests": 0, "orders": 0, "fills": 0, "cancels": 0, "rejected": 0,
+                                      "errors_injected": 0, "stalls": 0, "throttled": 0, "banned": 0,
+                                      "ws_pushed": 0}
+        self._stop = threading.Event()
+        self._tick_price()
+
+    def now_ms(self) -> int:
+        return self.clock.now_ms
+
+    # ----- vòng nền: giá, khớp LIMIT, funding, hạn listenKey -----
+    def _tick_price(self) -> None:
+        now = self.now_ms()
+        with self._lock:
+            for s in self.feed.symbols:
+                self.sim.set_price(s, self.feed.price(s, now))
+            nxt = self.sim._next_funding_ms
+            if nxt and now >= nxt:
+                for s, (amt, _) in self.sim.positions.items():
+                    if amt:
+                        self._add_income(s, "FUNDING_FEE", -amt * self.sim.price.get(s, 0.0) * self.sim.funding_rate)
+            self.sim.advance(now)
+
+    def _match_book(self) -> None:
+        with self._lock:
+            for s, ids in self.book.items():
+                px = self.sim.price.get(s, 0.0)
+                for oid in list(ids):
+                    o = self.orders[oid]
+                    lim = float(o["price"])
+                    if (o["side"] == "BUY" and px <= lim) or (o["side"] == "SELL" and px >= lim):
+                        ids.remove(oid)
+                        self._fill(o, lim, maker=True)
+
+    def _expire_keys(self) -> None:
+        now = self.now_ms()
+        with self._lock:
+            dead = [k for k, exp in self.listen_keys.items() if exp <= now]
+            for k in dead:
+                self.listen_keys.pop(k, None)
+        for k in dead:
+            self._push({"e": "listenKeyExpired", "E": now, "listenKey": k}, key=k)
+            for c in self.user_conns.get(k, []):
+                c.close()
+
+    def run_background(self, tick_sec: float = 0.2, ws_drop_sec: float = 0.0) -> "MockExchange":
+        def loop():
+            last_drop = time.time()
+            while not self._stop.wait(tick_sec):
+                try:
+                    self._tick_price()
+                    self._match_book()
+                    self._expire_keys()
+                    if ws_drop_sec > 0 and time.time() - last_drop >= ws_drop_sec:
+                        last_drop = time.time()
+                        self.drop_ws()
+                except Exception as e:
+                    print(f"[mock_exchange] ⚠️ vòng nền lỗi: {e}")
+
+        threading.Thread(target=loop, name="mock-exchange", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.drop_ws()
+
+    def drop_ws(self) -> None:
+        with self._lock:
+            conns = [c for lst in self.user_conns.values() for c in lst] + list(self.market_conns)
+        for c in conns:
+            c.close()
+
+    # ----- user data stream -----
+    def _push(self, event: Dict[str, Any], key: Optional[str] = None) -> None:
+        raw = json.dumps(event)
+        with self._lock:
+            conns = list(self.user_conns.get(key, [])) if key else [c for lst in self.user_conns.values() for c in lst]
+        for c in conns:
+            try:
+                c.send_text(raw)
+                self.stats["ws_pushed"] += 1
+            except Exception:
+                pass
+
+    def _order_event(self, o: Dict[str, Any], exec_type: str, last_qty: float = 0.0, last_px: float = 0.0,
+                     fee: float = 0.0, realized: float = 0.0, maker: bool = False) -> Dict[str, Any]:
+        now = self.now_ms()
+        return {"e": "ORDER_TRADE_UPDATE", "E": now, "T": now, "o": {
+            "s": o["symbol"], "c": o["clientOrderId"], "S": o["side"], "o": o["type"], "f": o["timeInForce"],
+            "q": o["origQty"], "p": o["price"], "ap": o["avgPrice"], "sp": "0", "x": exec_type, "X": o["status"],
+            "i": o["orderId"], "l": f"{last_qty:.8f}", "z": o["executedQty"], "L": f"{last_px:.8f}",
+            "N": "USDT", "n": f"{fee:.8f}", "T": o["updateTime"], "t": o["orderId"] if last_qty else 0,
+            "m": maker, "R": o["reduceOnly"], "ps": "BOTH", "rp": f"{realized:.8f}"}}
+
+    def _account_event(self, symbol: str, reason: str = "ORDER") -> Dict[str, Any]:
+        amt, entry = self.sim.positions.get(symbol, [0.0, 0.0])
+        px = self.sim.price.get(symbol, entry)
+        now = self.now_ms()
+        return {"e": "ACCOUNT_UPDATE", "E": now, "T": now, "a": {
+            "m": reason, "B": [{"a": "USDT", "wb": f"{self.sim.wallet:.8f}", "cw": f"{self.sim.wallet:.8f}", "bc": "0"}],
+            "P": [{"s": symbol, "pa": f"{amt:.8f}", "ep": f"{entry:.8f}", "cr": f"{self.sim.realized:.8f}",
+                   "up": f"{amt * (px - entry):.8f}", "mt": "cross", "iw": "0", "ps": "BOTH"}]}}
+
+    def new_listen_key(self) -> str:
+        with self._lock:
+            key = uuid.uuid4().hex + uuid.uuid4().hex
+            self.listen_keys[key] = self.now_ms() + LISTEN_KEY_TTL_MS
+            return key
+
+    # ----- lệnh -----
+    def _add_income(self, symbol: str, kind: str, amount: float, info: str = "") -> None:
+        if abs(amount) < 1e-12:
+            return
+        self._tran += 1
+        self.income.append({"symbol": symbol, "incomeType": kind, "income": f"{amount:.8f}", "asset": "USDT",
+                            "info": info, "time": self.now_ms(), "tranId": self._tran, "tradeId": info})
+
+    def _fill(self, o: Dict[str, Any], px: Optional[float] = None, maker: bool = False) -> None:
+        qty = float(o["origQty"]) - float(o["executedQty"])
+        realized0 = self.sim.realized
+        r = self.sim._order(o["symbol"], {"side": o["side"], "quantity": qty,
+                                          "reduceOnly": "true" if o["reduceOnly"] else "false"}, px=px)
+        now = self.now_ms()
+        if r.status_code != 200:                   # reduceOnly không còn vị thế để giảm → sàn huỷ (EXPIRED)
+            o.update(status="EXPIRED", updateTime=now)
+            self._push(self._order_event(o, "EXPIRED"))
+            return
+        f = r.json()
+        done, ap = float(f["executedQty"]), float(f["avgPrice"])
+        fee = self.sim.fills[-1]["fee"]
+        realized = self.sim.realized - realized0
+        o.update(status="FILLED", executedQty=f"{done:.8f}", avgPrice=f"{ap:.8f}",
+                 cumQuote=f"{done * ap:.8f}", updateTime=now)
+        self.stats["fills"] += 1
+        self._add_income(o["symbol"], "REALIZED_PNL", realized, str(o["orderId"]))
+        self._add_income(o["symbol"], "COMMISSION", -fee, str(o["orderId"]))
+        self._push(self._order_event(o, "TRADE", done, ap, fee, realized, maker))
+        self._push(self._account_event(o["symbol"]))
+
+    def place(self, q: Dict[str, str]) -> Dict[str, Any]:
+        sym = q.get("symbol", "").upper()
+        side = q.get("side", "").upper()
+        kind = q.get("type", "").upper()
+        if sym not in self.book:
+            raise ApiError(400, -1121, "Invalid symbol.")
+        if side not in ("BUY", "SELL") or kind not in ("MARKET", "LIMIT"):
+            raise ApiError(400, -1116, "Invalid orderType.")
+        try:
+            qty = float(q.get("quantity", 0))
+        except ValueError:
+            raise ApiError(400, -1100, "Illegal characters found in parameter 'quantity'.")
+        step = self.sim.step
+        if qty < self.sim.min_qty or abs(qty / step - round(qty / step)) > 1e-6:
+            raise ApiError(400, -1111, "Precision is over the maximum defined for this asset.")
+        reduce = q.get("reduceOnly", "false").lower() == "true"
+        with self._lock:
+            cur = self.sim.price[sym]
+            price = 0.0
+            if kind == "LIMIT":
+                try:
+                    price = float(q["price"])
+                except (KeyError, ValueError):
+                    raise ApiError(400, -1102, "Mandatory parameter 'price' was not sent, was empty/null, or malformed.")
+                if price <= 0:
+                    raise ApiError(400, -4014, "Price not increased by tick size.")
+            if not reduce and qty * (price or cur) < self.min_notional:
+                raise ApiError(400, -4164, f"Order's notional must be no smaller than {self.min_notional}")
+            cid = q.get("newClientOrderId") or f"mock-{uuid.uuid4().hex[:16]}"
+            if any(self.orders[i]["clientOrderId"] == cid for i in self.book[sym]):
+                raise ApiError(400, -4116, "ClientOrderId is duplicated.")
+            if self.reject_rate and self._rng.random() < self.reject_rate:
+                self.stats["rejected"] += 1
+                raise ApiError(400, -2019, "Margin is insufficient.")
+            self._oid += 1
+            now = self.now_ms()
+            o = {"orderId": self._oid, "symbol": sym, "status": "NEW", "clientOrderId": cid,
+                 "price": _fmt(price, self.feed.tick[sym]), "avgPrice": "0", "origQty": f"{qty:.8f}",
+                 "executedQty": "0", "cumQuote": "0", "timeInForce": q.get("timeInForce", "GTC"), "type": kind,
+                 "reduceOnly": reduce, "closePosition": False, "side": side, "positionSide": "BOTH",
+                 "stopPrice": "0", "workingType": "CONTRACT_PRICE", "origType": kind, "time": now, "updateTime": now}
+            self.orders[o["orderId"]] = o
+            self.stats["orders"] += 1
+            ack = dict(o)
+            self._push(self._order_event(o, "NEW"))
+            if kind == "MARKET":
+                self._fill(o)
+            elif (side == "BUY" and price >= cur) or (side == "SELL" and price <= cur):
+                self._fill(o, cur)                 # LIMIT vượt giá → khớp ngay như taker
+            elif o["timeInForce"] in ("IOC", "FOK"):
+                o.update(status="EXPIRED", updateTime=self.now_ms())
+                self._push(self._order_event(o, "EXPIRED"))
+            else:
+                self.book[sym].append(o["orderId"])
+            return dict(o) if q.get("newOrderRespType", "ACK").upper() == "RESULT" else ack
+
+    def find(self, q: Dict[str, str]) -> Dict[str, Any]:
+        o = self.orders.get(int(q.get("orderId", 0) or 0))
+        if o is None and q.get("origClientOrderId"):
+            o = next((x for x in reversed(list(self.orders.values()))
+                      if x["clientOrderId"] == q["origClientOrderId"]), None)
+        if o is None or (q.get("symbol") and o["symbol"] != q["symbol"].upper()):
+            raise ApiError(400, -2013, "Order does not exist.")
+        return o
+
+    def cancel(self, q: Dict[str, str]) -> Dict[str, Any]:
+        with self._lock:
+            o = self.find(q)
+            if o["orderId"] not in self.book.get(o["symbol"], []):
+                raise ApiError(400, -2011, "Unknown order sent.")
+            self.book[o["symbol"]].remove(o["orderId"])
+            o.update(status="CANCELED", updateTime=self.now_ms())
+            self.stats["cancels"] += 1
+            self._push(self._order_event(o, "CANCELED"))
+            return dict(o)
+
+    # ----- đọc -----
+    def positions(self, symbol: Optional[str] = None) -> List[Dict[str, Any]]:
+        out = []
+        for s in self.feed.symbols:
+            if symbol and s != symbol.upper():
+                continue
+            amt, entry = self.sim.positions.get(s, [0.0, 0.0])
+            px = self.sim.price.get(s, 0.0)
+            out.append({"symbol": s, "positionAmt": f"{amt:.8f}", "entryPrice": f"{entry:.8f}",
+                        "markPrice": f"{px:.8f}", "unRealizedProfit": f"{amt * (px - entry):.8f}",
+                        "liquidationPrice": "0", "leverage": str(self.leverage[s]), "maxNotionalValue": "1000000",
+                        "marginType": "cross", "isolatedMargin": "0", "isAutoAddMargin": "false",
+                        "positionSide": "BOTH", "notional": f"{amt * px:.8f}", "updateTime": self.now_ms()})
+        return out
+
+    def balance(self) -> List[Dict[str, Any]]:
+        upnl = self.sim.equity() - self.sim.wallet
+        w = self.sim.wallet
+        return [{"accountAlias": "mock", "asset": "USDT", "balance": f"{w:.8f}", "crossWalletBalance": f"{w:.8f}",
+                 "crossUnPnl": f"{upnl:.8f}", "availableBalance": f"{w + min(0.0, upnl):.8f}",
+                 "maxWithdrawAmount": f"{w + min(0.0, upnl):.8f}", "marginAvailable": True,
+                 "updateTime": self.now_ms()}]
+
+    def income_rows(self, q: Dict[str, str]) -> List[Dict[str, Any]]:
+        now = self.now_ms()
+        end = int(q.get("endTime", now))
+        start = int(q.get("startTime", (end if "endTime" in q else now) - 7 * 86_400_000))
+        limit = max(1, min(int(q.get("limit", 100)), 1000))
+        kind, sym = q.get("incomeType"), q.get("symbol", "").upper()
+        with self._lock:
+            rows = [r for r in self.income if start <= r["time"] <= end
+                    and (not kind or r["incomeType"] == kind) and (not sym or r["symbol"] == sym)]
+        return rows[:limit]
+
+    def exchange_info(self) -> Dict[str, Any]:
+        step = _fmt(self.sim.step, self.sim.step)
+        return {"timezone": "UTC", "serverTime": self.now_ms(), "futuresType": "U_MARGINED",
+                "rateLimits": [{"rateLimitType": "REQUEST_WEIGHT", "interval": "MINUTE", "intervalNum": 1,
+                                "limit": self.weight_limit},
+                               {"rateLimitType": "ORDERS", "interval": "MINUTE", "intervalNum": 1,
+                                "limit": self.order_limit}],
+                "symbols": [{"symbol": s, "pair": s, "contractType": "PERPETUAL", "status": "TRADING",
+                             "baseAsset": s[:-4], "quoteAsset": "USDT", "marginAsset": "USDT",
+                             "pricePrecision": len(_fmt(0, t).split(".")[-1]) if t < 1 else 0,
+                             "quantityPrecision": len(step.split(".")[-1]) if "." in step else 0,
+                             "orderTypes": ["LIMIT", "MARKET"], "timeInForce": ["GTC", "IOC", "FOK"],
+                             "filters": [
+                                 {"filterType": "PRICE_FILTER", "tickSize": _fmt(t, t), "minPrice": _fmt(t, t),
+                                  "maxPrice": "10000000"},
+                                 {"filterType": "LOT_SIZE", "stepSize": step, "minQty": step, "maxQty": "1000"},
+                                 {"filterType": "MARKET_LOT_SIZE", "stepSize": step, "minQty": step, "maxQty": "120"},
+                                 {"filterType": "MIN_NOTIONAL", "notional": str(self.min_notional)},
+                             ]} for s, t in self.feed.tick.items()]}
+
+    def premium(self, sym: str) -> Dict[str, Any]:
+        now = self.now_ms()
+        px = self.sim.price.get(sym, 0.0)
+        return {"symbol": sym, "markPrice": f"{px:.8f}", "indexPrice": f"{px:.8f}",
+                "estimatedSettlePrice": f"{px:.8f}", "lastFundingRate": f"{self.sim.funding_rate:.8f}",
+                "interestRate": "0.00010000", "nextFundingTime": (now // FUNDING_MS + 1) * FUNDING_MS, "time": now}
+
+    # ----- weight / xác thực -----
+    def charge(self, ip: str, weight: int, is_order: bool) -> Dict[str, str]:
+        """Cộng weight/lệnh theo IP trong phút hiện tại; vượt ngưỡng → ApiError 429/418 (kèm Retry-After)."""
+        now = self.now_ms()
+        with self._lock:
+            until = self._banned.get(ip, 0.0)
+            if until > time.time():
+                self.stats["banned"] += 1
+                raise ApiError(418, -1003, f"Way too many requests; IP({ip}) banned until {int(until * 1000)}.",
+                               {"Retry-After": str(int(until - time.time()) + 1)})
+            u = self._usage.get(ip)
+            minute = now // MINUTE_MS
+            if u is None or u[0] != minute:
+                u = self._usage[ip] = [minute, 0, 0, 0]
+            u[1] += weight
+            u[2] += 1 if is_order else 0
+            hdrs = {"X-MBX-USED-WEIGHT-1M": str(u[1])}
+            if is_order:
+                hdrs["X-MBX-ORDER-COUNT-1M"] = str(u[2])
+            over = u[1] > self.weight_limit or (is_order and u[2] > self.order_limit)
+            if over:
+                u[3] += 1
+                self.stats["throttled"] += 1
+                retry = str(int((MINUTE_MS - now % MINUTE_MS) / 1000) + 1)
+                if u[3] > self.ban_after:
+                    self._banned[ip] = time.time() + self.ban_sec
+                    raise ApiError(418, -1003, f"Way too many requests; IP({ip}) banned.",
+                                   {**hdrs, "Retry-After": str(int(self.ban_sec))})
+                if u[1] > self.weight_limit:
+                    raise ApiError(429, -1003, f"Too many requests; current limit of IP({ip}) is "
+                                   f"{self.weight_limit} requests per minute.", {**hdrs, "Retry-After": retry})
+                raise ApiError(429, -1015, f"Too many new orders; current limit is {self.order_limit} orders "
+                               f"per MINUTE.", {**hdrs, "Retry-After": retry})
+            return hdrs
+
+    def check_key(self, key: Optional[str]) -> None:
+        if not key or (self.api_key and key != self.api_key):
+            raise ApiError(401, -2015, "Invalid API-key, IP, or permissions for action.")
+
+    def check_signed(self, raw_query: str, body: str, q: Dict[str, str]) -> None:
+        sig = q.get("signature")
+        if not sig:
+            raise ApiError(400, -1102, "Mandatory parameter 'signature' was not sent, was empty/null, or malformed.")
+        total = "&".join(p for p in (raw_query, body) if p)
+        payload = "&".join(p for p in total.split("&") if not p.startswith("signature="))
+        good = hmac.new(self.secret.encode(), payload.encode(), hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(sig, good):
+            raise ApiError(400, -1022, "Signature for this request is not valid.")
+        try:
+            ts = int(q.get("timestamp", 0))
+        except ValueError:
+            ts = 0
+        now = self.now_ms()
+        if ts > now + 1000 or now - ts > int(q.get("recvWindow", 5000)):
+            raise ApiError(400, -1021, "Timestamp for this request is outside of the recvWindow.")
+
+    # ----- REST -----
+    def route(self, method: str, path: str, q: Dict[str, str]) -> Any:
+        now = self.now_ms()
+        sym = q.get("symbol", "").upper()
+        if path == "/fapi/v1/ping":
+            return {}
+        if path == "/fapi/v1/time":
+            return {"serverTime": now}
+        if path == "/fapi/v1/klines":
+            if sym not in self.book:
+                raise ApiError(400, -1121, "Invalid symbol.")
+            try:
+                interval_ms(q.get("interval", ""))
+            except Exception:
+                raise ApiError(400, -1120, "Invalid interval.")
+            return self.feed.klines(sym, q["interval"], max(1, min(int(q.get("limit", 500)), 1500)), now,
+                                    int(q["startTime"]) if "startTime" in q else None,
+                                    int(q["endTime"]) if "endTime" in q else None)
+        if path == "/fapi/v1/ticker/price":
+            rows = [{"symbol": s, "price": _fmt(self.sim.price[s], self.feed.tick[s]), "time": now}
+                    for s in self.feed.symbols if not sym or s == sym]
+            if sym and not rows:
+                raise ApiError(400, -1121, "Invalid symbol.")
+            return rows[0] if sym else rows
+        if path == "/fapi/v1/premiumIndex":
+            if sym and sym not in self.book:
+                raise ApiError(400, -1121, "Invalid symbol.")
+            return self.premium(sym) if sym else [self.premium(s) for s in self.feed.symbols]
+        if path == "/fapi/v1/exchangeInfo":
+            return self.exchange_info()
+        if path == "/fapi/v1/listenKey":
+            if method == "POST":
+                return {"listenKey": self.new_listen_key()}
+            key = q.get("listenKey")
+            with self._lock:
+                if method == "PUT":
+                    if key not in self.listen_keys:
+                        raise ApiError(400, -1125, "This listenKey does not exist.")
+                    self.listen_keys[key] = now + LISTEN_KEY_TTL_MS
+                    return {}
+                self.listen_keys.pop(key, None)
+            for c in self.user_conns.get(key, []):
+                c.close()
+            return {}
+        if path == "/fapi/v1/order":
+            if method == "POST":
+                return self.place(q)
+            if method == "DELETE":
+                return self.cancel(q)
+            return dict(self.find(q))
+        if path == "/fapi/v1/openOrders":
+            with self._lock:
+                return [dict(self.orders[i]) for s, ids in self.book.items() if not sym or s == sym for i in ids]
+        if path == "/fapi/v1/leverage":
+            lev = int(q.get("leverage", 0) or 0)
+            if sym not in self.book:
+                raise ApiError(400, -1121, "Invalid symbol.")
+            if not 1 <= lev <= 125:
+                raise ApiError(400, -4028, f"Leverage {lev} is not valid")
+            self.leverage[sym] = lev
+            return {"symbol": sym, "leverage": lev, "maxNotionalValue": "1000000"}
+        if path == "/fapi/v1/income":
+            return self.income_rows(q)
+        if path == "/fapi/v2/positionRisk":
+            return self.positions(sym or None)
+        if path == "/fapi/v2/balance":
+            return self.balance()
+        raise ApiError(404, -1, f"unknown endpoint {method} {path}")
+
+    def http_handler(self):
+        ex = self
+
+        class H(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"          # keep-alive: pool kết nối của BinanceClient được tái dùng
+            disable_nagle_algorithm = True         # header + body ghi 2 lần → không có cờ này mỗi request chờ ~40ms ACK
+
+            def log_message(self, *a):
+                pass
+
+            def _send(self, code: int, body: Any, headers: Optional[Dict[str, str]] = None) -> None:
+                raw = json.dumps(body).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def _route(self, method: str) -> None:
+                u = urlparse(self.path)
+                n = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(n).decode() if n else ""
+                q = dict(parse_qsl(u.query))
+                q.update(parse_qsl(body))
+                ex.stats["requests"] += 1
+                hdrs: Dict[str, str] = {}
+                try:
+                    delay = ex.latency_ms + (ex._rng.uniform(0, ex.jitter_ms) if ex.jitter_ms else 0.0)
+                    if ex.stall_rate and ex._rng.random() < ex.stall_rate:
+                        ex.stats["stalls"] += 1
+                        delay += ex.stall_ms
+                    if delay > 0:
+                        time.sleep(delay / 1000.0)
+                    is_order = u.path == "/fapi/v1/order" and method == "POST"
+                    hdrs = ex.charge(self.client_address[0], endpoint_weight(u.path, q), is_order)
+                    if ex.error_rate and ex._rng.random() < ex.error_rate:
+                        ex.stats["errors_injected"] += 1
+                        raise ApiError(503, -1001, "Internal error; unable to process your request. Please try again.")
+                    if u.path in SIGNED_PATHS or u.path == "/fapi/v1/listenKey":
+                        ex.check_key(self.headers.get("X-MBX-APIKEY"))
+                    if u.path in SIGNED_PATHS:
+                        ex.check_signed(u.query, body, q)
+                    self._send(200, ex.route(method, u.path, q), hdrs)
+                except ApiError as e:
+                    self._send(e.status, {"code": e.code, "msg": e.msg}, {**hdrs, **e.headers})
+                except Exception as e:
+                    self._send(400, {"code": -1000, "msg": f"An unknown error occurred: {e}"}, hdrs)
+
+            def do_GET(self):
+                self._route("GET")
+
+            def do_POST(self):
+                self._route("POST")
+
+            def do_PUT(self):
+                self._route("PUT")
+
+            def do_DELETE(self):
+                self._route("DELETE")
+
+        return H
+
+    # ----- WS -----
+    def _kline_msg(self, stream: str, open_ms: int, now: int, closed: bool) -> Dict[str, Any]:
+        sym, _, tf = stream.partition("@kline_")
+        k = self.feed.kline(sym.upper(), tf, open_ms, open_ms + interval_ms(tf) - 1 if closed else now)
+        return {"e": "kline", "E": now, "s": sym.upper(),
+                "k": {"t": k[0], "T": k[6], "s": sym.upper(), "i": tf, "o": k[1], "c": k[4], "h": k[2],
+                      "l": k[3], "v": k[5], "n": k[8], "q": k[7], "x": closed}}
+
+    def _market_loop(self, conn: WSConn, streams: List[str], combined: bool) -> None:
+        opens = {}
+        for s in streams:
+            sym, _, tf = s.partition("@kline_")
+            if sym.upper() not in self.book or not tf:
+                return
+            iv = interval_ms(tf)
+            opens[s] = (self.now_ms() // iv * iv, iv)
+        with self._lock:
+            self.market_conns.append(conn)
+        try:
+            while not conn.closed and not self._stop.is_set():
+                now = self.now_ms()
+                for s, (open_ms, iv) in list(opens.items()):
+                    closed = now >= open_ms + iv
+                    msg = self._kline_msg(s, open_ms, now, closed)
+                    conn.send_text(json.dumps({"stream": s, "data": msg} if combined else msg))
+                    if closed:
+                        opens[s] = (open_ms + iv, iv)
+                nxt = min(o + iv for o, iv in opens.values())
+                time.sleep(max(0.0, min(1.0, (nxt - self.now_ms()) / 1000.0)))
+        finally:
+            with self._lock:
+                if conn in self.market_conns:
+                    self.market_conns.remove(conn)
+
+    def ws_handler(self, conn: WSConn, path: str) -> None:
+        u = urlparse(path)
+        if u.path.startswith("/stream"):
+            streams = [s for s in dict(parse_qsl(u.query)).get("streams", "").split("/") if s]
+            return self._market_loop(conn, streams, combined=True)
+        name = u.path.rsplit("/", 1)[-1]
+        if "@kline_" in name:
+            return self._market_loop(conn, [name], combined=False)
+        with self._lock:
+            if name not in self.listen_keys:
+                return
+            self.user_conns.setdefault(name, []).append(conn)
+        while not conn.closed and not self._stop.is_set():
+            try:
+                conn.recv(timeout=1.0)
+            except Exception:
+                break
+        with self._lock:
+            if conn in self.user_conns.get(name, []):
+                self.user_conns[name].remove(conn)
+
+
+def serve(port: int = 0, rest_port: int = 0, ws_drop_sec: float = 0.0, **kw):
+    """Khởi động WS + REST + vòng giá/khớp lệnh (thread nền). Trả (exchange, ws_server, http_server)."""
+    ex = MockExchange(**kw).run_background(ws_drop_sec=ws_drop_sec)
+    ws = WSServer(ex.ws_handler, port=port).start()
+    http = ThreadingHTTPServer(("127.0.0.1", rest_port), ex.http_handler())
+    http.daemon_threads = True
+    threading.Thread(target=http.serve_forever, daemon=True).start()
+    return ex, ws, http
+
+
+# ========== Benchmark ==========
+def bench(ex: MockExchange, rest: str, ws_url: str, orders: int = 1000, threads: int = 8,
+          fills: int = 50, ticks: int = 0, symbol: str = "BTCUSDT") -> Dict[str, Any]:
+    """Throughput POST /order qua BinanceClient, độ trễ lệnh → FILLED qua user stream, độ trễ tick đóng nến."""
+    from concurrent.futures import ThreadPoolExecutor
+    from core.execution.binance_client import BinanceClient
+    from core.execution.user_stream import UserStream
+    from core.runtime.candle_clock import ServerClock, CandleCloseTicker
+
+    clock = ServerClock(rest)
+    clock.sync()
+    client = BinanceClient(rest, ex.api_key, ex.secret, clock=clock, limiter=None, log=lambda m: None)
+    out: Dict[str, Any] = {}
+
+    # 1) throughput đặt lệnh MARKET (mua/bán xen kẽ để vị thế quanh 0)
+    lat: List[float] = []
+    errs = [0]
+
+    def one(i: int) -> None:
+        t0 = time.perf_counter()
+        try:
+            client.post("/fapi/v1/order", {"symbol": symbol, "side": "BUY" if i % 2 == 0 else "SELL",
+                                           "type": "MARKET", "quantity": "0.001"}, retries=0)
+            lat.append((time.perf_counter() - t0) * 1000)
+        except Exception:
+            errs[0] += 1
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(orders)))
+    dt = time.perf_counter() - t0
+    out["orders"] = {"sent": orders, "ok": len(lat), "errors": errs[0], "threads": threads,
+                     "per_sec": round(len(lat) / dt, 1) if dt > 0 else 0.0,
+                     "p50_ms": round(_pct(lat, 0.5), 2), "p95_ms": round(_pct(lat, 0.95), 2),
+                     "p99_ms": round(_pct(lat, 0.99), 2)}
+
+    # 2) POST → FILLED nhận qua user data stream
+    if fills > 0:
+        us = UserStream(client, ws_base=ws_url, log=lambda m: None).start(wait_sec=5)
+        fl: List[float] = []
+        for i in range(fills):
+            t0 = time.perf_counter()
+            try:
+                o = client.post("/fapi/v1/order", {"symbol": symbol, "side": "BUY" if i % 2 == 0 else "SELL",
+                                                   "type": "MARKET", "quantity": "0.001"}, retries=0)
+                if us.wait_final(symbol, o["orderId"], None, timeout_sec=5).get("status") == "FILLED":
+                    fl.append((time.perf_counter() - t0) * 1000)
+            except Exception:
+                pass
+        us.stop(release_key=True)
+        out["fill"] = {"orders": fills, "filled": len(fl), "p50_ms": round(_pct(fl, 0.5), 2),
+                       "p95_ms": round(_pct(fl, 0.95), 2), "stream": us.stats()}
+
+    # 3) nến 1m đóng → tick (WS kline)
+    if ticks > 0:
+        tk = CandleCloseTicker(symbol, "1m", rest_base=rest, ws_base=ws_url, clock=clock, log=lambda m: None).start()
+        tl, src = [], {}
+        for _ in range(ticks):
+            ev = tk.wait()
+            if ev is not None:
+                tl.append(ev.detect_latency_ms)
+                src[ev.source] = src.get(ev.source, 0) + 1
+        tk.stop()
+        out["tick"] = {"closes": len(tl), "sources": src, "p50_ms": _pct(tl, 0.5), "max_ms": max(tl, default=0)}
+    out["server"] = dict(ex.stats)
+    out["client"] = client.stats()
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8765, help="cổng WS")
+    ap.add_argument("--rest-port", type=int, default=8766, help="cổng REST")
+    ap.add_argument("--symbols", default="BTCUSDT,ETHUSDT")
+    ap.add_argument("--api-key", default="mock-key")
+    ap.add_argument("--secret", default="mock-secret")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--wallet", type=float, default=10000.0)
+    ap.add_argument("--fee-bps", type=float, default=4.0)
+    ap.add_argument("--slippage-bps", type=float, default=1.0)
+    ap.add_argument("--funding-rate", type=float, default=0.0001)
+    ap.add_argument("--min-notional", type=float, default=5.0)
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="trễ cố định mỗi request REST")
+    ap.add_argument("--jitter-ms", type=float, default=0.0, help="trễ ngẫu nhiên thêm 0..jitter")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="tỉ lệ request trả 503 (-1001)")
+    ap.add_argument("--reject-rate", type=float, default=0.0, help="tỉ lệ lệnh bị -2019")
+    ap.add_argument("--stall-rate", type=float, default=0.0, help="tỉ lệ request bị treo --stall-ms")
+    ap.add_argument("--stall-ms", type=float, default=15000.0)
+    ap.add_argument("--weight-limit", type=int, default=2400)
+    ap.add_argument("--order-limit", type=int, default=1200)
+    ap.add_argument("--ban-sec", type=float, default=120.0)
+    ap.add_argument("--skew-ms", type=int, default=0)
+    ap.add_argument("--ws-drop-sec", type=float, default=0.0, help="cắt mọi WS mỗi N giây (0 = tắt)")
+    ap.add_argument("--bench", action="store_true", help="chạy server trên cổng ngẫu nhiên rồi đo tải")
+    ap.add_argument("--bench-orders", type=int, default=1000)
+    ap.add_argument("--bench-threads", type=int, default=8)
+    ap.add_argument("--bench-fills", type=int, default=50)
+    ap.add_argument("--bench-ticks", type=int, default=0, help="số lần đóng nến 1m cần đo (mỗi lần ≤ 60s)")
+    a = ap.parse_args()
+    kw = dict(symbols=[s.strip().upper() for s in a.symbols.split(",") if s.strip()], api_key=a.api_key,
+              secret=a.secret, seed=a.seed, wallet=a.wallet, fee_bps=a.fee_bps, slippage_bps=a.slippage_bps,
+              funding_rate=a.funding_rate, min_notional=a.min_notional, latency_ms=a.latency_ms,
+              jitter_ms=a.jitter_ms, error_rate=a.error_rate, reject_rate=a.reject_rate, stall_rate=a.stall_rate,
+              stall_ms=a.stall_ms, weight_limit=a.weight_limit, order_limit=a.order_limit, ban_sec=a.ban_sec,
+              skew_ms=a.skew_ms)
+    if a.bench:
+        ex, ws, http = serve(0, 0, a.ws_drop_sec, **kw)
+        rest = f"http://127.0.0.1:{http.server_address[1]}"
+        res = bench(ex, rest, ws.url, a.bench_orders, a.bench_threads, a.bench_fills, a.bench_ticks,
+                    kw["symbols"][0])
+        print(json.dumps(res, ensure_ascii=False, indent=2))
+        ex.stop()
+        ws.stop()
+        http.shutdown()
+        return
+    ex, ws, http = serve(a.port, a.rest_port, a.ws_drop_sec, **kw)
+    print(f"✅ Mock exchange: WS {ws.url} | REST http://127.0.0.1:{http.server_address[1]} "
+          f"| symbols={','.join(ex.feed.symbols)} key={a.api_key} latency={a.latency_ms}±{a.jitter_ms}ms "
+          f"error_rate={a.error_rate} weight_limit={a.weight_limit}")
+    try:
+        while True:
+            time.sleep(60)
+            print(f"[mock_exchange] {ex.stats} wallet={ex.sim.wallet:.2f}")
+    except KeyboardInterrupt:
+        ex.stop()
+        ws.stop()
+        http.shutdown()
+
+
+if __name__ == "__main__":
+    main()
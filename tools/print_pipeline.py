@@ -30,9 +30,8 @@ def load_flags():
 
 def check_artifacts():
     names = [
-        "btc_candles.json",
-        "eth_candles.json",
-        "decision_history.json",
+        "candles",
+        "decision_log",
         "trade_history.json",
     ]
     return {n: (DATA_DIR / n).exists() for n in names}
@@ -3,7 +3,7 @@
 from __future__ import annotations
 from pathlib import Path
 import json, sys
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 
 DATA_DIR = Path("data")
 TRADES_FILE = DATA_DIR / "trade_history.json"
@@ -48,7 +48,15 @@ def load_trades(path: Path):
         arr = obj
     else:
         arr = []
+    return _normalize(arr)
 
+def load_trades_db(symbol: str | None = SYMBOL, since=None):
+    """Trade từ history_db (lọc symbol/thời gian theo chỉ mục, không nạp cả trade_history.json)."""
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+    from core.memory.history_db import get_db
+    return _normalize(get_db().trades(since=since, symbol=symbol, status="FILLED"))
+
+def _normalize(arr):
     out = []
     for r in arr:
         if not isinstance(r, dict): continue
@@ -103,6 +111,16 @@ def last_price_from_candles(path: Path) -> float:
         pass
     return 0.0
 
+def last_price_from_store(symbol: str = SYMBOL) -> float:
+    """Giá đóng cửa nến cuối từ kho cột memory-mapped (không parse JSON)."""
+    try:
+        from core.collector.candle_store import get_store
+        from configs.config import TIMEFRAME
+        v = get_store().view(symbol, str(TIMEFRAME or "15m"), n=1)
+        return float(v.close[-1]) if v is not None and len(v) else 0.0
+    except Exception:
+        return 0.0
+
 class PnLTracker:
     def __init__(self):
         self.lots = []   # {"qty":..., "price":..., "side": "LONG"/"SHORT", "ts": ...}
@@ -153,13 +171,29 @@ class PnLTracker:
         return net, avg
 
 def main():
-    trades = load_trades(TRADES_FILE)
+    import argparse
+    ap = argparse.ArgumentParser(description="Báo cáo PnL từ lệnh FILLED")
+    ap.add_argument("--symbol", default=SYMBOL)
+    ap.add_argument("--days", type=float, default=0.0, help="chỉ xét N ngày gần nhất (0 = toàn bộ)")
+    ap.add_argument("--file", default="", help="đọc file trade_history JSON thay cho history_db")
+    a = ap.parse_args()
+    symbol = a.symbol.upper()
+
+    if a.file:
+        trades = [t for t in load_trades(Path(a.file)) if str(t["symbol"]).upper() == symbol]
+    else:
+        since = datetime.now(timezone.utc) - timedelta(days=a.days) if a.days > 0 else None
+        try:
+            trades = load_trades_db(symbol, since)
+        except Exception as e:
+            print(f"history_db lỗi ({e}) → đọc {TRADES_FILE}")
+            trades = [t for t in load_trades(TRADES_FILE) if str(t["symbol"]).upper() == symbol]
     if not trades:
-        print("📭 Không tìm thấy giao dịch FILLED trong data/trade_history.json.")
+        print(f"📭 Không tìm thấy giao dịch FILLED {symbol} (history_db / data/trade_history.json).")
         print("→ Bật CRX_ENABLE_ORDER_EXECUTOR=1 để phát sinh lệnh mới, hoặc kiểm tra format trade_history.")
         return 0
 
-    last_px = last_price_from_candles(CANDLES_FILE)
+    last_px = last_price_from_store(symbol) or last_price_from_candles(CANDLES_FILE)
     tracker = PnLTracker()
     for t in trades:
         tracker.on_trade(t["side"], t["qty"], t["price"], t["ts"])
@@ -169,11 +203,11 @@ def main():
     if abs(pos) > 1e-12 and last_px > 0:
         unreal = (last_px - avg) * pos if pos > 0 else (avg - last_px) * (-pos)
 
-    print(f"===== TRADE REPORT ({SYMBOL}) =====")
+    print(f"===== TRADE REPORT ({symbol}) =====")
     print(f"Trades (FILLED): {len(trades)} | Closed deals: {len(tracker.closed)}")
     print(f"Realized PnL: {tracker.realized:.4f} USDT")
     if abs(pos) > 0:
-        print(f"Open Position: {pos:.6f} BTC @ {avg:.2f} | Last: {last_px:.2f} | Unrealized: {unreal:.4f} USDT")
+        print(f"Open Position: {pos:.6f} {symbol.replace('USDT', '')} @ {avg:.2f} | Last: {last_px:.2f} | Unrealized: {unreal:.4f} USDT")
     else:
         print("Open Position: 0")
 
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+tools/user_stream_stub.py
+Server giả lập user data stream Binance Futures (local), dùng để test core/execution/user_stream.py.
+- REST: /fapi/v1/time, /fapi/v1/listenKey (POST/PUT/DELETE), /fapi/v1/order (POST MARKET, GET trạng thái),
+        /fapi/v2/positionRisk, /fapi/v2/balance, /fapi/v1/exchangeInfo (đủ cho tools/close_all_positions.py). Request ký được kiểm HMAC bằng --secret.
+- WS  : /ws/<listenKey> → ORDER_TRADE_UPDATE (NEW rồi FILLED sau --fill-delay-ms) + ACCOUNT_UPDATE.
+- Sự cố: drop_ws() cắt mọi kết nối WS, expire_keys() gửi listenKeyExpired + huỷ key (client phải xin key mới).
+
+Cách dùng:
+  python tools/user_stream_stub.py --port 8775 --rest-port 8776
+  CRX_WS_BASE=ws://127.0.0.1:8775 CRX_REST_BASE=http://127.0.0.1:8776 BINANCE_API_KEY=stub BINANCE_API_SECRET=stub-secret ...
+  python tools/user_stream_stub.py --selftest      # chạy kịch bản kiểm tra listener (exit 1 nếu sai)
+"""
+from __future__ import annotations
+
+import sys
+import hmac
+import json
+import time
+import uuid
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qsl, urlencode
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from utils.ws_helpers import WSServer, WSConn
+
+
+class UserStreamStub:
+    def __init__(self, secret: str = "stub-secret", fill_delay_ms: int = 50, price: float = 60000.0):
+        self.secret = secret
+        self.fill_delay_ms = fill_delay_ms
+        self.price = price
+        self.keys: set = set()
+        self.conns: dict = {}                       # listenKey → [WSConn]
+        self.orders: dict = {}                      # orderId → order (dạng REST)
+        self.positions: dict = {}                   # symbol → [amt, entry]
+        self.rest_calls: dict = {}
+        self.push_orders = True                     # False → không đẩy ORDER_TRADE_UPDATE (ép client dùng REST)
+        self._oid = 0
+        self._lock = threading.Lock()
+
+    def now_ms(self) -> int:
+        return int(time.time() * 1000)
+
+    # ----- WS -----
+    def ws_handler(self, conn: WSConn, path: str) -> None:
+        key = path.rsplit("/", 1)[-1]
+        if key not in self.keys:
+            return
+        with self._lock:
+            self.conns.setdefault(key, []).append(conn)
+        while not conn.closed:
+            try:
+                conn.recv(timeout=1.0)
+            except Exception:
+                break
+        with self._lock:
+            if conn in self.conns.get(key, []):
+                self.conns[key].remove(conn)
+
+    def push(self, event: dict) -> None:
+        raw = json.dumps(event)
+        with self._lock:
+            conns = [c for lst in self.conns.values() for c in lst]
+        for c in conns:
+            try:
+                c.send_text(raw)
+            except Exception:
+                pass
+
+    def drop_ws(self) -> None:
+        with self._lock:
+            conns = [c for lst in self.conns.values() for c in lst]
+        for c in conns:
+            c.close()
+
+    def expire_keys(self) -> None:
+        self.push({"e": "listenKeyExpired", "E": self.now_ms()})
+        with self._lock:
+            self.keys.clear()
+        self.drop_ws()
+
+    # ----- lệnh -----
+    def _order_event(self, o: dict, exec_type: str, last_qty: str = "0") -> dict:
+        return {"e": "ORDER_TRADE_UPDATE", "E": self.now_ms(), "T": self.now_ms(), "o": {
+            "s": o["symbol"], "c": o["clientOrderId"], "S": o["side"], "o": o["type"], "q": o["origQty"],
+            "p": "0", "ap": o["avgPrice"], "X": o["status"], "x": exec_type, "i": o["orderId"],
+            "l": last_qty, "z": o["executedQty"], "L": o["avgPrice"], "T": o["updateTime"],
+            "R": o["reduceOnly"], "ps": "BOTH", "rp": "0", "n": "0", "N": "USDT"}}
+
+    def place(self, p: dict) -> dict:
+        with self._lock:
+            self._oid += 1
+            o = {"symbol": p.get("symbol", "BTCUSDT").upper(), "orderId": self._oid,
+                 "clientOrderId": p.get("newClientOrderId") or f"stub-{uuid.uuid4().hex[:12]}",
+                 "side": p.get("side", "BUY").upper(), "type": p.get("type", "MARKET"), "status": "NEW",
+                 "origQty": p.get("quantity", "0"), "executedQty": "0", "avgPrice": "0",
+                 "reduceOnly": str(p.get("reduceOnly", "false")).lower() == "true", "updateTime": self.now_ms()}
+            self.orders[o["orderId"]] = o
+        if self.push_orders:
+            self.push(self._order_event(o, "NEW"))
+        threading.Timer(self.fill_delay_ms / 1000.0, self._fill, args=(o["orderId"],)).start()
+        return dict(o)
+
+    def _fill(self, oid: int) -> None:
+        with self._lock:
+            o = self.orders[oid]
+            qty = float(o["origQty"])
+            sgn = 1 if o["side"] == "BUY" else -1
+            amt, entry = self.positions.get(o["symbol"], [0.0, 0.0])
+            new = amt + sgn * qty
+            self.positions[o["symbol"]] = [new, self.price if abs(new) > 1e-12 else 0.0]
+            o.update(status="FILLED", executedQty=o["origQty"], avgPrice=f"{self.price:.2f}", updateTime=self.now_ms())
+            snap = dict(o)
+        if self.push_orders:
+            self.push(self._order_event(snap, "TRADE", snap["origQty"]))
+        amt, entry = self.positions[snap["symbol"]]
+        self.push({"e": "ACCOUNT_UPDATE", "E": self.now_ms(), "T": self.now_ms(), "a": {
+            "m": "ORDER", "B": [{"a": "USDT", "wb": "1000", "cw": "1000"}],
+            "P": [{"s": snap["symbol"], "pa": f"{amt:.8f}", "ep": f"{entry:.2f}", "up": "0", "ps": "BOTH"}]}})
+
+    # ----- REST -----
+    def _signed_ok(self, q: dict) -> bool:
+        sig = q.pop("signature", None)
+        good = hmac.new(self.secret.encode(), urlencode(q).encode(), hashlib.sha256).hexdigest()
+        return sig == good
+
+    def http_handler(self):
+        stub = self
+
+        class H(BaseHTTPRequestHandler):
+            def log_message(self, *a):
+                pass
+
+            def _send(self, code: int, body) -> None:
+                raw = json.dumps(body).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def _route(self, method: str) -> None:
+                u = urlparse(self.path)
+                q = dict(parse_qsl(u.query))
+                n = self.headers.get("Content-Length")
+                if n:
+                    q.update(parse_qsl(self.rfile.read(int(n)).decode()))
+                stub.rest_calls[f"{method} {u.path}"] = stub.rest_calls.get(f"{method} {u.path}", 0) + 1
+                if u.path == "/fapi/v1/time":
+                    return self._send(200, {"serverTime": stub.now_ms()})
+                if u.path == "/fapi/v1/listenKey":
+                    if method == "POST":
+                        key = uuid.uuid4().hex
+                        stub.keys.add(key)
+                        return self._send(200, {"listenKey": key})
+                    if method == "PUT":
+                        ok = q.get("listenKey") in stub.keys
+                        return self._send(200 if ok else 400, {} if ok else {"code": -1125, "msg": "listenKey not exist"})
+                    stub.keys.discard(q.get("listenKey"))
+                    return self._send(200, {})
+                if u.path == "/fapi/v1/exchangeInfo":
+                    return self._send(200, {"symbols": [{"symbol": s, "status": "TRADING", "filters": [
+                        {"filterType": "LOT_SIZE", "stepSize": "0.001", "minQty": "0.001"}]}
+                        for s in ("BTCUSDT", "ETHUSDT")]})
+                if u.path in ("/fapi/v1/order", "/fapi/v2/positionRisk", "/fapi/v2/balance"):
+                    if not stub._signed_ok(q):
+                        return self._send(400, {"code": -1022, "msg": "bad signature"})
+                    if u.path == "/fapi/v2/balance":
+                        return self._send(200, [{"asset": "USDT", "balance": "1000", "availableBalance": "1000"}])
+                    if u.path == "/fapi/v2/positionRisk":
+                        return self._send(200, [{"symbol": s, "positionAmt": f"{a:.8f}", "entryPrice": f"{e:.2f}",
+                                                 "unRealizedProfit": "0", "positionSide": "BOTH"}
+                                                for s, (a, e) in stub.positions.items()])
+                    if method == "POST":
+                        return self._send(200, stub.place(q))
+                    o = stub.orders.get(int(q.get("orderId", 0) or 0))
+                    if o is None:
+                        o = next((x for x in stub.orders.values() if x["clientOrderId"] == q.get("origClientOrderId")), None)
+                    return self._send(200, dict(o)) if o else self._send(400, {"code": -2013, "msg": "Order does not exist."})
+                self._send(404, {"code": -1, "msg": "unknown"})
+
+            def do_GET(self):
+                self._route("GET")
+
+            def do_POST(self):
+                self._route("POST")
+
+            def do_PUT(self):
+                self._route("PUT")
+
+            def do_DELETE(self):
+                self._route("DELETE")
+
+        return H
+
+
+def serve(port: int = 0, rest_port: int = 0, secret: str = "stub-secret", fill_delay_ms: int = 50):
+    """Khởi động WS + REST giả lập (thread nền). Trả (stub, ws_server, http_server)."""
+    stub = UserStreamStub(secret=secret, fill_delay_ms=fill_delay_ms)
+    ws = WSServer(stub.ws_handler, port=port).start()
+    http = ThreadingHTTPServer(("127.0.0.1", rest_port), stub.http_handler())
+    threading.Thread(target=http.serve_forever, daemon=True).start()
+    return stub, ws, http
+
+
+def selftest() -> int:
+    """Kịch bản: fill qua push, Future/asyncio, REST fallback khi WS đứt, nối lại, listenKey hết hạn."""
+    import asyncio
+    from core.execution.binance_client import BinanceClient
+    from core.execution.user_stream import UserStream
+    from core.runtime.candle_clock import ServerClock
+
+    stub, ws, http = serve(fill_delay_ms=80)
+    rest = f"http://127.0.0.1:{http.server_address[1]}"
+    client = BinanceClient(rest, "stub", "stub-secret", clock=ServerClock(rest), limiter=None, log=lambda m: None)
+    logs: list = []
+    us = UserStream(client, ws_base=ws.url, log=logs.append).start(wait_sec=5)
+    fails = []
+
+    def check(name: str, ok: bool, info: str = "") -> None:
+        print(f"  {'✅' if ok else '❌'} {name} {info}")
+        if not ok:
+            fails.append(name)
+
+    def order(side: str = "BUY", qty: str = "0.010") -> dict:
+        return client.post("/fapi/v1/order", {"symbol": "BTCUSDT", "side": side, "type": "MARKET", "quantity": qty})
+
+    check("kết nối", us.connected)
+    # 1) fill qua push, không hỏi REST /order
+    before = stub.rest_calls.get("GET /fapi/v1/order", 0)
+    t0 = time.time()
+    o = order()
+    final = us.wait_final("BTCUSDT", o["orderId"], None, timeout_sec=5)
+    dt = (time.time() - t0) * 1000
+    check("fill qua stream", final.get("status") == "FILLED" and stub.rest_calls.get("GET /fapi/v1/order", 0) == before,
+          f"({dt:.0f}ms, fill_delay=80ms, status={final.get('status')}, REST GET order={stub.rest_calls.get('GET /fapi/v1/order', 0) - before})")
+    time.sleep(0.1)
+    check("sổ vị thế", abs(us.positions.get("BTCUSDT", {}).get("positionAmt", 0) - 0.01) < 1e-9, str(us.positions))
+    # 2) Future + asyncio
+    o = order("SELL")
+    fut = us.future_for(client_order_id=o["clientOrderId"])
+    res = asyncio.run(us.await_final(o["orderId"], timeout_sec=5))
+    check("future/await", fut.result(timeout=5)["status"] == "FILLED" and res["status"] == "FILLED")
+    # 3) lệnh đã khớp trước khi đăng ký chờ → trả ngay từ sổ
+    o = order()
+    time.sleep(0.3)
+    t0 = time.time()
+    final = us.wait_final("BTCUSDT", o["orderId"], None, timeout_sec=5)
+    check("đã khớp trước khi chờ", final.get("status") == "FILLED" and time.time() - t0 < 0.05)
+    # 4) stream không đẩy lệnh (đứt ngầm) → REST bảo hiểm
+    stub.push_orders = False
+    us_rest_sec = 0.5
+    import core.execution.user_stream as usm
+    old, usm.REST_SAFETY_SEC = usm.REST_SAFETY_SEC, us_rest_sec
+    o = order()
+    final = us.wait_final("BTCUSDT", o["orderId"], None, timeout_sec=5)
+    usm.REST_SAFETY_SEC = old
+    stub.push_orders = True
+    check("REST bảo hiểm", final.get("status") == "FILLED")
+    # 5) WS đứt → nối lại + REST fallback trong lúc đứt
+    stub.drop_ws()
+    time.sleep(0.2)
+    o = order()
+    final = us.wait_final("BTCUSDT", o["orderId"], None, timeout_sec=5, interval_sec=0.2)
+    check("REST khi WS đứt", final.get("status") == "FILLED")
+    us._connected_evt.wait(5)
+    check("nối lại", us.connected, f"(listenKey cũ còn={us.listen_key in stub.keys})")
+    # 6) listenKey hết hạn → key mới
+    key0 = us.listen_key
+    stub.expire_keys()
+    time.sleep(0.3)
+    us._connected_evt.wait(5)
+    check("listenKey mới", us.connected and us.listen_key != key0 and us.listen_key in stub.keys)
+    o = order()
+    final = us.wait_final("BTCUSDT", o["orderId"], None, timeout_sec=5)
+    check("fill sau khi đổi key", final.get("status") == "FILLED")
+    us.stop(release_key=True)
+    ws.stop()
+    http.shutdown()
+    print(f"[user_stream_stub] REST calls: {stub.rest_calls} | stream: {us.stats()}")
+    return 1 if fails else 0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8775, help="cổng WS")
+    ap.add_argument("--rest-port", type=int, default=8776, help="cổng REST")
+    ap.add_argument("--secret", default="stub-secret")
+    ap.add_argument("--fill-delay-ms", type=int, default=50)
+    ap.add_argument("--selftest", action="store_true")
+    a = ap.parse_args()
+    if a.selftest:
+        raise SystemExit(selftest())
+    _, ws, http = serve(a.port, a.rest_port, a.secret, a.fill_delay_ms)
+    print(f"✅ Stub user stream: WS {ws.url} | REST http://127.0.0.1:{http.server_address[1]}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        ws.stop()
+        http.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 # tools/validate_history.py
 # -*- coding: utf-8 -*-
 """
-Trình soát lỗi decision_history.json cho CrX.
+Trình soát lỗi lịch sử quyết định cho CrX (decision log mặc định, hoặc 1 file JSON mảng).
 - Mặc định: chỉ kiểm tra & báo cáo (không sửa).
 - Tùy chọn --fix: điền mặc định an toàn khi có thể.
 """
@@ -11,10 +11,17 @@ import argparse
 from datetime import datetime
 from typing import Any, Dict, List, Tuple, Optional
 import math
+import os
 import re
 import sys
 from copy import deepcopy
 
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from core.memory.decision_log import load_records
+
 DECISIONS = {"BUY", "SELL", "HOLD"}
 
 def parse_ts(s: str) -> Optional[datetime]:
@@ -182,16 +189,16 @@ def validate_entry(
     return entry, issues, ts
 
 def main():
-    ap = argparse.ArgumentParser(description="Validate decision_history.json cho CrX.")
-    ap.add_argument("path", help="Đường dẫn tới decision_history.json")
+    ap = argparse.ArgumentParser(description="Validate lịch sử quyết định cho CrX.")
+    ap.add_argument("path", nargs="?", default=None,
+                    help="Thư mục decision log (mặc định data/decision_log) hoặc file JSON mảng")
     ap.add_argument("--fix", action="store_true", help="Tự điền mặc định an toàn khi có thể.")
     ap.add_argument("--out", default=None, help="Ghi file JSON đã fix ra đường dẫn này (chỉ khi dùng --fix).")
     args = ap.parse_args()
 
     # Đọc file
     try:
-        with open(args.path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = load_records(args.path)
     except Exception as ex:
         print(f"❌ Không đọc được file: {ex}")
         sys.exit(1)
@@ -0,0 +1,233 @@
+# utils/ws_helpers.py
+# -*- coding: utf-8 -*-
+"""
+WebSocket tối giản (RFC6455) chỉ dùng thư viện chuẩn – đủ cho stream Binance & server giả lập local.
+- connect(url) → WSConn (client, frame có mask), hỗ trợ ws:// và wss://
+- WSServer(handler) → server đa luồng cho test (handler(conn, path) chạy trên thread riêng)
+- WSConn tự trả lời ping, gom frame continuation, close → ConnectionError
+"""
+from __future__ import annotations
+
+import os
+import ssl
+import base64
+import socket
+import struct
+import hashlib
+import threading
+from typing import Callable, Optional, Tuple
+from urllib.parse import urlparse
+
+_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OP_CONT, OP_TEXT, OP_BIN, OP_CLOSE, OP_PING, OP_PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+
+
+def _accept_key(key: str) -> str:
+    return base64.b64encode(hashlib.sha1((key + _GUID).encode()).digest()).decode()
+
+
+def _read_http_head(sock: socket.socket) -> bytes:
+    buf = b""
+    while b"\r\n\r\n" not in buf:
+        chunk = sock.recv(1024)
+        if not chunk:
+            raise ConnectionError("ws: mất kết nối khi bắt tay")
+        buf += chunk
+        if len(buf) > 65536:
+            raise ConnectionError("ws: header bắt tay quá dài")
+    return buf
+
+
+class WSConn:
+    def __init__(self, sock: socket.socket, mask: bool, pending: bytes = b""):
+        self.sock = sock
+        self.mask = mask            # client → server bắt buộc mask
+        self._buf = pending
+        self._send_lock = threading.Lock()
+        self.closed = False
+
+    # ----- gửi -----
+    def _send_frame(self, opcode: int, payload: bytes) -> None:
+        head = bytes([0x80 | opcode])
+        n = len(payload)
+        mbit = 0x80 if self.mask else 0
+        if n < 126:
+            head += bytes([mbit | n])
+        elif n < 65536:
+            head += bytes([mbit | 126]) + struct.pack("!H", n)
+        else:
+            head += bytes([mbit | 127]) + struct.pack("!Q", n)
+        if self.mask:
+            key = os.urandom(4)
+            payload = bytes(b ^ key[i % 4] for i, b in enumerate(payload))
+            head += key
+        with self._send_lock:
+            self.sock.sendall(head + payload)
+
+    def send_text(self, text: str) -> None:
+        self._send_frame(OP_TEXT, text.encode("utf-8"))
+
+    def ping(self, data: bytes = b"") -> None:
+        self._send_frame(OP_PING, data)
+
+    # ----- nhận -----
+    def _read_exact(self, n: int) -> bytes:
+        while len(self._buf) < n:
+            chunk = self.sock.recv(max(4096, n - len(self._buf)))
+            if not chunk:
+                self.closed = True
+                raise ConnectionError("ws: kết nối đã đóng")
+            self._buf += chunk
+        out, self._buf = self._buf[:n], self._buf[n:]
+        return out
+
+    def _read_frame(self) -> Tuple[bool, int, bytes]:
+        b1, b2 = self._read_exact(2)
+        fin, opcode = bool(b1 & 0x80), b1 & 0x0F
+        masked, n = bool(b2 & 0x80), b2 & 0x7F
+        if n == 126:
+            n = struct.unpack("!H", self._read_exact(2))[0]
+        elif n == 127:
+            n = struct.unpack("!Q", self._read_exact(8))[0]
+        key = self._read_exact(4) if masked else b""
+        payload = self._read_exact(n)
+        if masked:
+            payload = bytes(b ^ key[i % 4] for i, b in enumerate(payload))
+        return fin, opcode, payload
+
+    def recv(self, timeout: Optional[float] = None) -> Optional[str]:
+        """Trả message text kế tiếp; None nếu hết timeout. Đóng kết nối → ConnectionError."""
+        self.sock.settimeout(timeout)
+        parts: list = []
+        try:
+            while True:
+                fin, opcode, payload = self._read_frame()
+                if opcode == OP_PING:
+                    self._send_frame(OP_PONG, payload)
+                    continue
+                if opcode == OP_PONG:
+                    continue
+                if opcode == OP_CLOSE:
+                    self.close()
+                    raise ConnectionError("ws: server đóng kết nối")
+                parts.append(payload)
+                if fin:
+                    return b"".join(parts).decode("utf-8", errors="replace")
+        except socket.timeout:
+            if parts:
+                raise ConnectionError("ws: timeout giữa message phân mảnh")
+            return None
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._send_frame(OP_CLOSE, struct.pack("!H", 1000))
+        except Exception:
+            pass
+        try:
+            self.sock.close()
+        except Exception:
+            pass
+
+
+def connect(url: str, timeout: float = 10.0, headers: Optional[dict] = None) -> WSConn:
+    u = urlparse(url)
+    secure = u.scheme == "wss"
+    host, port = u.hostname or "localhost", u.port or (443 if secure else 80)
+    path = (u.path or "/") + (f"?{u.query}" if u.query else "")
+    sock = socket.create_connection((host, port), timeout=timeout)
+    if secure:
+        sock = ssl.create_default_context().wrap_socket(sock, server_hostname=host)
+    key = base64.b64encode(os.urandom(16)).decode()
+    lines = [
+        f"GET {path} HTTP/1.1",
+        f"Host: {host}:{port}",
+        "Upgrade: websocket",
+        "Connection: Upgrade",
+        f"Sec-WebSocket-Key: {key}",
+        "Sec-WebSocket-Version: 13",
+    ] + [f"{k}: {v}" for k, v in (headers or {}).items()]
+    sock.sendall(("\r\n".join(lines) + "\r\n\r\n").encode())
+    raw = _read_http_head(sock)
+    head, _, rest = raw.partition(b"\r\n\r\n")
+    text = head.decode("latin-1")
+    if " 101 " not in text.split("\r\n", 1)[0]:
+        sock.close()
+        raise ConnectionError(f"ws: bắt tay thất bại: {text.splitlines()[0] if text else '?'}")
+    if _accept_key(key) not in text:
+        sock.close()
+        raise ConnectionError("ws: Sec-WebSocket-Accept không khớp")
+    return WSConn(sock, mask=True, pending=rest)
+
+
+class WSServer:
+    """
+    Server WebSocket đa luồng cho giả lập local (stream nến, user-data...).
+    handler(conn, path) chạy trên thread riêng cho từng client; trả về → đóng kết nối.
+    """
+    def __init__(self, handler: Callable[[WSConn, str], None], host: str = "127.0.0.1", port: int = 0):
+        self.handler = handler
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((host, port))
+        self._sock.listen(16)
+        self.host, self.port = self._sock.getsockname()[:2]
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    def start(self) -> "WSServer":
+        self._thread = threading.Thread(target=self._accept_loop, name="ws-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        try:
+            self._sock.close()
+        except Exception:
+            pass
+
+    def _accept_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                cli, _ = self._sock.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._serve, args=(cli,), daemon=True).start()
+
+    def _serve(self, cli: socket.socket) -> None:
+        conn = None
+        try:
+            raw = _read_http_head(cli)
+            head, _, rest = raw.partition(b"\r\n\r\n")
+            lines = head.decode("latin-1").split("\r\n")
+            path = lines[0].split(" ")[1] if len(lines[0].split(" ")) > 1 else "/"
+            hdrs = {k.strip().lower(): v.strip() for k, _, v in (ln.partition(":") for ln in lines[1:])}
+            key = hdrs.get("sec-websocket-key")
+            if not key:
+                cli.sendall(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+                cli.close()
+                return
+            cli.sendall((
+                "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                f"Sec-WebSocket-Accept: {_accept_key(key)}\r\n\r\n"
+            ).encode())
+            conn = WSConn(cli, mask=False, pending=rest)
+            self.handler(conn, path)
+        except Exception:
+            pass
+        finally:
+            if conn is not None:
+                conn.close()
+            else:
+                try:
+                    cli.close()
+                except Exception:
+                    pass